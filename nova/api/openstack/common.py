@@ -485,6 +485,14 @@ def check_snapshots_enabled(f):
 class ViewBuilder(object):
     """Model API responses as dictionaries."""
 
+    def _map_items(self, func, items):
+        """Return func applied to each of items, as a generator when the
+        list is long enough for the response to be streamed.
+        """
+        if wsgi.should_stream(len(items)):
+            return (func(item) for item in items)
+        return [func(item) for item in items]
+
     def _get_project_id(self, request):
         """Get project id from request url if present or empty string
         otherwise
@@ -165,6 +165,9 @@ class QuotaSetsController(wsgi.Controller):
                                 user_id=user_id)
             except exception.AdminRequired:
                 raise webob.exc.HTTPForbidden()
+        # The limits read above are cached on the context, drop them so
+        # the response shows the new ones.
+        QUOTAS.forget_limits(context, project_id)
         return self._format_quota_set(id, self._get_quotas(context, id,
                                                            user_id=user_id))
 
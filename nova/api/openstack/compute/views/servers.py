@@ -131,9 +131,12 @@ class ViewBuilder(common.ViewBuilder):
         :param servers: List of servers in dictionary format
         :param coll_name: Name of collection, used to generate the next link
                           for a pagination query
-        :returns: Server data in dictionary format
+        :returns: Server data in dictionary format, the servers being
+                  generated as they are serialized when the list is
+                  streamed
         """
-        server_list = [func(request, server)["server"] for server in servers]
+        server_list = self._map_items(
+            lambda server: func(request, server)["server"], servers)
         servers_links = self._get_collection_links(request,
                                                    servers,
                                                    coll_name)
@@ -14,12 +14,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import inspect
+import itertools
 import math
 import time
 from xml.dom import minidom
 
 from lxml import etree
+from oslo.config import cfg
 import six
 import webob
 
@@ -33,6 +36,22 @@ from nova import utils
 from nova import wsgi
 
 
+wsgi_opts = [
+    cfg.IntOpt('osapi_stream_threshold',
+               default=0,
+               help='JSON responses holding a list of at least this many '
+                    'items are streamed with chunked transfer encoding '
+                    'instead of being serialized in one piece. The default '
+                    'of 0 never streams responses'),
+    cfg.IntOpt('osapi_stream_chunk_size',
+               default=100,
+               help='Number of list items serialized into each chunk of a '
+                    'streamed JSON response'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(wsgi_opts)
+
 XMLNS_V10 = 'http://docs.rackspacecloud.com/servers/api/v1.0'
 XMLNS_V11 = 'http://docs.openstack.org/compute/api/v1.1'
 
@@ -333,6 +352,16 @@ class MetadataXMLDeserializer(XMLDeserializer):
         return metadata
 
 
+def _is_list_value(value):
+    return isinstance(value, (list, tuple, collections.Iterator))
+
+
+def should_stream(length):
+    """Return True if a list of length items should be streamed."""
+    return (CONF.osapi_stream_threshold > 0 and
+            length >= CONF.osapi_stream_threshold)
+
+
 class DictSerializer(ActionDispatcher):
     """Default request body serialization."""
 
@@ -349,6 +378,33 @@ class JSONDictSerializer(DictSerializer):
     def default(self, data):
         return jsonutils.dumps(data)
 
+    def serialize_chunks(self, data, chunk_size):
+        """Serialize data, a dict, into an iterator of JSON text chunks.
+
+        List and iterator values of data are encoded chunk_size items at
+        a time, so neither the whole document nor, for iterators, the
+        whole list has to be held in memory at once.  The result is the
+        same text default() would produce.
+        """
+        yield '{'
+        for index, (key, value) in enumerate(data.iteritems()):
+            prefix = '%s%s: ' % (index and ', ' or '', jsonutils.dumps(key))
+            if not _is_list_value(value):
+                yield prefix + jsonutils.dumps(value)
+                continue
+            yield prefix + '['
+            items = iter(value)
+            separator = ''
+            while True:
+                chunk = [jsonutils.dumps(item)
+                         for item in itertools.islice(items, chunk_size)]
+                if not chunk:
+                    break
+                yield separator + ', '.join(chunk)
+                separator = ', '
+            yield ']'
+        yield '}'
+
 
 class XMLDictSerializer(DictSerializer):
 
@@ -607,10 +663,43 @@ class ResponseObject(object):
             response.headers[hdr] = utils.utf8(str(value))
         response.headers['Content-Type'] = utils.utf8(content_type)
         if self.obj is not None:
-            response.body = serializer.serialize(self.obj)
+            if self._should_stream(serializer):
+                # Without a Content-Length the WSGI server sends the
+                # chunks with chunked transfer encoding.
+                response.app_iter = serializer.serialize_chunks(
+                    self.obj, CONF.osapi_stream_chunk_size)
+            else:
+                self._list_iterators()
+                response.body = serializer.serialize(self.obj)
 
         return response
 
+    def _list_iterators(self, skip=None):
+        """Turn the iterators held by the object, but skip, into lists."""
+        if isinstance(self.obj, dict):
+            for key, value in self.obj.items():
+                if key != skip and isinstance(value, collections.Iterator):
+                    self.obj[key] = list(value)
+
+    def _should_stream(self, serializer):
+        """Return True if the object should be serialized in chunks.
+
+        Only dicts serialized to JSON are streamed, when they hold an
+        iterator, which controllers return to avoid building long lists,
+        or a list longer than osapi_stream_threshold.
+        """
+        if (not CONF.osapi_stream_threshold or
+                not isinstance(serializer, JSONDictSerializer) or
+                not isinstance(self.obj, dict)):
+            return False
+        for value in self.obj.values():
+            if isinstance(value, collections.Iterator):
+                return True
+            if (isinstance(value, (list, tuple)) and
+                    should_stream(len(value))):
+                return True
+        return False
+
     @property
     def code(self):
         """Retrieve the response status."""
@@ -883,6 +972,44 @@ class Resource(wsgi.Application):
 
         return None
 
+    def _streamed_key(self, resp_obj, extensions):
+        """Return the key of the iterator resp_obj streams, if any.
+
+        Generator extensions can only process the response once, so the
+        response is not streamed when there is one.
+        """
+        if (any(inspect.isgenerator(ext) for ext in extensions) or
+                not resp_obj._should_stream(resp_obj.serializer)):
+            return None
+        for key, value in resp_obj.obj.items():
+            if isinstance(value, collections.Iterator):
+                return key
+        return None
+
+    def _post_process_pages(self, extensions, resp_obj, key, items, request,
+                            action_args):
+        """Yield the items of a streamed list, running the post-processing
+        extensions on each page of them before it is serialized.
+        """
+        while True:
+            page = list(itertools.islice(items,
+                                         CONF.osapi_stream_chunk_size))
+            if not page:
+                return
+            page_obj = ResponseObject({key: page})
+            page_obj.media_type = resp_obj.media_type
+            page_obj.serializer = resp_obj.serializer
+            response = self.post_process_extensions(extensions, page_obj,
+                                                    request, action_args)
+            if response:
+                # The status was already sent, so cut the response short
+                # rather than end it with a list missing items.
+                msg = _("Extension failed while streaming '%s'") % key
+                LOG.error(msg)
+                raise exception.NovaException(msg)
+            for item in page_obj.obj[key]:
+                yield item
+
     def _should_have_body(self, request):
         return request.method in _METHODS_WITH_BODY
 
@@ -993,9 +1120,26 @@ class Resource(wsgi.Application):
                     resp_obj._default_code = meth.wsgi_code
                 resp_obj.preserialize(accept, self.default_serializers)
 
-                # Process post-processing extensions
-                response = self.post_process_extensions(post, resp_obj,
-                                                        request, action_args)
+                # Process post-processing extensions, a page at a time
+                # when the response streams a list
+                post = list(post)
+                key = self._streamed_key(resp_obj, post)
+                resp_obj._list_iterators(skip=key)
+                if key is None:
+                    response = self.post_process_extensions(post, resp_obj,
+                                                            request,
+                                                            action_args)
+                else:
+                    items = resp_obj.obj[key]
+                    resp_obj.obj[key] = list(itertools.islice(
+                        items, CONF.osapi_stream_chunk_size))
+                    response = self.post_process_extensions(post, resp_obj,
+                                                            request,
+                                                            action_args)
+                    resp_obj.obj[key] = itertools.chain(
+                        resp_obj.obj[key],
+                        self._post_process_pages(post, resp_obj, key, items,
+                                                 request, action_args))
 
             if resp_obj and not response:
                 response = resp_obj.serialize(request, accept,
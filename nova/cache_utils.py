@@ -0,0 +1,174 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In process cache with O(1) expiry and optional LRU bounds, for when no
+memcached servers are configured.
+"""
+
+import collections
+import heapq
+import sys
+
+from oslo.config import cfg
+
+from nova.openstack.common import memorycache
+from nova.openstack.common import timeutils
+
+cache_opts = [
+    cfg.IntOpt('memorycache_max_items',
+               default=0,
+               help='Maximum number of entries kept by the in process '
+                    'cache, least recently used entries are evicted first. '
+                    '0 means no limit.'),
+    cfg.IntOpt('memorycache_max_bytes',
+               default=0,
+               help='Approximate maximum size in bytes of the keys and '
+                    'values kept by the in process cache, least recently '
+                    'used entries are evicted first. 0 means no limit.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(cache_opts)
+
+
+def get_client(memcached_servers=None):
+    """Return a memcache client, or a Client if no servers are set."""
+    client_cls = Client
+
+    if not memcached_servers:
+        memcached_servers = CONF.memcached_servers
+    if memcached_servers:
+        try:
+            import memcache
+            client_cls = memcache.Client
+        except ImportError:
+            pass
+
+    return client_cls(memcached_servers, debug=0)
+
+
+class Client(memorycache.Client):
+    """A memorycache.Client which doesn't scan the whole cache.
+
+    Entries are kept in least recently used order and their expiry times
+    in a heap: an expired entry is dropped when it is looked up, or, in
+    expiry order, when any entry is set. The least recently used entries
+    are evicted when the cache holds more than memorycache_max_items
+    entries or memorycache_max_bytes bytes, as estimated by
+    sys.getsizeof().
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Ignores the passed in args."""
+        super(Client, self).__init__(*args, **kwargs)
+        self.cache = collections.OrderedDict()
+        self.max_items = CONF.memorycache_max_items
+        self.max_bytes = CONF.memorycache_max_bytes
+        self._sizes = {}
+        self._bytes = 0
+        self._expiry = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key):
+        del self.cache[key]
+        self._bytes -= self._sizes.pop(key)
+
+    def _store(self, key, timeout, value):
+        if key in self.cache:
+            self._remove(key)
+        self.cache[key] = (timeout, value)
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        self._sizes[key] = size
+        self._bytes += size
+
+    def _expire(self, now):
+        """Drop the entries which expired by now."""
+        while self._expiry and self._expiry[0][0] <= now:
+            timeout, key = heapq.heappop(self._expiry)
+            # Skip keys deleted or set again since this timeout was pushed.
+            entry = self.cache.get(key)
+            if entry is not None and entry[0] == timeout:
+                self._remove(key)
+                self.expirations += 1
+        if len(self._expiry) > 2 * len(self.cache) + 64:
+            self._expiry = [(expiry, cached_key) for cached_key, (expiry, _v)
+                            in self.cache.iteritems() if expiry]
+            heapq.heapify(self._expiry)
+
+    def _evict(self):
+        """Drop the least recently used entries while over a limit."""
+        while self.cache and (
+                (self.max_items and len(self.cache) > self.max_items) or
+                (self.max_bytes and self._bytes > self.max_bytes)):
+            self._remove(next(iter(self.cache)))
+            self.evictions += 1
+
+    def get(self, key):
+        """Retrieves the value for a key or None."""
+        entry = self.cache.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        timeout, value = entry
+        if timeout and timeutils.utcnow_ts() >= timeout:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        # Move the key to the most recently used end.
+        del self.cache[key]
+        self.cache[key] = entry
+        self.hits += 1
+        return value
+
+    def set(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key."""
+        now = timeutils.utcnow_ts()
+        timeout = 0
+        if time != 0:
+            timeout = now + time
+            heapq.heappush(self._expiry, (timeout, key))
+        self._store(key, timeout, value)
+        self._expire(now)
+        self._evict()
+        return True
+
+    def incr(self, key, delta=1):
+        """Increments the value for a key."""
+        value = self.get(key)
+        if value is None:
+            return None
+        new_value = int(value) + delta
+        self._store(key, self.cache[key][0], str(new_value))
+        return new_value
+
+    def delete(self, key, time=0):
+        """Deletes the value associated with a key."""
+        if key in self.cache:
+            self._remove(key)
+
+    def get_stats(self):
+        """Returns cache statistics, named like memcached's."""
+        return [('memorycache', {'curr_items': len(self.cache),
+                                 'bytes': self._bytes,
+                                 'get_hits': self.hits,
+                                 'get_misses': self.misses,
+                                 'evictions': self.evictions,
+                                 'reclaimed': self.expirations})]
@@ -267,6 +267,7 @@ class ProjectCommands(object):
                 except exception.QuotaExists:
                     db.quota_update(ctxt, project_id, key, value,
                                     user_id=user_id)
+                QUOTAS.forget_limits(ctxt, project_id)
             else:
                 print(_('%(key)s is not a valid quota key. Valid options are: '
                         '%(options)s.') % {'key': key,
@@ -1027,6 +1028,7 @@ class FlavorCommands(object):
                             ctxt,
                             inst_type["flavorid"],
                             ext_spec)
+            flavors.invalidate_cache()
             print((_("Key %(key)s set to %(value)s on instance "
                      "type %(name)s") %
                    {'key': key, 'value': value, 'name': name}))
@@ -1049,6 +1051,7 @@ class FlavorCommands(object):
                         ctxt,
                         inst_type["flavorid"],
                         key)
+            flavors.invalidate_cache()
 
             print((_("Key %(key)s on flavor %(name)s unset") %
                    {'key': key, 'name': name}))
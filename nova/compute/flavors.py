@@ -18,12 +18,17 @@
 
 """Built-in instance properties."""
 
+import binascii
+import copy
+import hashlib
+import os
 import re
 import uuid
 
 from oslo.config import cfg
 import six
 
+from nova import cache_utils
 from nova import context
 from nova import db
 from nova import exception
@@ -39,6 +44,13 @@ flavor_opts = [
                default='m1.small',
                help='Default flavor to use for the EC2 API only. The Nova API '
                'does not support a default flavor.'),
+    cfg.IntOpt('flavor_cache_seconds',
+               default=300,
+               help='Seconds to cache flavors and their extra specs looked '
+                    'up by id, name or flavor id, 0 disables the cache. '
+                    'Flavor changes invalidate the cache of the process '
+                    'making them, and of every process sharing '
+                    'memcached_servers with it.'),
 ]
 
 CONF = cfg.CONF
@@ -63,6 +75,82 @@ SQL_SP_FLOAT_MAX = 3.40282e+38
 # Validate extra specs key names.
 VALID_EXTRASPEC_NAME_REGEX = re.compile(r"[\w\.\- :]+$", re.UNICODE)
 
+# NOTE: Flavors almost never change but are looked up on every boot,
+# resize and scheduling request, so lookups are cached. Cached entries
+# are keyed by a generation token that any flavor change replaces,
+# which invalidates all of them at once.
+_GENERATION_KEY = 'flavorcache-generation'
+MC = None
+_CACHE_STATS = {'hits': 0, 'misses': 0}
+
+
+def _get_cache():
+    global MC
+
+    if MC is None:
+        MC = cache_utils.get_client()
+
+    return MC
+
+
+def reset_cache():
+    """Reset the flavor cache and its statistics, mainly for testing."""
+    global MC
+
+    MC = None
+    _CACHE_STATS.update(hits=0, misses=0)
+
+
+def invalidate_cache():
+    """Drop every cached flavor lookup, called on flavor changes."""
+    _get_cache().set(_GENERATION_KEY, _new_generation())
+
+
+def get_cache_stats():
+    """Return the hits, misses and hit rate of the flavor cache."""
+    stats = dict(_CACHE_STATS, hit_rate=0.0)
+    lookups = stats['hits'] + stats['misses']
+    if lookups:
+        stats['hit_rate'] = float(stats['hits']) / lookups
+    return stats
+
+
+def _new_generation():
+    return binascii.hexlify(os.urandom(8))
+
+
+def _get_generation(cache):
+    generation = cache.get(_GENERATION_KEY)
+    if generation is None:
+        cache.add(_GENERATION_KEY, _new_generation())
+        generation = cache.get(_GENERATION_KEY)
+    return generation
+
+
+def _cached_lookup(ctxt, kind, lookup, *args):
+    """Return lookup(ctxt, *args), from the flavor cache if possible.
+
+    Which flavors a lookup sees depends on the project and read_deleted
+    of the context, so they are part of the key. Callers get their own
+    copy of the cached value, which they are free to change.
+    """
+    if CONF.flavor_cache_seconds <= 0:
+        return lookup(ctxt, *args)
+
+    cache = _get_cache()
+    scope = None if ctxt.is_admin else ctxt.project_id
+    key = 'flavorcache-%s-%s' % (_get_generation(cache), hashlib.sha1(
+        repr((kind, scope, ctxt.read_deleted, args))).hexdigest())
+    value = cache.get(key)
+    if value is not None:
+        _CACHE_STATS['hits'] += 1
+        return copy.deepcopy(value)
+
+    _CACHE_STATS['misses'] += 1
+    value = lookup(ctxt, *args)
+    cache.set(key, copy.deepcopy(value), time=CONF.flavor_cache_seconds)
+    return value
+
 
 def _int_or_none(val):
     if val is not None:
@@ -161,10 +249,12 @@ def create(name, memory, vcpus, root_gb, ephemeral_gb=0, flavorid=None,
         raise exception.InvalidInput(reason=_("is_public must be a boolean"))
 
     try:
-        return db.flavor_create(context.get_admin_context(), kwargs)
+        flavor = db.flavor_create(context.get_admin_context(), kwargs)
     except db_exc.DBError as e:
         LOG.exception(_('DB error: %s') % e)
         raise exception.FlavorCreateFailed()
+    invalidate_cache()
+    return flavor
 
 
 def destroy(name):
@@ -176,6 +266,7 @@ def destroy(name):
     except (ValueError, exception.NotFound):
         LOG.exception(_('Instance type %s not found for deletion') % name)
         raise exception.FlavorNotFoundByName(flavor_name=name)
+    invalidate_cache()
 
 
 def get_all_flavors(ctxt=None, inactive=False, filters=None):
@@ -226,7 +317,7 @@ def get_flavor(instance_type_id, ctxt=None, inactive=False):
     if inactive:
         ctxt = ctxt.elevated(read_deleted="yes")
 
-    return db.flavor_get(ctxt, instance_type_id)
+    return _cached_lookup(ctxt, 'id', db.flavor_get, instance_type_id)
 
 
 def get_flavor_by_name(name, ctxt=None):
@@ -237,7 +328,7 @@ def get_flavor_by_name(name, ctxt=None):
     if ctxt is None:
         ctxt = context.get_admin_context()
 
-    return db.flavor_get_by_name(ctxt, name)
+    return _cached_lookup(ctxt, 'name', db.flavor_get_by_name, name)
 
 
 # TODO(termie): flavor-specific code should probably be in the API that uses
@@ -250,7 +341,17 @@ def get_flavor_by_flavor_id(flavorid, ctxt=None, read_deleted="yes"):
     if ctxt is None:
         ctxt = context.get_admin_context(read_deleted=read_deleted)
 
-    return db.flavor_get_by_flavor_id(ctxt, flavorid, read_deleted)
+    return _cached_lookup(ctxt, 'flavorid', db.flavor_get_by_flavor_id,
+                          flavorid, read_deleted)
+
+
+def get_flavor_extra_specs(flavorid, ctxt=None):
+    """Retrieve the extra specs of a flavor by flavorid."""
+    if ctxt is None:
+        ctxt = context.get_admin_context()
+
+    return _cached_lookup(ctxt, 'extra_specs', db.flavor_extra_specs_get,
+                          flavorid)
 
 
 def get_flavor_access_by_flavor_id(flavorid, ctxt=None):
@@ -266,7 +367,9 @@ def add_flavor_access(flavorid, projectid, ctxt=None):
     if ctxt is None:
         ctxt = context.get_admin_context()
 
-    return db.flavor_access_add(ctxt, flavorid, projectid)
+    access = db.flavor_access_add(ctxt, flavorid, projectid)
+    invalidate_cache()
+    return access
 
 
 def remove_flavor_access(flavorid, projectid, ctxt=None):
@@ -274,7 +377,8 @@ def remove_flavor_access(flavorid, projectid, ctxt=None):
     if ctxt is None:
         ctxt = context.get_admin_context()
 
-    return db.flavor_access_remove(ctxt, flavorid, projectid)
+    db.flavor_access_remove(ctxt, flavorid, projectid)
+    invalidate_cache()
 
 
 def extract_flavor(instance, prefix=''):
@@ -27,6 +27,7 @@ terminating it.
 
 import base64
 import contextlib
+import datetime
 import functools
 import socket
 import sys
@@ -117,6 +118,17 @@ compute_opts = [
     cfg.IntOpt('network_allocate_retries',
                default=0,
                help="Number of times to retry network allocation on failures"),
+    cfg.IntOpt('heal_instance_info_cache_batch_size',
+               default=1,
+               help='Number of instances whose network info_cache is '
+                    'healed on each run. With more than one, the instances '
+                    'whose info_cache is the oldest are healed first, and '
+                    'the network info of the whole batch is refreshed at '
+                    'once'),
+    cfg.IntOpt('heal_instance_info_cache_concurrency',
+               default=4,
+               help='Maximum number of instances of a batch whose network '
+                    'info_cache is healed at the same time'),
     ]
 
 interval_opts = [
@@ -2049,12 +2061,14 @@ class ComputeManager(manager.Manager):
         try:
             # Verify that all the BDMs have a device_name set and assign a
             # default to the ones missing it with the help of the driver.
-            self._default_block_device_names(context, instance, image,
-                    block_device_mapping)
+            # The BDM and instance saves are sent to conductor in one call.
+            with obj_base.action_batch():
+                self._default_block_device_names(context, instance, image,
+                        block_device_mapping)
 
-            instance.vm_state = vm_states.BUILDING
-            instance.task_state = task_states.BLOCK_DEVICE_MAPPING
-            instance.save()
+                instance.vm_state = vm_states.BUILDING
+                instance.task_state = task_states.BLOCK_DEVICE_MAPPING
+                instance.save()
 
             block_device_info = self._prep_block_device(context, instance,
                     block_device_mapping)
@@ -4910,6 +4924,11 @@ class ComputeManager(manager.Manager):
         if not heal_interval:
             return
 
+        if CONF.heal_instance_info_cache_batch_size > 1:
+            self._heal_instance_info_cache_batch(
+                context, CONF.heal_instance_info_cache_batch_size)
+            return
+
         instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
         instance = None
 
@@ -4982,6 +5001,83 @@ class ComputeManager(manager.Manager):
             LOG.debug("Didn't find any instances for network info cache "
                       "update.")
 
+    @staticmethod
+    def _info_cache_updated_at(instance):
+        info_cache = instance.info_cache
+        if info_cache is None:
+            return datetime.datetime.min
+        return (info_cache.updated_at or info_cache.created_at or
+                datetime.datetime.min).replace(tzinfo=None)
+
+    def _heal_instance_info_cache_batch(self, context, batch_size):
+        """Update the info_cache's network information of the next
+        batch_size instances on the list of instances to heal, which is
+        sorted so that the oldest info_caches come first.
+        """
+        instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
+
+        LOG.debug('Starting heal instance info cache')
+
+        if not instance_uuids:
+            LOG.debug('Rebuilding the list of instances to heal')
+            db_instances = objects.InstanceList.get_by_host(
+                context, self.host, expected_attrs=['info_cache'],
+                use_slave=True)
+            candidates = []
+            for inst in db_instances:
+                # We don't want to refresh the cache for instances
+                # which are building or deleting.
+                if (inst.vm_state == vm_states.BUILDING or
+                        inst.task_state == task_states.DELETING):
+                    continue
+                candidates.append(inst)
+            candidates.sort(key=self._info_cache_updated_at)
+            instance_uuids = [inst.uuid for inst in candidates]
+            self._instance_uuids_to_heal = instance_uuids
+
+        batch_uuids = instance_uuids[:batch_size]
+        del instance_uuids[:batch_size]
+
+        instances = []
+        if batch_uuids:
+            db_instances = objects.InstanceList.get_by_filters(
+                context, {'uuid': batch_uuids, 'deleted': False},
+                expected_attrs=['system_metadata', 'info_cache'],
+                use_slave=True)
+            for inst in db_instances:
+                # Check the instance hasn't been migrated
+                if inst.host != self.host:
+                    LOG.debug('Skipping network cache update for instance '
+                              'because it has been migrated to another '
+                              'host.', instance=inst)
+                # Check the instance isn't being deleting
+                elif inst.task_state == task_states.DELETING:
+                    LOG.debug('Skipping network cache update for instance '
+                              'because it is being deleted.', instance=inst)
+                else:
+                    instances.append(inst)
+
+        if not instances:
+            LOG.debug("Didn't find any instances for network info cache "
+                      "update.")
+            return
+
+        try:
+            # Call to network API to get the instances info.. this will
+            # force an update to the instances' info_cache
+            nw_infos = self.network_api.get_instances_nw_info(
+                context, instances,
+                max_concurrency=CONF.heal_instance_info_cache_concurrency,
+                use_slave=True)
+        except Exception:
+            LOG.error(_('An error occurred while refreshing the network '
+                        'cache.'), exc_info=True)
+            return
+        for instance in instances:
+            if instance.uuid in nw_infos:
+                LOG.debug('Updated the network info_cache for instance',
+                          instance=instance)
+
     @periodic_task.periodic_task
     def _poll_rebooting_instances(self, context):
         if CONF.reboot_timeout > 0:
@@ -5307,9 +5403,11 @@ class ComputeManager(manager.Manager):
 
         To sync power state data we make a DB call to get the number of
         virtual machines known by the hypervisor and if the number matches the
-        number of virtual machines known by the database, we proceed in a lazy
-        loop, one database record at a time, checking if the hypervisor has the
-        same power state as is in the database.
+        number of virtual machines known by the database, we proceed to read
+        the power state of every instance without a pending task from the
+        hypervisor in one call. Only the instances whose power state differs
+        from the database, or does not match their vm_state, are then
+        checked again one database record at a time.
         """
         db_instances = objects.InstanceList.get_by_host(context,
                                                              self.host,
@@ -5324,6 +5422,7 @@ class ComputeManager(manager.Manager):
                      {'num_db_instances': num_db_instances,
                       'num_vm_instances': num_vm_instances})
 
+        idle_instances = []
         for db_instance in db_instances:
             if db_instance['task_state'] is not None:
                 LOG.info(_("During sync_power_state the instance has a "
@@ -5331,15 +5430,28 @@ class ComputeManager(manager.Manager):
                          {'task': db_instance['task_state']},
                          instance=db_instance)
                 continue
-            # No pending tasks. Now try to figure out the real vm_power_state.
+            idle_instances.append(db_instance)
+
+        # No pending tasks. Now try to figure out the real vm_power_states.
+        # Note(maoy): this call might take a long time, for example, because
+        # of a broken libvirt driver.
+        try:
+            vm_power_states = self.driver.get_power_states(idle_instances)
+        except Exception:
+            LOG.exception(_("Periodic sync_power_state task had an error "
+                            "while reading the power states of the "
+                            "instances."))
+            return
+
+        for db_instance in idle_instances:
+            vm_power_state = vm_power_states.get(db_instance['uuid'])
+            if vm_power_state is None:
+                # The driver failed to read it, and logged why.
+                continue
+            if not self._power_state_needs_sync(db_instance,
+                                                vm_power_state):
+                continue
             try:
-                try:
-                    vm_instance = self.driver.get_info(db_instance)
-                    vm_power_state = vm_instance['state']
-                except exception.InstanceNotFound:
-                    vm_power_state = power_state.NOSTATE
-                # Note(maoy): the above get_info call might take a long time,
-                # for example, because of a broken libvirt driver.
                 try:
                     self._sync_instance_power_state(context,
                                                     db_instance,
@@ -5354,6 +5466,52 @@ class ComputeManager(manager.Manager):
                                 "while processing an instance."),
                                 instance=db_instance)
 
+    @staticmethod
+    def _power_state_discrepancy(vm_state, vm_power_state):
+        """Return the discrepancy between the vm_state and the power state
+        of an instance that _sync_instance_power_state() acts on or warns
+        about, or None if there is none.
+        """
+        # Note(maoy): we go through all possible vm_states. BUILDING,
+        # RESCUED, RESIZED, SUSPENDED and ERROR are ignored for now.
+        if vm_state == vm_states.ACTIVE:
+            # The only rational power state should be RUNNING
+            if vm_power_state in (power_state.SHUTDOWN,
+                                  power_state.CRASHED):
+                return 'shutdown'
+            elif vm_power_state == power_state.SUSPENDED:
+                return 'suspended'
+            elif vm_power_state == power_state.PAUSED:
+                return 'paused'
+            elif vm_power_state == power_state.NOSTATE:
+                return 'not_found'
+        elif vm_state == vm_states.STOPPED:
+            if vm_power_state not in (power_state.NOSTATE,
+                                      power_state.SHUTDOWN,
+                                      power_state.CRASHED):
+                return 'not_stopped'
+        elif vm_state == vm_states.PAUSED:
+            if vm_power_state in (power_state.SHUTDOWN,
+                                  power_state.CRASHED):
+                return 'paused_shutdown'
+        elif vm_state in (vm_states.SOFT_DELETED,
+                          vm_states.DELETED):
+            if vm_power_state not in (power_state.NOSTATE,
+                                      power_state.SHUTDOWN):
+                return 'not_deleted'
+        return None
+
+    @classmethod
+    def _power_state_needs_sync(cls, db_instance, vm_power_state):
+        """Return whether _sync_instance_power_state() has anything to do
+        for an instance, based on its possibly stale database record.
+        """
+        # A recorded power state with a discrepancy is acted on or warned
+        # about again on every run, until it is resolved.
+        return (vm_power_state != db_instance['power_state'] or
+                cls._power_state_discrepancy(db_instance['vm_state'],
+                                             vm_power_state) is not None)
+
     def _sync_instance_power_state(self, context, db_instance, vm_power_state,
                                    use_slave=False):
         """Align instance power state between the database and hypervisor.
@@ -5402,92 +5560,75 @@ class ComputeManager(manager.Manager):
             db_power_state = vm_power_state
 
         # Note(maoy): Now resolve the discrepancy between vm_state and
-        # vm_power_state. We go through all possible vm_states.
-        if vm_state in (vm_states.BUILDING,
-                        vm_states.RESCUED,
-                        vm_states.RESIZED,
-                        vm_states.SUSPENDED,
-                        vm_states.ERROR):
-            # TODO(maoy): we ignore these vm_state for now.
-            pass
-        elif vm_state == vm_states.ACTIVE:
-            # The only rational power state should be RUNNING
-            if vm_power_state in (power_state.SHUTDOWN,
-                                  power_state.CRASHED):
-                LOG.warn(_("Instance shutdown by itself. Calling "
-                           "the stop API."), instance=db_instance)
-                try:
-                    # Note(maoy): here we call the API instead of
-                    # brutally updating the vm_state in the database
-                    # to allow all the hooks and checks to be performed.
-                    self.compute_api.stop(context, db_instance)
-                except Exception:
-                    # Note(maoy): there is no need to propagate the error
-                    # because the same power_state will be retrieved next
-                    # time and retried.
-                    # For example, there might be another task scheduled.
-                    LOG.exception(_("error during stop() in "
-                                    "sync_power_state."),
-                                  instance=db_instance)
-            elif vm_power_state == power_state.SUSPENDED:
-                LOG.warn(_("Instance is suspended unexpectedly. Calling "
-                           "the stop API."), instance=db_instance)
-                try:
-                    self.compute_api.stop(context, db_instance)
-                except Exception:
-                    LOG.exception(_("error during stop() in "
-                                    "sync_power_state."),
-                                  instance=db_instance)
-            elif vm_power_state == power_state.PAUSED:
-                # Note(maoy): a VM may get into the paused state not only
-                # because the user request via API calls, but also
-                # due to (temporary) external instrumentations.
-                # Before the virt layer can reliably report the reason,
-                # we simply ignore the state discrepancy. In many cases,
-                # the VM state will go back to running after the external
-                # instrumentation is done. See bug 1097806 for details.
-                LOG.warn(_("Instance is paused unexpectedly. Ignore."),
-                         instance=db_instance)
-            elif vm_power_state == power_state.NOSTATE:
-                # Occasionally, depending on the status of the hypervisor,
-                # which could be restarting for example, an instance may
-                # not be found.  Therefore just log the condition.
-                LOG.warn(_("Instance is unexpectedly not found. Ignore."),
-                         instance=db_instance)
-        elif vm_state == vm_states.STOPPED:
-            if vm_power_state not in (power_state.NOSTATE,
-                                      power_state.SHUTDOWN,
-                                      power_state.CRASHED):
-                LOG.warn(_("Instance is not stopped. Calling "
-                           "the stop API."), instance=db_instance)
-                try:
-                    # NOTE(russellb) Force the stop, because normally the
-                    # compute API would not allow an attempt to stop a stopped
-                    # instance.
-                    self.compute_api.force_stop(context, db_instance)
-                except Exception:
-                    LOG.exception(_("error during stop() in "
-                                    "sync_power_state."),
-                                  instance=db_instance)
-        elif vm_state == vm_states.PAUSED:
-            if vm_power_state in (power_state.SHUTDOWN,
-                                  power_state.CRASHED):
-                LOG.warn(_("Paused instance shutdown by itself. Calling "
-                           "the stop API."), instance=db_instance)
-                try:
-                    self.compute_api.force_stop(context, db_instance)
-                except Exception:
-                    LOG.exception(_("error during stop() in "
-                                    "sync_power_state."),
-                                  instance=db_instance)
-        elif vm_state in (vm_states.SOFT_DELETED,
-                          vm_states.DELETED):
-            if vm_power_state not in (power_state.NOSTATE,
-                                      power_state.SHUTDOWN):
-                # Note(maoy): this should be taken care of periodically in
-                # _cleanup_running_deleted_instances().
-                LOG.warn(_("Instance is not (soft-)deleted."),
-                         instance=db_instance)
+        # vm_power_state.
+        discrepancy = self._power_state_discrepancy(vm_state, vm_power_state)
+        if discrepancy == 'shutdown':
+            LOG.warn(_("Instance shutdown by itself. Calling "
+                       "the stop API."), instance=db_instance)
+            try:
+                # Note(maoy): here we call the API instead of
+                # brutally updating the vm_state in the database
+                # to allow all the hooks and checks to be performed.
+                self.compute_api.stop(context, db_instance)
+            except Exception:
+                # Note(maoy): there is no need to propagate the error
+                # because the same power_state will be retrieved next
+                # time and retried.
+                # For example, there might be another task scheduled.
+                LOG.exception(_("error during stop() in "
+                                "sync_power_state."),
+                              instance=db_instance)
+        elif discrepancy == 'suspended':
+            LOG.warn(_("Instance is suspended unexpectedly. Calling "
+                       "the stop API."), instance=db_instance)
+            try:
+                self.compute_api.stop(context, db_instance)
+            except Exception:
+                LOG.exception(_("error during stop() in "
+                                "sync_power_state."),
+                              instance=db_instance)
+        elif discrepancy == 'paused':
+            # Note(maoy): a VM may get into the paused state not only
+            # because the user request via API calls, but also
+            # due to (temporary) external instrumentations.
+            # Before the virt layer can reliably report the reason,
+            # we simply ignore the state discrepancy. In many cases,
+            # the VM state will go back to running after the external
+            # instrumentation is done. See bug 1097806 for details.
+            LOG.warn(_("Instance is paused unexpectedly. Ignore."),
+                     instance=db_instance)
+        elif discrepancy == 'not_found':
+            # Occasionally, depending on the status of the hypervisor,
+            # which could be restarting for example, an instance may
+            # not be found.  Therefore just log the condition.
+            LOG.warn(_("Instance is unexpectedly not found. Ignore."),
+                     instance=db_instance)
+        elif discrepancy == 'not_stopped':
+            LOG.warn(_("Instance is not stopped. Calling "
+                       "the stop API."), instance=db_instance)
+            try:
+                # NOTE(russellb) Force the stop, because normally the
+                # compute API would not allow an attempt to stop a stopped
+                # instance.
+                self.compute_api.force_stop(context, db_instance)
+            except Exception:
+                LOG.exception(_("error during stop() in "
+                                "sync_power_state."),
+                              instance=db_instance)
+        elif discrepancy == 'paused_shutdown':
+            LOG.warn(_("Paused instance shutdown by itself. Calling "
+                       "the stop API."), instance=db_instance)
+            try:
+                self.compute_api.force_stop(context, db_instance)
+            except Exception:
+                LOG.exception(_("error during stop() in "
+                                "sync_power_state."),
+                              instance=db_instance)
+        elif discrepancy == 'not_deleted':
+            # Note(maoy): this should be taken care of periodically in
+            # _cleanup_running_deleted_instances().
+            LOG.warn(_("Instance is not (soft-)deleted."),
+                     instance=db_instance)
 
     @periodic_task.periodic_task
     def _reclaim_queued_deletes(self, context):
@@ -80,7 +80,7 @@ class ConductorManager(manager.Manager):
     namespace.  See the ComputeTaskManager class for details.
     """
 
-    target = messaging.Target(version='2.0')
+    target = messaging.Target(version='2.2')
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(service_name='conductor',
@@ -406,17 +406,25 @@ class ConductorManager(manager.Manager):
             raise messaging.ExpectedException()
 
     def object_class_action(self, context, objname, objmethod,
-                            objver, args, kwargs):
-        """Perform a classmethod action on an object."""
+                            objver, args, kwargs, compact=False):
+        """Perform a classmethod action on an object.
+
+        If compact is set, an object result is returned in the compact
+        primitive format.
+        """
         objclass = nova_object.NovaObject.obj_class_from_name(objname,
                                                               objver)
         result = self._object_dispatch(objclass, objmethod, context,
                                        args, kwargs)
+        if not isinstance(result, nova_object.NovaObject):
+            return result
         # NOTE(danms): The RPC layer will convert to primitives for us,
         # but in this case, we need to honor the version the client is
         # asking for, so we do it before returning here.
-        return (result.obj_to_primitive(target_version=objver)
-                if isinstance(result, nova_object.NovaObject) else result)
+        primitive = result.obj_to_primitive(target_version=objver)
+        if compact:
+            return nova_object.compact_primitive(primitive)
+        return primitive
 
     def object_action(self, context, objinst, objmethod, args, kwargs):
         """Perform an action on an object."""
@@ -439,6 +447,29 @@ class ConductorManager(manager.Manager):
         updates['obj_what_changed'] = objinst.obj_what_changed()
         return updates, result
 
+    def object_action_batch(self, context, actions):
+        """Perform a list of object and object class actions in order.
+
+        Object actions are ['object', objinst, objmethod, args, kwargs] and
+        class actions are ['class', objname, objver, objmethod, args,
+        kwargs]. Returns the (updates, result) of every action, as returned
+        by object_action(), with no updates for class actions. Processing
+        stops at the first action that raises.
+        """
+        results = []
+        for action in actions:
+            if action[0] == 'class':
+                objname, objver, objmethod, args, kwargs = action[1:]
+                results.append((None, self.object_class_action(
+                    context, objname=objname, objmethod=objmethod,
+                    objver=objver, args=args, kwargs=kwargs)))
+            else:
+                objinst, objmethod, args, kwargs = action[1:]
+                results.append(self.object_action(
+                    context, objinst=objinst, objmethod=objmethod,
+                    args=args, kwargs=kwargs))
+        return results
+
     def object_backport(self, context, objinst, target_version):
         return objinst.obj_to_primitive(target_version=target_version)
 
@@ -149,6 +149,9 @@ class ConductorAPI(object):
     ...  - Remove action_event_start() and action_event_finish()
     ...  - Remove instance_get_by_uuid()
     ...  - Remove agent_build_get_by_triple()
+
+    2.1  - Added object_action_batch()
+    2.2  - Added compact to object_class_action()
     """
 
     VERSION_ALIASES = {
@@ -338,16 +341,39 @@ class ConductorAPI(object):
 
     def object_class_action(self, context, objname, objmethod, objver,
                             args, kwargs):
-        cctxt = self.client.prepare()
-        return cctxt.call(context, 'object_class_action',
-                          objname=objname, objmethod=objmethod,
-                          objver=objver, args=args, kwargs=kwargs)
+        kw = {'objname': objname, 'objmethod': objmethod, 'objver': objver,
+              'args': args, 'kwargs': kwargs}
+        if self.client.can_send_version('2.2'):
+            # Have object results, lists of instances in particular, sent
+            # back in the compact primitive format.
+            version = '2.2'
+            kw['compact'] = True
+        else:
+            version = '2.0'
+        cctxt = self.client.prepare(version=version)
+        return cctxt.call(context, 'object_class_action', **kw)
 
     def object_action(self, context, objinst, objmethod, args, kwargs):
         cctxt = self.client.prepare()
         return cctxt.call(context, 'object_action', objinst=objinst,
                           objmethod=objmethod, args=args, kwargs=kwargs)
 
+    def object_action_batch(self, context, actions):
+        if not self.client.can_send_version('2.1'):
+            results = []
+            for action in actions:
+                if action[0] == 'class':
+                    objname, objver, objmethod, args, kwargs = action[1:]
+                    results.append((None, self.object_class_action(
+                        context, objname, objmethod, objver, args, kwargs)))
+                else:
+                    objinst, objmethod, args, kwargs = action[1:]
+                    results.append(self.object_action(
+                        context, objinst, objmethod, args, kwargs))
+            return results
+        cctxt = self.client.prepare(version='2.1')
+        return cctxt.call(context, 'object_action_batch', actions=actions)
+
     def object_backport(self, context, objinst, target_version):
         cctxt = self.client.prepare()
         return cctxt.call(context, 'object_backport', objinst=objinst,
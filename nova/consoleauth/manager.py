@@ -21,6 +21,7 @@ import time
 from oslo.config import cfg
 from oslo import messaging
 
+from nova import cache_utils
 from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import rpcapi as compute_rpcapi
 from nova import manager
@@ -28,7 +29,6 @@ from nova import objects
 from nova.openstack.common.gettextutils import _, _LW
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
 
 
 LOG = logging.getLogger(__name__)
@@ -52,7 +52,7 @@ class ConsoleAuthManager(manager.Manager):
     def __init__(self, scheduler_driver=None, *args, **kwargs):
         super(ConsoleAuthManager, self).__init__(service_name='consoleauth',
                                                  *args, **kwargs)
-        self.mc = memorycache.get_client()
+        self.mc = cache_utils.get_client()
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
         self.cells_rpcapi = cells_rpcapi.CellsAPI()
 
@@ -93,6 +93,9 @@ class RequestContext(object):
         # rs_limits turnstile pre-processor.
         # See https://lists.launchpad.net/openstack/msg12200.html
         self.quota_class = quota_class
+        # Quota limits read while serving this request, filled in by the
+        # quota driver.  Not serialized, so every request starts afresh.
+        self.quota_limits = {}
         self.user_name = user_name
         self.project_name = project_name
         self.is_admin = is_admin
@@ -232,6 +232,25 @@ def compute_node_get_all(context, no_date_fields=False):
     return IMPL.compute_node_get_all(context, no_date_fields)
 
 
+def compute_node_get_updated_since(context, updated_since):
+    """Get computeNodes created or updated since a given time.
+
+    :param context: The security context
+    :param updated_since: Only compute nodes whose 'updated_at' or
+                          'created_at' is at or after this datetime are
+                          returned in full
+
+    :returns: Tuple of (compute_nodes, node_services). compute_nodes is a
+              list of dictionaries, as returned by compute_node_get_all,
+              for the nodes that changed. node_services maps the ID of
+              every non-deleted compute node to its service dictionary
+              (None if the service is gone), which lets callers drop
+              deleted nodes and refresh service state without re-reading
+              every compute node row.
+    """
+    return IMPL.compute_node_get_updated_since(context, updated_since)
+
+
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     """Get compute nodes by hypervisor hostname.
 
@@ -529,6 +548,17 @@ def fixed_ip_associate_pool(context, network_id, instance_uuid=None,
                                         instance_uuid, host)
 
 
+def fixed_ip_claim(context, network_id, address, instance_uuid=None,
+                   host=None):
+    """Associate a free fixed ip of a network to instance or host.
+
+    Raises if the fixed ip is not free.
+
+    """
+    return IMPL.fixed_ip_claim(context, network_id, address,
+                               instance_uuid, host)
+
+
 def fixed_ip_create(context, values):
     """Create a fixed ip from the values dictionary."""
     return IMPL.fixed_ip_create(context, values)
@@ -593,6 +623,11 @@ def fixed_ip_get_by_network_host(context, network_uuid, host):
     return IMPL.fixed_ip_get_by_network_host(context, network_uuid, host)
 
 
+def fixed_ip_get_free_addresses_by_network(context, network_id):
+    """Get the addresses of the free fixed ips of a network."""
+    return IMPL.fixed_ip_get_free_addresses_by_network(context, network_id)
+
+
 def fixed_ips_by_virtual_interface(context, vif_id):
     """Get fixed ips by virtual interface or raise if none exist."""
     return IMPL.fixed_ips_by_virtual_interface(context, vif_id)
@@ -1143,6 +1178,19 @@ def quota_reserve(context, resources, quotas, user_quotas, deltas, expire,
                               project_id=project_id, user_id=user_id)
 
 
+def quota_reserve_optimistic(context, resources, quotas, user_quotas, deltas,
+                             expire, until_refresh, max_age, project_id=None,
+                             user_id=None):
+    """Check quotas and create appropriate reservations, without locking
+    the quota usages.
+    """
+    return IMPL.quota_reserve_optimistic(context, resources, quotas,
+                                         user_quotas, deltas, expire,
+                                         until_refresh, max_age,
+                                         project_id=project_id,
+                                         user_id=user_id)
+
+
 def reservation_commit(context, reservations, project_id=None, user_id=None):
     """Commit quota reservations."""
     return IMPL.reservation_commit(context, reservations,
@@ -1830,6 +1878,12 @@ def instance_fault_get_by_instance_uuids(context, instance_uuids):
     return IMPL.instance_fault_get_by_instance_uuids(context, instance_uuids)
 
 
+def instance_fault_get_latest_by_instance_uuids(context, instance_uuids):
+    """Get the latest instance fault for each of the instance_uuids."""
+    return IMPL.instance_fault_get_latest_by_instance_uuids(context,
+                                                            instance_uuids)
+
+
 ####################
 
 
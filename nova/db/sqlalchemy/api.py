@@ -590,17 +590,9 @@ def compute_node_get_all(context, no_date_fields):
                                 order_by(compute_node.c.service_id)
         compute_node_rows = conn.execute(compute_node_query).fetchall()
 
-        service_query = select(filter_columns(service)).\
-                            where((service.c.deleted == 0) &
-                                  (service.c.binary == 'nova-compute')).\
-                            order_by(service.c.id)
-        service_rows = conn.execute(service_query).fetchall()
+        services = _compute_services_by_id(conn, filter_columns(service))
 
     # Join ComputeNode & Service manually.
-    services = {}
-    for proxy in service_rows:
-        services[proxy['id']] = dict(proxy.items())
-
     compute_nodes = []
     for proxy in compute_node_rows:
         node = dict(proxy.items())
@@ -611,6 +603,55 @@ def compute_node_get_all(context, no_date_fields):
     return compute_nodes
 
 
+def _compute_services_by_id(conn, columns):
+    """Return a dict of non-deleted nova-compute services keyed by id."""
+    service = models.Service.__table__
+    service_query = select(columns).\
+                        where((service.c.deleted == 0) &
+                              (service.c.binary == 'nova-compute')).\
+                        order_by(service.c.id)
+    return dict((proxy['id'], dict(proxy.items()))
+                for proxy in conn.execute(service_query).fetchall())
+
+
+@require_admin_context
+def compute_node_get_updated_since(context, updated_since):
+    engine = get_engine()
+
+    compute_node = models.ComputeNode.__table__
+    service = models.Service.__table__
+
+    with engine.begin() as conn:
+        # updated_at is NULL until the first resource tracker update, so
+        # freshly created nodes are picked up through created_at instead.
+        changed_query = select([compute_node]).\
+                            where((compute_node.c.deleted == 0) &
+                                  or_(compute_node.c.updated_at >=
+                                          updated_since,
+                                      compute_node.c.created_at >=
+                                          updated_since)).\
+                            order_by(compute_node.c.service_id)
+        changed_rows = conn.execute(changed_query).fetchall()
+
+        live_query = select([compute_node.c.id,
+                             compute_node.c.service_id]).\
+                         where(compute_node.c.deleted == 0)
+        live_rows = conn.execute(live_query).fetchall()
+
+        services = _compute_services_by_id(conn, list(service.c))
+
+    compute_nodes = []
+    for proxy in changed_rows:
+        node = dict(proxy.items())
+        node['service'] = services.get(proxy['service_id'])
+        compute_nodes.append(node)
+
+    node_services = dict((proxy['id'], services.get(proxy['service_id']))
+                         for proxy in live_rows)
+
+    return compute_nodes, node_services
+
+
 @require_admin_context
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     field = models.ComputeNode.hypervisor_hostname
@@ -1182,6 +1223,37 @@ def fixed_ip_associate_pool(context, network_id, instance_uuid=None,
     return fixed_ip_ref
 
 
+@require_admin_context
+def fixed_ip_claim(context, network_id, address, instance_uuid=None,
+                   host=None):
+    if instance_uuid and not uuidutils.is_uuid_like(instance_uuid):
+        raise exception.InvalidUUID(uuid=instance_uuid)
+
+    values = {}
+    if instance_uuid:
+        values['instance_uuid'] = instance_uuid
+    if host:
+        values['host'] = host
+
+    session = get_session()
+    with session.begin():
+        # NOTE: unlike fixed_ip_associate_pool(), this doesn't lock any
+        #       row. The update only matches the address while it is free,
+        #       so only one of concurrent claims of an address succeeds.
+        count = model_query(context, models.FixedIp, session=session,
+                            read_deleted="no").\
+                        filter_by(network_id=network_id).\
+                        filter_by(address=address).\
+                        filter_by(reserved=False).\
+                        filter_by(instance_uuid=None).\
+                        filter_by(host=None).\
+                        update(values, synchronize_session=False)
+        if not count:
+            raise exception.FixedIpNotFree(address=address,
+                                           network_id=network_id)
+        return _fixed_ip_get_by_address(context, address, session=session)
+
+
 @require_context
 def fixed_ip_create(context, values):
     fixed_ip_ref = models.FixedIp()
@@ -1403,6 +1475,18 @@ def fixed_ip_get_by_network_host(context, network_id, host):
     return result
 
 
+@require_admin_context
+def fixed_ip_get_free_addresses_by_network(context, network_id):
+    result = model_query(context, models.FixedIp.address,
+                         base_model=models.FixedIp, read_deleted="no").\
+                 filter_by(network_id=network_id).\
+                 filter_by(reserved=False).\
+                 filter_by(instance_uuid=None).\
+                 filter_by(host=None).\
+                 all()
+    return [row.address for row in result]
+
+
 @require_context
 def fixed_ips_by_virtual_interface(context, vif_id):
     result = model_query(context, models.FixedIp, read_deleted="no").\
@@ -1886,9 +1970,6 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
         manual_joins, columns_to_join = _manual_join_columns(columns_to_join)
 
     query_prefix = session.query(models.Instance)
-    for column in columns_to_join:
-        query_prefix = query_prefix.options(joinedload(column))
-
     query_prefix = query_prefix.order_by(sort_fn[sort_dir](
             getattr(models.Instance, sort_key)))
 
@@ -1958,18 +2039,66 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                               filters)
 
     # paginate query
+    sort_keys = [sort_key]
+    sort_keys.extend(key for key in ('created_at', 'id') if key != sort_key)
     if marker is not None:
-        try:
-            marker = _instance_get_by_uuid(context, marker, session=session)
-        except exception.InstanceNotFound:
-            raise exception.MarkerNotFound(marker)
-    query_prefix = sqlalchemyutils.paginate_query(query_prefix,
-                           models.Instance, limit,
-                           [sort_key, 'created_at', 'id'],
-                           marker=marker,
-                           sort_dir=sort_dir)
+        marker = _instance_get_marker(context, marker, sort_keys,
+                                      session=session)
+    if limit is None:
+        query_prefix = sqlalchemyutils.paginate_query(query_prefix,
+                               models.Instance, limit, sort_keys,
+                               marker=marker, sort_dir=sort_dir)
+        for column in columns_to_join:
+            query_prefix = query_prefix.options(joinedload(column))
+        instances = query_prefix.all()
+    else:
+        # Find the ids of the page first, so that the joined tables are
+        # only read for the instances returned rather than joined into a
+        # query over every matching instance.
+        page_query = sqlalchemyutils.paginate_query(
+                query_prefix.with_entities(models.Instance.id),
+                models.Instance, limit, sort_keys,
+                marker=marker, sort_dir=sort_dir)
+        page_ids = [row[0] for row in page_query.all()]
+        instances = _instance_get_all_by_ids(page_ids, columns_to_join,
+                                             session=session)
+
+    return _instances_fill_metadata(context, instances, manual_joins)
+
+
+def _instance_get_marker(context, marker, sort_keys, session=None):
+    """Return the sort key values of the marker instance, without loading
+    the instance and its joined tables.
+    """
+    columns = [getattr(models.Instance, key) for key in sort_keys]
+    result = model_query(context, *columns, session=session,
+                         base_model=models.Instance, project_only=True).\
+                filter_by(uuid=marker).\
+                first()
+    if not result:
+        raise exception.MarkerNotFound(marker)
+    return result
+
+
+# Size of the "id IN (...)" lists used to load a page of instances, below
+# the 999 bound parameters SQLite accepts per statement.
+_INSTANCE_ID_CHUNK = 500
+
 
-    return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
+def _instance_get_all_by_ids(instance_ids, columns_to_join, session):
+    """Return the instances with the given ids, in the same order."""
+    instances = {}
+    for i in xrange(0, len(instance_ids), _INSTANCE_ID_CHUNK):
+        query = session.query(models.Instance).\
+                filter(models.Instance.id.in_(
+                    instance_ids[i:i + _INSTANCE_ID_CHUNK]))
+        for column in columns_to_join:
+            query = query.options(joinedload(column))
+        for instance in query.all():
+            instances[instance.id] = instance
+    # Instances deleted since their id was read are left out.
+    return [instances[instance_id] for instance_id in instance_ids
+            if instance_id in instances]
 
 
 def tag_filter(context, query, model, model_metadata,
@@ -3241,35 +3370,202 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
         LOG.warning(_("Change will make usage less than 0 for the following "
                       "resources: %s"), unders)
     if overs:
-        if project_quotas == user_quotas:
-            usages = project_usages
+        _raise_over_quota(overs, project_quotas, user_quotas, deltas,
+                          project_usages, user_usages)
+
+    return reservations
+
+
+def _raise_over_quota(overs, project_quotas, user_quotas, deltas,
+                      project_usages, user_usages):
+    if project_quotas == user_quotas:
+        usages = project_usages
+    else:
+        usages = user_usages
+    usages = dict((k, dict(in_use=v['in_use'], reserved=v['reserved']))
+                  for k, v in usages.items())
+    headroom = dict((res, user_quotas[res] -
+                         (usages[res]['in_use'] + usages[res]['reserved']))
+                    for res in user_quotas.keys())
+
+    # If quota_cores is unlimited [-1]:
+    # - set cores headroom based on instances headroom:
+    if user_quotas.get('cores') == -1:
+        if deltas['cores']:
+            hc = headroom['instances'] * deltas['cores']
+            headroom['cores'] = hc / deltas['instances']
         else:
-            usages = user_usages
-        usages = dict((k, dict(in_use=v['in_use'], reserved=v['reserved']))
-                      for k, v in usages.items())
-        headroom = dict((res, user_quotas[res] -
-                             (usages[res]['in_use'] + usages[res]['reserved']))
-                        for res in user_quotas.keys())
-
-        # If quota_cores is unlimited [-1]:
-        # - set cores headroom based on instances headroom:
-        if user_quotas.get('cores') == -1:
-            if deltas['cores']:
-                hc = headroom['instances'] * deltas['cores']
-                headroom['cores'] = hc / deltas['instances']
+            headroom['cores'] = headroom['instances']
+
+    # If quota_ram is unlimited [-1]:
+    # - set ram headroom based on instances headroom:
+    if user_quotas.get('ram') == -1:
+        if deltas['ram']:
+            hr = headroom['instances'] * deltas['ram']
+            headroom['ram'] = hr / deltas['instances']
+        else:
+            headroom['ram'] = headroom['instances']
+    raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
+                              usages=usages, headroom=headroom)
+
+
+# Number of times quota_reserve_optimistic() retries a reservation whose
+# usages changed under it before falling back to quota_reserve().
+_QUOTA_RESERVE_OPTIMISTIC_RETRIES = 10
+
+
+class _QuotaUsageConflict(Exception):
+    """A quota usage changed since it was read."""
+    pass
+
+
+@require_context
+def quota_reserve_optimistic(context, resources, project_quotas, user_quotas,
+                             deltas, expire, until_refresh, max_age,
+                             project_id=None, user_id=None):
+    """Variant of quota_reserve() which does not lock the usages.
+
+    The usages are read without locking. The reservation is then written
+    with conditional UPDATEs of the usages of the reserved resources,
+    which only match if the usages are still the ones the quotas were
+    checked against. If any of them changed the reservation is retried,
+    so concurrent reservations of different resources never wait for one
+    another.
+
+    Reservations which need the usages to be refreshed or created are
+    handed to quota_reserve(), as are the ones which keep conflicting.
+    """
+    if project_id is None:
+        project_id = context.project_id
+    if user_id is None:
+        user_id = context.user_id
+
+    for attempt in xrange(_QUOTA_RESERVE_OPTIMISTIC_RETRIES):
+        try:
+            reservations = _quota_reserve_optimistic(
+                context, project_quotas, user_quotas, deltas, expire,
+                until_refresh, max_age, project_id, user_id)
+        except _QuotaUsageConflict:
+            LOG.debug('Quota usages of project %(project_id)s changed '
+                      'during reservation attempt %(attempt)d',
+                      {'project_id': project_id, 'attempt': attempt + 1})
+            continue
+        if reservations is not None:
+            return reservations
+        break
+
+    return quota_reserve(context, resources, project_quotas, user_quotas,
+                         deltas, expire, until_refresh, max_age,
+                         project_id=project_id, user_id=user_id)
+
+
+def _quota_reserve_optimistic(context, project_quotas, user_quotas, deltas,
+                              expire, until_refresh, max_age, project_id,
+                              user_id):
+    """Make one attempt of quota_reserve_optimistic().
+
+    Returns the reservation UUIDs, or None if the usages must be
+    refreshed first. Raises _QuotaUsageConflict if a usage changed since
+    it was read.
+    """
+    elevated = context.elevated()
+    rows = model_query(context, models.QuotaUsage, read_deleted="no").\
+                   filter_by(project_id=project_id).\
+                   all()
+    project_usages = dict()
+    user_usages = dict()
+    resource_rows = dict()
+    for row in rows:
+        project_usages.setdefault(row.resource,
+                                  dict(in_use=0, reserved=0, total=0))
+        project_usages[row.resource]['in_use'] += row.in_use
+        project_usages[row.resource]['reserved'] += row.reserved
+        project_usages[row.resource]['total'] += row.in_use + row.reserved
+        resource_rows.setdefault(row.resource, []).append(row)
+        if row.user_id is None or row.user_id == user_id:
+            user_usages[row.resource] = row
+
+    # The same conditions as in quota_reserve() for refreshing a usage
+    new_until_refresh = {}
+    for resource in deltas:
+        usage = user_usages.get(resource)
+        if usage is None or usage.in_use < 0:
+            return None
+        if usage.until_refresh is not None:
+            if usage.until_refresh - 1 <= 0:
+                return None
+            new_until_refresh[resource] = usage.until_refresh - 1
+        elif max_age and (usage.updated_at -
+                          timeutils.utcnow()).seconds >= max_age:
+            return None
+
+    unders = [res for res, delta in deltas.items()
+              if delta < 0 and
+              delta + user_usages[res].in_use < 0]
+
+    for key, value in user_usages.items():
+        if key not in project_usages:
+            project_usages[key] = value
+    overs = [res for res, delta in deltas.items()
+             if user_quotas[res] >= 0 and delta >= 0 and
+             (project_quotas[res] < delta +
+              project_usages[res]['total'] or
+              user_quotas[res] < delta +
+              user_usages[res].total)]
+    if overs:
+        _raise_over_quota(overs, project_quotas, user_quotas, deltas,
+                          project_usages, user_usages)
+
+    session = get_session()
+    with session.begin():
+        # Update the usages of the reserved resources in id order, so
+        # that concurrent reservations do not deadlock. Where the project
+        # quota was checked, the usages of the other users are written
+        # back unchanged, only to check that they did not change since
+        # the project totals were computed from them.
+        guarded = []
+        for resource, delta in deltas.items():
+            if delta >= 0 and user_quotas[resource] >= 0:
+                guarded.extend(resource_rows[resource])
             else:
-                headroom['cores'] = headroom['instances']
-
-        # If quota_ram is unlimited [-1]:
-        # - set ram headroom based on instances headroom:
-        if user_quotas.get('ram') == -1:
-            if deltas['ram']:
-                hr = headroom['instances'] * deltas['ram']
-                headroom['ram'] = hr / deltas['instances']
+                guarded.append(user_usages[resource])
+        for row in sorted(guarded, key=lambda row: row.id):
+            resource = row.resource
+            delta = deltas[resource]
+            if row is user_usages[resource]:
+                values = {'reserved': row.reserved + max(delta, 0),
+                          'until_refresh': new_until_refresh.get(
+                              resource, row.until_refresh)}
+                if values['reserved'] == row.reserved and (
+                        values['until_refresh'] == row.until_refresh):
+                    values['updated_at'] = row.updated_at
             else:
-                headroom['ram'] = headroom['instances']
-        raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
-                                  usages=usages, headroom=headroom)
+                values = {'reserved': row.reserved,
+                          'updated_at': row.updated_at}
+            count = model_query(context, models.QuotaUsage,
+                                read_deleted="no", session=session).\
+                        filter_by(id=row.id).\
+                        filter_by(in_use=row.in_use).\
+                        filter_by(reserved=row.reserved).\
+                        filter_by(until_refresh=row.until_refresh).\
+                        update(values, synchronize_session=False)
+            if not count:
+                raise _QuotaUsageConflict()
+
+        reservations = []
+        for res, delta in deltas.items():
+            reservation = _reservation_create(elevated,
+                                              str(uuid.uuid4()),
+                                              user_usages[res],
+                                              project_id,
+                                              user_id,
+                                              res, delta, expire,
+                                              session=session)
+            reservations.append(reservation.uuid)
+
+    if unders:
+        LOG.warning(_("Change will make usage less than 0 for the following "
+                      "resources: %s"), unders)
 
     return reservations
 
@@ -5318,6 +5614,41 @@ def instance_fault_get_by_instance_uuids(context, instance_uuids):
     return output
 
 
+def instance_fault_get_latest_by_instance_uuids(context, instance_uuids):
+    """Get the latest instance fault for each of the instance_uuids."""
+    if not instance_uuids:
+        return {}
+
+    # Groupwise maximum: the creation time of the latest fault of each
+    # instance, served by the (instance_uuid, deleted, created_at) index,
+    # joined back to the faults created at that time.
+    latest = model_query(context, models.InstanceFault.instance_uuid,
+                         func.max(models.InstanceFault.created_at).label(
+                             'created_at'),
+                         base_model=models.InstanceFault,
+                         read_deleted='no').\
+                     filter(models.InstanceFault.instance_uuid.in_(
+                         instance_uuids)).\
+                     group_by(models.InstanceFault.instance_uuid).\
+                     subquery()
+    rows = model_query(context, models.InstanceFault, read_deleted='no').\
+                       join(latest, and_(
+                           models.InstanceFault.instance_uuid ==
+                           latest.c.instance_uuid,
+                           models.InstanceFault.created_at ==
+                           latest.c.created_at)).\
+                       order_by(desc(models.InstanceFault.id)).\
+                       all()
+
+    output = {}
+    for row in rows:
+        # Faults created within the same second tie, the highest id wins.
+        if row['instance_uuid'] not in output:
+            output[row['instance_uuid']] = dict(row.iteritems())
+
+    return output
+
+
 ##################
 
 
@@ -0,0 +1,61 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Index
+from sqlalchemy import MetaData
+from sqlalchemy import Table
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+INDEX_NAME = 'instances_project_id_deleted_created_at_idx'
+INDEX_COLUMNS = ['project_id', 'deleted', 'created_at']
+
+
+def _get_table_index(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+    table = Table('instances', meta, autoload=True)
+    for idx in table.indexes:
+        if idx.columns.keys() == INDEX_COLUMNS:
+            break
+    else:
+        idx = None
+    return meta, table, idx
+
+
+def upgrade(migrate_engine):
+    """Add an index covering the default server listing of a project,
+    which filters on project_id and deleted and sorts on created_at.
+    """
+    meta, table, index = _get_table_index(migrate_engine)
+    if index:
+        LOG.info(_('Skipped adding %s because an equivalent index'
+                   ' already exists.'), INDEX_NAME)
+        return
+    columns = [getattr(table.c, col_name) for col_name in INDEX_COLUMNS]
+    index = Index(INDEX_NAME, *columns)
+    index.create(migrate_engine)
+
+
+def downgrade(migrate_engine):
+    meta, table, index = _get_table_index(migrate_engine)
+    if not index:
+        LOG.info(_('Skipped removing %s because no such index exists'),
+                 INDEX_NAME)
+        return
+    index.drop(migrate_engine)
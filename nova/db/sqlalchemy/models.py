@@ -166,6 +166,8 @@ class Instance(BASE, NovaBase):
               'host', 'node', 'deleted'),
         Index('instances_host_deleted_cleaned_idx',
               'host', 'deleted', 'cleaned'),
+        Index('instances_project_id_deleted_created_at_idx',
+              'project_id', 'deleted', 'created_at'),
     )
     injected_files = []
 
@@ -701,6 +701,11 @@ class FixedIpAlreadyInUse(NovaException):
                 "%(instance_uuid)s.")
 
 
+class FixedIpNotFree(NovaException):
+    msg_fmt = _("Fixed IP address %(address)s is not free in network "
+                "%(network_id)s.")
+
+
 class FixedIpAssociatedWithMultipleInstances(NovaException):
     msg_fmt = _("More than one instance is associated with fixed ip address "
                 "'%(address)s'.")
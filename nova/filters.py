@@ -43,6 +43,16 @@ class BaseFilter(object):
             if self._filter_one(obj, filter_properties):
                 yield obj
 
+    def filter_columns(self, columns, filter_properties):
+        """Return a boolean array marking the objects that pass, or None.
+
+        Override in a subclass whose decision is plain arithmetic on the
+        columns offered by the handler, so that every object is evaluated
+        in one array operation. Returning None means the filter cannot be
+        vectorized for this request and filter_all() is used instead.
+        """
+        return None
+
     # Set to true in a subclass if a filter only needs to be run once
     # for each request rather than for each instance
     run_filter_once_per_request = False
@@ -64,10 +74,45 @@ class BaseFilterHandler(loadables.BaseLoader):
     This class should be subclassed where one needs to use filters.
     """
 
+    def _get_columns(self, objs):
+        """Return a columnar view of objs for vectorized filtering, or
+        None if vectorized filtering is not in use.
+        """
+        return None
+
+    def _filter_columns(self, filter_classes, columns, filter_properties,
+            index):
+        """Evaluate every vectorizable filter as one combined mask.
+
+        Returns the objects that pass all of them and the filter classes
+        that still have to be run one object at a time.
+        """
+        mask = columns.all()
+        remaining = []
+        for filter_cls in filter_classes:
+            filter = filter_cls()
+            if not filter.run_filter_for_index(index):
+                continue
+            filter_mask = filter.filter_columns(columns, filter_properties)
+            if filter_mask is None:
+                remaining.append(filter_cls)
+                continue
+            mask &= filter_mask
+        return columns.select(mask), remaining
+
     def get_filtered_objects(self, filter_classes, objs,
             filter_properties, index=0):
         list_objs = list(objs)
         LOG.debug("Starting with %d host(s)", len(list_objs))
+        columns = self._get_columns(list_objs)
+        if columns is not None:
+            list_objs, filter_classes = self._filter_columns(
+                    filter_classes, columns, filter_properties, index)
+            if not list_objs:
+                LOG.info(_("Vectorized filters returned 0 hosts"))
+                return list_objs
+            LOG.debug("Vectorized filters returned %d host(s)",
+                      len(list_objs))
         for filter_cls in filter_classes:
             cls_name = filter_cls.__name__
             filter = filter_cls()
@@ -16,6 +16,8 @@
 import functools
 import inspect
 
+import eventlet
+
 from nova.db import base
 from nova import hooks
 from nova.network import model as network_model
@@ -233,6 +235,38 @@ class NetworkAPI(base.Base):
         """Returns all network info related to an instance."""
         raise NotImplementedError()
 
+    def get_instances_nw_info(self, context, instances, max_concurrency=1,
+                              use_slave=False):
+        """Returns the network info of several instances and updates
+        their caches.
+
+        Up to max_concurrency instances are processed at the same time.
+        Returns a dict of instance uuid to network info; the instances
+        whose network info could not be retrieved are logged and left out.
+        """
+        return self._get_instances_nw_info(
+            context, instances, max_concurrency,
+            functools.partial(self.get_instance_nw_info,
+                              use_slave=use_slave))
+
+    def _get_instances_nw_info(self, context, instances, max_concurrency,
+                               get_instance_nw_info):
+        results = {}
+
+        def _get_nw_info(instance):
+            try:
+                results[instance['uuid']] = get_instance_nw_info(context,
+                                                                 instance)
+            except Exception:
+                LOG.error(_('An error occurred while refreshing the network '
+                            'cache.'), instance=instance, exc_info=True)
+
+        pool = eventlet.GreenPool(max(1, max_concurrency))
+        for instance in instances:
+            pool.spawn_n(_get_nw_info, instance)
+        pool.waitall()
+        return results
+
     def validate_networks(self, context, requested_networks, num_instances):
         """validate the networks passed at the time of creating
         the server.
@@ -0,0 +1,67 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import random
+
+import netaddr
+
+
+class FreeIpBitmap(object):
+    """The free addresses of a network, one byte per address of its cidr.
+
+    This is only a hint of which addresses are free: the network manager
+    still claims them in the database, which is what fails when another
+    host took an address first.
+    """
+
+    def __init__(self, cidr, addresses=()):
+        self.network = netaddr.IPNetwork(cidr)
+        self.bitmap = bytearray(self.network.size)
+        self.free = 0
+        for address in addresses:
+            self.release(address)
+
+    def _index(self, address):
+        index = int(netaddr.IPAddress(address)) - self.network.first
+        if 0 <= index < len(self.bitmap):
+            return index
+
+    def release(self, address):
+        """Mark an address as free."""
+        index = self._index(address)
+        if index is not None and not self.bitmap[index]:
+            self.bitmap[index] = 1
+            self.free += 1
+
+    def take(self, address):
+        """Mark an address as used."""
+        index = self._index(address)
+        if index is not None and self.bitmap[index]:
+            self.bitmap[index] = 0
+            self.free -= 1
+
+    def choose(self):
+        """Return a random free address, or None if there is none.
+
+        Concurrent allocations in the network then rarely try to claim the
+        same address, unlike when they all pick the first free one.
+        """
+        if not self.free:
+            return None
+        start = random.randrange(len(self.bitmap))
+        index = self.bitmap.find('\x01', start)
+        if index == -1:
+            index = self.bitmap.find('\x01', 0, start)
+        return str(netaddr.IPAddress(self.network.first + index,
+                                     self.network.version))
@@ -18,6 +18,7 @@
 """Implements vlans, bridges, and iptables rules using linux utilities."""
 
 import calendar
+import collections
 import inspect
 import os
 import re
@@ -120,6 +121,18 @@ linux_net_opts = [
                default='DROP',
                help=('The table that iptables to jump to when a packet is '
                      'to be dropped.')),
+    cfg.BoolOpt('iptables_incremental_apply',
+                default=False,
+                help='Only rewrite the wrapped chains that changed since the '
+                     'last apply, with iptables-restore --noflush, as long '
+                     'as no other rule or chain changed. All the rules are '
+                     'still applied at startup and every '
+                     'iptables_full_apply_interval seconds.'),
+    cfg.IntOpt('iptables_full_apply_interval',
+               default=600,
+               help='Seconds between applies of all the iptables rules when '
+                    'iptables_incremental_apply is set. 0 applies all the '
+                    'rules every time.'),
     cfg.IntOpt('ovs_vsctl_timeout',
                default=120,
                help='Amount of time, in seconds, that ovs_vsctl should wait '
@@ -190,6 +203,18 @@ class IptablesTable(object):
         self.unwrapped_chains = set()
         self.remove_chains = set()
         self.dirty = True
+        # Wrapped chains whose rules changed, and wrapped chains removed,
+        # since the last apply. Any other change needs a full apply.
+        self.dirty_chains = set()
+        self.removed_chains = set()
+        self.full_apply = True
+
+    def _mark_dirty(self, chain, wrap=True):
+        self.dirty = True
+        if wrap:
+            self.dirty_chains.add(chain)
+        else:
+            self.full_apply = True
 
     def has_chain(self, name, wrap=True):
         if wrap:
@@ -211,9 +236,10 @@ class IptablesTable(object):
         """
         if wrap:
             self.chains.add(name)
+            self.removed_chains.discard(name)
         else:
             self.unwrapped_chains.add(name)
-        self.dirty = True
+        self._mark_dirty(name, wrap)
 
     def remove_chain(self, name, wrap=True):
         """Remove named chain.
@@ -233,7 +259,10 @@ class IptablesTable(object):
             LOG.warn(_('Attempted to remove chain %s which does not exist'),
                      name)
             return
-        self.dirty = True
+        self._mark_dirty(name, wrap)
+        if wrap:
+            self.dirty_chains.discard(name)
+            self.removed_chains.add(name)
 
         # non-wrapped chains and rules need to be dealt with specially,
         # so we keep a list of them to be iterated over in apply()
@@ -252,6 +281,9 @@ class IptablesTable(object):
         if not wrap:
             self.remove_rules += filter(lambda r: jump_snippet in r.rule,
                                         self.rules)
+        for rule in self.rules:
+            if jump_snippet in rule.rule:
+                self._mark_dirty(rule.chain, rule.wrap)
         self.rules = filter(lambda r: jump_snippet not in r.rule, self.rules)
 
     def add_rule(self, chain, rule, wrap=True, top=False):
@@ -276,7 +308,7 @@ class IptablesTable(object):
             LOG.debug("Skipping duplicate iptables rule addition")
         else:
             self.rules.append(IptablesRule(chain, rule, wrap, top))
-            self.dirty = True
+            self._mark_dirty(chain, wrap)
 
     def _wrap_target_chain(self, s):
         if s.startswith('$'):
@@ -295,7 +327,7 @@ class IptablesTable(object):
             self.rules.remove(IptablesRule(chain, rule, wrap, top))
             if not wrap:
                 self.remove_rules.append(IptablesRule(chain, rule, wrap, top))
-            self.dirty = True
+            self._mark_dirty(chain, wrap)
         except ValueError:
             LOG.warn(_('Tried to remove rule that was not there:'
                        ' %(chain)r %(rule)r %(wrap)r %(top)r'),
@@ -307,18 +339,18 @@ class IptablesTable(object):
         if isinstance(regex, six.string_types):
             regex = re.compile(regex)
         num_rules = len(self.rules)
+        for rule in self.rules:
+            if regex.match(str(rule)):
+                self._mark_dirty(rule.chain, rule.wrap)
         self.rules = filter(lambda r: not regex.match(str(r)), self.rules)
-        removed = num_rules - len(self.rules)
-        if removed > 0:
-            self.dirty = True
-        return removed
+        return num_rules - len(self.rules)
 
     def empty_chain(self, chain, wrap=True):
         """Remove all rules from a chain."""
         chained_rules = [rule for rule in self.rules
                               if rule.chain == chain and rule.wrap == wrap]
         if chained_rules:
-            self.dirty = True
+            self._mark_dirty(chain, wrap)
         for rule in chained_rules:
             self.rules.remove(rule)
 
@@ -358,6 +390,7 @@ class IptablesManager(object):
         self.ipv6 = {'filter': IptablesTable()}
 
         self.iptables_apply_deferred = False
+        self.last_full_apply = None
 
         # Add a nova-filter-top chain. It's intended to be shared
         # among the various nova components. It sits at the very top
@@ -447,6 +480,16 @@ class IptablesManager(object):
         if CONF.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
+        if self._can_apply_incrementally(s):
+            try:
+                self._apply_chains(s)
+                LOG.debug("IPTablesManager.apply of changed chains completed "
+                          "with success")
+                return
+            except processutils.ProcessExecutionError:
+                LOG.exception(_('Failed to apply the changed iptables '
+                                'chains, applying all the rules'))
+
         for cmd, tables in s:
             all_tables, _err = self.execute('%s-save' % (cmd,), '-c',
                                                 run_as_root=True,
@@ -457,11 +500,55 @@ class IptablesManager(object):
                 all_lines[start:end] = self._modify_rules(
                         all_lines[start:end], table, table_name)
                 table.dirty = False
+                table.dirty_chains.clear()
+                table.removed_chains.clear()
+                table.full_apply = False
             self.execute('%s-restore' % (cmd,), '-c', run_as_root=True,
                          process_input='\n'.join(all_lines),
                          attempts=5)
+        self.last_full_apply = timeutils.utcnow()
         LOG.debug("IPTablesManager.apply completed with success")
 
+    def _can_apply_incrementally(self, s):
+        """Whether only the changed wrapped chains need to be applied.
+
+        That is, all the rules were applied recently, and since then only
+        the rules of wrapped chains changed.
+        """
+        if (not CONF.iptables_incremental_apply or
+                not CONF.iptables_full_apply_interval or
+                self.last_full_apply is None or
+                timeutils.is_older_than(self.last_full_apply,
+                                        CONF.iptables_full_apply_interval)):
+            return False
+        for cmd, tables in s:
+            for table in tables.itervalues():
+                if table.full_apply:
+                    return False
+        return True
+
+    def _apply_chains(self, s):
+        """Rewrite the wrapped chains that changed since the last apply.
+
+        Unlike a full apply, this neither saves the current rules nor
+        touches any other chain, as iptables-restore --noflush leaves the
+        chains that are not in its input alone.
+        """
+        for cmd, tables in s:
+            all_lines = []
+            for table_name, table in tables.iteritems():
+                if table.dirty:
+                    all_lines += self._modify_chains(table, table_name)
+            if all_lines:
+                self.execute('%s-restore' % (cmd,), '-c', '--noflush',
+                             run_as_root=True,
+                             process_input='\n'.join(all_lines),
+                             attempts=5)
+            for table in tables.itervalues():
+                table.dirty = False
+                table.dirty_chains.clear()
+                table.removed_chains.clear()
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -474,6 +561,37 @@ class IptablesManager(object):
         end = lines[start:].index('COMMIT') + start + 2
         return (start, end)
 
+    def _modify_chains(self, table, table_name):
+        """Return the iptables-restore --noflush input for a table that
+        rewrites its dirty chains and deletes its removed chains.
+        """
+        # Declaring an existing chain flushes it. The removed chains are
+        # flushed too, as they can only be deleted once empty and once no
+        # other chain jumps to them.
+        dirty_chains = table.dirty_chains & table.chains
+        chains = sorted(dirty_chains) + sorted(table.removed_chains)
+        lines = ['*%s' % table_name]
+        lines += [':%s-%s - [0:0]' % (binary_name, name) for name in chains]
+
+        # Like _modify_rules(), put the top rules first and let the last
+        # occurrence of a rule take precedence.
+        rules = [rule for rule in table.rules
+                 if rule.wrap and rule.chain in dirty_chains]
+        rule_lines = [str(rule) for rule in rules if rule.top]
+        rule_lines += [str(rule) for rule in rules if not rule.top]
+        seen_lines = set()
+        unique_lines = []
+        for line in reversed(rule_lines):
+            if line not in seen_lines:
+                seen_lines.add(line)
+                unique_lines.append(line)
+        lines += reversed(unique_lines)
+
+        lines += ['-X %s-%s' % (binary_name, name)
+                  for name in sorted(table.removed_chains)]
+        lines.append('COMMIT')
+        return lines
+
     def _modify_rules(self, current_lines, table, table_name):
         unwrapped_chains = table.unwrapped_chains
         chains = table.chains
@@ -496,19 +614,17 @@ class IptablesManager(object):
 
         if CONF.iptables_top_regex:
             regex = re.compile(CONF.iptables_top_regex)
-            temp_filter = filter(lambda line: regex.search(line), new_filter)
-            for rule_str in temp_filter:
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                                    new_filter)
-            top_rules = temp_filter
+            top_rules = filter(lambda line: regex.search(line), new_filter)
+            top_lines = set(line.strip() for line in top_rules)
+            new_filter = filter(lambda s: s.strip() not in top_lines,
+                                new_filter)
 
         if CONF.iptables_bottom_regex:
             regex = re.compile(CONF.iptables_bottom_regex)
-            temp_filter = filter(lambda line: regex.search(line), new_filter)
-            for rule_str in temp_filter:
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                    new_filter)
-            bottom_rules = temp_filter
+            bottom_rules = filter(lambda line: regex.search(line), new_filter)
+            bottom_lines = set(line.strip() for line in bottom_rules)
+            new_filter = filter(lambda s: s.strip() not in bottom_lines,
+                                new_filter)
 
         seen_chains = False
         rules_index = 0
@@ -523,6 +639,11 @@ class IptablesManager(object):
         if not seen_chains:
             rules_index = 2
 
+        # The last line of the table for each rule, keyed by the rule
+        # without its [packet:byte] counts.
+        current_rules = dict((_rule_key(line), line) for line in new_filter)
+        top_keys = set()
+
         our_rules = top_rules
         bot_rules = []
         for rule in rules:
@@ -535,30 +656,21 @@ class IptablesManager(object):
                 # We don't want to remove an entry if it has non-zero
                 # [packet:byte] counts and replace it with [0:0], so let's
                 # go look for a duplicate, and over-ride our table rule if
-                # found.
-
-                # ignore [packet:byte] counts at beginning of line
-                if rule_str.startswith('['):
-                    rule_str = rule_str.split(']', 1)[1]
-                dup_filter = filter(lambda s: rule_str.strip() in s.strip(),
-                                    new_filter)
-
-                new_filter = filter(lambda s:
-                                    rule_str.strip() not in s.strip(),
-                                    new_filter)
-                # if no duplicates, use original rule
-                if dup_filter:
-                    # grab the last entry, if there is one
-                    dup = dup_filter[-1]
-                    rule_str = str(dup)
-                else:
-                    rule_str = str(rule)
-                rule_str.strip()
+                # found. Only the first of several identical top rules can
+                # find one, as it takes the duplicates out of the table.
+                key = _rule_key(rule_str)
+                if key not in top_keys and key in current_rules:
+                    rule_str = current_rules[key]
+                top_keys.add(key)
 
                 our_rules += [rule_str]
             else:
                 bot_rules += [rule_str]
 
+        if top_keys:
+            new_filter = filter(lambda s: _rule_key(s) not in top_keys,
+                                new_filter)
+
         our_rules += bot_rules
 
         new_filter[rules_index:rules_index] = our_rules
@@ -573,11 +685,14 @@ class IptablesManager(object):
         new_filter[commit_index:commit_index] = bottom_rules
         seen_lines = set()
 
+        # Each rule to remove takes out a single matching rule line.
+        removals = collections.defaultdict(int)
+        for rule in remove_rules:
+            removals[_rule_key(str(rule))] += 1
+
         def _weed_out_duplicates(line):
             # ignore [packet:byte] counts at beginning of lines
-            if line.startswith('['):
-                line = line.split(']', 1)[1]
-            line = line.strip()
+            line = _rule_key(line)
             if line in seen_lines:
                 return False
             else:
@@ -592,23 +707,15 @@ class IptablesManager(object):
                 line = line.split(':')[1]
                 line = line.split('- [')[0]
                 line = line.strip()
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
+                if line in remove_chains:
+                    remove_chains.remove(line)
+                    return False
             elif line.startswith('['):
                 # it's a rule
-                # ignore [packet:byte] counts at beginning of lines
-                line = line.split(']', 1)[1]
-                line = line.strip()
-                for rule in remove_rules:
-                    # ignore [packet:byte] counts at beginning of rules
-                    rule_str = str(rule)
-                    rule_str = rule_str.split(' ', 1)[1]
-                    rule_str = rule_str.strip()
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
+                line = _rule_key(line)
+                if removals.get(line):
+                    removals[line] -= 1
+                    return False
 
             # Leave it alone
             return True
@@ -623,12 +730,75 @@ class IptablesManager(object):
 
         # flush lists, just in case we didn't find something
         remove_chains.clear()
-        for rule in remove_rules:
-            remove_rules.remove(rule)
+        del remove_rules[:]
 
         return new_filter
 
 
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    Keeps hash:ip sets of addresses in the kernel, such as the members of a
+    security group, so that a single iptables rule can match any of them
+    with '-m set --match-set <name> src'. Once a set exists, changes to its
+    members are applied with ipset add and del, without touching iptables.
+
+    """
+
+    def __init__(self, execute=None):
+        if not execute:
+            self.execute = _execute
+        else:
+            self.execute = execute
+
+        # The members of each set, as last applied.
+        self.sets = {}
+
+    def set_members(self, name, members, family='inet'):
+        """Make the named set hold exactly the given addresses.
+
+        The set is created if needed. Its name must not be longer than 31
+        characters.
+
+        """
+        members = set(members)
+        current = self.sets.get(name)
+        if current is None:
+            # The set may be left over from a previous run, with other
+            # members, so it is emptied before being filled.
+            lines = ['create %s hash:ip family %s' % (name, family),
+                     'flush %s' % name]
+            lines += ['add %s %s' % (name, member)
+                      for member in sorted(members)]
+            self.execute('ipset', 'restore', '-exist', run_as_root=True,
+                         process_input='\n'.join(lines) + '\n')
+        else:
+            for member in sorted(current - members):
+                self.execute('ipset', 'del', name, member, '-exist',
+                             run_as_root=True)
+            for member in sorted(members - current):
+                self.execute('ipset', 'add', name, member, '-exist',
+                             run_as_root=True)
+        self.sets[name] = members
+
+    def destroy_set(self, name):
+        """Destroy the named set.
+
+        No iptables rule may refer to it anymore.
+
+        """
+        if self.sets.pop(name, None) is not None:
+            self.execute('ipset', 'destroy', name, run_as_root=True,
+                         check_exit_code=False)
+
+
+def _rule_key(line):
+    """Return an iptables rule line without its [packet:byte] counts."""
+    if line.startswith('['):
+        line = line.split(']', 1)[1]
+    return line.strip()
+
+
 # NOTE(jkoelker) This is just a nice little stub point since mocking
 #                builtins with mox is a nightmare
 def write_to_file(file, data, mode='w'):
@@ -38,6 +38,8 @@ topologies.  All of the network commands are issued to a subclass of
                                  is disassociated
 :create_unique_mac_address_attempts:  Number of times to attempt creating
                                       a unique mac address
+:use_fixed_ip_bitmap:  Allocate fixed ips from a bitmap of the free ones
+:fixed_ip_claim_attempts:  Number of addresses of the bitmap to try to claim
 
 """
 
@@ -61,6 +63,7 @@ from nova import manager
 from nova.network import api as network_api
 from nova.network import driver
 from nova.network import floating_ips
+from nova.network import ip_bitmap
 from nova.network import model as network_model
 from nova.network import rpcapi as network_rpcapi
 from nova import objects
@@ -130,6 +133,16 @@ network_opts = [
     cfg.IntOpt('create_unique_mac_address_attempts',
                default=5,
                help='Number of attempts to create unique mac address'),
+    cfg.BoolOpt('use_fixed_ip_bitmap',
+                default=False,
+                help='If True, allocate fixed IPs by claiming a random free '
+                     'address of a bitmap of the free addresses of the '
+                     'network, instead of locking the first free one'),
+    cfg.IntOpt('fixed_ip_claim_attempts',
+               default=5,
+               help='Number of free addresses of the bitmap to try to claim '
+                    'before allocating a fixed IP by locking the first free '
+                    'one'),
     cfg.BoolOpt('fake_call',
                 default=False,
                 help='If True, skip using the queue and make local calls'),
@@ -304,6 +317,8 @@ class NetworkManager(manager.Manager):
         self.l3driver = importutils.import_object(l3_lib)
 
         self.quotas_cls = quotas_obj.Quotas
+        # The FreeIpBitmap of each network, by network id
+        self._free_fixed_ips = {}
 
         super(NetworkManager, self).__init__(service_name='network',
                                              *args, **kwargs)
@@ -332,11 +347,51 @@ class NetworkManager(manager.Manager):
             return fip.address
         except exception.FixedIpNotFoundForNetworkHost:
             elevated = context.elevated()
-            fip = fixed_ip_obj.FixedIP.associate_pool(elevated,
-                                                      network_id,
-                                                      host=host)
+            fip = self._associate_pool(elevated, network_ref, host=host)
             return fip.address
 
+    def _load_free_fixed_ips(self, context, network):
+        addresses = fixed_ip_obj.FixedIP.get_free_addresses_by_network(
+            context, network['id'])
+        free_ips = ip_bitmap.FreeIpBitmap(network['cidr'], addresses)
+        self._free_fixed_ips[network['id']] = free_ips
+        return free_ips
+
+    def _associate_pool(self, context, network, instance_uuid=None,
+                        host=None):
+        """Associate a free fixed ip of the network to instance or host."""
+        if not CONF.use_fixed_ip_bitmap or not network['cidr']:
+            return fixed_ip_obj.FixedIP.associate_pool(
+                context, network['id'], instance_uuid=instance_uuid,
+                host=host)
+
+        free_ips = self._free_fixed_ips.get(network['id'])
+        if free_ips is None or not free_ips.free:
+            free_ips = self._load_free_fixed_ips(context, network)
+        for attempt in xrange(CONF.fixed_ip_claim_attempts):
+            address = free_ips.choose()
+            if address is None:
+                break
+            free_ips.take(address)
+            try:
+                return fixed_ip_obj.FixedIP.claim(
+                    context, network['id'], address,
+                    instance_uuid=instance_uuid, host=host)
+            except exception.FixedIpNotFree:
+                LOG.debug('Fixed ip %s was taken by another host', address)
+
+        # NOTE: the bitmap is out of date or the network is full, let the
+        #       database find a free address and reload the bitmap next time.
+        self._free_fixed_ips.pop(network['id'], None)
+        return fixed_ip_obj.FixedIP.associate_pool(
+            context, network['id'], instance_uuid=instance_uuid, host=host)
+
+    def _release_fixed_ip_address(self, network_id, address):
+        """Return a disassociated fixed ip to the bitmap of its network."""
+        free_ips = self._free_fixed_ips.get(network_id)
+        if free_ips is not None:
+            free_ips.release(str(address))
+
     def get_dhcp_leases(self, ctxt, network_ref):
         """Broker the request to the driver to fetch the dhcp leases."""
         LOG.debug('Get DHCP leases for network %s', network_ref['uuid'])
@@ -370,6 +425,7 @@ class NetworkManager(manager.Manager):
                                                                    time)
             if num:
                 LOG.debug('Disassociated %s stale fixed ip(s)', num)
+                self._free_fixed_ips.clear()
 
     def set_network_host(self, context, network_ref):
         """Safely sets the host of the network."""
@@ -820,6 +876,8 @@ class NetworkManager(manager.Manager):
                 #             will just get a warn in lease or release.
                 if not fixed_ip.leased:
                     fixed_ip.disassociate()
+                    self._release_fixed_ip_address(fixed_ip.network_id,
+                                                   address)
                 return self.get_instance_nw_info(context, instance_id,
                                                  rxtx_factor, host)
         raise exception.FixedIpNotFoundForSpecificInstance(
@@ -892,14 +950,17 @@ class NetworkManager(manager.Manager):
                                                          instance_id,
                                                          network['id'])
                 else:
-                    fip = fixed_ip_obj.FixedIP.associate_pool(
-                        context.elevated(), network['id'], instance_id)
+                    fip = self._associate_pool(context.elevated(), network,
+                                               instance_id)
                 vif = vif_obj.VirtualInterface.get_by_instance_and_network(
                         context, instance_id, network['id'])
                 fip.allocated = True
                 fip.virtual_interface_id = vif.id
                 fip.save()
                 cleanup.append(fip.disassociate)
+                cleanup.append(functools.partial(
+                    self._release_fixed_ip_address, network['id'],
+                    fip.address))
 
                 self._do_trigger_security_group_members_refresh_for_instance(
                     instance_id)
@@ -1021,6 +1082,7 @@ class NetworkManager(manager.Manager):
                 if (instance_uuid == fixed_ip_ref.instance_uuid and
                         not fixed_ip_ref.leased):
                     fixed_ip_ref.disassociate()
+                    self._release_fixed_ip_address(network['id'], address)
             else:
                 # We can't try to free the IP address so just call teardown
                 self._teardown_network_on_host(context, network)
@@ -1059,6 +1121,7 @@ class NetworkManager(manager.Manager):
         fixed_ip.save()
         if not fixed_ip.allocated:
             fixed_ip.disassociate()
+            self._release_fixed_ip_address(fixed_ip.network_id, address)
 
     @staticmethod
     def _convert_int_args(kwargs):
@@ -1841,9 +1904,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                                                      instance_id,
                                                      network['id'])
             else:
-                fip = fixed_ip_obj.FixedIP.associate_pool(context,
-                                                          network['id'],
-                                                          instance_id)
+                fip = self._associate_pool(context, network, instance_id)
         address = fip.address
 
         vif = vif_obj.VirtualInterface.get_by_instance_and_network(
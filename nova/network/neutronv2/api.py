@@ -489,7 +489,8 @@ class API(base_api.NetworkAPI):
         return neutronv2.get_client(context).show_port(port_id)
 
     def get_instance_nw_info(self, context, instance, networks=None,
-                             port_ids=None, use_slave=False):
+                             port_ids=None, use_slave=False,
+                             neutron_ports=None):
         """Return network information for specified instance
            and update cache.
         """
@@ -497,18 +498,46 @@ class API(base_api.NetworkAPI):
         #                   special APIs that pummeled slaves instead of
         #                   the master. For now we just ignore this arg.
         result = self._get_instance_nw_info(context, instance, networks,
-                                            port_ids)
+                                            port_ids, neutron_ports)
         base_api.update_instance_cache_with_nw_info(self, context, instance,
                                                     result, update_cells=False)
         return result
 
+    def get_instances_nw_info(self, context, instances, max_concurrency=1,
+                              use_slave=False):
+        """Efficient override of base get_instances_nw_info method.
+
+        Lists the ports of all of the instances with a single neutron call.
+        """
+        instance_ports = {}
+        if instances:
+            client = neutronv2.get_client(context, admin=True)
+            data = client.list_ports(
+                device_id=[instance['uuid'] for instance in instances])
+            for port in data.get('ports', []):
+                instance_ports.setdefault(port['device_id'], []).append(port)
+
+        def get_instance_nw_info(context, instance):
+            # Only the ports of the instance's tenant, like the search
+            # done for a single instance
+            neutron_ports = [
+                port for port in instance_ports.get(instance['uuid'], [])
+                if port.get('tenant_id') == instance['project_id']]
+            return self.get_instance_nw_info(context, instance,
+                                             use_slave=use_slave,
+                                             neutron_ports=neutron_ports)
+
+        return self._get_instances_nw_info(context, instances,
+                                           max_concurrency,
+                                           get_instance_nw_info)
+
     def _get_instance_nw_info(self, context, instance, networks=None,
-                              port_ids=None):
+                              port_ids=None, neutron_ports=None):
         # keep this caching-free version of the get_instance_nw_info method
         # because it is used by the caching logic itself.
         LOG.debug('get_instance_nw_info()', instance=instance)
         nw_info = self._build_network_info_model(context, instance, networks,
-                                                 port_ids)
+                                                 port_ids, neutron_ports)
         return network_model.NetworkInfo.hydrate(nw_info)
 
     def _gather_port_ids_and_networks(self, context, instance, networks=None,
@@ -1145,7 +1174,7 @@ class API(base_api.NetworkAPI):
         return network, ovs_interfaceid
 
     def _build_network_info_model(self, context, instance, networks=None,
-                                  port_ids=None):
+                                  port_ids=None, neutron_ports=None):
         """Return list of ordered VIFs attached to instance.
 
         :param context - request context.
@@ -1157,14 +1186,19 @@ class API(base_api.NetworkAPI):
                           instance in order of attachment. If value is None
                           this value will be populated from the existing
                           cached value.
+        :param neutron_ports - The instance's ports, already listed from
+                               neutron. If value is None they are listed
+                               here.
         """
 
-        search_opts = {'tenant_id': instance['project_id'],
-                       'device_id': instance['uuid'], }
         client = neutronv2.get_client(context, admin=True)
-        data = client.list_ports(**search_opts)
+        if neutron_ports is None:
+            search_opts = {'tenant_id': instance['project_id'],
+                           'device_id': instance['uuid'], }
+            data = client.list_ports(**search_opts)
+            neutron_ports = data.get('ports', [])
 
-        current_neutron_ports = data.get('ports', [])
+        current_neutron_ports = neutron_ports
         networks, port_ids = self._gather_port_ids_and_networks(
                 context, instance, networks, port_ids)
         nw_info = network_model.NetworkInfo()
@@ -15,6 +15,7 @@
 """Nova common internal object model"""
 
 import collections
+import contextlib
 import copy
 import functools
 
@@ -27,6 +28,7 @@ from nova import exception
 from nova import objects
 from nova.objects import fields
 from nova.openstack.common.gettextutils import _
+from nova.openstack.common import local
 from nova.openstack.common import log as logging
 from nova.openstack.common import versionutils
 
@@ -146,6 +148,15 @@ def remotable_classmethod(fn):
     @functools.wraps(fn)
     def wrapper(cls, context, *args, **kwargs):
         if NovaObject.indirection_api:
+            batch = _current_batch()
+            action = ['class', cls.obj_name(), cls.VERSION, fn.__name__,
+                      args, kwargs]
+            if batch is not None and kwargs.get('want_result') is False:
+                batch.add(context, action)
+                return
+            if batch is not None and batch.actions:
+                # Send the queued actions along with this one.
+                return batch.flush(context, action)
             result = NovaObject.indirection_api.object_class_action(
                 context, cls.obj_name(), fn.__name__, cls.VERSION,
                 args, kwargs)
@@ -183,6 +194,18 @@ def remotable(fn):
         # Force this to be set if it wasn't before.
         self._context = ctxt
         if NovaObject.indirection_api:
+            batch = _current_batch()
+            if batch is not None and fn.__name__ in BATCHABLE_METHODS:
+                # Send the object as it is now, it may change before the
+                # batch goes out.
+                snapshot = self.obj_clone()
+                batch.add(ctxt, ['object', snapshot, fn.__name__, args,
+                                 kwargs], (self, snapshot))
+                return
+            if batch is not None and batch.actions:
+                # Send the queued actions along with this one.
+                return batch.flush(ctxt, ['object', self, fn.__name__, args,
+                                          kwargs], self)
             updates, result = NovaObject.indirection_api.object_action(
                 ctxt, self, fn.__name__, args, kwargs)
             for key, value in updates.iteritems():
@@ -200,6 +223,119 @@ def remotable(fn):
     return wrapper
 
 
+# Remotable methods returning nothing, which action_batch() may defer.
+# Remotable classmethods are deferred when called with want_result=False.
+BATCHABLE_METHODS = frozenset(['save'])
+
+
+def _field_unchanged(objinst, snapshot, name):
+    """Return True if field name of objinst still has its snapshot value."""
+    if not objinst.obj_attr_is_set(name):
+        return not snapshot.obj_attr_is_set(name)
+    if not snapshot.obj_attr_is_set(name):
+        return False
+    # Compare primitives, so that nested objects compare by value and
+    # changes made to them since the snapshot are noticed.
+    field = objinst.fields[name]
+    return (field.to_primitive(objinst, name, objinst[name]) ==
+            field.to_primitive(snapshot, name, snapshot[name]))
+
+
+class _ActionBatch(object):
+    """Remotable calls queued by one greenthread, see action_batch()."""
+
+    def __init__(self):
+        self.context = None
+        self.actions = []
+        self.targets = []
+
+    def add(self, context, action, target=None):
+        """Queue an action, target is the (object, snapshot) it was made
+        for, if any.
+        """
+        if self.context is not None and context is not self.context:
+            # The batch is sent with a single context.
+            self.flush()
+        self.context = context
+        self.actions.append(action)
+        self.targets.append(target)
+
+    def flush(self, context=None, action=None, objinst=None):
+        """Send the queued actions, followed by action if given, apply
+        their updates and return the result of action, which is made on
+        objinst if it is an object action.
+        """
+        if action is not None:
+            self.add(context, action)
+        if not self.actions:
+            return
+        context, actions, targets = self.context, self.actions, self.targets
+        self.context, self.actions, self.targets = None, [], []
+        if objinst is not None:
+            sent_changes = objinst.obj_what_changed()
+        results = NovaObject.indirection_api.object_action_batch(context,
+                                                                 actions)
+        for target, (updates, result) in zip(targets, results):
+            if target is not None:
+                objinst_, snapshot = target
+                modified = set(name for name in objinst_.obj_what_changed()
+                               if not _field_unchanged(objinst_, snapshot,
+                                                       name))
+                self._apply_updates(objinst_, updates, modified)
+        if objinst is not None:
+            # objinst went out with the changes saved by the queued actions
+            # still pending, and they came back as changed.
+            updates = results[-1][0]
+            cleared = sent_changes - objinst.obj_what_changed()
+            self._apply_updates(objinst, dict(
+                updates, obj_what_changed=[
+                    name for name in updates.get('obj_what_changed', [])
+                    if name not in cleared or name in updates]))
+        return result
+
+    @staticmethod
+    def _apply_updates(objinst, updates, modified=frozenset()):
+        """Apply the updates of an action to objinst, except to the fields
+        in modified, which keep their local value and stay changed.
+        """
+        for key, value in updates.iteritems():
+            if key in objinst.fields and key not in modified:
+                field = objinst.fields[key]
+                objinst[key] = field.from_primitive(objinst, key, value)
+        objinst.obj_reset_changes()
+        objinst._changed_fields = (
+            set(modified) | set(updates.get('obj_what_changed', [])))
+
+
+def _current_batch():
+    return getattr(local.strong_store, 'object_action_batch', None)
+
+
+@contextlib.contextmanager
+def action_batch():
+    """Send the remotable calls that return nothing in batches.
+
+    Within the block, save() calls and remotable classmethods called with
+    want_result=False made by this greenthread are queued instead of being
+    sent to the indirection service. The queue goes out in a single
+    object_action_batch call along with the next remotable call that
+    returns something, or when the block exits. Objects keep their pending
+    changes until then, and errors of queued calls are raised by the call
+    sending them, so the block should not make other RPC calls that rely
+    on them. Nothing is queued when there is no indirection service.
+    """
+    if _current_batch() is not None:
+        # Nested block, the outermost one sends the batch.
+        yield
+        return
+    batch = local.strong_store.object_action_batch = _ActionBatch()
+    try:
+        yield
+    finally:
+        local.strong_store.object_action_batch = None
+        batch.flush()
+
+
 @six.add_metaclass(NovaObjectMetaclass)
 class NovaObject(object):
     """Base class and object factory.
@@ -283,6 +419,11 @@ class NovaObject(object):
     def _obj_from_primitive(cls, context, objver, primitive):
         self = cls()
         self._context = context
+        self._obj_load_primitive(objver, primitive)
+        return self
+
+    def _obj_load_primitive(self, objver, primitive):
+        """Set the fields and changes of this object from a primitive."""
         self.VERSION = objver
         objdata = primitive['nova_object.data']
         changes = primitive.get('nova_object.changes', [])
@@ -291,7 +432,6 @@ class NovaObject(object):
                 setattr(self, name, field.from_primitive(self, name,
                                                          objdata[name]))
         self._changed_fields = set([x for x in changes if x in self.fields])
-        return self
 
     @classmethod
     def obj_from_primitive(cls, primitive, context=None):
@@ -635,6 +775,8 @@ class NovaObjectSerializer(messaging.NoOpSerializer):
     def deserialize_entity(self, context, entity):
         if isinstance(entity, dict) and 'nova_object.name' in entity:
             entity = self._process_object(context, entity)
+        elif isinstance(entity, dict) and COMPACT_SCHEMAS_KEY in entity:
+            entity = self._process_object(context, expand_primitive(entity))
         elif isinstance(entity, (tuple, list, set)):
             entity = self._process_iterable(context, self.deserialize_entity,
                                             entity)
@@ -662,6 +804,90 @@ def obj_to_primitive(obj):
         return obj
 
 
+# Keys of the compact primitive format, see compact_primitive().
+COMPACT_SCHEMAS_KEY = 'nova_object.schemas'
+COMPACT_OBJECT_KEY = 'nova_object.compact'
+
+
+def _compact_value(value, schemas, schema_indexes):
+    # Objects are only found in fields and in lists, never in plain dicts.
+    if isinstance(value, dict) and 'nova_object.name' in value:
+        return {COMPACT_OBJECT_KEY: _compact_object(value, schemas,
+                                                    schema_indexes)}
+    if isinstance(value, (list, tuple)):
+        return [_compact_value(item, schemas, schema_indexes)
+                for item in value]
+    return value
+
+
+def _compact_object(primitive, schemas, schema_indexes):
+    data = primitive['nova_object.data']
+    names = []
+    null_names = []
+    for name in sorted(data):
+        if data[name] is None:
+            null_names.append(name)
+        else:
+            names.append(name)
+    key = (primitive['nova_object.name'], primitive['nova_object.namespace'],
+           primitive['nova_object.version'], tuple(names), tuple(null_names))
+    index = schema_indexes.get(key)
+    if index is None:
+        index = schema_indexes[key] = len(schemas)
+        schemas.append([key[0], key[1], key[2], names, null_names])
+    compact = [index, primitive.get('nova_object.changes', [])]
+    compact.extend(_compact_value(data[name], schemas, schema_indexes)
+                   for name in names)
+    return compact
+
+
+def compact_primitive(primitive):
+    """Return the compact form of an object primitive.
+
+    The name, namespace, version and field names shared by objects of the
+    same class are listed once, in a table of schemas, along with the
+    fields set to None, and every object, including the nested ones,
+    becomes a list of the index of its schema, its changed fields and the
+    values of its other set fields in schema order. Unset fields are left
+    out as usual. This shrinks lists of objects a lot, e.g. InstanceList
+    results.
+
+    The receiver must be able to expand it with expand_primitive(), so
+    it is only sent to services known to support it.
+    """
+    schemas = []
+    compact = _compact_object(primitive, schemas, {})
+    return {COMPACT_SCHEMAS_KEY: schemas, COMPACT_OBJECT_KEY: compact}
+
+
+def _expand_value(value, schemas):
+    if isinstance(value, dict) and COMPACT_OBJECT_KEY in value:
+        return _expand_object(value[COMPACT_OBJECT_KEY], schemas)
+    if isinstance(value, list):
+        return [_expand_value(item, schemas) for item in value]
+    return value
+
+
+def _expand_object(compact, schemas):
+    name, namespace, version, names, null_names = schemas[compact[0]]
+    data = dict.fromkeys(null_names)
+    data.update((field, _expand_value(value, schemas))
+                for field, value in zip(names, compact[2:]))
+    primitive = {'nova_object.name': name,
+                 'nova_object.namespace': namespace,
+                 'nova_object.version': version,
+                 'nova_object.data': data}
+    if compact[1]:
+        primitive['nova_object.changes'] = compact[1]
+    return primitive
+
+
+def expand_primitive(compact):
+    """Turn the result of compact_primitive() back into a primitive."""
+    return _expand_object(compact[COMPACT_OBJECT_KEY],
+                          compact[COMPACT_SCHEMAS_KEY])
+
+
 def obj_make_list(context, list_obj, item_cls, db_list, **extra_args):
     """Construct an object list from a list of primitives.
 
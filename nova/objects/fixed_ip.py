@@ -26,7 +26,8 @@ FIXED_IP_OPTIONAL_ATTRS = ['instance', 'network']
 class FixedIP(obj_base.NovaPersistentObject, obj_base.NovaObject):
     # Version 1.0: Initial version
     # Version 1.1: Added virtual_interface field
-    VERSION = '1.1'
+    # Version 1.2: Added claim() and get_free_addresses_by_network()
+    VERSION = '1.2'
 
     fields = {
         'id': fields.IntegerField(),
@@ -118,6 +119,18 @@ class FixedIP(obj_base.NovaPersistentObject, obj_base.NovaObject):
                                                 host=host)
         return cls._from_db_object(context, cls(context), db_fixedip)
 
+    @obj_base.remotable_classmethod
+    def claim(cls, context, network_id, address, instance_uuid=None,
+              host=None):
+        db_fixedip = db.fixed_ip_claim(context, network_id, str(address),
+                                       instance_uuid=instance_uuid,
+                                       host=host)
+        return cls._from_db_object(context, cls(context), db_fixedip)
+
+    @obj_base.remotable_classmethod
+    def get_free_addresses_by_network(cls, context, network_id):
+        return db.fixed_ip_get_free_addresses_by_network(context, network_id)
+
     @obj_base.remotable_classmethod
     def disassociate_by_address(cls, context, address):
         db.fixed_ip_disassociate(context, address)
@@ -163,7 +176,8 @@ class FixedIP(obj_base.NovaPersistentObject, obj_base.NovaObject):
 class FixedIPList(obj_base.ObjectListBase, obj_base.NovaObject):
     # Version 1.0: Initial version
     # Version 1.1: Added get_by_network()
-    VERSION = '1.1'
+    # Version 1.2: FixedIP <= version 1.2
+    VERSION = '1.2'
 
     fields = {
         'objects': fields.ListOfObjectsField('FixedIP'),
@@ -171,6 +185,7 @@ class FixedIPList(obj_base.ObjectListBase, obj_base.NovaObject):
     child_versions = {
         '1.0': '1.0',
         '1.1': '1.1',
+        '1.2': '1.2',
         }
 
     @obj_base.remotable_classmethod
@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from nova.compute import flavors
 from nova import db
 from nova import exception
 from nova import objects
@@ -117,20 +118,20 @@ class Flavor(base.NovaPersistentObject, base.NovaObject):
 
     @base.remotable_classmethod
     def get_by_id(cls, context, id):
-        db_flavor = db.flavor_get(context, id)
+        db_flavor = flavors.get_flavor(id, ctxt=context)
         return cls._from_db_object(context, cls(context), db_flavor,
                                    expected_attrs=['extra_specs'])
 
     @base.remotable_classmethod
     def get_by_name(cls, context, name):
-        db_flavor = db.flavor_get_by_name(context, name)
+        db_flavor = flavors.get_flavor_by_name(name, ctxt=context)
         return cls._from_db_object(context, cls(context), db_flavor,
                                    expected_attrs=['extra_specs'])
 
     @base.remotable_classmethod
     def get_by_flavor_id(cls, context, flavor_id, read_deleted=None):
-        db_flavor = db.flavor_get_by_flavor_id(context, flavor_id,
-                                               read_deleted)
+        db_flavor = flavors.get_flavor_by_flavor_id(
+            flavor_id, ctxt=context, read_deleted=read_deleted)
         return cls._from_db_object(context, cls(context), db_flavor,
                                    expected_attrs=['extra_specs'])
 
@@ -140,6 +141,7 @@ class Flavor(base.NovaPersistentObject, base.NovaObject):
             raise exception.ObjectActionError(action='add_access',
                                               reason='projects modified')
         db.flavor_access_add(context, self.flavorid, project_id)
+        flavors.invalidate_cache()
         self._load_projects(context)
 
     @base.remotable
@@ -148,6 +150,7 @@ class Flavor(base.NovaPersistentObject, base.NovaObject):
             raise exception.ObjectActionError(action='remove_access',
                                               reason='projects modified')
         db.flavor_access_remove(context, self.flavorid, project_id)
+        flavors.invalidate_cache()
         self._load_projects(context)
 
     @base.remotable
@@ -162,6 +165,7 @@ class Flavor(base.NovaPersistentObject, base.NovaObject):
                 expected_attrs.append(attr)
         projects = updates.pop('projects', [])
         db_flavor = db.flavor_create(context, updates, projects=projects)
+        flavors.invalidate_cache()
         self._from_db_object(context, self, db_flavor,
                              expected_attrs=expected_attrs)
 
@@ -180,6 +184,7 @@ class Flavor(base.NovaPersistentObject, base.NovaObject):
             db.flavor_access_add(context, self.flavorid, project_id)
         for project_id in to_delete:
             db.flavor_access_remove(context, self.flavorid, project_id)
+        flavors.invalidate_cache()
         self.obj_reset_changes(['projects'])
 
     @base.remotable
@@ -197,6 +202,7 @@ class Flavor(base.NovaPersistentObject, base.NovaObject):
                                                to_add)
         for key in to_delete:
             db.flavor_extra_specs_delete(context, self.flavorid, key)
+        flavors.invalidate_cache()
         self.obj_reset_changes(['extra_specs'])
 
     def save(self):
@@ -235,6 +241,7 @@ class Flavor(base.NovaPersistentObject, base.NovaObject):
     @base.remotable
     def destroy(self, context):
         db.flavor_destroy(context, self.name)
+        flavors.invalidate_cache()
 
 
 class FlavorList(base.ObjectListBase, base.NovaObject):
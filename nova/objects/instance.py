@@ -15,6 +15,7 @@
 from nova.cells import opts as cells_opts
 from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import flavors
+from nova.compute import vm_states
 from nova import db
 from nova import exception
 from nova import notifications
@@ -162,10 +163,48 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
 
     obj_extra_fields = ['name']
 
+    # (loader, data) the fields of an instance listed by InstanceList are
+    # loaded from when they are first touched: loader(instance, data,
+    # attrname) loads a single field and returns whether it could, and
+    # loader(instance, data) loads them all.
+    _lazy_source = None
+
     def __init__(self, *args, **kwargs):
         super(Instance, self).__init__(*args, **kwargs)
         self._reset_metadata_tracking()
 
+    def _hydrate(self):
+        """Load the fields from the lazy source, keeping the values of the
+        fields set since the instance was created.
+        """
+        loader, data = self._lazy_source
+        self._lazy_source = None
+        set_values = {}
+        for name in self.fields:
+            attrname = base.get_attrname(name)
+            if hasattr(self, attrname):
+                set_values[attrname] = getattr(self, attrname)
+        changes = set(self._changed_fields)
+        loader(self, data)
+        for attrname, value in set_values.iteritems():
+            setattr(self, attrname, value)
+        self._changed_fields |= changes
+
+    def _lazy_load(self, attrname):
+        """Load attrname from the lazy source, along with every other field
+        unless it can be loaded alone.
+        """
+        loader, data = self._lazy_source
+        if (attrname in INSTANCE_OPTIONAL_ATTRS or
+                not loader(self, data, attrname)):
+            self._hydrate()
+
+    def obj_attr_is_set(self, attrname):
+        if (self._lazy_source is not None and attrname in self.fields and
+                not hasattr(self, base.get_attrname(attrname))):
+            self._lazy_load(attrname)
+        return super(Instance, self).obj_attr_is_set(attrname)
+
     def _reset_metadata_tracking(self, fields=None):
         if fields is None or 'system_metadata' in fields:
             self._orig_system_metadata = (dict(self.system_metadata) if
@@ -176,9 +215,13 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
 
     def obj_reset_changes(self, fields=None):
         super(Instance, self).obj_reset_changes(fields)
-        self._reset_metadata_tracking(fields=fields)
+        if self._lazy_source is None:
+            self._reset_metadata_tracking(fields=fields)
 
     def obj_what_changed(self):
+        if self._lazy_source is not None:
+            # Nothing loaded from the lazy source has been changed yet.
+            return set(self._changed_fields)
         changes = super(Instance, self).obj_what_changed()
         if 'metadata' in self and self.metadata != self._orig_metadata:
             changes.add('metadata')
@@ -256,14 +299,8 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
             expected_attrs = []
         # Most of the field names match right now, so be quick
         for field in instance.fields:
-            if field in INSTANCE_OPTIONAL_ATTRS:
-                continue
-            elif field == 'deleted':
-                instance.deleted = db_inst['deleted'] == db_inst['id']
-            elif field == 'cleaned':
-                instance.cleaned = db_inst['cleaned'] == 1
-            else:
-                instance[field] = db_inst[field]
+            if field not in INSTANCE_OPTIONAL_ATTRS:
+                instance[field] = _db_column_value(db_inst, field)
 
         if 'metadata' in expected_attrs:
             instance['metadata'] = utils.instance_meta(db_inst)
@@ -501,6 +538,10 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
         self.obj_reset_changes()
 
     def obj_load_attr(self, attrname):
+        if self._lazy_source is not None:
+            self._lazy_load(attrname)
+            if self.obj_attr_is_set(attrname):
+                return
         if attrname not in INSTANCE_OPTIONAL_ATTRS:
             raise exception.ObjectActionError(
                 action='obj_load_attr',
@@ -567,6 +608,15 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
             self.obj_reset_changes(['metadata'])
 
 
+def _db_column_value(db_inst, field):
+    """Return the value of a non-optional Instance field from a DB row."""
+    if field == 'deleted':
+        return db_inst['deleted'] == db_inst['id']
+    elif field == 'cleaned':
+        return db_inst['cleaned'] == 1
+    return db_inst[field]
+
+
 def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
     get_fault = expected_attrs and 'fault' in expected_attrs
     inst_faults = {}
@@ -574,24 +624,53 @@ def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
         # Build an instance_uuid:latest-fault mapping
         expected_attrs.remove('fault')
         instance_uuids = [inst['uuid'] for inst in db_inst_list]
-        faults = objects.InstanceFaultList.get_by_instance_uuids(
+        faults = objects.InstanceFaultList.get_latest_by_instance_uuids(
             context, instance_uuids)
         for fault in faults:
-            if fault.instance_uuid not in inst_faults:
-                inst_faults[fault.instance_uuid] = fault
+            inst_faults[fault.instance_uuid] = fault
+
+    # Periodic tasks and API calls often only read a few fields of a long
+    # list, so the instances are only built from their row when one of
+    # their fields is first touched.
+    expected_attrs = list(expected_attrs or [])
+
+    def load(instance, db_inst, attrname=None):
+        if attrname is None:
+            objects.Instance._from_db_object(context, instance, db_inst,
+                                             expected_attrs=expected_attrs)
+        else:
+            instance[attrname] = _db_column_value(db_inst, attrname)
+            instance._changed_fields.discard(attrname)
+        return True
 
     inst_list.objects = []
     for db_inst in db_inst_list:
-        inst_obj = objects.Instance._from_db_object(
-                context, objects.Instance(context), db_inst,
-                expected_attrs=expected_attrs)
+        inst_obj = objects.Instance(context)
+        inst_obj._lazy_source = (load, db_inst)
         if get_fault:
-            inst_obj.fault = inst_faults.get(inst_obj.uuid, None)
+            inst_obj.fault = inst_faults.get(db_inst['uuid'], None)
         inst_list.objects.append(inst_obj)
     inst_list.obj_reset_changes()
     return inst_list
 
 
+def _load_primitive(instance, primitive, attrname=None):
+    if attrname is None:
+        instance._obj_load_primitive(primitive['nova_object.version'],
+                                     primitive)
+        instance._reset_metadata_tracking()
+        return True
+    objdata = primitive['nova_object.data']
+    if attrname not in objdata:
+        return False
+    field = instance.fields[attrname]
+    instance[attrname] = field.from_primitive(instance, attrname,
+                                              objdata[attrname])
+    if attrname not in primitive.get('nova_object.changes', []):
+        instance._changed_fields.discard(attrname)
+    return True
+
+
 class InstanceList(base.ObjectListBase, base.NovaObject):
     # Version 1.0: Initial version
     # Version 1.1: Added use_slave to get_by_host
@@ -616,6 +695,33 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         '1.6': '1.13',
         }
 
+    def _obj_load_primitive(self, objver, primitive):
+        # Like _make_instance_list(), only build the instances from their
+        # primitive when one of their fields is first touched.
+        objdata = dict(primitive['nova_object.data'])
+        instance_primitives = objdata.pop('objects', None)
+        primitive = dict(primitive)
+        primitive['nova_object.data'] = objdata
+        super(InstanceList, self)._obj_load_primitive(objver, primitive)
+        if instance_primitives is None:
+            return
+        instances = []
+        for instance_primitive in instance_primitives:
+            if (instance_primitive['nova_object.namespace'] != 'nova' or
+                    instance_primitive['nova_object.name'] != 'Instance'):
+                instances.append(base.NovaObject.obj_from_primitive(
+                    instance_primitive, context=self._context))
+                continue
+            objclass = self.obj_class_from_name(
+                'Instance', instance_primitive['nova_object.version'])
+            instance = objclass(self._context)
+            instance.VERSION = instance_primitive['nova_object.version']
+            instance._lazy_source = (_load_primitive, instance_primitive)
+            instances.append(instance)
+        changes = set(self._changed_fields)
+        self.objects = instances
+        self._changed_fields = changes
+
     @base.remotable_classmethod
     def get_by_filters(cls, context, filters,
                        sort_key='created_at', sort_dir='desc', limit=None,
@@ -711,16 +817,21 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         return cls.get_by_security_group_id(context, security_group.id)
 
     def fill_faults(self):
-        """Batch query the database for our instances' faults.
+        """Batch query the database for our instances' latest faults.
+
+        Only the faults of instances in the ERROR or DELETED state, the
+        ones whose faults are shown by the API, are looked up, the other
+        instances get no fault.
 
         :returns: A list of instance uuids for which faults were found.
         """
-        uuids = [inst.uuid for inst in self]
-        faults = objects.InstanceFaultList.get_by_instance_uuids(
-            self._context, uuids)
+        uuids = [inst.uuid for inst in self
+                 if inst.vm_state in (vm_states.ERROR, vm_states.DELETED)]
         faults_by_uuid = {}
-        for fault in faults:
-            if fault.instance_uuid not in faults_by_uuid:
+        if uuids:
+            faults = objects.InstanceFaultList.get_latest_by_instance_uuids(
+                self._context, uuids)
+            for fault in faults:
                 faults_by_uuid[fault.instance_uuid] = fault
 
         for instance in self:
@@ -15,10 +15,19 @@
 
 """Policy Engine For Nova."""
 
+import ast
+import re
+
+import six
+
 from nova import exception
+from nova.openstack.common import log as logging
 from nova.openstack.common import policy
 
 
+LOG = logging.getLogger(__name__)
+
+
 _ENFORCER = None
 
 
@@ -43,10 +52,10 @@ def init(policy_file=None, rules=None, default_rule=None, use_conf=True):
 
     global _ENFORCER
     if not _ENFORCER:
-        _ENFORCER = policy.Enforcer(policy_file=policy_file,
-                                    rules=rules,
-                                    default_rule=default_rule,
-                                    use_conf=use_conf)
+        _ENFORCER = Enforcer(policy_file=policy_file,
+                             rules=rules,
+                             default_rule=default_rule,
+                             use_conf=use_conf)
 
 
 def set_rules(rules, overwrite=True, use_conf=False):
@@ -121,6 +130,273 @@ class IsAdminCheck(policy.Check):
         return creds['is_admin'] == self.expected
 
 
+# Names of the target values a GenericCheck match interpolates.
+_TARGET_KEY_RE = re.compile(r'%\(([^)]*)\)')
+
+_MISSING = object()
+
+
+class _CompiledRule(object):
+    """A rule compiled into a function of (target, creds, roles), along
+    with the credentials and target values that function reads and the
+    number of checks it evaluates at most.
+
+    Decisions of a rule may only be cached if it is cacheable, i.e. if its
+    result depends on nothing but those values.
+    """
+
+    def __init__(self, func, creds=(), target=(), roles=False,
+                 cacheable=True, checks=1):
+        self.func = func
+        self.creds = tuple(sorted(set(creds)))
+        self.target = tuple(sorted(set(target)))
+        self.roles = roles
+        self.cacheable = cacheable
+        self.checks = checks
+
+    @classmethod
+    def combine(cls, func, parts):
+        """Return a rule made of func, which calls the rules in parts."""
+        creds = set()
+        target = set()
+        for part in parts:
+            creds.update(part.creds)
+            target.update(part.target)
+        return cls(func, creds, target,
+                   roles=any(part.roles for part in parts),
+                   cacheable=all(part.cacheable for part in parts),
+                   checks=sum(part.checks for part in parts))
+
+
+def _value(values, name):
+    # The type tells apart equal values which print differently, e.g.
+    # True and 1.
+    value = values.get(name, _MISSING)
+    return value.__class__, value
+
+
+class Enforcer(policy.Enforcer):
+    """Enforcer evaluating rules compiled into plain functions.
+
+    A rule is compiled on first use into nested closures, with the rules
+    it refers to inlined and the literals of its checks evaluated once.
+    Decisions of rules made of at least min_cached_checks checks, for
+    which looking the decision up is cheaper than evaluating the rule,
+    are remembered, keyed on the rule and on the credential and target
+    values the rule reads, in a cache of at most decision_cache_size
+    entries.  The cache is split in two generations:
+    new decisions go to the young one, and when it is half full the old
+    one is dropped and the young one becomes old, so the least recently
+    used decisions go first.  Compiled rules and decisions are dropped
+    whenever the rules change, e.g. when the policy file is reloaded.
+    """
+
+    decision_cache_size = 1024
+    min_cached_checks = 4
+
+    def __init__(self, *args, **kwargs):
+        super(Enforcer, self).__init__(*args, **kwargs)
+        self._reset_compiled()
+
+    def _reset_compiled(self):
+        self._compiled_rules = self.rules
+        self._compiled = {}
+        self._decisions = {}
+        self._old_decisions = {}
+
+    def set_rules(self, rules, overwrite=True, use_conf=False):
+        super(Enforcer, self).set_rules(rules, overwrite, use_conf)
+        self._reset_compiled()
+
+    def enforce(self, rule, target, creds, do_raise=False,
+                exc=None, *args, **kwargs):
+        """Checks authorization of a rule against the target and credentials.
+
+        Behaves like policy.Enforcer.enforce(), see there.
+        """
+        if not isinstance(rule, six.string_types):
+            return super(Enforcer, self).enforce(rule, target, creds,
+                                                 do_raise, exc,
+                                                 *args, **kwargs)
+
+        self.load_rules()
+        if self.rules is not self._compiled_rules:
+            # The rules were replaced without going through set_rules()
+            self._reset_compiled()
+
+        result = self._check(rule, target, creds)
+
+        if do_raise and not result:
+            if exc:
+                raise exc(*args, **kwargs)
+
+            raise policy.PolicyNotAuthorized(rule)
+
+        return result
+
+    def _check(self, rule, target, creds):
+        if not self.rules:
+            # No rules to reference means we're going to fail closed
+            return False
+
+        compiled = self._compile_rule(rule, ())
+        if compiled is None:
+            LOG.debug("Rule [%s] doesn't exist" % rule)
+            return False
+
+        roles = None
+        if compiled.roles:
+            roles = frozenset(role.lower() for role in creds['roles'])
+
+        if (not compiled.cacheable or not self.decision_cache_size or
+                compiled.checks < self.min_cached_checks):
+            return compiled.func(target, creds, roles)
+
+        try:
+            key = (rule, roles,
+                   tuple([_value(creds, name) for name in compiled.creds]),
+                   tuple([_value(target, name) for name in compiled.target]))
+            result = self._decisions.get(key, _MISSING)
+        except (AttributeError, TypeError):
+            # Not a dict or unhashable values, don't cache.
+            return compiled.func(target, creds, roles)
+        if result is not _MISSING:
+            return result
+
+        result = self._old_decisions.get(key, _MISSING)
+        if result is _MISSING:
+            result = compiled.func(target, creds, roles)
+        self._decisions[key] = result
+        if len(self._decisions) * 2 >= self.decision_cache_size:
+            self._old_decisions = self._decisions
+            self._decisions = {}
+        return result
+
+    def _compile_rule(self, name, parents):
+        """Return the named rule compiled, or None if there is no such
+        rule and no default rule.
+        """
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            try:
+                check = self.rules[name]
+            except KeyError:
+                return None
+            compiled = self._compile(check, parents + (name,))
+            self._compiled[name] = compiled
+        return compiled
+
+    def _compile(self, check, parents):
+        compiler = self._compilers.get(type(check), '_compile_call')
+        return getattr(self, compiler)(check, parents)
+
+    def _compile_call(self, check, parents):
+        # Checks without a compiler, e.g. http: checks, are called as
+        # they are on every evaluation.
+        return _CompiledRule(lambda target, creds, roles:
+                             check(target, creds, self), cacheable=False)
+
+    def _compile_true(self, check, parents):
+        return _CompiledRule(lambda target, creds, roles: True)
+
+    def _compile_false(self, check, parents):
+        return _CompiledRule(lambda target, creds, roles: False)
+
+    def _compile_not(self, check, parents):
+        rule = self._compile(check.rule, parents)
+        func = rule.func
+        return _CompiledRule.combine(
+            lambda target, creds, roles: not func(target, creds, roles),
+            [rule])
+
+    def _compile_and(self, check, parents):
+        rules = [self._compile(rule, parents) for rule in check.rules]
+        funcs = tuple(rule.func for rule in rules)
+
+        def func(target, creds, roles):
+            for rule_func in funcs:
+                if not rule_func(target, creds, roles):
+                    return False
+            return True
+        return _CompiledRule.combine(func, rules)
+
+    def _compile_or(self, check, parents):
+        rules = [self._compile(rule, parents) for rule in check.rules]
+        funcs = tuple(rule.func for rule in rules)
+
+        def func(target, creds, roles):
+            for rule_func in funcs:
+                if rule_func(target, creds, roles):
+                    return True
+            return False
+        return _CompiledRule.combine(func, rules)
+
+    def _compile_rule_check(self, check, parents):
+        if check.match in parents:
+            # A recursive rule, leave it to the interpreter
+            return self._compile_call(check, parents)
+        rule = self._compile_rule(check.match, parents)
+        if rule is None:
+            # We don't have any matching rule; fail closed
+            return self._compile_false(check, parents)
+        return rule
+
+    def _compile_role(self, check, parents):
+        match = check.match.lower()
+        return _CompiledRule(lambda target, creds, roles: match in roles,
+                             roles=True)
+
+    def _compile_generic(self, check, parents):
+        kind = check.kind
+        match = check.match
+        target_keys = _TARGET_KEY_RE.findall(match)
+        if '%' in match and not target_keys:
+            return self._compile_call(check, parents)
+        try:
+            # Try to interpret kind as a literal
+            literal = six.text_type(ast.literal_eval(kind))
+            creds_keys = ()
+        except ValueError:
+            literal = None
+            creds_keys = (kind,)
+        except SyntaxError:
+            return self._compile_call(check, parents)
+
+        def func(target, creds, roles):
+            if target_keys:
+                try:
+                    value = match % target
+                except KeyError:
+                    return False
+            else:
+                value = match
+            if literal is not None:
+                return value == literal
+            try:
+                return value == six.text_type(creds[kind])
+            except KeyError:
+                return False
+        return _CompiledRule(func, creds=creds_keys, target=target_keys)
+
+    def _compile_is_admin(self, check, parents):
+        expected = check.expected
+        return _CompiledRule(lambda target, creds, roles:
+                             creds['is_admin'] == expected,
+                             creds=('is_admin',))
+
+    _compilers = {
+        policy.TrueCheck: '_compile_true',
+        policy.FalseCheck: '_compile_false',
+        policy.NotCheck: '_compile_not',
+        policy.AndCheck: '_compile_and',
+        policy.OrCheck: '_compile_or',
+        policy.RuleCheck: '_compile_rule_check',
+        policy.RoleCheck: '_compile_role',
+        policy.GenericCheck: '_compile_generic',
+        IsAdminCheck: '_compile_is_admin',
+    }
+
+
 def get_rules():
     if _ENFORCER:
         return _ENFORCER.rules
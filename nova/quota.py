@@ -84,6 +84,11 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
                help='Default driver to use for quota checks'),
+    cfg.BoolOpt('quota_optimistic_reservations',
+                default=False,
+                help='Whether the DbQuotaDriver reserves quota with '
+                     'conditional updates of the quota usages instead of '
+                     'locking all of the usages of the project'),
     ]
 
 CONF = cfg.CONF
@@ -97,6 +102,37 @@ class DbQuotaDriver(object):
     """
     UNLIMITED_VALUE = -1
 
+    def _get_limits(self, context, key, load):
+        """Return a copy of the quota limits identified by key.
+
+        The limits are loaded with load() on first use and then kept on
+        the request context, so that the several quota checks made by a
+        single request only read each set of limits from the database
+        once.  Contexts without a quota_limits cache always load them.
+        """
+        cache = getattr(context, 'quota_limits', None)
+        if cache is None:
+            return load()
+        if key not in cache:
+            cache[key] = load()
+        return dict(cache[key])
+
+    def forget_limits(self, context, project_id):
+        """Drop the limits of a project cached on the request context.
+
+        Call it after changing the quotas of the project, so that the
+        rest of the request reads the new ones.
+
+        :param context: The request context, for access checks.
+        :param project_id: The ID of the project whose quotas changed.
+        """
+        cache = getattr(context, 'quota_limits', None)
+        if not cache:
+            return
+        for key in cache.keys():
+            if key[0] in ('project', 'user') and key[1] == project_id:
+                del cache[key]
+
     def get_by_project_and_user(self, context, project_id, user_id, resource):
         """Get a specific quota by project and user."""
 
@@ -122,7 +158,9 @@ class DbQuotaDriver(object):
         """
 
         quotas = {}
-        default_quotas = db.quota_class_get_default(context)
+        default_quotas = self._get_limits(
+            context, ('default',),
+            lambda: db.quota_class_get_default(context))
         for resource in resources.values():
             quotas[resource.name] = default_quotas.get(resource.name,
                                                        resource.default)
@@ -163,7 +201,9 @@ class DbQuotaDriver(object):
         if project_id == context.project_id:
             quota_class = context.quota_class
         if quota_class:
-            class_quotas = db.quota_class_get_all_by_name(context, quota_class)
+            class_quotas = self._get_limits(
+                context, ('class', quota_class),
+                lambda: db.quota_class_get_all_by_name(context, quota_class))
         else:
             class_quotas = {}
 
@@ -200,6 +240,17 @@ class DbQuotaDriver(object):
 
         return modified_quotas
 
+    def _get_project_limits(self, context, project_id):
+        return self._get_limits(
+            context, ('project', project_id),
+            lambda: db.quota_get_all_by_project(context, project_id))
+
+    def _get_user_limits(self, context, project_id, user_id):
+        return self._get_limits(
+            context, ('user', project_id, user_id),
+            lambda: db.quota_get_all_by_project_and_user(context, project_id,
+                                                         user_id))
+
     def get_user_quotas(self, context, resources, project_id, user_id,
                         quota_class=None, defaults=True,
                         usages=True, project_quotas=None,
@@ -226,10 +277,10 @@ class DbQuotaDriver(object):
         :param user_quotas: Quotas dictionary for the specified project
                             and user.
         """
-        user_quotas = user_quotas or db.quota_get_all_by_project_and_user(
+        user_quotas = user_quotas or self._get_user_limits(
             context, project_id, user_id)
         # Use the project quota for default user quota.
-        proj_quotas = project_quotas or db.quota_get_all_by_project(
+        proj_quotas = project_quotas or self._get_project_limits(
             context, project_id)
         for key, value in proj_quotas.iteritems():
             if key not in user_quotas.keys():
@@ -267,7 +318,7 @@ class DbQuotaDriver(object):
                         will be returned.
         :param project_quotas: Quotas dictionary for the specified project.
         """
-        project_quotas = project_quotas or db.quota_get_all_by_project(
+        project_quotas = project_quotas or self._get_project_limits(
             context, project_id)
         project_usages = None
         if usages:
@@ -435,7 +486,7 @@ class DbQuotaDriver(object):
             user_id = context.user_id
 
         # Get the applicable quotas
-        project_quotas = db.quota_get_all_by_project(context, project_id)
+        project_quotas = self._get_project_limits(context, project_id)
         quotas = self._get_quotas(context, resources, values.keys(),
                                   has_sync=False, project_id=project_id,
                                   project_quotas=project_quotas)
@@ -524,7 +575,7 @@ class DbQuotaDriver(object):
         # NOTE(Vek): We're not worried about races at this point.
         #            Yes, the admin may be in the process of reducing
         #            quotas, but that's a pretty rare thing.
-        project_quotas = db.quota_get_all_by_project(context, project_id)
+        project_quotas = self._get_project_limits(context, project_id)
         quotas = self._get_quotas(context, resources, deltas.keys(),
                                   has_sync=True, project_id=project_id,
                                   project_quotas=project_quotas)
@@ -538,10 +589,14 @@ class DbQuotaDriver(object):
         #            which means access to the session.  Since the
         #            session isn't available outside the DBAPI, we
         #            have to do the work there.
-        return db.quota_reserve(context, resources, quotas, user_quotas,
-                                deltas, expire,
-                                CONF.until_refresh, CONF.max_age,
-                                project_id=project_id, user_id=user_id)
+        if CONF.quota_optimistic_reservations:
+            quota_reserve = db.quota_reserve_optimistic
+        else:
+            quota_reserve = db.quota_reserve
+        return quota_reserve(context, resources, quotas, user_quotas,
+                             deltas, expire,
+                             CONF.until_refresh, CONF.max_age,
+                             project_id=project_id, user_id=user_id)
 
     def commit(self, context, reservations, project_id=None, user_id=None):
         """Commit reservations.
@@ -628,6 +683,7 @@ class DbQuotaDriver(object):
         """
 
         db.quota_destroy_all_by_project_and_user(context, project_id, user_id)
+        self.forget_limits(context, project_id)
 
     def destroy_all_by_project(self, context, project_id):
         """Destroy all quotas, usages, and reservations associated with a
@@ -638,6 +694,7 @@ class DbQuotaDriver(object):
         """
 
         db.quota_destroy_all_by_project(context, project_id)
+        self.forget_limits(context, project_id)
 
     def expire(self, context):
         """Expire reservations.
@@ -913,6 +970,14 @@ class NoopQuotaDriver(object):
         """
         pass
 
+    def forget_limits(self, context, project_id):
+        """Drop the limits of a project cached on the request context.
+
+        :param context: The request context, for access checks.
+        :param project_id: The ID of the project whose quotas changed.
+        """
+        pass
+
     def expire(self, context):
         """Expire reservations.
 
@@ -1389,6 +1454,18 @@ class QuotaEngine(object):
 
         self._driver.destroy_all_by_project(context, project_id)
 
+    def forget_limits(self, context, project_id):
+        """Drop the limits of a project cached on the request context.
+
+        Call it after changing the quotas of the project, so that the
+        rest of the request reads the new ones.
+
+        :param context: The request context, for access checks.
+        :param project_id: The ID of the project whose quotas changed.
+        """
+
+        self._driver.forget_limits(context, project_id)
+
     def expire(self, context):
         """Expire reservations.
 
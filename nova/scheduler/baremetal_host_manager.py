@@ -44,11 +44,15 @@ class BaremetalNodeState(host_manager.HostState):
         stats = compute.get('stats', '{}')
         self.stats = jsonutils.loads(stats)
 
+        self.update_column_store()
+
     def consume_from_instance(self, instance):
         self.free_ram_mb = 0
         self.free_disk_mb = 0
         self.vcpus_used = self.vcpus_total
 
+        self.update_column_store()
+
 
 def new_host_state(self, host, node, **kwargs):
     """Returns an instance of BaremetalNodeState or HostState according to
@@ -13,7 +13,25 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo.config import cfg
+
 from nova.scheduler import filter_scheduler
+from nova.scheduler import shared_host_state
+
+caching_scheduler_opts = [
+    cfg.StrOpt('scheduler_shared_host_state_path',
+               help='Path of a file, ideally on tmpfs, through which the '
+                    'CachingScheduler workers on a node share the resource '
+                    'usage of the hosts they schedule to. If unset, each '
+                    'worker keeps a private cache'),
+    cfg.IntOpt('scheduler_shared_host_state_max_hosts',
+               default=16384,
+               help='Number of compute nodes the shared host state file '
+                    'has room for'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(caching_scheduler_opts)
 
 
 class CachingScheduler(filter_scheduler.FilterScheduler):
@@ -45,6 +63,12 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
     more retries, because the data stored on any additional scheduler will
     be more out of date, than if it was fetched from the database.
 
+    Workers on the same node can reduce this by sharing the resource usage
+    of each host through scheduler_shared_host_state_path: one of them
+    publishes the usage it fetches from the database, and every worker
+    publishes the resources it consumes and reads those consumed by the
+    others before each request. Schedulers on other nodes are not covered.
+
     In a similar way, if you have a high number of server deletes, the
     extra capacity from those deletes will not show up until the cache is
     refreshed.
@@ -53,6 +77,11 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
     def __init__(self, *args, **kwargs):
         super(CachingScheduler, self).__init__(*args, **kwargs)
         self.all_host_states = None
+        self.shared_host_states = None
+        if CONF.scheduler_shared_host_state_path:
+            self.shared_host_states = shared_host_state.SharedHostStates(
+                CONF.scheduler_shared_host_state_path,
+                CONF.scheduler_shared_host_state_max_hosts)
 
     def run_periodic_tasks(self, context):
         """Called from a periodic tasks in the manager."""
@@ -61,6 +90,7 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
         # a user request, so no user requests have to wait while we
         # fetch the list of hosts.
         self.all_host_states = self._get_up_hosts(elevated)
+        self._share_host_states()
 
     def _get_all_host_states(self, context):
         """Called from the filter scheduler, in a template pattern."""
@@ -69,9 +99,21 @@ class CachingScheduler(filter_scheduler.FilterScheduler):
             # comes in before the first run of the periodic task.
             # Rather than raise an error, we fetch the list of hosts.
             self.all_host_states = self._get_up_hosts(context)
+            self._share_host_states()
+        elif self.shared_host_states is not None:
+            self.shared_host_states.sync(self.all_host_states)
 
         return self.all_host_states
 
+    def _share_host_states(self):
+        """Publish or pick up the shared usage of freshly loaded hosts."""
+        if self.shared_host_states is None:
+            return
+        if self.shared_host_states.is_refresher():
+            self.shared_host_states.publish(self.all_host_states)
+        else:
+            self.shared_host_states.sync(self.all_host_states, force=True)
+
     def _get_up_hosts(self, context):
         all_hosts_iterator = self.host_manager.get_all_host_states(context)
         return list(all_hosts_iterator)
@@ -0,0 +1,155 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Columnar view of HostState objects.
+
+Numeric HostState fields are laid out as one NumPy array per field, indexed
+by host position, so that filters and weighers doing plain arithmetic on
+them can evaluate every host in a single array operation instead of one
+Python call per host. NumPy is optional; callers must check is_available()
+and fall back to per-host evaluation when it is missing.
+"""
+
+import operator
+
+from nova.openstack.common import importutils
+
+numpy = importutils.try_import('numpy')
+
+
+def is_available():
+    """Return True if columnar evaluation can be used."""
+    return numpy is not None
+
+
+class HostColumnStore(object):
+    """Numeric HostState fields kept in NumPy arrays, one slot per host.
+
+    The HostManager builds a store over every host state it tracks and
+    each attached HostState writes its fields back into its slot whenever
+    it is updated, so that requests can read columns without touching
+    every host state.
+    """
+
+    fields = ('free_ram_mb', 'total_usable_ram_mb', 'free_disk_mb',
+              'total_usable_disk_gb', 'vcpus_total', 'vcpus_used',
+              'num_instances', 'num_io_ops')
+
+    def __init__(self, host_states):
+        self.host_states = list(host_states)
+        self._rows = dict((field, row) for row, field
+                          in enumerate(self.fields))
+        self._data = numpy.zeros((len(self.fields), len(self.host_states)))
+        for index, host_state in enumerate(self.host_states):
+            host_state.attach_column_store(self, index)
+
+    def __len__(self):
+        return len(self.host_states)
+
+    def detach(self):
+        """Release every host state, e.g. before building a new store."""
+        for host_state in self.host_states:
+            host_state.attach_column_store(None, -1)
+
+    def update(self, index, host_state):
+        """Copy the fields of the host state at index into the store."""
+        for row, field in enumerate(self.fields):
+            self._data[row, index] = getattr(host_state, field) or 0
+
+    def column(self, field, indexes):
+        """Return field for the hosts at indexes, or None if the field is
+        not kept in the store.
+        """
+        row = self._rows.get(field)
+        if row is None:
+            return None
+        return self._data[row][indexes]
+
+
+class HostStateColumns(object):
+    """Numeric HostState fields as NumPy arrays indexed by host.
+
+    Columns are read from the hosts' HostColumnStore when they all belong
+    to one, and are otherwise built lazily on first access, so only the
+    fields the active filters and weighers touch are ever copied out of
+    the host states. Oversubscription limits computed by filters are only
+    written back to the hosts that survive every filter.
+    """
+
+    def __init__(self, host_states):
+        self.host_states = list(host_states)
+        self._columns = {}
+        self._limits = []
+        self._store = None
+        self._indexes = None
+        if self.host_states:
+            store = self.host_states[0].column_store
+            if store is not None:
+                indexes = numpy.array(map(operator.attrgetter('column_index'),
+                                          self.host_states))
+                # Hosts detached from the store are marked with -1.
+                if indexes.min() >= 0:
+                    self._store = store
+                    self._indexes = indexes
+
+    def __len__(self):
+        return len(self.host_states)
+
+    def __getitem__(self, field):
+        column = self._columns.get(field)
+        if column is None:
+            if self._store is not None:
+                column = self._store.column(field, self._indexes)
+            if column is None:
+                values = map(operator.attrgetter(field), self.host_states)
+                # Unset (None) fields come through as NaN; treat them as 0
+                # like the per-host filters do.
+                column = numpy.nan_to_num(numpy.array(values,
+                                                      dtype=numpy.float64))
+            self._columns[field] = column
+        return column
+
+    def metric(self, name):
+        """Return the value of a metric for every host, NaN where the host
+        does not report it.
+        """
+        return numpy.array([host_state.metrics[name].value
+                            if name in host_state.metrics else numpy.nan
+                            for host_state in self.host_states],
+                           dtype=numpy.float64)
+
+    def all(self):
+        """Return a mask with every host selected."""
+        return numpy.ones(len(self.host_states), dtype=bool)
+
+    def set_limits(self, key, values, mask):
+        """Record per-host oversubscription limits for selected hosts.
+
+        The limits are applied by select() to the hosts it returns.
+        """
+        self._limits.append((key, values, mask))
+
+    def select(self, mask):
+        """Return the host states selected by a boolean mask."""
+        indexes = numpy.flatnonzero(mask)
+        selected = [self.host_states[i] for i in indexes.tolist()]
+        for key, values, limit_mask in self._limits:
+            for host_state, value, has_limit in zip(
+                    selected, values[indexes].tolist(),
+                    limit_mask[indexes].tolist()):
+                if has_limit:
+                    host_state.limits[key] = value
+        return selected
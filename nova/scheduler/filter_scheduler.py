@@ -48,7 +48,15 @@ filter_scheduler_opts = [
                     'chosen from. A value of 1 chooses the '
                     'first host returned by the weighing functions. '
                     'This value must be at least 1. Any value less than 1 '
-                    'will be ignored, and 1 will be used instead')
+                    'will be ignored, and 1 will be used instead'),
+    cfg.BoolOpt('scheduler_batch_placement',
+                default=False,
+                help='Place all the instances of a multi-instance request '
+                     'in one pass: hosts are filtered and weighed once, and '
+                     'only the host chosen for an instance is filtered and '
+                     'weighed again for the next one. Weights are then '
+                     'normalized once per request instead of once per '
+                     'instance'),
 ]
 
 CONF.register_opts(filter_scheduler_opts)
@@ -258,6 +266,10 @@ class FilterScheduler(driver.Scheduler):
             num_instances = len(instance_uuids)
         else:
             num_instances = request_spec.get('num_instances', 1)
+        if CONF.scheduler_batch_placement and num_instances > 1:
+            return self._schedule_batch(hosts, filter_properties,
+                                        instance_properties, num_instances,
+                                        update_group_hosts)
         for num in xrange(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
@@ -268,8 +280,11 @@ class FilterScheduler(driver.Scheduler):
 
             LOG.debug("Filtered %(hosts)s", {'hosts': hosts})
 
+            # Only the best scheduler_host_subset_size hosts can be
+            # chosen, so there is no need to rank the others.
             weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
-                    filter_properties)
+                    filter_properties,
+                    limit=max(CONF.scheduler_host_subset_size, 1))
 
             LOG.debug("Weighed %(hosts)s", {'hosts': weighed_hosts})
 
@@ -290,6 +305,63 @@ class FilterScheduler(driver.Scheduler):
                 filter_properties['group_hosts'].add(chosen_host.obj.host)
         return selected_hosts
 
+    def _schedule_batch(self, hosts, filter_properties, instance_properties,
+                        num_instances, update_group_hosts):
+        """Place num_instances instances with a single filtering and
+        weighing pass over all hosts.
+
+        The weighed hosts are kept in a heap. Once resources are consumed
+        from the chosen host only that host is filtered and weighed again,
+        unless joining a new host to an affinity group may rule out the
+        other hosts, in which case they are filtered again too.
+        """
+        hosts = self.host_manager.get_filtered_hosts(hosts,
+                filter_properties, index=0)
+        if not hosts:
+            return []
+
+        LOG.debug("Filtered %(hosts)s", {'hosts': hosts})
+
+        weighed_hosts = self.host_manager.get_weighed_host_heap(hosts,
+                filter_properties)
+        scheduler_host_subset_size = max(CONF.scheduler_host_subset_size, 1)
+        affinity = 'affinity' in filter_properties.get('group_policies', ())
+
+        selected_hosts = []
+        for num in xrange(num_instances):
+            if not len(weighed_hosts):
+                # Can't get any more locally.
+                break
+
+            best_hosts = [weighed_hosts.pop() for _i in
+                          xrange(min(scheduler_host_subset_size,
+                                     len(weighed_hosts)))]
+            chosen_host = random.choice(best_hosts)
+            selected_hosts.append(chosen_host)
+            for weighed_host in best_hosts:
+                if weighed_host is not chosen_host:
+                    weighed_hosts.push(weighed_host, reweigh=False)
+
+            # Now consume the resources so the filter/weights
+            # will change for the next instance.
+            chosen_host.obj.consume_from_instance(instance_properties)
+            new_group_host = False
+            if update_group_hosts is True:
+                new_group_host = (chosen_host.obj.host not in
+                                  filter_properties['group_hosts'])
+                filter_properties['group_hosts'].add(chosen_host.obj.host)
+
+            if num + 1 == num_instances:
+                break
+            if affinity and new_group_host:
+                weighed_hosts.retain(self.host_manager.get_filtered_hosts(
+                        weighed_hosts.objects(), filter_properties,
+                        index=num + 1))
+            if self.host_manager.get_filtered_hosts([chosen_host.obj],
+                    filter_properties, index=num + 1):
+                weighed_hosts.push(chosen_host)
+        return selected_hosts
+
     def _get_all_host_states(self, context):
         """Template method, so a subclass can implement caching."""
         return self.host_manager.get_all_host_states(context)
@@ -17,7 +17,20 @@
 Scheduler host filters
 """
 
+from oslo.config import cfg
+
 from nova import filters
+from nova.scheduler import columns
+
+vectorized_filters_opt = cfg.BoolOpt('scheduler_vectorized_filters',
+        default=False,
+        help='Evaluate filters that support it, such as RamFilter, '
+             'CoreFilter, DiskFilter, NumInstancesFilter and IoOpsFilter, '
+             'over all hosts at once using NumPy arrays. Requires NumPy; '
+             'other filters are still run once per host')
+
+CONF = cfg.CONF
+CONF.register_opt(vectorized_filters_opt)
 
 
 class BaseHostFilter(filters.BaseFilter):
@@ -37,6 +50,10 @@ class HostFilterHandler(filters.BaseFilterHandler):
     def __init__(self):
         super(HostFilterHandler, self).__init__(BaseHostFilter)
 
+    def _get_columns(self, objs):
+        if CONF.scheduler_vectorized_filters and columns.is_available():
+            return columns.HostStateColumns(objs)
+
 
 def all_filters():
     """Return a list of filter classes found in this directory.
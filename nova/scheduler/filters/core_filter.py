@@ -70,6 +70,21 @@ class CoreFilter(BaseCoreFilter):
     def _get_cpu_allocation_ratio(self, host_state, filter_properties):
         return CONF.cpu_allocation_ratio
 
+    def filter_columns(self, columns, filter_properties):
+        """Return True for hosts with sufficient CPU cores."""
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return columns.all()
+
+        # Fail safe for hosts not reporting VCPUs, as in host_passes()
+        unknown = columns['vcpus_total'] == 0
+        vcpus_total = columns['vcpus_total'] * CONF.cpu_allocation_ratio
+        if unknown.any():
+            LOG.warning(_LW("VCPUs not set; assuming CPU collection broken"))
+        columns.set_limits('vcpu', vcpus_total, vcpus_total > 0)
+        return unknown | ((vcpus_total - columns['vcpus_used']) >=
+                          instance_type['vcpus'])
+
 
 class AggregateCoreFilter(BaseCoreFilter):
     """AggregateCoreFilter with per-aggregate CPU subscription flag.
@@ -78,12 +93,9 @@ class AggregateCoreFilter(BaseCoreFilter):
     """
 
     def _get_cpu_allocation_ratio(self, host_state, filter_properties):
-        # TODO(uni): DB query in filter is a performance hit, especially for
-        # system with lots of hosts. Will need a general solution here to fix
-        # all filters with aggregate DB call things.
-        aggregate_vals = utils.aggregate_values_from_db(
+        aggregate_vals = utils.aggregate_values(
             filter_properties['context'],
-            host_state.host,
+            host_state,
             'cpu_allocation_ratio')
         try:
             ratio = utils.validate_num_values(
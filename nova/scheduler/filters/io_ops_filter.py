@@ -47,3 +47,6 @@ class IoOpsFilter(filters.BaseHostFilter):
                         {'host_state': host_state,
                          'max_io_ops': max_io_ops})
         return passes
+
+    def filter_columns(self, columns, filter_properties):
+        return columns['num_io_ops'] < CONF.max_io_ops_per_host
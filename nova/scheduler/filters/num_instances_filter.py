@@ -41,3 +41,6 @@ class NumInstancesFilter(filters.BaseHostFilter):
                         {'host_state': host_state,
                          'max_instances': max_instances})
         return passes
+
+    def filter_columns(self, columns, filter_properties):
+        return columns['num_instances'] < CONF.max_instances_per_host
@@ -15,6 +15,7 @@
 """Bench of utility methods used by filters."""
 
 
+from nova import db
 from nova.objects import aggregate
 from nova.openstack.common.gettextutils import _LI
 from nova.openstack.common import log as logging
@@ -33,6 +34,32 @@ def aggregate_values_from_db(context, host, key_name):
     return aggregate_vals
 
 
+def aggregate_metadata_get_by_host(context, host_state, key=None):
+    """Returns the metadata of the aggregates of a host, as a dict of sets
+    of values by key, like db.aggregate_metadata_get_by_host().
+
+    Uses the metadata the HostManager attached to the host state, and
+    only queries the database for host states without any.
+    """
+    metadata = getattr(host_state, 'aggregate_metadata', None)
+    if metadata is None:
+        return db.aggregate_metadata_get_by_host(context, host_state.host,
+                                                 key=key)
+    if key:
+        return {key: metadata[key]} if key in metadata else {}
+    return metadata
+
+
+def aggregate_values(context, host_state, key_name):
+    """Returns a set of values based on a metadata key for the host of a
+    host state, like aggregate_values_from_db().
+    """
+    metadata = getattr(host_state, 'aggregate_metadata', None)
+    if metadata is None:
+        return aggregate_values_from_db(context, host_state.host, key_name)
+    return set(metadata.get(key_name, ()))
+
+
 def validate_num_values(vals, default=None, cast_to=int, based_on=min):
     """Returns a corretly casted value based on a set of values.
 
@@ -18,6 +18,7 @@ Manage hosts in the current zone.
 """
 
 import collections
+import datetime
 import UserDict
 
 from oslo.config import cfg
@@ -32,6 +33,7 @@ from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
 from nova.pci import pci_request
 from nova.pci import pci_stats
+from nova.scheduler import columns
 from nova.scheduler import filters
 from nova.scheduler import weights
 
@@ -58,6 +60,30 @@ host_manager_opts = [
     cfg.ListOpt('scheduler_weight_classes',
                 default=['nova.scheduler.weights.all_weighers'],
                 help='Which weight class names to use for weighing hosts'),
+    cfg.BoolOpt('scheduler_incremental_host_state_refresh',
+                default=False,
+                help='Only read compute nodes that changed since the last '
+                     'refresh when building host states, instead of '
+                     'reading every compute node on each request'),
+    cfg.IntOpt('scheduler_host_state_resync_interval',
+               default=300,
+               help='Interval in seconds between full reads of all compute '
+                    'nodes when incremental host state refresh is '
+                    'enabled'),
+    cfg.IntOpt('scheduler_host_state_refresh_lag',
+               default=60,
+               help='Seconds before the start of the last read of the '
+                    'compute nodes from which incremental host state '
+                    'refresh reads changed nodes again. Covers rows '
+                    'committed after the read but stamped before it, and '
+                    'the clock skew between the hosts writing them'),
+    cfg.IntOpt('scheduler_aggregate_metadata_refresh_interval',
+               default=60,
+               help='Interval in seconds between reads of the metadata of '
+                    'all host aggregates, which the aggregate and '
+                    'availability zone filters look up by host instead of '
+                    'querying the database for every host. 0 reads it on '
+                    'every request'),
     ]
 
 CONF = cfg.CONF
@@ -145,6 +171,17 @@ class HostState(object):
         # Generic metrics from compute nodes
         self.metrics = {}
 
+        # Slot of this host in the HostManager's columnar store, if any.
+        self.column_store = None
+        self.column_index = -1
+
+        # Segment shared with sibling scheduler workers, if any.
+        self.shared_state = None
+
+        # Metadata of the aggregates of this host, as sets of values by
+        # key, attached by the HostManager. None when not attached.
+        self.aggregate_metadata = None
+
         self.updated = None
         if compute:
             self.update_from_compute_node(compute)
@@ -152,6 +189,17 @@ class HostState(object):
     def update_service(self, service):
         self.service = ReadOnlyDict(service)
 
+    def attach_column_store(self, column_store, column_index):
+        """Attach to (or, with None, detach from) a columnar store."""
+        self.column_store = column_store
+        self.column_index = column_index
+        self.update_column_store()
+
+    def update_column_store(self):
+        """Write resource fields through to the columnar store, if any."""
+        if self.column_store is not None:
+            self.column_store.update(self.column_index, self)
+
     def _update_metrics_from_compute_node(self, compute):
         #NOTE(llu): The 'or []' is to avoid json decode failure of None
         #           returned from compute.get, because DB schema allows
@@ -258,6 +306,8 @@ class HostState(object):
         # update metrics
         self._update_metrics_from_compute_node(compute)
 
+        self.update_column_store()
+
     def consume_from_instance(self, instance):
         """Incrementally update host state from an instance."""
         disk_mb = (instance['root_gb'] + instance['ephemeral_gb']) * 1024
@@ -299,13 +349,25 @@ class HostState(object):
         if pci_requests and self.pci_stats:
             self.pci_stats.apply_requests(pci_requests)
 
+        io_ops = 0
         if vm_state == vm_states.BUILDING or task_state in [
                 task_states.RESIZE_MIGRATING, task_states.REBUILDING,
                 task_states.RESIZE_PREP, task_states.IMAGE_SNAPSHOT,
                 task_states.IMAGE_BACKUP, task_states.UNSHELVING,
                 task_states.RESCUING]:
+            io_ops = 1
             self.num_io_ops += 1
 
+        if self.shared_state is not None:
+            # Publish the claim to sibling workers and pick up theirs.
+            self.shared_state.claim(self, {'free_ram_mb': -ram_mb,
+                                           'free_disk_mb': -disk_mb,
+                                           'vcpus_used': vcpus,
+                                           'num_instances': 1,
+                                           'num_io_ops': io_ops})
+
+        self.update_column_store()
+
     def __repr__(self):
         return ("(%s, %s) ram:%s disk:%s io_ops:%s instances:%s" %
                 (self.host, self.nodename, self.free_ram_mb, self.free_disk_mb,
@@ -320,6 +382,19 @@ class HostManager(object):
 
     def __init__(self):
         self.host_state_map = {}
+        # Incremental refresh bookkeeping: compute node id -> state key,
+        # the time of the last full read and the time from which the next
+        # refresh reads changed compute nodes.
+        self._compute_node_keys = {}
+        self._last_full_refresh = None
+        self._updated_since = None
+        # Columnar copy of host resources for vectorized filters, rebuilt
+        # whenever hosts are added to or removed from host_state_map.
+        self._column_store = None
+        self._host_set_changed = False
+        # Aggregate metadata by host and the time it was read.
+        self._aggregate_metadata = {}
+        self._aggregate_metadata_refreshed = None
         self.filter_handler = filters.HostFilterHandler()
         self.filter_classes = self.filter_handler.get_matching_classes(
                 CONF.scheduler_available_filters)
@@ -424,9 +499,16 @@ class HostManager(object):
         return self.filter_handler.get_filtered_objects(filter_classes,
                 hosts, filter_properties, index)
 
-    def get_weighed_hosts(self, hosts, weight_properties):
-        """Weigh the hosts."""
+    def get_weighed_hosts(self, hosts, weight_properties, limit=None):
+        """Weigh the hosts, returning only the best limit ones if set."""
         return self.weight_handler.get_weighed_objects(self.weight_classes,
+                hosts, weight_properties, limit=limit)
+
+    def get_weighed_host_heap(self, hosts, weight_properties):
+        """Weigh the hosts into a heap which can re-weigh them one at a
+        time.
+        """
+        return self.weight_handler.get_weighed_heap(self.weight_classes,
                 hosts, weight_properties)
 
     def get_all_host_states(self, context):
@@ -434,9 +516,116 @@ class HostManager(object):
         the HostManager knows about. Also, each of the consumable resources
         in HostState are pre-populated and adjusted based on data in the db.
         """
+        if self._needs_full_refresh():
+            self._refresh_all_host_states(context)
+        else:
+            self._refresh_changed_host_states(context)
+        self._update_column_store()
+        self._refresh_aggregate_metadata(context)
+        for host_state in self.host_state_map.itervalues():
+            host_state.aggregate_metadata = self._aggregate_metadata.get(
+                    host_state.host, {})
+        return self.host_state_map.itervalues()
+
+    def _refresh_aggregate_metadata(self, context):
+        """Index the metadata of every aggregate by host, unless it was
+        read less than scheduler_aggregate_metadata_refresh_interval
+        seconds ago.
+        """
+        interval = CONF.scheduler_aggregate_metadata_refresh_interval
+        if (interval > 0 and self._aggregate_metadata_refreshed and
+                not timeutils.is_older_than(
+                    self._aggregate_metadata_refreshed, interval)):
+            return
+        refresh_started = timeutils.utcnow()
+        metadata_by_host = collections.defaultdict(
+                lambda: collections.defaultdict(set))
+        for aggregate in db.aggregate_get_all(context):
+            metadata = aggregate.metadetails
+            for host in aggregate.hosts:
+                for key, value in metadata.iteritems():
+                    metadata_by_host[host][key].add(value)
+        self._aggregate_metadata = dict(
+                (host, dict(metadata))
+                for host, metadata in metadata_by_host.iteritems())
+        self._aggregate_metadata_refreshed = refresh_started
+
+    def _update_column_store(self):
+        use_columns = (CONF.scheduler_vectorized_filters and
+                       columns.is_available())
+        if self._column_store is not None:
+            if use_columns and not self._host_set_changed:
+                return
+            self._column_store.detach()
+            self._column_store = None
+        if use_columns:
+            self._column_store = columns.HostColumnStore(
+                    self.host_state_map.itervalues())
+        self._host_set_changed = False
+
+    def _needs_full_refresh(self):
+        if not CONF.scheduler_incremental_host_state_refresh:
+            return True
+        if self._last_full_refresh is None:
+            return True
+        return timeutils.is_older_than(
+                self._last_full_refresh,
+                CONF.scheduler_host_state_resync_interval)
+
+    def _refresh_all_host_states(self, context):
+        """Rebuild host states from every compute node in the db."""
+        refresh_started = timeutils.utcnow()
 
         # Get resource usage across the available compute nodes:
         compute_nodes = db.compute_node_get_all(context)
+        self._compute_node_keys = {}
+        seen_nodes = self._update_host_states(compute_nodes)
+        self._remove_dead_nodes(seen_nodes)
+        self._last_full_refresh = refresh_started
+        self._set_updated_since(refresh_started)
+
+    def _refresh_changed_host_states(self, context):
+        """Apply compute nodes changed since the last refresh as deltas.
+
+        Service records are small and are refreshed for every live node,
+        since filters rely on them to tell whether a host is up.
+        """
+        refresh_started = timeutils.utcnow()
+        compute_nodes, node_services = db.compute_node_get_updated_since(
+                context, self._updated_since)
+        self._update_host_states(compute_nodes)
+
+        seen_nodes = set()
+        for compute_id, service in node_services.iteritems():
+            if not service:
+                continue
+            state_key = self._compute_node_keys.get(compute_id)
+            host_state = self.host_state_map.get(state_key)
+            if host_state is None:
+                # A live node we have never built a host state for, e.g.
+                # one whose service has just come back. Fall back to a
+                # full read rather than guessing at its resources.
+                self._refresh_all_host_states(context)
+                return
+            host_state.update_service(service)
+            seen_nodes.add(state_key)
+        self._remove_dead_nodes(seen_nodes)
+        self._set_updated_since(refresh_started)
+
+    def _set_updated_since(self, refresh_started):
+        """Set from when the next refresh reads changed compute nodes.
+
+        The timestamps of the rows read can't be used: they come from the
+        clocks of the hosts writing them, and a row can be committed after
+        the read with a timestamp from before it.
+        """
+        self._updated_since = refresh_started - datetime.timedelta(
+                seconds=CONF.scheduler_host_state_refresh_lag)
+
+    def _update_host_states(self, compute_nodes):
+        """Create or update host states from compute node dicts and
+        return the set of state keys that were seen.
+        """
         seen_nodes = set()
         for compute in compute_nodes:
             service = compute['service']
@@ -452,15 +641,26 @@ class HostManager(object):
             else:
                 host_state = self.host_state_cls(host, node, compute=compute)
                 self.host_state_map[state_key] = host_state
+                self._host_set_changed = True
             host_state.update_service(dict(service.iteritems()))
             seen_nodes.add(state_key)
 
-        # remove compute nodes from host_state_map if they are not active
+            self._compute_node_keys[compute['id']] = state_key
+        return seen_nodes
+
+    def _remove_dead_nodes(self, seen_nodes):
+        """Remove compute nodes from host_state_map if they are not
+        active.
+        """
         dead_nodes = set(self.host_state_map.keys()) - seen_nodes
         for state_key in dead_nodes:
             host, node = state_key
             LOG.info(_("Removing dead compute node %(host)s:%(node)s "
                        "from scheduler") % {'host': host, 'node': node})
             del self.host_state_map[state_key]
-
-        return self.host_state_map.itervalues()
+        if dead_nodes:
+            self._host_set_changed = True
+            self._compute_node_keys = dict(
+                    (compute_id, state_key) for compute_id, state_key
+                    in self._compute_node_keys.iteritems()
+                    if state_key not in dead_nodes)
@@ -0,0 +1,230 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Host resource usage shared between scheduler workers on one node.
+
+The segment is a memory mapped file, ideally on tmpfs, holding a fixed size
+record of resource counters per compute node. One worker, the refresher,
+publishes the counters of the host states it loads from the database. Every
+worker overlays the records on its own cached host states before scheduling
+and applies its claims to the records, so sibling workers see the resources
+consumed by each other without waiting for the next database refresh.
+"""
+
+import contextlib
+import errno
+import fcntl
+import mmap
+import os
+import struct
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# HostState counters kept in the segment, in record order.
+FIELDS = ('free_ram_mb', 'free_disk_mb', 'vcpus_used', 'num_instances',
+          'num_io_ops')
+
+_MAGIC = 'NOVAHS01'
+# magic, change counter, layout counter, number of hosts, capacity
+_HEADER = struct.Struct('<8sQQII')
+_CHANGES = struct.Struct('<Q')
+_CHANGES_OFFSET = 8
+_HEADER_SIZE = 64
+_KEY_SIZE = 256
+_RECORD = struct.Struct('<%ds%dq' % (_KEY_SIZE, len(FIELDS)))
+
+
+def _key(host_state):
+    key = '%s\n%s' % (host_state.host, host_state.nodename)
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return key
+
+
+class SharedHostStates(object):
+    """Resource counters of a set of hosts in a shared memory segment."""
+
+    def __init__(self, path, max_hosts):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._refresher_fd = None
+        with self._lock(fcntl.LOCK_EX):
+            self.capacity = self._init_file(max_hosts)
+        self._map = mmap.mmap(self._fd,
+                              _HEADER_SIZE + self.capacity * _RECORD.size)
+        self._layout = None
+        self._slots = {}
+        self._seen_changes = None
+
+    def _init_file(self, max_hosts):
+        """Set the file up unless another worker already did, and return
+        its capacity in hosts.
+        """
+        header = os.read(self._fd, _HEADER.size)
+        if len(header) == _HEADER.size:
+            magic, _changes, _layout, _num_hosts, capacity = _HEADER.unpack(
+                header)
+            if magic == _MAGIC:
+                if capacity != max_hosts:
+                    LOG.warn(_("Shared host state file %(path)s has room for "
+                               "%(capacity)d hosts, not %(max_hosts)d") %
+                             {'path': self.path, 'capacity': capacity,
+                              'max_hosts': max_hosts})
+                return capacity
+        os.ftruncate(self._fd, _HEADER_SIZE + max_hosts * _RECORD.size)
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        os.write(self._fd, _HEADER.pack(_MAGIC, 0, 0, 0, max_hosts))
+        return max_hosts
+
+    def close(self):
+        if self._fd is None:
+            return
+        self._map.close()
+        os.close(self._fd)
+        self._fd = None
+        if self._refresher_fd is not None:
+            os.close(self._refresher_fd)
+            self._refresher_fd = None
+
+    @contextlib.contextmanager
+    def _lock(self, operation):
+        fcntl.flock(self._fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _offset(slot):
+        return _HEADER_SIZE + slot * _RECORD.size
+
+    def _load_slots(self):
+        """Rebuild the index of records if they were rewritten since it was
+        last built, and return the change counter. The caller must hold
+        the lock.
+        """
+        _magic, changes, layout, num_hosts, _capacity = _HEADER.unpack_from(
+            self._map, 0)
+        if layout != self._layout:
+            self._slots = {}
+            for slot in xrange(num_hosts):
+                key = _RECORD.unpack_from(self._map, self._offset(slot))[0]
+                self._slots[key.rstrip('\0')] = slot
+            self._layout = layout
+        return changes
+
+    def _load_record(self, host_state, slot):
+        record = _RECORD.unpack_from(self._map, self._offset(slot))
+        for field, value in zip(FIELDS, record[1:]):
+            setattr(host_state, field, value)
+
+    def is_refresher(self):
+        """Return True if this worker should publish its host states.
+
+        The first worker to ask holds the role until it exits; another
+        worker then takes it over the next time it asks.
+        """
+        if self._refresher_fd is None:
+            fd = os.open(self.path + '.refresher', os.O_RDWR | os.O_CREAT,
+                         0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as e:
+                os.close(fd)
+                if e.errno not in (errno.EACCES, errno.EAGAIN):
+                    raise
+                return False
+            self._refresher_fd = fd
+        return True
+
+    def publish(self, host_states):
+        """Replace every record with the counters of host_states."""
+        records = []
+        for host_state in host_states:
+            key = _key(host_state)
+            if len(key) >= _KEY_SIZE:
+                LOG.warn(_("Not sharing host state of %s, its name is too "
+                           "long") % host_state.host)
+                continue
+            records.append((key, host_state))
+        if len(records) > self.capacity:
+            LOG.warn(_("Only sharing %(capacity)d of %(count)d host states, "
+                       "increase scheduler_shared_host_state_max_hosts") %
+                     {'capacity': self.capacity, 'count': len(records)})
+            records = records[:self.capacity]
+
+        with self._lock(fcntl.LOCK_EX):
+            _magic, changes, layout, _num_hosts, _capacity = (
+                _HEADER.unpack_from(self._map, 0))
+            for slot, (key, host_state) in enumerate(records):
+                _RECORD.pack_into(self._map, self._offset(slot), key,
+                                  *[int(getattr(host_state, field) or 0)
+                                    for field in FIELDS])
+            _HEADER.pack_into(self._map, 0, _MAGIC, changes + 1, layout + 1,
+                              len(records), self.capacity)
+            self._load_slots()
+            for host_state in host_states:
+                host_state.shared_state = (
+                    self if _key(host_state) in self._slots else None)
+            self._seen_changes = changes + 1
+
+    def sync(self, host_states, force=False):
+        """Load the shared counters into host_states.
+
+        Does nothing if no record changed since the last call, unless
+        force is set, e.g. because host_states were reloaded since.
+        """
+        with self._lock(fcntl.LOCK_SH):
+            changes = self._load_slots()
+            if changes == self._seen_changes and not force:
+                return
+            for host_state in host_states:
+                slot = self._slots.get(_key(host_state))
+                if slot is None:
+                    host_state.shared_state = None
+                    continue
+                self._load_record(host_state, slot)
+                host_state.shared_state = self
+                host_state.update_column_store()
+            self._seen_changes = changes
+
+    def claim(self, host_state, deltas):
+        """Add deltas, a dict of counter increments, to the record of
+        host_state and load the result, which includes the claims of the
+        other workers, into host_state.
+
+        Returns False if host_state is no longer shared.
+        """
+        key = _key(host_state)
+        with self._lock(fcntl.LOCK_EX):
+            changes = self._load_slots()
+            slot = self._slots.get(key)
+            if slot is None:
+                host_state.shared_state = None
+                return False
+            offset = self._offset(slot)
+            record = list(_RECORD.unpack_from(self._map, offset))
+            for index, field in enumerate(FIELDS, 1):
+                record[index] += int(deltas.get(field, 0))
+            _RECORD.pack_into(self._map, offset, *record)
+            _CHANGES.pack_into(self._map, _CHANGES_OFFSET, changes + 1)
+            self._load_record(host_state, slot)
+            if changes == self._seen_changes:
+                self._seen_changes = changes + 1
+        return True
@@ -20,7 +20,6 @@ from oslo.config import cfg
 
 from nova.compute import flavors
 from nova.compute import utils as compute_utils
-from nova import db
 from nova import exception
 from nova import notifications
 from nova.objects import base as obj_base
@@ -56,7 +55,8 @@ def build_request_spec(ctxt, image, instances, instance_type=None):
         instance_type = flavors.extract_flavor(instance)
     # NOTE(comstud): This is a bit ugly, but will get cleaned up when
     # we're passing an InstanceType internal object.
-    extra_specs = db.flavor_extra_specs_get(ctxt, instance_type['flavorid'])
+    extra_specs = flavors.get_flavor_extra_specs(instance_type['flavorid'],
+                                                 ctxt=ctxt)
     instance_type['extra_specs'] = extra_specs
     request_spec = {
             'image': image or {},
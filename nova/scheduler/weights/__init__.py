@@ -19,9 +19,18 @@ Scheduler host weights
 
 from oslo.config import cfg
 
+from nova.scheduler import columns
 from nova import weights
 
+vectorized_weighers_opt = cfg.BoolOpt('scheduler_vectorized_weighers',
+        default=False,
+        help='Compute the weights of all hosts at once using NumPy arrays '
+             'for weighers that support it, such as RAMWeigher and '
+             'MetricsWeigher. Requires NumPy; other weighers are still '
+             'run once per host')
+
 CONF = cfg.CONF
+CONF.register_opt(vectorized_weighers_opt)
 
 
 class WeighedHost(weights.WeighedObject):
@@ -46,6 +55,10 @@ class HostWeightHandler(weights.BaseWeightHandler):
     def __init__(self):
         super(HostWeightHandler, self).__init__(BaseHostWeigher)
 
+    def _get_columns(self, obj_list):
+        if CONF.scheduler_vectorized_weighers and columns.is_available():
+            return columns.HostStateColumns(obj_list)
+
 
 def all_weighers():
     """Return a list of weight plugin classes found in this directory."""
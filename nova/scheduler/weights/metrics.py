@@ -29,9 +29,12 @@ in the configuration file as the followings:
 from oslo.config import cfg
 
 from nova import exception
+from nova.openstack.common import importutils
 from nova.scheduler import utils
 from nova.scheduler import weights
 
+numpy = importutils.try_import('numpy')
+
 metrics_weight_opts = [
         cfg.FloatOpt('weight_multiplier',
                      default=1.0,
@@ -102,3 +105,28 @@ class MetricsWeigher(weights.BaseHostWeigher):
                         return CONF.metrics.weight_of_unavailable
 
         return value
+
+    def weigh_columns(self, columns, weight_properties):
+        weights = numpy.zeros(len(columns))
+        unavailable = numpy.zeros(len(columns), dtype=bool)
+
+        for (name, ratio) in self.setting:
+            values = columns.metric(name)
+            missing = numpy.isnan(values)
+            if missing.any():
+                if CONF.metrics.required:
+                    host_state = columns.host_states[
+                            numpy.flatnonzero(missing)[0]]
+                    raise exception.ComputeHostMetricNotFound(
+                            host=host_state.host,
+                            node=host_state.nodename,
+                            name=name)
+                # Same as in _weigh_object(): hosts missing a metric get
+                # weight_of_unavailable unless the metric can not matter.
+                if ratio * self.weight_multiplier() != 0:
+                    unavailable |= missing
+                values = numpy.where(missing, 0.0, values)
+            weights += values * ratio
+
+        weights[unavailable] = CONF.metrics.weight_of_unavailable
+        return weights
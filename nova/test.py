@@ -37,6 +37,7 @@ from oslo.config import cfg
 from oslo.messaging import conffixture as messaging_conffixture
 import testtools
 
+from nova.compute import flavors
 from nova import context
 from nova import db
 from nova.db import migration
@@ -316,6 +317,10 @@ class TestCase(testtools.TestCase):
         # caching of that value.
         utils._IS_NEUTRON = None
 
+        # NOTE: Flavor lookups are cached per process, drop those cached
+        # by the previous tests.
+        flavors.reset_cache()
+
         mox_fixture = self.useFixture(moxstubout.MoxStubout())
         self.mox = mox_fixture.mox
         self.stubs = mox_fixture.stubs
@@ -121,6 +121,16 @@ class QuotaSetsTest(test.TestCase):
         body['quota_set'].update(id=id)
         self.assertEqual(res_dict, body)
 
+    def test_quotas_update_returns_new_limits(self):
+        id = 'update_me'
+        body = {'quota_set': {'instances': 3}}
+        req = fakes.HTTPRequestV3.blank('/os-quota-sets/' + id,
+                                      use_admin_context=True)
+        res_dict = self.controller.update(req, id, body=body)
+
+        self.assertEqual(3, res_dict['quota_set']['instances'])
+        self.assertEqual(20, res_dict['quota_set']['cores'])
+
     def test_quotas_update_zero_value_as_admin(self):
         id = 'update_me'
         body = {'quota_set': {'instances': 0, 'cores': 0,
@@ -17,6 +17,7 @@
 
 import base64
 import datetime
+import inspect
 import uuid
 
 import iso8601
@@ -4261,6 +4262,17 @@ class ServersViewBuilderTest(test.TestCase):
         self.assertThat(output,
                 matchers.DictMatches(self.expected_detailed_server))
 
+    def test_build_server_list(self):
+        output = self.view_builder.index(self.request, [self.instance])
+        self.assertEqual([self.expected_server["server"]], output["servers"])
+
+    def test_build_server_list_streamed(self):
+        self.flags(osapi_stream_threshold=1)
+        output = self.view_builder.detail(self.request, [self.instance])
+        self.assertTrue(inspect.isgenerator(output["servers"]))
+        self.assertEqual([self.expected_detailed_server["server"]],
+                         list(output["servers"]))
+
 
 class ServerXMLSerializationTest(test.TestCase):
 
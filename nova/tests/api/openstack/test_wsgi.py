@@ -11,12 +11,15 @@
 #    under the License.
 
 import inspect
+
+import mock
 import webob
 
 from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova import exception
 from nova.openstack.common import gettextutils
+from nova.openstack.common import jsonutils
 from nova import test
 from nova.tests.api.openstack import fakes
 from nova.tests import utils
@@ -231,6 +234,23 @@ class JSONDictSerializerTest(test.NoDBTestCase):
         result = result.replace('\n', '').replace(' ', '')
         self.assertEqual(result, expected_json)
 
+    def test_serialize_chunks(self):
+        servers = [dict(id=i, name='server-%d' % i) for i in range(5)]
+        input_dict = dict(servers=servers, servers_links=[], count=5)
+        serializer = wsgi.JSONDictSerializer()
+        chunks = list(serializer.serialize_chunks(input_dict, 2))
+        self.assertEqual(serializer.serialize(input_dict), ''.join(chunks))
+        # Five servers, two per chunk.
+        self.assertEqual(3, len([chunk for chunk in chunks
+                                 if 'server-' in chunk]))
+
+    def test_serialize_chunks_iterator(self):
+        input_dict = dict(servers=(dict(id=i) for i in range(3)))
+        serializer = wsgi.JSONDictSerializer()
+        result = ''.join(serializer.serialize_chunks(input_dict, 2))
+        self.assertEqual({'servers': [{'id': 0}, {'id': 1}, {'id': 2}]},
+                         jsonutils.loads(result))
+
 
 class TextDeserializerTest(test.NoDBTestCase):
     def test_dispatch_default(self):
@@ -1039,6 +1059,64 @@ class ResourceTest(test.NoDBTestCase):
         self.assertEqual(called, [2])
         self.assertEqual(response, 'foo')
 
+    def _process_streamed_stack(self, extension):
+        class Controller(object):
+            def index(self, req):
+                return dict(servers=(dict(id=i) for i in range(5)))
+
+        self.flags(osapi_stream_threshold=1, osapi_stream_chunk_size=2)
+        resource = wsgi.Resource(Controller())
+        request = wsgi.Request.blank('/tests')
+        with mock.patch.object(resource, 'get_method',
+                return_value=(resource.controller.index, [extension])):
+            return resource._process_stack(request, 'index', {}, None, '',
+                                           'application/json')
+
+    def test_process_stack_streams_pages_through_extensions(self):
+        pages = []
+
+        def extension(req, resp_obj):
+            pages.append(len(resp_obj.obj['servers']))
+            for server in resp_obj.obj['servers']:
+                server['extended'] = True
+
+        response = self._process_streamed_stack(extension)
+        # Only the first page is processed before the response is sent.
+        self.assertEqual([2], pages)
+        self.assertIsNone(response.content_length)
+        self.assertEqual(
+            {'servers': [dict(id=i, extended=True) for i in range(5)]},
+            jsonutils.loads(response.body))
+        self.assertEqual([2, 2, 1], pages)
+
+    def test_process_stack_streamed_extension_fault(self):
+        def extension(req, resp_obj):
+            raise webob.exc.HTTPBadRequest()
+
+        response = self._process_streamed_stack(extension)
+        self.assertEqual(400, response.status_int)
+
+    def test_process_stack_streamed_extension_fails_later_page(self):
+        def extension(req, resp_obj):
+            if resp_obj.obj['servers'][0]['id']:
+                return 'failed'
+
+        response = self._process_streamed_stack(extension)
+        self.assertEqual(200, response.status_int)
+        self.assertRaises(exception.NovaException, lambda: response.body)
+
+    def test_process_stack_not_streamed_with_generator_extension(self):
+        def extension(req):
+            resp_obj = yield
+            for server in resp_obj.obj['servers']:
+                server['extended'] = True
+
+        response = self._process_streamed_stack(extension)
+        self.assertEqual(len(response.body), response.content_length)
+        self.assertEqual(
+            {'servers': [dict(id=i, extended=True) for i in range(5)]},
+            jsonutils.loads(response.body))
+
     def test_resource_exception_handler_type_error(self):
         # A TypeError should be translated to a Fault/HTTP 400.
         def foo(a,):
@@ -1205,6 +1283,39 @@ class ResponseObjectTest(test.NoDBTestCase):
             self.assertEqual(response.status_int, 202)
             self.assertEqual(response.body, mtype)
 
+    def test_serialize_streams_iterator(self):
+        self.flags(osapi_stream_threshold=3)
+        robj = wsgi.ResponseObject(
+            dict(servers=(dict(id=i) for i in range(3))))
+        request = wsgi.Request.blank('/tests/123')
+        response = robj.serialize(request, 'application/json',
+                                  {'json': wsgi.JSONDictSerializer})
+
+        self.assertIsNone(response.content_length)
+        self.assertEqual({'servers': [{'id': 0}, {'id': 1}, {'id': 2}]},
+                         jsonutils.loads(response.body))
+
+    def test_serialize_streams_long_list(self):
+        self.flags(osapi_stream_threshold=3)
+        request = wsgi.Request.blank('/tests/123')
+        for count, streamed in ((2, False), (3, True)):
+            obj = dict(servers=[dict(id=i) for i in range(count)])
+            robj = wsgi.ResponseObject(obj)
+            response = robj.serialize(request, 'application/json',
+                                      {'json': wsgi.JSONDictSerializer})
+            self.assertEqual(streamed, response.content_length is None)
+            self.assertEqual(obj, jsonutils.loads(response.body))
+
+    def test_serialize_not_streamed_by_default(self):
+        robj = wsgi.ResponseObject(dict(servers=iter([dict(id=1)])))
+        request = wsgi.Request.blank('/tests/123')
+        response = robj.serialize(request, 'application/json',
+                                  {'json': wsgi.JSONDictSerializer})
+
+        self.assertEqual(len(response.body), response.content_length)
+        self.assertEqual({'servers': [{'id': 1}]},
+                         jsonutils.loads(response.body))
+
 
 class ValidBodyTest(test.NoDBTestCase):
 
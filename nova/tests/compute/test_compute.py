@@ -5993,6 +5993,78 @@ class ComputeTestCase(BaseTestCase):
         # Stays the same because we didn't find anything to process
         self.assertEqual(3, call_info['get_nw_info'])
 
+    def test_heal_instance_info_cache_batch(self):
+        self.flags(heal_instance_info_cache_interval=-1,
+                   heal_instance_info_cache_batch_size=2,
+                   heal_instance_info_cache_concurrency=2)
+        ctxt = context.get_admin_context()
+        now = timeutils.utcnow()
+
+        instances = {}
+        for x, age in enumerate([5, 30, None, 10, 20]):
+            inst = fake_instance.fake_instance_obj(
+                ctxt, uuid='fake-uuid-%s' % x, host=self.compute.host)
+            if age is None:
+                inst.info_cache = None
+            else:
+                inst.info_cache = objects.InstanceInfoCache(
+                    instance_uuid=inst.uuid, created_at=now,
+                    updated_at=now - datetime.timedelta(minutes=age))
+            instances[inst.uuid] = inst
+        # Building and deleting instances are not healed.
+        building = fake_instance.fake_instance_obj(
+            ctxt, uuid='fake-uuid-building', host=self.compute.host,
+            vm_state=vm_states.BUILDING)
+        building.info_cache = None
+        by_host = objects.InstanceList(
+            objects=[building] + [instances[uuid]
+                                 for uuid in sorted(instances)])
+
+        # Moved to another host since the list was built.
+        instances['fake-uuid-3'].host = 'not-me'
+
+        def fake_get_by_filters(context, filters, expected_attrs=None,
+                                use_slave=False):
+            self.assertEqual(['system_metadata', 'info_cache'],
+                             expected_attrs)
+            return objects.InstanceList(
+                objects=[instances[uuid] for uuid in filters['uuid']])
+
+        def fake_get_instances_nw_info(context, instances, max_concurrency=1,
+                                       use_slave=False):
+            self.assertEqual(2, max_concurrency)
+            return dict((instance.uuid, []) for instance in instances)
+
+        with contextlib.nested(
+                mock.patch.object(objects.InstanceList, 'get_by_host',
+                                  return_value=by_host),
+                mock.patch.object(objects.InstanceList, 'get_by_filters',
+                                  side_effect=fake_get_by_filters),
+                mock.patch.object(self.compute.network_api,
+                                  'get_instances_nw_info',
+                                  side_effect=fake_get_instances_nw_info)) as (
+                get_by_host_mock, get_by_filters_mock, get_nw_info_mock):
+            def healed():
+                instances = get_nw_info_mock.call_args[0][1]
+                return [instance.uuid for instance in instances]
+
+            # Missing info caches come first, then the oldest ones.
+            self.compute._heal_instance_info_cache(ctxt)
+            self.assertEqual(1, get_by_host_mock.call_count)
+            self.assertEqual(['fake-uuid-2', 'fake-uuid-1'], healed())
+
+            self.compute._heal_instance_info_cache(ctxt)
+            self.assertEqual(['fake-uuid-4'], healed())
+
+            self.compute._heal_instance_info_cache(ctxt)
+            self.assertEqual(['fake-uuid-0'], healed())
+            self.assertEqual(3, get_nw_info_mock.call_count)
+
+            # The list is rebuilt once it has been walked through.
+            self.compute._heal_instance_info_cache(ctxt)
+            self.assertEqual(2, get_by_host_mock.call_count)
+            self.assertEqual(4, get_nw_info_mock.call_count)
+
     @mock.patch('nova.objects.InstanceList.get_by_filters')
     @mock.patch('nova.compute.api.API.unrescue')
     def test_poll_rescued_instances(self, unrescue, get):
@@ -6556,31 +6628,110 @@ class ComputeTestCase(BaseTestCase):
 
     def test_sync_power_states(self):
         ctxt = self.context.elevated()
-        self._create_fake_instance({'host': self.compute.host})
-        self._create_fake_instance({'host': self.compute.host})
-        self._create_fake_instance({'host': self.compute.host})
-        self.mox.StubOutWithMock(self.compute.driver, 'get_info')
+        params = {'host': self.compute.host,
+                  'power_state': power_state.RUNNING}
+        gone = self._create_fake_instance(params)
+        stopped = self._create_fake_instance(params)
+        unchanged = self._create_fake_instance(params)
+        unreadable = self._create_fake_instance(params)
+        busy = self._create_fake_instance(
+            dict(params, task_state=task_states.REBOOTING))
+        self.mox.StubOutWithMock(self.compute.driver, 'get_power_states')
         self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
 
+        # Only the instances without a pending task are read, in one call.
+        idle_uuids = set([gone['uuid'], stopped['uuid'], unchanged['uuid'],
+                          unreadable['uuid']])
+        self.assertNotIn(busy['uuid'], idle_uuids)
+        self.compute.driver.get_power_states(
+            mox.Func(lambda instances: set(instance['uuid']
+                                           for instance in instances) ==
+                     idle_uuids)).AndReturn(
+            {gone['uuid']: power_state.NOSTATE,
+             stopped['uuid']: power_state.SHUTDOWN,
+             unchanged['uuid']: power_state.RUNNING})
+
         # Check to make sure task continues on error.
-        self.compute.driver.get_info(mox.IgnoreArg()).AndRaise(
-            exception.InstanceNotFound(instance_id='fake-uuid'))
-        self.compute._sync_instance_power_state(ctxt, mox.IgnoreArg(),
-                                                power_state.NOSTATE).AndRaise(
+        self.compute._sync_instance_power_state(
+            ctxt, mox.ContainsKeyValue('uuid', gone['uuid']),
+            power_state.NOSTATE, use_slave=True).InAnyOrder().AndRaise(
             exception.InstanceNotFound(instance_id='fake-uuid'))
+        self.compute._sync_instance_power_state(
+            ctxt, mox.ContainsKeyValue('uuid', stopped['uuid']),
+            power_state.SHUTDOWN, use_slave=True).InAnyOrder()
+        self.mox.ReplayAll()
+        self.compute._sync_power_states(ctxt)
+        self.mox.VerifyAll()
 
-        self.compute.driver.get_info(mox.IgnoreArg()).AndReturn(
-            {'state': power_state.RUNNING})
-        self.compute._sync_instance_power_state(ctxt, mox.IgnoreArg(),
-                                                power_state.RUNNING,
-                                                use_slave=True)
-        self.compute.driver.get_info(mox.IgnoreArg()).AndReturn(
-            {'state': power_state.SHUTDOWN})
-        self.compute._sync_instance_power_state(ctxt, mox.IgnoreArg(),
-                                                power_state.SHUTDOWN,
-                                                use_slave=True)
+    def test_sync_power_states_driver_error(self):
+        ctxt = self.context.elevated()
+        self._create_fake_instance({'host': self.compute.host})
+        self.mox.StubOutWithMock(self.compute.driver, 'get_power_states')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+        self.compute.driver.get_power_states(mox.IgnoreArg()).AndRaise(
+            test.TestingException())
         self.mox.ReplayAll()
         self.compute._sync_power_states(ctxt)
+        self.mox.VerifyAll()
+
+    def test_power_state_needs_sync(self):
+        needs_sync = self.compute._power_state_needs_sync
+
+        def instance(vm_state, db_power_state):
+            return {'vm_state': vm_state, 'power_state': db_power_state}
+
+        self.assertTrue(needs_sync(instance(vm_states.ACTIVE,
+                                            power_state.RUNNING),
+                                   power_state.SHUTDOWN))
+        self.assertFalse(needs_sync(instance(vm_states.ACTIVE,
+                                             power_state.RUNNING),
+                                    power_state.RUNNING))
+        # Unchanged, but still inconsistent with the vm_state.
+        self.assertTrue(needs_sync(instance(vm_states.ACTIVE,
+                                            power_state.SHUTDOWN),
+                                   power_state.SHUTDOWN))
+        self.assertTrue(needs_sync(instance(vm_states.STOPPED,
+                                            power_state.RUNNING),
+                                   power_state.RUNNING))
+        self.assertFalse(needs_sync(instance(vm_states.STOPPED,
+                                             power_state.SHUTDOWN),
+                                    power_state.SHUTDOWN))
+        self.assertTrue(needs_sync(instance(vm_states.PAUSED,
+                                            power_state.CRASHED),
+                                   power_state.CRASHED))
+        self.assertTrue(needs_sync(instance(vm_states.SOFT_DELETED,
+                                            power_state.RUNNING),
+                                   power_state.RUNNING))
+        self.assertFalse(needs_sync(instance(vm_states.ERROR,
+                                             power_state.SHUTDOWN),
+                                    power_state.SHUTDOWN))
+
+    def test_power_state_needs_sync_matches_sync_instance_power_state(self):
+        # With an unchanged power state, _sync_power_states() must skip
+        # exactly the instances _sync_instance_power_state() does nothing
+        # for.
+        all_vm_states = [getattr(vm_states, name) for name in dir(vm_states)
+                         if name.isupper() and not name.startswith('ALLOW')]
+        for vm_state in all_vm_states:
+            for vm_power_state in power_state.STATE_MAP:
+                db_instance = mock.Mock(host=self.compute.host,
+                                        task_state=None, vm_state=vm_state,
+                                        power_state=vm_power_state)
+                with contextlib.nested(
+                    mock.patch.object(self.compute.compute_api, 'stop'),
+                    mock.patch.object(self.compute.compute_api,
+                                      'force_stop'),
+                    mock.patch.object(compute_manager.LOG, 'warn')
+                ) as (stop, force_stop, warn):
+                    self.compute._sync_instance_power_state(
+                        self.context, db_instance, vm_power_state)
+                acted = stop.called or force_stop.called or warn.called
+                needs_sync = self.compute._power_state_needs_sync(
+                    {'vm_state': vm_state, 'power_state': vm_power_state},
+                    vm_power_state)
+                self.assertEqual(acted, needs_sync,
+                                 (vm_state, vm_power_state))
+                self.assertFalse(db_instance.save.called)
 
     def _test_lifecycle_event(self, lifecycle_event, power_state):
         instance = self._create_fake_instance()
@@ -556,6 +556,21 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
         self.assertRaises(messaging.ExpectedException,
                           self._test_object_action, True, True)
 
+    def test_object_class_action_compact(self):
+        class TestObject(obj_base.NovaObject):
+            fields = {'foo': fields.IntegerField()}
+
+            @classmethod
+            def get(cls, context):
+                return cls(foo=1)
+
+        result = self.conductor.object_class_action(
+            self.context, TestObject.obj_name(), 'get', '1.0', tuple(), {},
+            compact=True)
+        self.assertIn(obj_base.COMPACT_SCHEMAS_KEY, result)
+        self.assertEqual(TestObject(foo=1).obj_to_primitive(),
+                         obj_base.expand_primitive(result))
+
     def test_object_action_copies_object(self):
         class TestObject(obj_base.NovaObject):
             fields = {'dict': fields.DictOfStringsField()}
@@ -575,6 +590,28 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
         self.assertIn('dict', updates)
         self.assertEqual({'foo': 'bar'}, updates['dict'])
 
+    def test_object_action_batch(self):
+        class TestObject(obj_base.NovaObject):
+            fields = {'foo': fields.IntegerField()}
+
+            def bump(self, context):
+                self.foo += 1
+
+            @classmethod
+            def bar(cls, context, value):
+                return value
+
+        obj = TestObject(foo=1)
+        obj.obj_reset_changes()
+        results = self.conductor.object_action_batch(
+            self.context,
+            [['object', obj, 'bump', tuple(), {}],
+             ['class', TestObject.obj_name(), '1.0', 'bar', (2,), {}]])
+        updates, result = results[0]
+        self.assertEqual(2, updates['foo'])
+        self.assertEqual(set(['foo']), updates['obj_what_changed'])
+        self.assertEqual((None, 2), results[1])
+
     def _test_expected_exceptions(self, db_method, conductor_method, errors,
                                   *args, **kwargs):
         # Tests that expected exceptions are handled properly.
@@ -781,6 +818,25 @@ class ConductorRPCAPITestCase(_BaseTestCase, test.TestCase):
         self.conductor_manager = self.conductor_service.manager
         self.conductor = conductor_rpcapi.ConductorAPI()
 
+    def test_object_action_batch_version_cap(self):
+        self.flags(conductor='2.0', group='upgrade_levels')
+        conductor = conductor_rpcapi.ConductorAPI()
+        actions = [['object', 'obj', 'foo', tuple(), {}],
+                   ['class', 'Obj', '1.0', 'bar', tuple(), {}]]
+        with contextlib.nested(
+            mock.patch.object(conductor, 'object_action',
+                              return_value=('updates', 'result')),
+            mock.patch.object(conductor, 'object_class_action',
+                              return_value='class-result')
+        ) as (object_action, object_class_action):
+            results = conductor.object_action_batch(self.context, actions)
+        self.assertEqual([('updates', 'result'), (None, 'class-result')],
+                         results)
+        object_action.assert_called_once_with(self.context, 'obj', 'foo',
+                                              tuple(), {})
+        object_class_action.assert_called_once_with(self.context, 'Obj',
+                                                    'bar', '1.0', tuple(), {})
+
     def test_block_device_mapping_update_or_create(self):
         fake_bdm = {'id': 'fake-id'}
         self.mox.StubOutWithMock(db, 'block_device_mapping_create')
@@ -25,6 +25,7 @@ import types
 import uuid as stdlib_uuid
 
 import eventlet
+import mock
 import mox
 import netaddr
 from oslo.config import cfg
@@ -1556,6 +1557,47 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         instances = db.instance_get_all_by_filters(self.ctxt, {}, limit=0)
         self.assertEqual([], instances)
 
+    def _page_instances(self, limit, **kwargs):
+        pages = []
+        marker = None
+        while True:
+            page = db.instance_get_all_by_filters(self.ctxt, {}, limit=limit,
+                                                  marker=marker, **kwargs)
+            if not page:
+                return pages
+            pages.append([inst['uuid'] for inst in page])
+            marker = page[-1]['uuid']
+
+    def test_instance_get_all_by_filters_paginate_pages(self):
+        instances = [self.create_instance_with_args() for i in range(5)]
+        uuids = [inst['uuid'] for inst in instances]
+        self.assertEqual([uuids[:2], uuids[2:4], uuids[4:]],
+                         self._page_instances(2, sort_key='id',
+                                              sort_dir='asc'))
+        uuids.reverse()
+        self.assertEqual([uuids[:3], uuids[3:]],
+                         self._page_instances(3, sort_key='id',
+                                              sort_dir='desc'))
+
+    def test_instance_get_all_by_filters_paginate_joins_page(self):
+        instances = [self.create_instance_with_args() for i in range(3)]
+        self.stubs.Set(sqlalchemy_api, '_INSTANCE_ID_CHUNK', 2)
+        result = db.instance_get_all_by_filters(self.ctxt, {}, limit=3,
+                                                sort_key='id',
+                                                sort_dir='asc')
+        self._assertEqualListsOfInstances(instances, result)
+        for inst in result:
+            meta = utils.metadata_to_dict(inst['metadata'])
+            self.assertEqual(meta, self.sample_data['metadata'])
+            self.assertIsNotNone(inst['info_cache'])
+
+    def test_instance_get_all_by_filters_marker_of_other_project(self):
+        inst = self.create_instance_with_args(project_id='other')
+        ctxt = context.RequestContext('user', 'project')
+        self.assertRaises(exception.MarkerNotFound,
+                          db.instance_get_all_by_filters,
+                          ctxt, {}, limit=1, marker=inst['uuid'])
+
     def test_instance_metadata_get_multi(self):
         uuids = [self.create_instance_with_args()['uuid'] for i in range(3)]
         meta = sqlalchemy_api._instance_metadata_get_multi(self.ctxt, uuids)
@@ -2677,6 +2719,47 @@ class InstanceFaultTestCase(test.TestCase, ModelsObjectComparatorMixin):
         faults = db.instance_fault_get_by_instance_uuids(self.ctxt, [])
         self.assertEqual({}, faults)
 
+    def test_instance_fault_get_latest_by_instance_uuids(self):
+        uuids = [str(stdlib_uuid.uuid4()) for i in range(3)]
+        now = timeutils.utcnow()
+        self.addCleanup(timeutils.clear_time_override)
+        expected = {}
+        for uuid in uuids[:2]:
+            db.instance_create(self.ctxt, {'uuid': uuid})
+            for seconds, code in ((0, 400), (10, 500), (5, 404)):
+                timeutils.set_time_override(
+                    now + datetime.timedelta(seconds=seconds))
+                fault = db.instance_fault_create(
+                    self.ctxt, self._create_fault_values(uuid, code))
+                if code == 500:
+                    expected[uuid] = fault
+
+        faults = db.instance_fault_get_latest_by_instance_uuids(self.ctxt,
+                                                               uuids)
+        self.assertEqual(sorted(uuids[:2]), sorted(faults))
+        for uuid in uuids[:2]:
+            self._assertEqualObjects(expected[uuid], faults[uuid])
+
+    def test_instance_fault_get_latest_by_instance_uuids_tie(self):
+        uuid = str(stdlib_uuid.uuid4())
+        db.instance_create(self.ctxt, {'uuid': uuid})
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        for code in (400, 500):
+            fault = db.instance_fault_create(
+                self.ctxt, self._create_fault_values(uuid, code))
+
+        faults = db.instance_fault_get_latest_by_instance_uuids(self.ctxt,
+                                                               [uuid])
+        self._assertEqualObjects(fault, faults[uuid])
+
+    def test_instance_fault_get_latest_by_instance_uuids_no_uuids(self):
+        self.mox.StubOutWithMock(query.Query, 'filter')
+        self.mox.ReplayAll()
+        faults = db.instance_fault_get_latest_by_instance_uuids(self.ctxt,
+                                                               [])
+        self.assertEqual({}, faults)
+
 
 class InstanceTypeTestCase(BaseInstanceTypeTestCase):
 
@@ -3417,6 +3500,76 @@ class FixedIPTestCase(BaseInstanceTypeTestCase):
         fixed_ip = db.fixed_ip_get_by_address(self.ctxt, address)
         self.assertEqual(fixed_ip['instance_uuid'], instance_uuid)
 
+    def test_fixed_ip_claim_invalid_uuid(self):
+        self.assertRaises(exception.InvalidUUID, db.fixed_ip_claim,
+                          self.ctxt, None, '192.168.0.1', '123')
+
+    def test_fixed_ip_claim_succeeds(self):
+        instance_uuid = self._create_instance()
+        network = db.network_create_safe(self.ctxt, {})
+
+        address = self.create_fixed_ip(network_id=network['id'])
+        fixed_ip = db.fixed_ip_claim(self.ctxt, network['id'], address,
+                                     instance_uuid)
+        self.assertEqual(fixed_ip['instance_uuid'], instance_uuid)
+        fixed_ip = db.fixed_ip_get_by_address(self.ctxt, address)
+        self.assertEqual(fixed_ip['instance_uuid'], instance_uuid)
+
+    def test_fixed_ip_claim_sets_host(self):
+        network = db.network_create_safe(self.ctxt, {})
+
+        address = self.create_fixed_ip(network_id=network['id'])
+        db.fixed_ip_claim(self.ctxt, network['id'], address, host='host')
+        fixed_ip = db.fixed_ip_get_by_address(self.ctxt, address)
+        self.assertEqual(fixed_ip['host'], 'host')
+        self.assertIsNone(fixed_ip['instance_uuid'])
+
+    def test_fixed_ip_claim_fails_if_ip_in_use(self):
+        instance_uuid = self._create_instance()
+        network = db.network_create_safe(self.ctxt, {})
+
+        address = self.create_fixed_ip(network_id=network['id'],
+                                       instance_uuid=instance_uuid)
+        self.assertRaises(exception.FixedIpNotFree, db.fixed_ip_claim,
+                          self.ctxt, network['id'], address,
+                          self._create_instance())
+        fixed_ip = db.fixed_ip_get_by_address(self.ctxt, address)
+        self.assertEqual(fixed_ip['instance_uuid'], instance_uuid)
+
+    def test_fixed_ip_claim_fails_if_ip_reserved_or_in_other_network(self):
+        network = db.network_create_safe(self.ctxt, {})
+        other_network = db.network_create_safe(self.ctxt, {})
+
+        reserved = self.create_fixed_ip(address='192.168.0.1',
+                                        network_id=network['id'],
+                                        reserved=True)
+        other = self.create_fixed_ip(address='192.168.0.2',
+                                     network_id=other_network['id'])
+        for address in (reserved, other):
+            self.assertRaises(exception.FixedIpNotFree, db.fixed_ip_claim,
+                              self.ctxt, network['id'], address,
+                              self._create_instance())
+
+    def test_fixed_ip_get_free_addresses_by_network(self):
+        instance_uuid = self._create_instance()
+        network = db.network_create_safe(self.ctxt, {})
+        other_network = db.network_create_safe(self.ctxt, {})
+
+        self.create_fixed_ip(address='192.168.0.1', network_id=network['id'])
+        self.create_fixed_ip(address='192.168.0.2', network_id=network['id'],
+                             instance_uuid=instance_uuid)
+        self.create_fixed_ip(address='192.168.0.3', network_id=network['id'],
+                             host='host')
+        self.create_fixed_ip(address='192.168.0.4', network_id=network['id'],
+                             reserved=True)
+        self.create_fixed_ip(address='192.168.0.5', network_id=network['id'])
+        self.create_fixed_ip(address='192.168.0.6',
+                             network_id=other_network['id'])
+
+        addresses = db.fixed_ip_get_free_addresses_by_network(self.ctxt,
+                                                              network['id'])
+        self.assertEqual(['192.168.0.1', '192.168.0.5'], sorted(addresses))
+
     def test_fixed_ip_create_same_address(self):
         address = '192.168.1.5'
         params = {'address': address}
@@ -5336,6 +5489,82 @@ class QuotaTestCase(test.TestCase, ModelsObjectComparatorMixin):
             resources_names.remove(reservation.resource)
         self.assertEqual(len(resources_names), 0)
 
+    def _reserve_optimistic(self, deltas, instances_quota=10,
+                            cores_quota=20):
+        resources = dict((resource.name, resource)
+                         for resource in quota.resources
+                         if resource.name in ('instances', 'cores'))
+        quotas = {'instances': instances_quota, 'cores': cores_quota}
+        return db.quota_reserve_optimistic(self.ctxt, resources, quotas,
+                                           quotas, deltas, None, None, None,
+                                           'project1', 'user1')
+
+    def _get_reserved(self):
+        usages = db.quota_usage_get_all_by_project_and_user(
+            self.ctxt, 'project1', 'user1')
+        return dict((resource, usages[resource]['reserved'])
+                    for resource in ('instances', 'cores'))
+
+    def test_quota_reserve_optimistic(self):
+        deltas = {'instances': 2, 'cores': 4}
+        # The usages do not exist yet, so the first reservation creates
+        # them through quota_reserve().
+        with mock.patch.object(sqlalchemy_api, 'quota_reserve',
+                               wraps=sqlalchemy_api.quota_reserve) as (
+                quota_reserve_mock):
+            first = self._reserve_optimistic(deltas)
+            self.assertEqual(1, quota_reserve_mock.call_count)
+            second = self._reserve_optimistic(deltas)
+            self.assertEqual(1, quota_reserve_mock.call_count)
+
+        self.assertEqual({'instances': 4, 'cores': 8}, self._get_reserved())
+        for reservation_uuid in first + second:
+            reservation = _reservation_get(self.ctxt, reservation_uuid)
+            self.assertEqual(deltas[reservation.resource], reservation.delta)
+        db.reservation_rollback(self.ctxt, second, 'project1', 'user1')
+        self.assertEqual({'instances': 2, 'cores': 4}, self._get_reserved())
+
+    def test_quota_reserve_optimistic_over_quota(self):
+        self._reserve_optimistic({'instances': 2, 'cores': 4})
+        self.assertRaises(exception.OverQuota, self._reserve_optimistic,
+                          {'instances': 2, 'cores': 20})
+        self.assertEqual({'instances': 2, 'cores': 4}, self._get_reserved())
+
+    def test_quota_reserve_optimistic_conflict(self):
+        self._reserve_optimistic({'instances': 1, 'cores': 1})
+        get_session = sqlalchemy_api.get_session
+        calls = []
+
+        def fake_get_session(*args, **kwargs):
+            # The usages are read with the first session and written with
+            # the second one: change them in between.
+            calls.append(args)
+            if len(calls) == 2:
+                db.quota_usage_update(self.ctxt, 'project1', 'user1',
+                                      'cores', reserved=5)
+            return get_session(*args, **kwargs)
+
+        with mock.patch.object(sqlalchemy_api, 'get_session',
+                               side_effect=fake_get_session):
+            self.assertRaises(sqlalchemy_api._QuotaUsageConflict,
+                              sqlalchemy_api._quota_reserve_optimistic,
+                              self.ctxt, {'instances': 10, 'cores': 20},
+                              {'instances': 10, 'cores': 20},
+                              {'instances': 1, 'cores': 1},
+                              None, None, None, 'project1', 'user1')
+        # Nothing was written by the failed attempt.
+        self.assertEqual({'instances': 1, 'cores': 5}, self._get_reserved())
+
+    def test_quota_reserve_optimistic_retries(self):
+        conflict = sqlalchemy_api._QuotaUsageConflict
+        with mock.patch.object(sqlalchemy_api, '_quota_reserve_optimistic',
+                               side_effect=[conflict(), conflict(),
+                                            ['fake-reservation']]) as (
+                attempt_mock):
+            self.assertEqual(['fake-reservation'],
+                             self._reserve_optimistic({'instances': 1}))
+        self.assertEqual(3, attempt_mock.call_count)
+
     def test_quota_destroy_all_by_project(self):
         reservations = _quota_reserve(self.ctxt, 'project1', 'user1')
         db.quota_destroy_all_by_project(self.ctxt, 'project1')
@@ -5631,6 +5860,33 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self._assertEqualListsOfObjects(expected, result,
                                         ignored_keys=['stats'])
 
+    def test_compute_node_get_updated_since(self):
+        service_data = self.service_dict.copy()
+        service_data['host'] = 'host2'
+        service = db.service_create(self.ctxt, service_data)
+        compute_node_data = self.compute_node_dict.copy()
+        compute_node_data['service_id'] = service['id']
+        compute_node_data['hypervisor_hostname'] = 'node2'
+        old_time = timeutils.utcnow() - datetime.timedelta(hours=1)
+        compute_node_data['created_at'] = old_time
+        old_node = db.compute_node_create(self.ctxt, compute_node_data)
+
+        since = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        nodes, node_services = db.compute_node_get_updated_since(self.ctxt,
+                                                                 since)
+        self.assertEqual([self.item['id']], [n['id'] for n in nodes])
+        self.assertEqual('host1', nodes[0]['service']['host'])
+        self.assertEqual(set([self.item['id'], old_node['id']]),
+                         set(node_services.keys()))
+        self.assertEqual('host2', node_services[old_node['id']]['host'])
+
+        db.compute_node_update(self.ctxt, old_node['id'], {'vcpus': 4})
+        db.compute_node_delete(self.ctxt, self.item['id'])
+        nodes, node_services = db.compute_node_get_updated_since(self.ctxt,
+                                                                 since)
+        self.assertEqual([old_node['id']], [n['id'] for n in nodes])
+        self.assertEqual([old_node['id']], node_services.keys())
+
     def test_compute_node_get(self):
         compute_node_id = self.item['id']
         node = db.compute_node_get(self.ctxt, compute_node_id)
@@ -572,6 +572,11 @@ class TestNovaMigrations(BaseWalkMigrationTestCase, CommonTestsMixIn):
         index_names = [idx.name for idx in t.indexes]
         self.assertIn(index, index_names)
 
+    def assertIndexNotExists(self, engine, table, index):
+        t = oslodbutils.get_table(engine, table)
+        index_names = [idx.name for idx in t.indexes]
+        self.assertNotIn(index, index_names)
+
     def assertIndexMembers(self, engine, table, index, members):
         self.assertIndexExists(engine, table, index)
 
@@ -707,6 +712,16 @@ class TestNovaMigrations(BaseWalkMigrationTestCase, CommonTestsMixIn):
         self.assertColumnNotExists(engine, 'networks', 'enable_dhcp')
         self.assertColumnNotExists(engine, 'networks', 'share_address')
 
+    def _check_247(self, engine, data):
+        self.assertIndexMembers(engine, 'instances',
+                                'instances_project_id_deleted_created_at_idx',
+                                ['project_id', 'deleted', 'created_at'])
+
+    def _post_downgrade_247(self, engine):
+        self.assertIndexNotExists(
+            engine, 'instances',
+            'instances_project_id_deleted_created_at_idx')
+
 
 class TestBaremetalMigrations(BaseWalkMigrationTestCase, CommonTestsMixIn):
     """Test sqlalchemy-migrate migrations."""
@@ -181,6 +181,7 @@ class FakeNetworkManager(network_manager.NetworkManager):
         self.deallocate_called = None
         self.deallocate_fixed_ip_calls = []
         self.network_rpcapi = network_rpcapi.NetworkAPI()
+        self._free_fixed_ips = {}
 
     # TODO(matelakat) method signature should align with the faked one's
     def deallocate_fixed_ip(self, context, address=None, host=None,
@@ -340,6 +340,26 @@ class ApiTestCase(test.TestCase):
                                                        'fake-addr')
         self.assertIsInstance(fip, fixed_ip_obj.FixedIP)
 
+    def test_get_instances_nw_info(self):
+        instances = [{'uuid': 'fake-uuid-%d' % i} for i in range(4)]
+        nw_info = network_model.NetworkInfo([])
+
+        def fake_get_instance_nw_info(context, instance, use_slave=False):
+            self.assertTrue(use_slave)
+            if instance['uuid'] == 'fake-uuid-2':
+                raise test.TestingException()
+            return nw_info
+
+        with mock.patch.object(self.network_api, 'get_instance_nw_info',
+                               side_effect=fake_get_instance_nw_info) as (
+                get_nw_info_mock):
+            result = self.network_api.get_instances_nw_info(
+                self.context, instances, max_concurrency=2, use_slave=True)
+        self.assertEqual(4, get_nw_info_mock.call_count)
+        # The instance whose network info failed is left out.
+        self.assertEqual({'fake-uuid-0': nw_info, 'fake-uuid-1': nw_info,
+                          'fake-uuid-3': nw_info}, result)
+
 
 @mock.patch('nova.network.api.API')
 @mock.patch('nova.db.instance_info_cache_update')
@@ -0,0 +1,66 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from nova.network import ip_bitmap
+from nova import test
+
+
+class FreeIpBitmapTestCase(test.NoDBTestCase):
+    def test_init_marks_addresses_free(self):
+        free_ips = ip_bitmap.FreeIpBitmap('10.0.0.0/24',
+                                          ['10.0.0.2', '10.0.0.3'])
+        self.assertEqual(256, len(free_ips.bitmap))
+        self.assertEqual(2, free_ips.free)
+        self.assertEqual(1, free_ips.bitmap[2])
+        self.assertEqual(1, free_ips.bitmap[3])
+
+    def test_release_and_take(self):
+        free_ips = ip_bitmap.FreeIpBitmap('10.0.0.0/24')
+        free_ips.release('10.0.0.5')
+        free_ips.release('10.0.0.5')
+        self.assertEqual(1, free_ips.free)
+        free_ips.take('10.0.0.5')
+        free_ips.take('10.0.0.5')
+        self.assertEqual(0, free_ips.free)
+        self.assertEqual(0, free_ips.bitmap[5])
+
+    def test_addresses_outside_network_ignored(self):
+        free_ips = ip_bitmap.FreeIpBitmap('10.0.0.0/24', ['10.0.1.5'])
+        self.assertEqual(0, free_ips.free)
+        free_ips.take('10.0.1.5')
+        self.assertEqual(0, free_ips.free)
+
+    def test_choose_none_free(self):
+        free_ips = ip_bitmap.FreeIpBitmap('10.0.0.0/24')
+        self.assertIsNone(free_ips.choose())
+
+    @mock.patch('random.randrange', return_value=100)
+    def test_choose_next_free_address(self, randrange):
+        free_ips = ip_bitmap.FreeIpBitmap('10.0.0.0/24',
+                                          ['10.0.0.20', '10.0.0.150'])
+        self.assertEqual('10.0.0.150', free_ips.choose())
+        randrange.assert_called_once_with(256)
+
+    @mock.patch('random.randrange', return_value=200)
+    def test_choose_wraps_around(self, randrange):
+        free_ips = ip_bitmap.FreeIpBitmap('10.0.0.0/24',
+                                          ['10.0.0.20', '10.0.0.150'])
+        self.assertEqual('10.0.0.20', free_ips.choose())
+
+    def test_choose_does_not_take(self):
+        free_ips = ip_bitmap.FreeIpBitmap('10.0.0.0/30', ['10.0.0.2'])
+        self.assertEqual('10.0.0.2', free_ips.choose())
+        self.assertEqual(1, free_ips.free)
@@ -2348,6 +2348,81 @@ class CommonNetworkTestCase(test.TestCase):
         #     Determine networks to NAT based on lookup
         self._test_init_host_dynamic_fixed_range(self.network)
 
+    @mock.patch.object(fixed_ip_obj.FixedIP, 'associate_pool')
+    def test_associate_pool_without_bitmap(self, associate_pool):
+        manager = network_manager.NetworkManager()
+        network = {'id': 1, 'cidr': '10.0.0.0/24'}
+        manager._associate_pool(self.context, network, FAKEUUID)
+        associate_pool.assert_called_once_with(
+            self.context, 1, instance_uuid=FAKEUUID, host=None)
+        self.assertEqual({}, manager._free_fixed_ips)
+
+    @mock.patch.object(fixed_ip_obj.FixedIP, 'claim')
+    @mock.patch.object(fixed_ip_obj.FixedIP, 'get_free_addresses_by_network',
+                       return_value=['10.0.0.2'])
+    def test_associate_pool_claims_free_address(self, get_free, claim):
+        self.flags(use_fixed_ip_bitmap=True)
+        manager = network_manager.NetworkManager()
+        network = {'id': 1, 'cidr': '10.0.0.0/24'}
+        fip = manager._associate_pool(self.context, network, FAKEUUID)
+        self.assertEqual(claim.return_value, fip)
+        get_free.assert_called_once_with(self.context, 1)
+        claim.assert_called_once_with(self.context, 1, '10.0.0.2',
+                                      instance_uuid=FAKEUUID, host=None)
+        self.assertEqual(0, manager._free_fixed_ips[1].free)
+
+        manager._release_fixed_ip_address(1, netaddr.IPAddress('10.0.0.2'))
+        self.assertEqual(1, manager._free_fixed_ips[1].free)
+
+    @mock.patch.object(fixed_ip_obj.FixedIP, 'claim')
+    @mock.patch.object(fixed_ip_obj.FixedIP, 'get_free_addresses_by_network',
+                       return_value=['10.0.0.2', '10.0.0.3'])
+    def test_associate_pool_retries_taken_address(self, get_free, claim):
+        self.flags(use_fixed_ip_bitmap=True)
+        manager = network_manager.NetworkManager()
+        network = {'id': 1, 'cidr': '10.0.0.0/24'}
+        fip = fixed_ip_obj.FixedIP()
+        claim.side_effect = [
+            exception.FixedIpNotFree(address='10.0.0.2', network_id=1), fip]
+        self.assertEqual(fip, manager._associate_pool(self.context, network,
+                                                      host='host'))
+        self.assertEqual(2, claim.call_count)
+        claimed = set(args[2] for args, kwargs in claim.call_args_list)
+        self.assertEqual(set(['10.0.0.2', '10.0.0.3']), claimed)
+        self.assertEqual(0, manager._free_fixed_ips[1].free)
+
+    @mock.patch.object(fixed_ip_obj.FixedIP, 'associate_pool')
+    @mock.patch.object(fixed_ip_obj.FixedIP, 'claim',
+                       side_effect=exception.FixedIpNotFree(
+                           address='10.0.0.2', network_id=1))
+    @mock.patch.object(fixed_ip_obj.FixedIP, 'get_free_addresses_by_network',
+                       return_value=['10.0.0.2', '10.0.0.3', '10.0.0.4'])
+    def test_associate_pool_falls_back_to_pool(self, get_free, claim,
+                                               associate_pool):
+        self.flags(use_fixed_ip_bitmap=True, fixed_ip_claim_attempts=2)
+        manager = network_manager.NetworkManager()
+        network = {'id': 1, 'cidr': '10.0.0.0/24'}
+        fip = manager._associate_pool(self.context, network, FAKEUUID)
+        self.assertEqual(associate_pool.return_value, fip)
+        self.assertEqual(2, claim.call_count)
+        associate_pool.assert_called_once_with(
+            self.context, 1, instance_uuid=FAKEUUID, host=None)
+        self.assertNotIn(1, manager._free_fixed_ips)
+
+    @mock.patch.object(fixed_ip_obj.FixedIP, 'associate_pool',
+                       side_effect=exception.NoMoreFixedIps())
+    @mock.patch.object(fixed_ip_obj.FixedIP, 'claim')
+    @mock.patch.object(fixed_ip_obj.FixedIP, 'get_free_addresses_by_network',
+                       return_value=[])
+    def test_associate_pool_no_free_address(self, get_free, claim,
+                                            associate_pool):
+        self.flags(use_fixed_ip_bitmap=True)
+        manager = network_manager.NetworkManager()
+        network = {'id': 1, 'cidr': '10.0.0.0/24'}
+        self.assertRaises(exception.NoMoreFixedIps, manager._associate_pool,
+                          self.context, network, FAKEUUID)
+        self.assertFalse(claim.called)
+
 
 class TestRPCFixedManager(network_manager.RPCAllocateFixedIP,
         network_manager.NetworkManager):
@@ -2311,6 +2311,48 @@ class TestNeutronv2WithMock(test.TestCase):
 
             list_ports_mock.assert_called_once_with(**list_port_mock_params)
 
+    def test_get_instances_nw_info(self):
+        instances = [{'uuid': 'fake-uuid-1', 'project_id': 'fake-project'},
+                     {'uuid': 'fake-uuid-2', 'project_id': 'fake-project'}]
+        ports = [{'id': 'port1', 'device_id': 'fake-uuid-1',
+                  'tenant_id': 'fake-project'},
+                 {'id': 'port2', 'device_id': 'fake-uuid-2',
+                  'tenant_id': 'fake-project'},
+                 {'id': 'port3', 'device_id': 'fake-uuid-2',
+                  'tenant_id': 'other-project'}]
+        nw_info = model.NetworkInfo([])
+        with contextlib.nested(
+            mock.patch.object(client.Client, 'list_ports',
+                              return_value={'ports': ports}),
+            mock.patch.object(self.api, 'get_instance_nw_info',
+                              return_value=nw_info)) as (
+                list_ports_mock, get_nw_info_mock):
+            result = self.api.get_instances_nw_info(
+                self.context, instances, max_concurrency=2, use_slave=True)
+
+        list_ports_mock.assert_called_once_with(
+            device_id=['fake-uuid-1', 'fake-uuid-2'])
+        self.assertEqual({'fake-uuid-1': nw_info, 'fake-uuid-2': nw_info},
+                         result)
+        get_nw_info_mock.assert_has_calls([
+            mock.call(self.context, instances[0], use_slave=True,
+                      neutron_ports=[ports[0]]),
+            mock.call(self.context, instances[1], use_slave=True,
+                      neutron_ports=[ports[1]])], any_order=True)
+
+    def test_build_network_info_model_listed_ports(self):
+        instance = {'uuid': 'fake-uuid', 'project_id': 'fake-project',
+                    'info_cache': {'network_info': []}}
+        with contextlib.nested(
+            mock.patch.object(client.Client, 'list_ports'),
+            mock.patch.object(self.api, '_gather_port_ids_and_networks',
+                              return_value=([], []))) as (
+                list_ports_mock, gather_mock):
+            nw_info = self.api._build_network_info_model(
+                self.context, instance, neutron_ports=[])
+        self.assertFalse(list_ports_mock.called)
+        self.assertEqual([], nw_info)
+
 
 class TestNeutronv2ModuleMethods(test.TestCase):
 
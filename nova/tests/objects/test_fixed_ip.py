@@ -165,6 +165,23 @@ class _TestFixedIPObject(object):
                                      host='host')
         self._compare(fixedip, fake_fixed_ip)
 
+    @mock.patch('nova.db.fixed_ip_claim')
+    def test_claim(self, claim):
+        claim.return_value = fake_fixed_ip
+        fixedip = fixed_ip.FixedIP.claim(self.context, 123, '1.2.3.4',
+                                         'fake-uuid', 'host')
+        claim.assert_called_with(self.context, 123, '1.2.3.4',
+                                 instance_uuid='fake-uuid', host='host')
+        self._compare(fixedip, fake_fixed_ip)
+
+    @mock.patch('nova.db.fixed_ip_get_free_addresses_by_network')
+    def test_get_free_addresses_by_network(self, get):
+        get.return_value = ['1.2.3.4', '1.2.3.5']
+        addresses = fixed_ip.FixedIP.get_free_addresses_by_network(
+            self.context, 123)
+        get.assert_called_with(self.context, 123)
+        self.assertEqual(['1.2.3.4', '1.2.3.5'], addresses)
+
     @mock.patch('nova.db.fixed_ip_disassociate')
     def test_disassociate_by_address(self, disassociate):
         fixed_ip.FixedIP.disassociate_by_address(self.context, '1.2.3.4')
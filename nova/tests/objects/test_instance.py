@@ -21,6 +21,7 @@ import netaddr
 
 from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import flavors
+from nova.compute import vm_states
 from nova import db
 from nova import exception
 from nova.network import model as network_model
@@ -115,7 +116,8 @@ class _TestInstanceObject(object):
 
     def test_get_with_expected(self):
         self.mox.StubOutWithMock(db, 'instance_get_by_uuid')
-        self.mox.StubOutWithMock(db, 'instance_fault_get_by_instance_uuids')
+        self.mox.StubOutWithMock(db,
+                                 'instance_fault_get_latest_by_instance_uuids')
 
         exp_cols = instance.INSTANCE_OPTIONAL_ATTRS[:]
         exp_cols.remove('fault')
@@ -126,9 +128,9 @@ class _TestInstanceObject(object):
             use_slave=False
             ).AndReturn(self.fake_instance)
         fake_faults = test_instance_fault.fake_faults
-        db.instance_fault_get_by_instance_uuids(
+        db.instance_fault_get_latest_by_instance_uuids(
                 self.context, [self.fake_instance['uuid']]
-                ).AndReturn(fake_faults)
+                ).AndReturn({'fake-uuid': fake_faults['fake-uuid'][0]})
 
         self.mox.ReplayAll()
         inst = instance.Instance.get_by_uuid(
@@ -579,13 +581,14 @@ class _TestInstanceObject(object):
         fake_faults = [dict(x, instance_uuid=fake_uuid)
                        for x in test_instance_fault.fake_faults['fake-uuid']]
         self.mox.StubOutWithMock(db, 'instance_get_by_uuid')
-        self.mox.StubOutWithMock(db, 'instance_fault_get_by_instance_uuids')
+        self.mox.StubOutWithMock(db,
+                                 'instance_fault_get_latest_by_instance_uuids')
         db.instance_get_by_uuid(self.context, fake_uuid,
                                 columns_to_join=[],
                                 use_slave=False
                                 ).AndReturn(self.fake_instance)
-        db.instance_fault_get_by_instance_uuids(
-            self.context, [fake_uuid]).AndReturn({fake_uuid: fake_faults})
+        db.instance_fault_get_latest_by_instance_uuids(
+            self.context, [fake_uuid]).AndReturn({fake_uuid: fake_faults[0]})
         self.mox.ReplayAll()
         inst = instance.Instance.get_by_uuid(self.context, fake_uuid,
                                              expected_attrs=['fault'])
@@ -923,6 +926,41 @@ class _TestInstanceListObject(object):
         self.assertEqual(inst_list.obj_what_changed(), set())
         self.assertRemotes()
 
+    def _get_lazy_instances(self):
+        fakes = [self.fake_instance(1),
+                 self.fake_instance(2)]
+        self.mox.StubOutWithMock(db, 'instance_get_all_by_host')
+        db.instance_get_all_by_host(self.context, 'foo',
+                                    columns_to_join=None,
+                                    use_slave=False).AndReturn(fakes)
+        self.mox.ReplayAll()
+        return fakes, instance.InstanceList.get_by_host(self.context, 'foo')
+
+    def test_get_by_host_loads_fields_lazily(self):
+        fakes, inst_list = self._get_lazy_instances()
+        inst = inst_list[0]
+        self.assertIsNotNone(inst._lazy_source)
+        self.assertEqual(fakes[0]['uuid'], inst.uuid)
+        self.assertEqual(fakes[0]['vm_state'], inst.vm_state)
+        self.assertIsNotNone(inst._lazy_source)
+        self.assertEqual(set(), inst.obj_what_changed())
+
+        primitive = inst.obj_to_primitive()
+        self.assertIsNone(inst._lazy_source)
+        self.assertEqual(fakes[0]['host'],
+                         primitive['nova_object.data']['host'])
+        self.assertEqual(set(), inst.obj_what_changed())
+
+    def test_lazy_instance_keeps_fields_set_before_loading(self):
+        fakes, inst_list = self._get_lazy_instances()
+        inst = inst_list[1]
+        inst.host = 'bar'
+        self.assertFalse(inst.obj_attr_is_set('metadata'))
+        self.assertIsNone(inst._lazy_source)
+        self.assertEqual('bar', inst.host)
+        self.assertEqual(fakes[1]['display_name'], inst.display_name)
+        self.assertEqual(set(['host']), inst.obj_what_changed())
+
     def test_get_by_host_and_node(self):
         fakes = [self.fake_instance(1),
                  self.fake_instance(2)]
@@ -998,14 +1036,15 @@ class _TestInstanceListObject(object):
             ]
         fake_faults = test_instance_fault.fake_faults
         self.mox.StubOutWithMock(db, 'instance_get_all_by_host')
-        self.mox.StubOutWithMock(db, 'instance_fault_get_by_instance_uuids')
+        self.mox.StubOutWithMock(db,
+                                 'instance_fault_get_latest_by_instance_uuids')
         db.instance_get_all_by_host(self.context, 'host',
                                     columns_to_join=[],
                                     use_slave=False
                                     ).AndReturn(fake_insts)
-        db.instance_fault_get_by_instance_uuids(
+        db.instance_fault_get_latest_by_instance_uuids(
             self.context, [x['uuid'] for x in fake_insts]
-            ).AndReturn(fake_faults)
+            ).AndReturn({'fake-uuid': fake_faults['fake-uuid'][0]})
         self.mox.ReplayAll()
         instances = instance.InstanceList.get_by_host(self.context, 'host',
                                                       expected_attrs=['fault'],
@@ -1016,30 +1055,31 @@ class _TestInstanceListObject(object):
         self.assertIsNone(instances[1].fault)
 
     def test_fill_faults(self):
-        self.mox.StubOutWithMock(db, 'instance_fault_get_by_instance_uuids')
+        self.mox.StubOutWithMock(db,
+                                 'instance_fault_get_latest_by_instance_uuids')
 
-        inst1 = instance.Instance(uuid='uuid1')
-        inst2 = instance.Instance(uuid='uuid2')
-        insts = [inst1, inst2]
+        inst1 = instance.Instance(uuid='uuid1', vm_state=vm_states.ERROR)
+        inst2 = instance.Instance(uuid='uuid2', vm_state=vm_states.DELETED)
+        inst3 = instance.Instance(uuid='uuid3', vm_state=vm_states.ACTIVE)
+        insts = [inst1, inst2, inst3]
         for inst in insts:
             inst.obj_reset_changes()
         db_faults = {
-            'uuid1': [{'id': 123,
-                       'instance_uuid': 'uuid1',
-                       'code': 456,
-                       'message': 'Fake message',
-                       'details': 'No details',
-                       'host': 'foo',
-                       'deleted': False,
-                       'deleted_at': None,
-                       'updated_at': None,
-                       'created_at': None,
-                       }
-                      ]}
-
-        db.instance_fault_get_by_instance_uuids(self.context,
-                                                [x.uuid for x in insts],
-                                                ).AndReturn(db_faults)
+            'uuid1': {'id': 123,
+                      'instance_uuid': 'uuid1',
+                      'code': 456,
+                      'message': 'Fake message',
+                      'details': 'No details',
+                      'host': 'foo',
+                      'deleted': False,
+                      'deleted_at': None,
+                      'updated_at': None,
+                      'created_at': None,
+                      }
+            }
+
+        db.instance_fault_get_latest_by_instance_uuids(
+            self.context, ['uuid1', 'uuid2']).AndReturn(db_faults)
         self.mox.ReplayAll()
         inst_list = instance.InstanceList()
         inst_list._context = self.context
@@ -1047,8 +1087,9 @@ class _TestInstanceListObject(object):
         faulty = inst_list.fill_faults()
         self.assertEqual(faulty, ['uuid1'])
         self.assertEqual(inst_list[0].fault.message,
-                         db_faults['uuid1'][0]['message'])
+                         db_faults['uuid1']['message'])
         self.assertIsNone(inst_list[1].fault)
+        self.assertIsNone(inst_list[2].fault)
         for inst in inst_list:
             self.assertEqual(inst.obj_what_changed(), set())
 
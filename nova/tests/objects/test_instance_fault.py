@@ -34,9 +34,11 @@ fake_faults = {
 
 class _TestInstanceFault(object):
     def test_get_latest_for_instance(self):
-        self.mox.StubOutWithMock(db, 'instance_fault_get_by_instance_uuids')
-        db.instance_fault_get_by_instance_uuids(self.context, ['fake-uuid']
-                                                ).AndReturn(fake_faults)
+        self.mox.StubOutWithMock(db,
+                                 'instance_fault_get_latest_by_instance_uuids')
+        db.instance_fault_get_latest_by_instance_uuids(
+            self.context, ['fake-uuid']).AndReturn(
+                {'fake-uuid': fake_faults['fake-uuid'][0]})
         self.mox.ReplayAll()
         fault = instance_fault.InstanceFault.get_latest_for_instance(
             self.context, 'fake-uuid')
@@ -44,9 +46,10 @@ class _TestInstanceFault(object):
             self.assertEqual(fake_faults['fake-uuid'][0][key], fault[key])
 
     def test_get_latest_for_instance_with_none(self):
-        self.mox.StubOutWithMock(db, 'instance_fault_get_by_instance_uuids')
-        db.instance_fault_get_by_instance_uuids(self.context, ['fake-uuid']
-                                                ).AndReturn({})
+        self.mox.StubOutWithMock(db,
+                                 'instance_fault_get_latest_by_instance_uuids')
+        db.instance_fault_get_latest_by_instance_uuids(
+            self.context, ['fake-uuid']).AndReturn({})
         self.mox.ReplayAll()
         fault = instance_fault.InstanceFault.get_latest_for_instance(
             self.context, 'fake-uuid')
@@ -73,6 +76,18 @@ class _TestInstanceFault(object):
             self.context, ['fake-uuid'])
         self.assertEqual(0, len(faults))
 
+    def test_get_latest_by_instance_uuids(self):
+        self.mox.StubOutWithMock(db,
+                                 'instance_fault_get_latest_by_instance_uuids')
+        db.instance_fault_get_latest_by_instance_uuids(
+            self.context, ['fake-uuid', 'other-uuid']).AndReturn(
+                {'fake-uuid': fake_faults['fake-uuid'][1]})
+        self.mox.ReplayAll()
+        faults = instance_fault.InstanceFaultList.get_latest_by_instance_uuids(
+            self.context, ['fake-uuid', 'other-uuid'])
+        self.assertEqual(1, len(faults))
+        self.assertEqual(2, faults[0].id)
+
     @mock.patch('nova.cells.rpcapi.CellsAPI.instance_fault_create_at_top')
     @mock.patch('nova.db.instance_fault_create')
     def _test_create(self, update_cells, mock_create, cells_fault_create):
@@ -735,6 +735,68 @@ class TestRemoteObject(_RemoteTest, _TestObject):
         obj = MyObj2.query(self.context)
         self.assertEqual('oldbar', obj.bar)
 
+    def _stub_action_batch(self):
+        batches = []
+        orig_object_action_batch = \
+            self.conductor_service.manager.object_action_batch
+
+        def fake_object_action_batch(*args, **kwargs):
+            batches.append([action[2] for action in kwargs['actions']])
+            return orig_object_action_batch(*args, **kwargs)
+        self.stubs.Set(self.conductor_service.manager, 'object_action_batch',
+                       fake_object_action_batch)
+        return batches
+
+    def test_action_batch(self):
+        obj1 = MyObj.query(self.context)
+        obj2 = MyObj.query(self.context)
+        batches = self._stub_action_batch()
+        with base.action_batch():
+            obj1.bar = 'one'
+            obj1.save()
+            obj2.bar = 'two'
+            obj2.save()
+            self.assertEqual([], batches)
+            self.assertEqual(set(['bar']), obj1.obj_what_changed())
+        self.assertEqual([['save', 'save']], batches)
+        self.assertEqual(set(), obj1.obj_what_changed())
+        self.assertEqual(set(), obj2.obj_what_changed())
+
+    def test_action_batch_sent_with_next_call(self):
+        obj = MyObj.query(self.context)
+        batches = self._stub_action_batch()
+        with base.action_batch():
+            obj.foo = 2
+            obj.save()
+            self.assertEqual('polo', obj.marco())
+            self.assertEqual([['save', 'marco']], batches)
+            obj._update_test()
+            self.assertEqual('updated', obj.bar)
+        self.assertEqual([['save', 'marco']], batches)
+        self.assertEqual(set(['bar']), obj.obj_what_changed())
+
+    def test_action_batch_keeps_later_changes(self):
+        obj = MyObj.query(self.context)
+        self._stub_action_batch()
+        with base.action_batch():
+            obj.bar = 'saved'
+            obj.save()
+            obj.bar = 'unsaved'
+        self.assertEqual('unsaved', obj.bar)
+        self.assertEqual(set(['bar']), obj.obj_what_changed())
+
+    def test_action_batch_keeps_changes_on_error(self):
+        obj = MyObj.query(self.context)
+        self.stubs.Set(base.NovaObject.indirection_api, 'object_action_batch',
+                       mock.Mock(side_effect=test.TestingException))
+
+        def save_in_batch():
+            with base.action_batch():
+                obj.bar = 'one'
+                obj.save()
+        self.assertRaises(test.TestingException, save_in_batch)
+        self.assertEqual(set(['bar']), obj.obj_what_changed())
+
 
 class TestObjectListBase(test.TestCase):
     def test_list_like_operations(self):
@@ -887,6 +949,34 @@ class TestObjectSerializer(_BaseTestCase):
             for item in thing2:
                 self.assertIsInstance(item, MyObj)
 
+    def test_compact_primitive(self):
+        class MyObjList(base.ObjectListBase, base.NovaObject):
+            fields = {'objects': fields.ListOfObjectsField('MyObj')}
+
+        objs = [MyObj(foo=i, bar='bar%i' % i) for i in range(3)]
+        objs[1].obj_reset_changes()
+        objs[1].deleted_at = None
+        objs[2].missing = 'set'
+        objlist = MyObjList(objects=objs)
+        primitive = objlist.obj_to_primitive()
+        compact = base.compact_primitive(primitive)
+        # One schema for the list, one for each set of MyObj fields
+        self.assertEqual(4, len(compact[base.COMPACT_SCHEMAS_KEY]))
+        compact = jsonutils.loads(jsonutils.dumps(compact))
+        self.assertEqual(primitive, base.expand_primitive(compact))
+
+    def test_compact_object_deserialization(self):
+        ser = base.NovaObjectSerializer()
+        obj = MyObj(foo=1, bar='bar')
+        compact = base.compact_primitive(obj.obj_to_primitive())
+        obj2 = ser.deserialize_entity(self.context, compact)
+        self.assertIsInstance(obj2, MyObj)
+        self.assertEqual(1, obj2.foo)
+        self.assertEqual('bar', obj2.bar)
+        self.assertFalse(obj2.obj_attr_is_set('missing'))
+        self.assertEqual(set(['foo', 'bar']), obj2.obj_what_changed())
+        self.assertEqual(self.context, obj2._context)
+
 
 # NOTE(danms): The hashes in this list should only be changed if
 # they come with a corresponding version bump in the affected
@@ -904,8 +994,8 @@ object_data = {
     'DNSDomainList': '1.0-6e3cc498d89dd7e90f9beb021644221c',
     'EC2InstanceMapping': '1.0-627baaf4b12c9067200979bdc4558a99',
     'EC2VolumeMapping': '1.0-2f8c3bf077c65a425294ec2b361c9143',
-    'FixedIP': '1.1-082fb26772ce2db783ce4934edca4652',
-    'FixedIPList': '1.1-8ea5cfca611598f1242fd4095e49e58b',
+    'FixedIP': '1.2-4ce2aa375338b482a2468e8bad8880c3',
+    'FixedIPList': '1.2-8ea5cfca611598f1242fd4095e49e58b',
     'Flavor': '1.1-096cfd023c35d07542cf732fb29b45e4',
     'FlavorList': '1.1-d559595f55936a6d602721c3bdff6fff',
     'FloatingIP': '1.1-27eb68b7c9c620dd5f0561b5a3be0e82',
@@ -917,7 +1007,7 @@ object_data = {
     'InstanceActionList': '1.0-d46ade45deeba63c55821e22c164bd1b',
     'InstanceExternalEvent': '1.0-f1134523654407a875fd59b80f759ee7',
     'InstanceFault': '1.2-313438e37e9d358f3566c85f6ddb2d3e',
-    'InstanceFaultList': '1.1-bd578be60d045629ca7b3ce1a2493ae4',
+    'InstanceFaultList': '1.2-4089bf30ef324afa4be570d2f4b9f78b',
     'InstanceGroup': '1.6-c032430832b3cbaf92c99088e4b2fdc8',
     'InstanceGroupList': '1.2-bebd07052779ae3b47311efe85428a8b',
     'InstanceInfoCache': '1.5-ef64b604498bfa505a8c93747a9d8b2f',
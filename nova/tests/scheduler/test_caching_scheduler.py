@@ -13,12 +13,16 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+
+import fixtures
 import mock
 
 from nova import exception
 from nova.openstack.common import timeutils
 from nova.scheduler import caching_scheduler
 from nova.scheduler import host_manager
+from nova.scheduler import shared_host_state
 from nova.tests.scheduler import test_scheduler
 
 ENABLE_PROFILER = False
@@ -72,6 +76,47 @@ class CachingSchedulerTestCase(test_scheduler.SchedulerTestCase):
             self.assertTrue(mock_get_hosts.called)
             self.assertEqual(mock_get_hosts.return_value, result)
 
+    def _flag_shared_host_states(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'host_states')
+        self.flags(scheduler_shared_host_state_path=path)
+        return path
+
+    @mock.patch.object(caching_scheduler.CachingScheduler,
+                       "_get_up_hosts")
+    def test_run_periodic_tasks_publishes_shared_hosts(self, mock_up_hosts):
+        path = self._flag_shared_host_states()
+        fake_host = self._get_fake_host_state()
+        mock_up_hosts.return_value = [fake_host]
+        driver = self.driver_cls()
+        self.addCleanup(driver.shared_host_states.close)
+
+        driver.run_periodic_tasks(mock.Mock())
+
+        self.assertIs(driver.shared_host_states, fake_host.shared_state)
+        sibling = shared_host_state.SharedHostStates(path, 1)
+        self.addCleanup(sibling.close)
+        self.assertFalse(sibling.is_refresher())
+
+    def test_select_destination_claims_shared_host(self):
+        path = self._flag_shared_host_states()
+        fake_request_spec = self._get_fake_request_spec()
+        publisher = shared_host_state.SharedHostStates(path, 1)
+        self.addCleanup(publisher.close)
+        publisher.publish([self._get_fake_host_state()])
+        fake_host = self._get_fake_host_state()
+        fake_host.free_ram_mb = 1024
+        driver = self.driver_cls()
+        self.addCleanup(driver.shared_host_states.close)
+        driver.all_host_states = [fake_host]
+
+        driver.select_destinations(self.context, fake_request_spec, {})
+
+        self.assertEqual(49488, fake_host.free_ram_mb)
+        published = self._get_fake_host_state()
+        publisher.sync([published])
+        self.assertEqual(49488, published.free_ram_mb)
+
     def test_select_destination_raises_with_no_hosts(self):
         fake_request_spec = self._get_fake_request_spec()
         self.driver.all_host_states = []
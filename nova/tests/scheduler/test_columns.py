@@ -0,0 +1,81 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler's columnar host state views.
+"""
+
+import testtools
+
+from nova.scheduler import columns
+from nova import test
+from nova.tests.scheduler import fakes
+
+
+@testtools.skipIf(not columns.is_available(), "NumPy is not installed")
+class HostStateColumnsTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(HostStateColumnsTestCase, self).setUp()
+        self.hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                          {'free_ram_mb': 512 * i,
+                                           'vcpus_used': i})
+                      for i in xrange(4)]
+
+    def test_gathered_columns(self):
+        host_columns = columns.HostStateColumns(self.hosts)
+        self.assertEqual(4, len(host_columns))
+        self.assertEqual([0, 512, 1024, 1536],
+                         list(host_columns['free_ram_mb']))
+
+    def test_unset_fields_are_zero(self):
+        self.hosts[1].free_ram_mb = None
+        host_columns = columns.HostStateColumns(self.hosts)
+        self.assertEqual([0, 0, 1024, 1536],
+                         list(host_columns['free_ram_mb']))
+
+    def test_select_applies_limits_to_selected_hosts(self):
+        host_columns = columns.HostStateColumns(self.hosts)
+        free_ram_mb = host_columns['free_ram_mb']
+        host_columns.set_limits('memory_mb', free_ram_mb * 2,
+                                free_ram_mb > 0)
+        selected = host_columns.select(free_ram_mb < 1500)
+        self.assertEqual(self.hosts[:3], selected)
+        self.assertEqual([{}, {'memory_mb': 1024}, {'memory_mb': 2048}, {}],
+                         [host.limits for host in self.hosts])
+
+    def test_store_columns_for_subset(self):
+        store = columns.HostColumnStore(self.hosts)
+        host_columns = columns.HostStateColumns(self.hosts[2:])
+        self.assertIs(store, host_columns._store)
+        self.assertEqual([2, 3], list(host_columns['vcpus_used']))
+
+    def test_store_follows_host_updates(self):
+        store = columns.HostColumnStore(self.hosts)
+        self.hosts[1].consume_from_instance({'root_gb': 0,
+                                             'ephemeral_gb': 0,
+                                             'memory_mb': 256, 'vcpus': 2})
+        host_columns = columns.HostStateColumns(self.hosts)
+        self.assertIs(store, host_columns._store)
+        self.assertEqual([0, 256, 1024, 1536],
+                         list(host_columns['free_ram_mb']))
+        self.assertEqual([0, 3, 2, 3], list(host_columns['vcpus_used']))
+
+    def test_detached_hosts_are_gathered(self):
+        store = columns.HostColumnStore(self.hosts)
+        store.detach()
+        self.hosts[0].free_ram_mb = 64
+        host_columns = columns.HostStateColumns(self.hosts)
+        self.assertIsNone(host_columns._store)
+        self.assertEqual(64, host_columns['free_ram_mb'][0])
@@ -43,11 +43,33 @@ def fake_get_filtered_hosts(hosts, filter_properties, index):
     return list(hosts)
 
 
+def fake_get_filtered_group_hosts(hosts, filter_properties, index):
+    """Pass hosts with 1GB of free RAM, honouring group policies."""
+    group_hosts = filter_properties.get('group_hosts')
+    policies = filter_properties.get('group_policies', [])
+    passing_hosts = []
+    for host in hosts:
+        if host.free_ram_mb < 1024:
+            continue
+        if group_hosts and 'affinity' in policies:
+            if host.host not in group_hosts:
+                continue
+        if group_hosts and 'anti-affinity' in policies:
+            if host.host in group_hosts:
+                continue
+        passing_hosts.append(host)
+    return passing_hosts
+
+
 class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
     """Test case for Filter Scheduler."""
 
     driver_cls = filter_scheduler.FilterScheduler
 
+    def setUp(self):
+        super(FilterSchedulerTestCase, self).setUp()
+        self.stubs.Set(db, 'aggregate_get_all', lambda context: [])
+
     def test_run_instance_no_hosts(self):
 
         def _fake_empty_call_zone_method(*args, **kwargs):
@@ -163,7 +185,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.next_weight = 1.0
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                limit=None):
             self.next_weight += 2.0
             host_state = hosts[0]
             return [weights.WeighedHost(host_state, self.next_weight)]
@@ -493,7 +516,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.next_weight = 50
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                limit=None):
             this_weight = self.next_weight
             self.next_weight = 0
             host_state = hosts[0]
@@ -522,6 +546,56 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.assertEqual(50, hosts[0].weight)
 
+    def _schedule_hosts(self, num_instances, group_policies=None):
+        sched = fakes.FakeFilterScheduler()
+        host_states = []
+        for i, free_ram_mb in enumerate([1024, 4096, 2048]):
+            host_state = host_manager.HostState('host%d' % i, 'node%d' % i)
+            host_state.free_ram_mb = free_ram_mb
+            host_states.append(host_state)
+
+        def _fake_setup_instance_group(context, filter_properties):
+            if group_policies is None:
+                return False
+            filter_properties['group_hosts'] = set()
+            filter_properties['group_policies'] = group_policies
+            return True
+
+        self.stubs.Set(sched, '_get_all_host_states',
+                lambda context: host_states)
+        self.stubs.Set(sched, '_setup_instance_group',
+                _fake_setup_instance_group)
+        self.stubs.Set(sched.host_manager, 'get_filtered_hosts',
+                fake_get_filtered_group_hosts)
+
+        instance_properties = {'project_id': 1,
+                               'root_gb': 0,
+                               'memory_mb': 1024,
+                               'ephemeral_gb': 0,
+                               'vcpus': 1,
+                               'os_type': 'Linux'}
+        request_spec = dict(instance_properties=instance_properties,
+                            instance_type={}, num_instances=num_instances)
+        weighed_hosts = sched._schedule(self.context, request_spec, {})
+        return [weighed_host.obj.host for weighed_host in weighed_hosts]
+
+    def test_schedule_batch_matches_schedule(self):
+        expected = ['host1', 'host1', 'host1', 'host2', 'host0', 'host1',
+                    'host2']
+        self.assertEqual(expected, self._schedule_hosts(8))
+        self.flags(scheduler_batch_placement=True)
+        self.assertEqual(expected, self._schedule_hosts(8))
+
+    def test_schedule_batch_anti_affinity(self):
+        self.flags(scheduler_batch_placement=True)
+        self.assertEqual(['host1', 'host2', 'host0'],
+                         self._schedule_hosts(5, ['anti-affinity']))
+
+    def test_schedule_batch_affinity(self):
+        self.flags(scheduler_batch_placement=True)
+        self.assertEqual(['host1'] * 4,
+                         self._schedule_hosts(5, ['affinity']))
+
     def test_select_destinations(self):
         """select_destinations is basically a wrapper around _schedule().
 
@@ -534,7 +608,8 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         selected_hosts = []
         selected_nodes = []
 
-        def _fake_weigh_objects(_self, functions, hosts, options):
+        def _fake_weigh_objects(_self, functions, hosts, options,
+                                limit=None):
             self.next_weight += 2.0
             host_state = hosts[0]
             selected_hosts.append(host_state.host)
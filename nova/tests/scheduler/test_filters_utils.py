@@ -42,3 +42,40 @@ class UtilsTestCase(test.NoDBTestCase):
 
         self.assertTrue(context.elevated.called)
         self.assertEqual(set([1, 3]), values)
+
+    @mock.patch("nova.db.aggregate_metadata_get_by_host")
+    def test_aggregate_metadata_get_by_host(self, get_by_host):
+        host_state = mock.Mock(host='h1',
+                               aggregate_metadata={'k1': set(['1', '3']),
+                                                   'k2': set(['2'])})
+
+        self.assertEqual({'k1': set(['1', '3']), 'k2': set(['2'])},
+                         utils.aggregate_metadata_get_by_host('ctxt',
+                                                              host_state))
+        self.assertEqual({'k2': set(['2'])},
+                         utils.aggregate_metadata_get_by_host(
+                             'ctxt', host_state, key='k2'))
+        self.assertEqual({}, utils.aggregate_metadata_get_by_host(
+            'ctxt', host_state, key='k3'))
+        self.assertFalse(get_by_host.called)
+
+    @mock.patch("nova.db.aggregate_metadata_get_by_host")
+    def test_aggregate_metadata_get_by_host_not_attached(self, get_by_host):
+        host_state = mock.Mock(host='h1', aggregate_metadata=None)
+        get_by_host.return_value = {'k1': set(['1'])}
+
+        self.assertEqual({'k1': set(['1'])},
+                         utils.aggregate_metadata_get_by_host(
+                             'ctxt', host_state, key='k1'))
+        get_by_host.assert_called_once_with('ctxt', 'h1', key='k1')
+
+    @mock.patch("nova.objects.aggregate.AggregateList.get_by_host")
+    def test_aggregate_values(self, get_by_host):
+        host_state = mock.Mock(host='h1',
+                               aggregate_metadata={'k1': set(['1', '3'])})
+
+        self.assertEqual(set(['1', '3']),
+                         utils.aggregate_values('ctxt', host_state, 'k1'))
+        self.assertEqual(set(), utils.aggregate_values('ctxt', host_state,
+                                                       'k2'))
+        self.assertFalse(get_by_host.called)
@@ -19,14 +19,20 @@ import httplib
 
 from oslo.config import cfg
 import stubout
+import testtools
 
 from nova import context
 from nova import db
 from nova.openstack.common import jsonutils
 from nova.openstack.common import timeutils
 from nova.pci import pci_stats
+from nova.scheduler import columns
 from nova.scheduler import filters
+from nova.scheduler.filters import core_filter
+from nova.scheduler.filters import disk_filter
 from nova.scheduler.filters import extra_specs_ops
+from nova.scheduler.filters import io_ops_filter
+from nova.scheduler.filters import num_instances_filter
 from nova.scheduler.filters import ram_filter
 from nova.scheduler.filters import trusted_filter
 from nova import servicegroup
@@ -1831,3 +1837,92 @@ class HostFiltersTestCase(test.NoDBTestCase):
                                    attribute_dict={'metrics': metrics})
         filt_cls = self.class_map['MetricsFilter']()
         self.assertFalse(filt_cls.host_passes(host, None))
+
+
+@testtools.skipIf(not columns.is_available(), "NumPy is not installed")
+class VectorizedHostFiltersTestCase(test.NoDBTestCase):
+    """Test vectorized filters against their per-host host_passes()."""
+
+    def setUp(self):
+        super(VectorizedHostFiltersTestCase, self).setUp()
+        self.hosts = [
+            fakes.FakeHostState('host1', 'node1',
+                {'free_ram_mb': 1023, 'total_usable_ram_mb': 1024,
+                 'free_disk_mb': 11 * 1024, 'total_usable_disk_gb': 12,
+                 'vcpus_total': 4, 'vcpus_used': 8,
+                 'num_instances': 50, 'num_io_ops': 8}),
+            fakes.FakeHostState('host2', 'node2',
+                {'free_ram_mb': -1024, 'total_usable_ram_mb': 2048,
+                 'free_disk_mb': -1024, 'total_usable_disk_gb': 12,
+                 'vcpus_total': 4, 'vcpus_used': 7,
+                 'num_instances': 49, 'num_io_ops': 7}),
+            fakes.FakeHostState('host3', 'node3',
+                {'free_ram_mb': 4096, 'total_usable_ram_mb': 4096,
+                 'free_disk_mb': 12 * 1024, 'total_usable_disk_gb': 12,
+                 'vcpus_total': 0, 'vcpus_used': 0,
+                 'num_instances': 0, 'num_io_ops': 0}),
+        ]
+        self.filter_properties = {'instance_type': {'memory_mb': 1024,
+                                                    'vcpus': 1,
+                                                    'root_gb': 1,
+                                                    'ephemeral_gb': 1,
+                                                    'swap': 512}}
+        self.flags(cpu_allocation_ratio=2, disk_allocation_ratio=1.5)
+        self.stubs.Set(ram_filter.RamFilter, 'ram_allocation_ratio', 2.0)
+
+    def _assert_matches_host_passes(self, filt_cls, limit_key=None):
+        host_columns = columns.HostStateColumns(self.hosts)
+        mask = filt_cls().filter_columns(host_columns, self.filter_properties)
+        host_columns.select(host_columns.all())
+        vectorized_limits = [host.limits.pop(limit_key, None)
+                             for host in self.hosts]
+        expected = [filt_cls().host_passes(host, self.filter_properties)
+                    for host in self.hosts]
+        self.assertEqual(expected, list(mask))
+        if limit_key:
+            self.assertEqual([host.limits.get(limit_key)
+                              for host in self.hosts], vectorized_limits)
+
+    def test_ram_filter(self):
+        self._assert_matches_host_passes(ram_filter.RamFilter, 'memory_mb')
+
+    def test_core_filter(self):
+        self._assert_matches_host_passes(core_filter.CoreFilter, 'vcpu')
+
+    def test_core_filter_no_instance_type(self):
+        self.filter_properties = {}
+        self._assert_matches_host_passes(core_filter.CoreFilter)
+
+    def test_disk_filter(self):
+        self._assert_matches_host_passes(disk_filter.DiskFilter, 'disk_gb')
+
+    def test_num_instances_filter(self):
+        self._assert_matches_host_passes(
+                num_instances_filter.NumInstancesFilter)
+
+    def test_io_ops_filter(self):
+        self._assert_matches_host_passes(io_ops_filter.IoOpsFilter)
+
+    def test_aggregate_filters_not_vectorized(self):
+        host_columns = columns.HostStateColumns(self.hosts)
+        for filt_cls in (ram_filter.AggregateRamFilter,
+                         core_filter.AggregateCoreFilter):
+            self.assertIsNone(filt_cls().filter_columns(
+                    host_columns, self.filter_properties))
+
+    def test_handler_falls_back_for_other_filters(self):
+        self.flags(scheduler_vectorized_filters=True)
+        seen = []
+
+        class FakeFilter(filters.BaseHostFilter):
+            def host_passes(self, host_state, filter_properties):
+                seen.append(host_state)
+                return host_state.host != 'host3'
+
+        handler = filters.HostFilterHandler()
+        result = handler.get_filtered_objects(
+                [ram_filter.RamFilter, FakeFilter,
+                 num_instances_filter.NumInstancesFilter],
+                self.hosts, self.filter_properties)
+        self.assertEqual([self.hosts[1]], result)
+        self.assertEqual(self.hosts[1:], seen)
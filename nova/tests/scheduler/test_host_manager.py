@@ -15,12 +15,15 @@
 """
 Tests For HostManager
 """
+import datetime
+
 from nova.compute import task_states
 from nova.compute import vm_states
 from nova import db
 from nova import exception
 from nova.openstack.common import jsonutils
 from nova.openstack.common import timeutils
+from nova.scheduler import columns
 from nova.scheduler import filters
 from nova.scheduler import host_manager
 from nova import test
@@ -38,11 +41,18 @@ class FakeFilterClass2(filters.BaseHostFilter):
         pass
 
 
+class FakeAggregate(object):
+    def __init__(self, hosts, metadetails):
+        self.hosts = hosts
+        self.metadetails = metadetails
+
+
 class HostManagerTestCase(test.NoDBTestCase):
     """Test case for HostManager class."""
 
     def setUp(self):
         super(HostManagerTestCase, self).setUp()
+        self.stubs.Set(db, 'aggregate_get_all', lambda context: [])
         self.host_manager = host_manager.HostManager()
         self.fake_hosts = [host_manager.HostState('fake_host%s' % x,
                 'fake-node') for x in xrange(1, 5)]
@@ -315,11 +325,73 @@ class HostManagerTestCase(test.NoDBTestCase):
                          8388608)
 
 
+class HostManagerAggregateMetadataTestCase(test.NoDBTestCase):
+    """Test case for the aggregate metadata index kept by HostManager."""
+
+    def setUp(self):
+        super(HostManagerAggregateMetadataTestCase, self).setUp()
+        self.flags(scheduler_aggregate_metadata_refresh_interval=60)
+        self.host_manager = host_manager.HostManager()
+        self.context = 'fake_context'
+        self.start = timeutils.utcnow()
+        timeutils.set_time_override(self.start)
+        self.addCleanup(timeutils.clear_time_override)
+        self.stubs.Set(db, 'compute_node_get_all',
+                       lambda context: fakes.COMPUTE_NODES[:4])
+        self.aggregates = [
+            FakeAggregate(['host1', 'host2'], {'availability_zone': 'az1',
+                                               'ssd': 'true'}),
+            FakeAggregate(['host2'], {'ssd': 'false'}),
+        ]
+        self.reads = 0
+
+        def fake_aggregate_get_all(context):
+            self.reads += 1
+            return self.aggregates
+
+        self.stubs.Set(db, 'aggregate_get_all', fake_aggregate_get_all)
+
+    def _host_states(self):
+        return dict((state.host, state) for state in
+                    self.host_manager.get_all_host_states(self.context))
+
+    def test_metadata_attached_to_host_states(self):
+        host_states = self._host_states()
+        self.assertEqual({'availability_zone': set(['az1']),
+                          'ssd': set(['true'])},
+                         host_states['host1'].aggregate_metadata)
+        self.assertEqual({'availability_zone': set(['az1']),
+                          'ssd': set(['true', 'false'])},
+                         host_states['host2'].aggregate_metadata)
+        self.assertEqual({}, host_states['host3'].aggregate_metadata)
+
+    def test_metadata_read_once_per_interval(self):
+        self._host_states()
+        self.aggregates = [FakeAggregate(['host3'], {'ssd': 'true'})]
+        host_states = self._host_states()
+        self.assertEqual(1, self.reads)
+        self.assertEqual({}, host_states['host3'].aggregate_metadata)
+
+        timeutils.advance_time_seconds(61)
+        host_states = self._host_states()
+        self.assertEqual(2, self.reads)
+        self.assertEqual({'ssd': set(['true'])},
+                         host_states['host3'].aggregate_metadata)
+        self.assertEqual({}, host_states['host1'].aggregate_metadata)
+
+    def test_metadata_read_on_every_request(self):
+        self.flags(scheduler_aggregate_metadata_refresh_interval=0)
+        self._host_states()
+        self._host_states()
+        self.assertEqual(2, self.reads)
+
+
 class HostManagerChangedNodesTestCase(test.NoDBTestCase):
     """Test case for HostManager class."""
 
     def setUp(self):
         super(HostManagerChangedNodesTestCase, self).setUp()
+        self.stubs.Set(db, 'aggregate_get_all', lambda context: [])
         self.host_manager = host_manager.HostManager()
         self.fake_hosts = [
               host_manager.HostState('host1', 'node1'),
@@ -373,6 +445,205 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         self.assertEqual(len(host_states_map), 0)
 
 
+class HostManagerIncrementalRefreshTestCase(test.NoDBTestCase):
+    """Test case for incremental host state refresh in HostManager."""
+
+    def setUp(self):
+        super(HostManagerIncrementalRefreshTestCase, self).setUp()
+        self.stubs.Set(db, 'aggregate_get_all', lambda context: [])
+        self.flags(scheduler_incremental_host_state_refresh=True,
+                   scheduler_host_state_resync_interval=300,
+                   scheduler_host_state_refresh_lag=60)
+        self.host_manager = host_manager.HostManager()
+        self.context = 'fake_context'
+        self.start = timeutils.utcnow()
+        self.since = self.start - datetime.timedelta(seconds=60)
+        timeutils.set_time_override(self.start)
+        self.addCleanup(timeutils.clear_time_override)
+        self.nodes = []
+        for compute in fakes.COMPUTE_NODES[:4]:
+            compute = dict(compute, updated_at=self.start)
+            compute['service'] = dict(compute['service'])
+            self.nodes.append(compute)
+        self.node_services = dict((n['id'], n['service'])
+                                  for n in self.nodes)
+
+    def test_first_call_reads_all_nodes(self):
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_updated_since')
+        db.compute_node_get_all(self.context).AndReturn(self.nodes)
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(self.context)
+        self.assertEqual(4, len(self.host_manager.host_state_map))
+
+    def test_second_call_applies_changes(self):
+        changed = dict(self.nodes[0], free_ram_mb=128,
+                       updated_at=self.start + datetime.timedelta(seconds=5))
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_updated_since')
+        db.compute_node_get_all(self.context).AndReturn(self.nodes)
+        db.compute_node_get_updated_since(self.context, self.since).\
+                AndReturn(([changed], self.node_services))
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(self.context)
+        timeutils.advance_time_seconds(10)
+        self.host_manager.get_all_host_states(self.context)
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(4, len(host_states_map))
+        self.assertEqual(128, host_states_map[('host1', 'node1')].free_ram_mb)
+        self.assertEqual(1024,
+                         host_states_map[('host2', 'node2')].free_ram_mb)
+        self.assertEqual(self.since + datetime.timedelta(seconds=10),
+                         self.host_manager._updated_since)
+
+    def test_reads_nodes_stamped_before_last_read_again(self):
+        # Committed after the first read, but stamped before it by a host
+        # whose clock lags, so older than the newest row of the first read.
+        self.nodes[0]['updated_at'] = (self.start -
+                                       datetime.timedelta(seconds=120))
+        late = dict(self.nodes[0], free_ram_mb=128,
+                    updated_at=self.start - datetime.timedelta(seconds=30))
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_updated_since')
+        db.compute_node_get_all(self.context).AndReturn(self.nodes)
+        db.compute_node_get_updated_since(self.context, self.since).\
+                AndReturn(([late], self.node_services))
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(self.context)
+        self.assertTrue(late['updated_at'] >= self.host_manager._updated_since)
+        self.host_manager.get_all_host_states(self.context)
+        host_state = self.host_manager.host_state_map[('host1', 'node1')]
+        self.assertEqual(128, host_state.free_ram_mb)
+
+    def test_refreshes_services_of_unchanged_nodes(self):
+        node_services = dict(self.node_services)
+        node_services[2] = dict(host='host2', disabled=False)
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_updated_since')
+        db.compute_node_get_all(self.context).AndReturn(self.nodes)
+        db.compute_node_get_updated_since(self.context, self.since).\
+                AndReturn(([], node_services))
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(self.context)
+        self.host_manager.get_all_host_states(self.context)
+        host_state = self.host_manager.host_state_map[('host2', 'node2')]
+        self.assertFalse(host_state.service['disabled'])
+
+    def test_removes_deleted_nodes(self):
+        node_services = dict(self.node_services)
+        del node_services[4]
+        node_services[3] = None
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_updated_since')
+        db.compute_node_get_all(self.context).AndReturn(self.nodes)
+        db.compute_node_get_updated_since(self.context, self.since).\
+                AndReturn(([], node_services))
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(self.context)
+        self.host_manager.get_all_host_states(self.context)
+        self.assertEqual(set([('host1', 'node1'), ('host2', 'node2')]),
+                         set(self.host_manager.host_state_map.keys()))
+
+    def test_unknown_live_node_triggers_full_refresh(self):
+        new_node = dict(self.nodes[0], id=6, hypervisor_hostname='node6')
+        node_services = dict(self.node_services)
+        node_services[6] = new_node['service']
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_updated_since')
+        db.compute_node_get_all(self.context).AndReturn(self.nodes)
+        db.compute_node_get_updated_since(self.context, self.since).\
+                AndReturn(([], node_services))
+        db.compute_node_get_all(self.context).AndReturn(
+                self.nodes + [new_node])
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(self.context)
+        self.host_manager.get_all_host_states(self.context)
+        self.assertIn(('host1', 'node6'), self.host_manager.host_state_map)
+
+    def test_resync_interval_forces_full_refresh(self):
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_updated_since')
+        db.compute_node_get_all(self.context).AndReturn(self.nodes)
+        db.compute_node_get_all(self.context).AndReturn(self.nodes[:2])
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(self.context)
+        timeutils.advance_time_seconds(301)
+        self.host_manager.get_all_host_states(self.context)
+        self.assertEqual(2, len(self.host_manager.host_state_map))
+
+    def test_disabled_always_reads_all_nodes(self):
+        self.flags(scheduler_incremental_host_state_refresh=False)
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_updated_since')
+        db.compute_node_get_all(self.context).AndReturn(self.nodes)
+        db.compute_node_get_all(self.context).AndReturn(self.nodes)
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(self.context)
+        self.host_manager.get_all_host_states(self.context)
+
+
+class HostManagerColumnStoreTestCase(test.NoDBTestCase):
+    """Test case for the columnar store kept by HostManager."""
+
+    def setUp(self):
+        super(HostManagerColumnStoreTestCase, self).setUp()
+        self.stubs.Set(db, 'aggregate_get_all', lambda context: [])
+        if not columns.is_available():
+            self.skipTest("NumPy is not installed")
+        self.flags(scheduler_vectorized_filters=True)
+        self.host_manager = host_manager.HostManager()
+        self.context = 'fake_context'
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+
+    def test_store_built_and_kept(self):
+        db.compute_node_get_all(self.context).AndReturn(fakes.COMPUTE_NODES)
+        db.compute_node_get_all(self.context).AndReturn(fakes.COMPUTE_NODES)
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(self.context)
+        store = self.host_manager._column_store
+        self.assertEqual(4, len(store))
+        self.host_manager.get_all_host_states(self.context)
+        self.assertIs(store, self.host_manager._column_store)
+        for host_state in self.host_manager.host_state_map.values():
+            self.assertIs(store, host_state.column_store)
+
+    def test_store_rebuilt_when_hosts_removed(self):
+        db.compute_node_get_all(self.context).AndReturn(fakes.COMPUTE_NODES)
+        db.compute_node_get_all(self.context).AndReturn(
+                fakes.COMPUTE_NODES[:2])
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(self.context)
+        old_store = self.host_manager._column_store
+        removed = self.host_manager.host_state_map[('host4', 'node4')]
+        self.host_manager.get_all_host_states(self.context)
+        self.assertEqual(2, len(self.host_manager._column_store))
+        self.assertIsNone(removed.column_store)
+        self.assertEqual(-1, removed.column_index)
+        self.assertIsNot(old_store, self.host_manager._column_store)
+
+    def test_store_dropped_when_disabled(self):
+        db.compute_node_get_all(self.context).AndReturn(fakes.COMPUTE_NODES)
+        db.compute_node_get_all(self.context).AndReturn(fakes.COMPUTE_NODES)
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(self.context)
+        self.flags(scheduler_vectorized_filters=False)
+        self.host_manager.get_all_host_states(self.context)
+        self.assertIsNone(self.host_manager._column_store)
+        for host_state in self.host_manager.host_state_map.values():
+            self.assertIsNone(host_state.column_store)
+
+
 class HostStateTestCase(test.NoDBTestCase):
     """Test case for HostState class."""
 
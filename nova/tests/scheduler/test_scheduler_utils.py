@@ -43,9 +43,10 @@ class SchedulerUtilsTestCase(test.NoDBTestCase):
         instance_type = {'flavorid': 'fake-id'}
 
         self.mox.StubOutWithMock(flavors, 'extract_flavor')
-        self.mox.StubOutWithMock(db, 'flavor_extra_specs_get')
+        self.mox.StubOutWithMock(flavors, 'get_flavor_extra_specs')
         flavors.extract_flavor(mox.IgnoreArg()).AndReturn(instance_type)
-        db.flavor_extra_specs_get(self.context, mox.IgnoreArg()).AndReturn([])
+        flavors.get_flavor_extra_specs(mox.IgnoreArg(),
+                                       ctxt=self.context).AndReturn([])
         self.mox.ReplayAll()
 
         request_spec = scheduler_utils.build_request_spec(self.context, image,
@@ -53,14 +54,14 @@ class SchedulerUtilsTestCase(test.NoDBTestCase):
         self.assertEqual({}, request_spec['image'])
 
     @mock.patch.object(flavors, 'extract_flavor')
-    @mock.patch.object(db, 'flavor_extra_specs_get')
-    def test_build_request_spec_with_object(self, flavor_extra_specs_get,
+    @mock.patch.object(flavors, 'get_flavor_extra_specs')
+    def test_build_request_spec_with_object(self, get_flavor_extra_specs,
                                             extract_flavor):
         instance_type = {'flavorid': 'fake-id'}
         instance = fake_instance.fake_instance_obj(self.context)
 
         extract_flavor.return_value = instance_type
-        flavor_extra_specs_get.return_value = []
+        get_flavor_extra_specs.return_value = []
 
         request_spec = scheduler_utils.build_request_spec(self.context, None,
                                                           [instance])
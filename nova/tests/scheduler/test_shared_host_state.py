@@ -0,0 +1,125 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For host state shared between scheduler workers.
+"""
+
+import os
+
+import fixtures
+
+from nova.scheduler import host_manager
+from nova.scheduler import shared_host_state
+from nova import test
+
+
+class SharedHostStatesTestCase(test.NoDBTestCase):
+    """Two SharedHostStates on one file stand in for two workers."""
+
+    def setUp(self):
+        super(SharedHostStatesTestCase, self).setUp()
+        self.path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                 'host_states')
+        self.worker1 = self._open()
+        self.worker2 = self._open()
+
+    def _open(self, max_hosts=4):
+        shared = shared_host_state.SharedHostStates(self.path, max_hosts)
+        self.addCleanup(shared.close)
+        return shared
+
+    def _host_states(self, count=2):
+        host_states = []
+        for i in xrange(count):
+            host_state = host_manager.HostState('host%d' % i, 'node%d' % i)
+            host_state.free_ram_mb = 1024
+            host_state.free_disk_mb = 10240
+            host_state.vcpus_used = 1
+            host_state.num_instances = 1
+            host_states.append(host_state)
+        return host_states
+
+    def _claim(self, host_state):
+        host_state.consume_from_instance({'root_gb': 1, 'ephemeral_gb': 0,
+                                          'memory_mb': 512, 'vcpus': 1})
+
+    def test_single_refresher(self):
+        self.assertTrue(self.worker1.is_refresher())
+        self.assertTrue(self.worker1.is_refresher())
+        self.assertFalse(self.worker2.is_refresher())
+        self.worker1.close()
+        self.assertTrue(self.worker2.is_refresher())
+
+    def test_publish_and_sync(self):
+        published = self._host_states()
+        self.worker1.publish(published)
+        self.assertIs(self.worker1, published[0].shared_state)
+
+        cached = self._host_states()
+        cached[0].free_ram_mb = 0
+        self.worker2.sync(cached)
+        self.assertEqual(1024, cached[0].free_ram_mb)
+        self.assertIs(self.worker2, cached[0].shared_state)
+
+    def test_claims_are_seen_by_other_workers(self):
+        self.worker1.publish(self._host_states())
+        hosts1 = self._host_states()
+        hosts2 = self._host_states()
+        self.worker1.sync(hosts1, force=True)
+        self.worker2.sync(hosts2)
+
+        self._claim(hosts1[0])
+        self.assertEqual(512, hosts1[0].free_ram_mb)
+        # The claim of the first worker is included in that of the second.
+        self._claim(hosts2[0])
+        self.assertEqual(0, hosts2[0].free_ram_mb)
+        self.assertEqual(8192, hosts2[0].free_disk_mb)
+        self.assertEqual(3, hosts2[0].vcpus_used)
+        self.assertEqual(3, hosts2[0].num_instances)
+        self.assertEqual(2, hosts2[0].num_io_ops)
+
+        self.worker1.sync(hosts1)
+        self.assertEqual(0, hosts1[0].free_ram_mb)
+        self.assertEqual(1024, hosts1[1].free_ram_mb)
+
+    def test_sync_skipped_without_changes(self):
+        self.worker1.publish(self._host_states())
+        hosts = self._host_states()
+        self.worker2.sync(hosts)
+        hosts[0].free_ram_mb = 0
+        self.worker2.sync(hosts)
+        self.assertEqual(0, hosts[0].free_ram_mb)
+        self.worker2.sync(hosts, force=True)
+        self.assertEqual(1024, hosts[0].free_ram_mb)
+
+    def test_unpublished_host_is_not_shared(self):
+        self.worker1.publish(self._host_states(1))
+        hosts = self._host_states(2)
+        self.worker2.sync(hosts)
+        self.assertIsNone(hosts[1].shared_state)
+
+        self.worker1.publish(self._host_states(0))
+        self.assertFalse(self.worker2.claim(hosts[0], {'free_ram_mb': -1}))
+        self.assertIsNone(hosts[0].shared_state)
+
+    def test_publish_over_capacity(self):
+        self.worker1.publish(self._host_states(6))
+        hosts = self._host_states(6)
+        self.worker2.sync(hosts)
+        self.assertIsNotNone(hosts[3].shared_state)
+        self.assertIsNone(hosts[4].shared_state)
+
+    def test_capacity_set_by_first_worker(self):
+        self.assertEqual(4, self._open(max_hosts=8).capacity)
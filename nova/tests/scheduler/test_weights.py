@@ -16,9 +16,12 @@
 Tests For Scheduler weights.
 """
 
+import testtools
+
 from nova import context
 from nova import exception
 from nova.openstack.common.fixture import mockpatch
+from nova.scheduler import columns
 from nova.scheduler import weights
 from nova import test
 from nova.tests import matchers
@@ -47,6 +50,8 @@ class RamWeigherTestCase(test.NoDBTestCase):
         self.useFixture(mockpatch.Patch(
             'nova.db.compute_node_get_all',
              return_value=fakes.COMPUTE_NODES))
+        self.useFixture(mockpatch.Patch('nova.db.aggregate_get_all',
+                                        return_value=[]))
         self.host_manager = fakes.FakeHostManager()
         self.weight_handler = weights.HostWeightHandler()
         self.weight_classes = self.weight_handler.get_matching_classes(
@@ -102,6 +107,13 @@ class RamWeigherTestCase(test.NoDBTestCase):
         self.assertEqual(weighed_host.weight, 1.0 * 2)
         self.assertEqual(weighed_host.obj.host, 'host4')
 
+    def test_limit_returns_best_hosts(self):
+        hostinfo_list = list(self._get_all_hosts())
+        weighed_hosts = self.weight_handler.get_weighed_objects(
+                self.weight_classes, hostinfo_list, {}, limit=2)
+        self.assertEqual(['host4', 'host3'],
+                         [weighed.obj.host for weighed in weighed_hosts])
+
     def test_ram_filter_negative(self):
         self.flags(ram_weight_multiplier=1.0)
         hostinfo_list = self._get_all_hosts()
@@ -135,6 +147,8 @@ class MetricsWeigherTestCase(test.NoDBTestCase):
         self.useFixture(mockpatch.Patch(
             'nova.db.compute_node_get_all',
              return_value=fakes.COMPUTE_NODES_METRICS))
+        self.useFixture(mockpatch.Patch('nova.db.aggregate_get_all',
+                                        return_value=[]))
         self.host_manager = fakes.FakeHostManager()
         self.weight_handler = weights.HostWeightHandler()
         self.weight_classes = self.weight_handler.get_matching_classes(
@@ -246,3 +260,19 @@ class MetricsWeigherTestCase(test.NoDBTestCase):
         self.flags(required=False, group='metrics')
         setting = ['foo=0.0001', 'zot=-1']
         self._do_test(setting, 1.0, 'host5')
+
+
+@testtools.skipIf(not columns.is_available(), "NumPy is not installed")
+class VectorizedRamWeigherTestCase(RamWeigherTestCase):
+    """Run the RAMWeigher tests through the batched weighing path."""
+    def setUp(self):
+        super(VectorizedRamWeigherTestCase, self).setUp()
+        self.flags(scheduler_vectorized_weighers=True)
+
+
+@testtools.skipIf(not columns.is_available(), "NumPy is not installed")
+class VectorizedMetricsWeigherTestCase(MetricsWeigherTestCase):
+    """Run the MetricsWeigher tests through the batched weighing path."""
+    def setUp(self):
+        super(VectorizedMetricsWeigherTestCase, self).setUp()
+        self.flags(scheduler_vectorized_weighers=True)
@@ -0,0 +1,115 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+from nova import cache_utils
+from nova.openstack.common import timeutils
+from nova import test
+
+
+class CacheUtilsTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(CacheUtilsTestCase, self).setUp()
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.client = cache_utils.get_client()
+
+    def _advance(self, seconds):
+        timeutils.advance_time_delta(datetime.timedelta(seconds=seconds))
+
+    def _stats(self):
+        return self.client.get_stats()[0][1]
+
+    def test_set_get_delete(self):
+        self.assertTrue(self.client.set('foo', 'bar'))
+        self.assertEqual('bar', self.client.get('foo'))
+        self.client.delete('foo')
+        self.assertIsNone(self.client.get('foo'))
+
+    def test_expiry(self):
+        self.client.set('foo', 'bar', time=5)
+        self.client.set('baz', 'qux')
+        self._advance(4)
+        self.assertEqual('bar', self.client.get('foo'))
+        self._advance(1)
+        self.assertIsNone(self.client.get('foo'))
+        self.assertEqual('qux', self.client.get('baz'))
+        self.assertEqual(1, self._stats()['reclaimed'])
+
+    def test_expired_entries_dropped_on_set(self):
+        for i in range(10):
+            self.client.set('key%d' % i, 'value', time=1)
+        self._advance(1)
+        self.client.set('other', 'value')
+        self.assertEqual(['other'], self.client.cache.keys())
+        self.assertEqual(10, self._stats()['reclaimed'])
+
+    def test_reset_timeout(self):
+        self.client.set('foo', 'bar', time=1)
+        self.client.set('foo', 'baz', time=10)
+        self._advance(5)
+        self.client.set('other', 'value')
+        self.assertEqual('baz', self.client.get('foo'))
+
+    def test_add(self):
+        self.assertTrue(self.client.add('foo', 'bar'))
+        self.assertFalse(self.client.add('foo', 'baz'))
+        self.assertEqual('bar', self.client.get('foo'))
+
+    def test_incr(self):
+        self.assertIsNone(self.client.incr('foo'))
+        self.client.set('foo', '1', time=5)
+        self.assertEqual(3, self.client.incr('foo', delta=2))
+        self.assertEqual('3', self.client.get('foo'))
+        self._advance(5)
+        self.assertIsNone(self.client.get('foo'))
+
+    def test_unbounded_by_default(self):
+        for i in range(100):
+            self.client.set('key%d' % i, 'value')
+        self.assertEqual(100, self._stats()['curr_items'])
+        self.assertEqual(0, self._stats()['evictions'])
+
+    def test_evicts_least_recently_used(self):
+        self.flags(memorycache_max_items=2)
+        client = cache_utils.get_client()
+        client.set('a', '1')
+        client.set('b', '2')
+        client.get('a')
+        client.set('c', '3')
+        self.assertIsNone(client.get('b'))
+        self.assertEqual('1', client.get('a'))
+        self.assertEqual('3', client.get('c'))
+        self.assertEqual(1, client.get_stats()[0][1]['evictions'])
+
+    def test_evicts_over_max_bytes(self):
+        self.flags(memorycache_max_items=0, memorycache_max_bytes=1000)
+        client = cache_utils.get_client()
+        for i in range(10):
+            client.set('key%d' % i, 'x' * 200)
+        stats = client.get_stats()[0][1]
+        self.assertTrue(stats['bytes'] <= 1000)
+        self.assertTrue(stats['evictions'] > 0)
+        self.assertEqual('x' * 200, client.get('key9'))
+
+    def test_hit_and_miss_counters(self):
+        self.client.set('foo', 'bar')
+        self.client.get('foo')
+        self.client.get('missing')
+        stats = self._stats()
+        self.assertEqual(1, stats['get_hits'])
+        self.assertEqual(1, stats['get_misses'])
+        self.assertEqual(1, stats['curr_items'])
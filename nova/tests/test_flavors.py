@@ -15,12 +15,15 @@ Unit Tests for flavors code
 """
 import time
 
+import mock
+
 from nova.compute import flavors
 from nova import context
 from nova import db
 from nova.db.sqlalchemy import api as sql_session
 from nova.db.sqlalchemy import models
 from nova import exception
+from nova import objects
 from nova import test
 
 
@@ -292,6 +295,55 @@ class InstanceTypeTestCase(test.TestCase):
         self.assertIn(flav2['id'], returned_flavors_ids)
 
 
+class FlavorCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(FlavorCacheTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.flavor = flavors.create('cached', 256, 1, 10, flavorid='c1')
+
+    def test_lookups_are_cached(self):
+        with mock.patch.object(db, 'flavor_get_by_flavor_id',
+                               wraps=db.flavor_get_by_flavor_id) as get:
+            first = flavors.get_flavor_by_flavor_id('c1', self.ctxt)
+            second = flavors.get_flavor_by_flavor_id('c1', self.ctxt)
+        self.assertEqual(1, get.call_count)
+        self.assertEqual(first, second)
+        self.assertEqual(dict(hits=1, misses=1, hit_rate=0.5),
+                         flavors.get_cache_stats())
+
+    def test_cached_flavors_are_copies(self):
+        flavors.get_flavor(self.flavor['id'], self.ctxt)['name'] = 'changed'
+        self.assertEqual('cached',
+                         flavors.get_flavor(self.flavor['id'],
+                                            self.ctxt)['name'])
+
+    def test_lookups_are_cached_per_project(self):
+        project_ctxt = context.RequestContext('user', 'project')
+        flavors.get_flavor_by_name('cached', self.ctxt)
+        with mock.patch.object(db, 'flavor_get_by_name',
+                               wraps=db.flavor_get_by_name) as get:
+            flavors.get_flavor_by_name('cached', project_ctxt)
+        self.assertEqual(1, get.call_count)
+
+    def test_changes_invalidate_cache(self):
+        flavors.get_flavor_extra_specs('c1', self.ctxt)
+        flavor = objects.Flavor.get_by_flavor_id(self.ctxt, 'c1')
+        flavor.extra_specs = {'hw:cpu_policy': 'dedicated'}
+        flavor.save()
+        self.assertEqual({'hw:cpu_policy': 'dedicated'},
+                         flavors.get_flavor_extra_specs('c1', self.ctxt))
+        flavors.destroy('cached')
+        self.assertRaises(exception.FlavorNotFound,
+                          flavors.get_flavor_by_flavor_id, 'c1',
+                          read_deleted='no')
+
+    def test_cache_disabled(self):
+        self.flags(flavor_cache_seconds=0)
+        flavors.get_flavor(self.flavor['id'], self.ctxt)
+        flavors.get_flavor(self.flavor['id'], self.ctxt)
+        self.assertEqual(0, flavors.get_cache_stats()['misses'])
+
+
 class InstanceTypeToolsTest(test.TestCase):
     def _dict_to_metadata(self, data):
         return [{'key': key, 'value': value} for key, value in data.items()]
@@ -15,7 +15,10 @@
 #    under the License.
 """Unit Tests for network code."""
 
+import datetime
+
 from nova.network import linux_net
+from nova.openstack.common import processutils
 from nova import test
 
 
@@ -276,3 +279,158 @@ class IptablesManagerTestCase(test.NoDBTestCase):
                                                self.manager.ipv4['filter'],
                                                'filter')
         self.assertEqual(current_lines, new_lines)
+
+    def test_top_rules_keep_counters(self):
+        current_lines = list(self.sample_filter)
+        current_lines[12] = '[5:10] -A FORWARD -j nova-filter-top'
+        new_lines = self.manager._modify_rules(current_lines,
+                                               self.manager.ipv4['filter'],
+                                               'filter')
+        self.assertIn('[5:10] -A FORWARD -j nova-filter-top', new_lines)
+        self.assertNotIn('[0:0] -A FORWARD -j nova-filter-top', new_lines)
+
+
+class IptablesManagerApplyTestCase(test.NoDBTestCase):
+
+    binary_name = linux_net.get_binary_name()
+
+    def setUp(self):
+        super(IptablesManagerApplyTestCase, self).setUp()
+        self.flags(iptables_incremental_apply=True, use_ipv6=False)
+        self.executes = []
+        self.manager = linux_net.IptablesManager(execute=self._execute)
+        self.manager.apply()
+        self.executes = []
+
+    def _execute(self, *cmd, **kwargs):
+        self.executes.append((cmd, kwargs.get('process_input')))
+        return '', ''
+
+    def test_wrapped_rule_applies_chain(self):
+        table = self.manager.ipv4['filter']
+        table.add_chain('inst-1')
+        table.add_rule('inst-1', '-p icmp -j ACCEPT')
+        table.add_rule('inst-1', '-j DROP')
+        table.add_rule('local', '-d 10.0.0.2 -j $inst-1')
+        self.manager.apply()
+
+        self.assertEqual(1, len(self.executes))
+        cmd, process_input = self.executes[0]
+        self.assertEqual(('iptables-restore', '-c', '--noflush'), cmd)
+        self.assertEqual(['*filter',
+                          ':%s-inst-1 - [0:0]' % self.binary_name,
+                          ':%s-local - [0:0]' % self.binary_name,
+                          '[0:0] -A %s-inst-1 -p icmp -j ACCEPT' % (
+                              self.binary_name),
+                          '[0:0] -A %s-inst-1 -j DROP' % self.binary_name,
+                          '[0:0] -A %s-local -d 10.0.0.2 -j %s-inst-1' % (
+                              self.binary_name, self.binary_name),
+                          'COMMIT'],
+                         process_input.split('\n'))
+        self.assertEqual(set(), table.dirty_chains)
+        self.assertFalse(table.dirty)
+
+    def test_removed_chain_is_deleted(self):
+        table = self.manager.ipv4['filter']
+        table.add_chain('inst-1')
+        table.add_rule('inst-1', '-j DROP')
+        table.add_rule('local', '-j $inst-1')
+        self.manager.apply()
+        self.executes = []
+
+        table.remove_chain('inst-1')
+        self.manager.apply()
+
+        cmd, process_input = self.executes[0]
+        self.assertEqual(['*filter',
+                          ':%s-local - [0:0]' % self.binary_name,
+                          ':%s-inst-1 - [0:0]' % self.binary_name,
+                          '-X %s-inst-1' % self.binary_name,
+                          'COMMIT'],
+                         process_input.split('\n'))
+
+    def test_unwrapped_rule_applies_all_rules(self):
+        table = self.manager.ipv4['filter']
+        table.add_rule('FORWARD', '-s 10.0.0.2 -j DROP', wrap=False)
+        self.manager.apply()
+
+        self.assertEqual([('iptables-save', '-c'), ('iptables-restore', '-c')],
+                         [cmd for cmd, process_input in self.executes])
+        self.assertFalse(table.full_apply)
+
+    def test_interval_applies_all_rules(self):
+        self.manager.last_full_apply -= datetime.timedelta(seconds=601)
+        self.manager.ipv4['filter'].add_rule('local', '-j DROP')
+        self.manager.apply()
+
+        self.assertEqual([('iptables-save', '-c'), ('iptables-restore', '-c')],
+                         [cmd for cmd, process_input in self.executes])
+
+    def test_disabled_applies_all_rules(self):
+        self.flags(iptables_incremental_apply=False)
+        self.manager.ipv4['filter'].add_rule('local', '-j DROP')
+        self.manager.apply()
+
+        self.assertEqual([('iptables-save', '-c'), ('iptables-restore', '-c')],
+                         [cmd for cmd, process_input in self.executes])
+
+    def test_failure_applies_all_rules(self):
+        def fail_noflush(*cmd, **kwargs):
+            self._execute(*cmd, **kwargs)
+            if '--noflush' in cmd:
+                raise processutils.ProcessExecutionError()
+            return '', ''
+
+        self.manager.execute = fail_noflush
+        self.manager.ipv4['filter'].add_rule('local', '-j DROP')
+        self.manager.apply()
+
+        self.assertEqual([('iptables-restore', '-c', '--noflush'),
+                          ('iptables-save', '-c'),
+                          ('iptables-restore', '-c')],
+                         [cmd for cmd, process_input in self.executes])
+
+
+class IpsetManagerTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(IpsetManagerTestCase, self).setUp()
+        self.executes = []
+        self.manager = linux_net.IpsetManager(execute=self._execute)
+
+    def _execute(self, *cmd, **kwargs):
+        self.executes.append((cmd, kwargs.get('process_input')))
+        return '', ''
+
+    def test_set_members_creates_set(self):
+        self.manager.set_members('nova-sg1-v4', ['10.0.0.3', '10.0.0.2'])
+        self.assertEqual([(('ipset', 'restore', '-exist'),
+                           'create nova-sg1-v4 hash:ip family inet\n'
+                           'flush nova-sg1-v4\n'
+                           'add nova-sg1-v4 10.0.0.2\n'
+                           'add nova-sg1-v4 10.0.0.3\n')],
+                         self.executes)
+
+    def test_set_members_adds_and_deletes_members(self):
+        self.manager.set_members('nova-sg1-v4', ['10.0.0.2', '10.0.0.3'])
+        self.executes = []
+        self.manager.set_members('nova-sg1-v4', ['10.0.0.3', '10.0.0.4'])
+        self.assertEqual(
+            [(('ipset', 'del', 'nova-sg1-v4', '10.0.0.2', '-exist'), None),
+             (('ipset', 'add', 'nova-sg1-v4', '10.0.0.4', '-exist'), None)],
+            self.executes)
+
+    def test_set_members_unchanged(self):
+        self.manager.set_members('nova-sg1-v4', ['10.0.0.2'])
+        self.executes = []
+        self.manager.set_members('nova-sg1-v4', ['10.0.0.2'])
+        self.assertEqual([], self.executes)
+
+    def test_destroy_set(self):
+        self.manager.set_members('nova-sg1-v4', ['10.0.0.2'])
+        self.executes = []
+        self.manager.destroy_set('nova-sg1-v4')
+        self.manager.destroy_set('nova-sg1-v4')
+        self.assertEqual([(('ipset', 'destroy', 'nova-sg1-v4'), None)],
+                         self.executes)
+        self.assertEqual({}, self.manager.sets)
@@ -403,6 +403,14 @@ class ProjectCommandsTestCase(test.TestCase):
         print_format = "%-36s %-10s" % ('instances', 'unlimited')
         self.assertEqual((print_format in result), True)
 
+    def test_quota_prints_updated_limit(self):
+        output = StringIO.StringIO()
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', output))
+        self.commands.quota(project_id='admin', key='cores', value='42')
+
+        print_format = "%-36s %-10s" % ('cores', 42)
+        self.assertIn(print_format, output.getvalue())
+
     def test_quota_update_invalid_key(self):
         self.assertEqual(2, self.commands.quota('admin', 'volumes1', '10'))
 
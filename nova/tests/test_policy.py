@@ -22,6 +22,7 @@ import six.moves.urllib.request as urlrequest
 
 from nova import context
 from nova import exception
+from nova.openstack.common import jsonutils
 from nova.openstack.common import policy as common_policy
 from nova import policy
 from nova import test
@@ -232,3 +233,111 @@ class AdminRolePolicyTestCase(test.NoDBTestCase):
         for action in self.actions:
             self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
                           self.context, action, self.target)
+
+
+class EnforcerTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(EnforcerTestCase, self).setUp()
+        self.rules = {
+            "admin_or_owner": "is_admin:True or project_id:%(project_id)s",
+            "default": "rule:admin_or_owner",
+            "example:owner": "rule:admin_or_owner",
+            "example:user": "user_id:%(user_id)s and not role:Banned",
+            "example:literal": "'fake':%(project_id)s",
+            "example:loop": "role:admin or rule:example:loop2",
+            "example:loop2": "rule:example:loop",
+            "example:http": "http://www.example.com/%(project_id)s",
+        }
+        self.enforcer = policy.Enforcer(rules=common_policy.Rules.load_json(
+            jsonutils.dumps(self.rules), 'default'), use_conf=False)
+        self.enforcer.min_cached_checks = 1
+
+    def _creds(self, **kwargs):
+        creds = dict(user_id='fake', project_id='fake', roles=['member'],
+                     is_admin=False)
+        creds.update(kwargs)
+        return creds
+
+    def test_same_decisions_as_interpreter(self):
+        interpreter = common_policy.Enforcer(
+            rules=self.enforcer.rules, use_conf=False)
+        creds_list = [self._creds(), self._creds(is_admin=True),
+                      self._creds(roles=['banned']),
+                      self._creds(roles=['Admin']),
+                      self._creds(user_id='other', project_id='other')]
+        targets = [{}, {'project_id': 'fake', 'user_id': 'fake'},
+                   {'project_id': 'other', 'user_id': 'other'}]
+        for rule in self.rules.keys() + ['example:noexist']:
+            if rule in ('example:http', 'example:loop', 'example:loop2'):
+                continue
+            for creds in creds_list:
+                for target in targets:
+                    for i in range(2):
+                        self.assertEqual(
+                            interpreter.enforce(rule, target, creds),
+                            self.enforcer.enforce(rule, target, creds),
+                            (rule, target, creds))
+
+    def test_recursive_rule(self):
+        creds = self._creds(roles=['admin'])
+        self.assertTrue(self.enforcer.enforce('example:loop', {}, creds))
+
+    def test_decisions_cached(self):
+        creds = self._creds()
+        target = {'project_id': 'fake'}
+        self.assertTrue(self.enforcer.enforce('example:owner', target, creds))
+        self.assertEqual(1, len(self.enforcer._decisions))
+
+        self.enforcer._compiled['example:owner'].func = None
+        self.assertTrue(self.enforcer.enforce('example:owner', target,
+                                              dict(creds, user_id='other')))
+        self.assertFalse(self.enforcer.enforce('example:literal',
+                                               {'project_id': 'other'},
+                                               creds))
+        self.assertEqual(2, len(self.enforcer._decisions))
+
+    def test_decision_cache_bounded(self):
+        self.enforcer.decision_cache_size = 4
+        for project_id in 'abcdefg':
+            self.enforcer.enforce('example:owner',
+                                  {'project_id': project_id}, self._creds())
+            # Keep using the decision for project a.
+            self.enforcer.enforce('example:owner', {'project_id': 'a'},
+                                  self._creds())
+            self.assertTrue(len(self.enforcer._decisions) +
+                            len(self.enforcer._old_decisions) <= 4)
+
+        self.enforcer._compiled['example:owner'].func = None
+        self.enforcer.enforce('example:owner', {'project_id': 'a'},
+                              self._creds())
+        self.enforcer.enforce('example:owner', {'project_id': 'g'},
+                              self._creds())
+
+    def test_set_rules_drops_decisions(self):
+        creds = self._creds()
+        self.assertTrue(self.enforcer.enforce('example:owner',
+                                              {'project_id': 'fake'}, creds))
+        self.enforcer.set_rules({'example:owner': common_policy.parse_rule(
+            '!')}, overwrite=False)
+        self.assertFalse(self.enforcer.enforce('example:owner',
+                                               {'project_id': 'fake'}, creds))
+
+    def test_simple_rules_not_cached(self):
+        self.enforcer.min_cached_checks = 2
+        creds = self._creds()
+        self.enforcer.enforce('example:owner', {}, creds)
+        self.enforcer.enforce('example:literal', {}, creds)
+        self.assertEqual(1, len(self.enforcer._decisions))
+
+    def test_http_check_not_cached(self):
+        responses = ['True', 'False']
+
+        def fakeurlopen(url, post_data):
+            return StringIO.StringIO(responses.pop(0))
+        self.stubs.Set(urlrequest, 'urlopen', fakeurlopen)
+        target = {'project_id': 'fake'}
+        self.assertTrue(self.enforcer.enforce('example:http', target,
+                                              self._creds()))
+        self.assertFalse(self.enforcer.enforce('example:http', target,
+                                               self._creds()))
+        self.assertEqual(0, len(self.enforcer._decisions))
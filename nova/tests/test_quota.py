@@ -328,6 +328,9 @@ class FakeDriver(object):
     def destroy_all_by_project(self, context, project_id):
         self.called.append(('destroy_all_by_project', context, project_id))
 
+    def forget_limits(self, context, project_id):
+        self.called.append(('forget_limits', context, project_id))
+
     def expire(self, context):
         self.called.append(('expire', context))
 
@@ -736,6 +739,16 @@ class QuotaEngineTestCase(test.TestCase):
                 ('destroy_all_by_project', context, 'test_project'),
                 ])
 
+    def test_forget_limits(self):
+        context = FakeContext(None, None)
+        driver = FakeDriver()
+        quota_obj = self._make_quota_obj(driver)
+        quota_obj.forget_limits(context, 'test_project')
+
+        self.assertEqual(driver.called, [
+                ('forget_limits', context, 'test_project'),
+                ])
+
     def test_expire(self):
         context = FakeContext(None, None)
         driver = FakeDriver()
@@ -1919,6 +1932,59 @@ class DbQuotaDriverTestCase(test.TestCase):
                                 quota.QUOTAS._resources,
                                 dict(metadata_items=128))
 
+    def test_limits_cached_on_context(self):
+        self._stub_get_by_project_and_user()
+        self._stub_quota_class_get_default()
+        ctxt = FakeContext('test_project', 'test_class')
+        ctxt.quota_limits = {}
+        for i in range(2):
+            self.driver.limit_check(ctxt, quota.QUOTAS._resources,
+                                    dict(metadata_items=64))
+        self.driver.get_project_quotas(ctxt, quota.QUOTAS._resources,
+                                       'test_project', usages=False)
+        result = self.driver.get_user_quotas(ctxt, quota.QUOTAS._resources,
+                                             'test_project', 'fake_user',
+                                             usages=False)
+
+        self.assertEqual(self.calls, [
+                'quota_get_all_by_project',
+                'quota_class_get_all_by_name',
+                'quota_class_get_default',
+                'quota_get_all_by_project_and_user',
+                ])
+        self.assertEqual(10, result['cores']['limit'])
+
+        self.stubs.Set(db, 'quota_destroy_all_by_project',
+                       lambda context, project_id: None)
+        self.driver.destroy_all_by_project(ctxt, 'test_project')
+        self.driver.get_project_quotas(ctxt, quota.QUOTAS._resources,
+                                       'test_project', usages=False)
+        self.assertEqual('quota_get_all_by_project', self.calls[-1])
+
+    def test_forget_limits(self):
+        self._stub_get_by_project_and_user()
+        self._stub_quota_class_get_default()
+        ctxt = FakeContext('test_project', 'test_class')
+        ctxt.quota_limits = {}
+        ctxt.quota_limits[('project', 'other_project')] = {'cores': 5}
+        self.driver.get_user_quotas(ctxt, quota.QUOTAS._resources,
+                                    'test_project', 'fake_user',
+                                    usages=False)
+        self.calls = []
+
+        self.driver.forget_limits(ctxt, 'test_project')
+        self.driver.get_user_quotas(ctxt, quota.QUOTAS._resources,
+                                    'test_project', 'fake_user',
+                                    usages=False)
+
+        # Only the limits of test_project are read again.
+        self.assertEqual(self.calls, [
+                'quota_get_all_by_project_and_user',
+                'quota_get_all_by_project',
+                ])
+        self.assertEqual({'cores': 5},
+                         ctxt.quota_limits[('project', 'other_project')])
+
     def _stub_quota_reserve(self):
         def fake_quota_reserve(context, resources, quotas, user_quotas, deltas,
                                expire, until_refresh, max_age, project_id=None,
@@ -1952,6 +2018,32 @@ class DbQuotaDriverTestCase(test.TestCase):
                 ])
         self.assertEqual(result, ['resv-1', 'resv-2', 'resv-3'])
 
+    def test_reserve_optimistic(self):
+        self.flags(quota_optimistic_reservations=True)
+        self._stub_get_project_quotas()
+        self._stub_quota_reserve()
+
+        def fake_quota_reserve_optimistic(context, resources, quotas,
+                                          user_quotas, deltas, expire,
+                                          until_refresh, max_age,
+                                          project_id=None, user_id=None):
+            self.calls.append(('quota_reserve_optimistic', expire,
+                               until_refresh, max_age))
+            return ['resv-1']
+        self.stubs.Set(db, 'quota_reserve_optimistic',
+                       fake_quota_reserve_optimistic)
+
+        result = self.driver.reserve(FakeContext('test_project', 'test_class'),
+                                     quota.QUOTAS._resources,
+                                     dict(instances=2))
+
+        expire = timeutils.utcnow() + datetime.timedelta(seconds=86400)
+        self.assertEqual(self.calls, [
+                'get_project_quotas',
+                ('quota_reserve_optimistic', expire, 0, 0),
+                ])
+        self.assertEqual(result, ['resv-1'])
+
     def test_reserve_int_expire(self):
         self._stub_get_project_quotas()
         self._stub_quota_reserve()
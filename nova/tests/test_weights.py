@@ -16,6 +16,8 @@
 Tests For weights.
 """
 
+import testtools
+
 from nova import test
 from nova import weights
 
@@ -51,3 +53,87 @@ class TestWeigher(test.NoDBTestCase):
         for seq, result, minval, maxval in map_:
             ret = weights.normalize(seq, minval=minval, maxval=maxval)
             self.assertEqual(tuple(ret), result)
+
+
+class TestWeighedObjectHeap(test.NoDBTestCase):
+    class FakeWeigher(weights.BaseWeigher):
+        def _weigh_object(self, obj, weight_properties):
+            return obj['weight']
+
+    class FakeWeightHandler(object):
+        object_class = weights.WeighedObject
+
+        def _get_columns(self, obj_list):
+            return None
+
+    def _get_heap(self, objs):
+        return weights.WeighedObjectHeap(self.FakeWeightHandler(),
+                                         [self.FakeWeigher], objs, {})
+
+    def test_pop_in_weight_order(self):
+        objs = [{'weight': 20.0}, {'weight': 50.0}, {'weight': 30.0},
+                {'weight': 50.0}]
+        heap = self._get_heap(objs)
+        self.assertEqual(4, len(heap))
+        popped = [heap.pop() for _i in xrange(4)]
+        self.assertEqual([objs[1], objs[3], objs[2], objs[0]],
+                         [weighed.obj for weighed in popped])
+        self.assertEqual([1.0, 1.0, 1.0 / 3, 0.0],
+                         [weighed.weight for weighed in popped])
+
+    def test_push_reweighs_against_initial_bounds(self):
+        objs = [{'weight': 20.0}, {'weight': 50.0}, {'weight': 30.0}]
+        heap = self._get_heap(objs)
+        best = heap.pop()
+        best.obj['weight'] = 10.0
+        heap.push(best)
+        self.assertEqual(-1.0 / 3, best.weight)
+        self.assertEqual(objs[2], heap.pop().obj)
+
+    def test_push_with_equal_initial_weights(self):
+        objs = [{'weight': 100.0}, {'weight': 100.0}]
+        heap = self._get_heap(objs)
+        best = heap.pop()
+        self.assertEqual(objs[0], best.obj)
+        best.obj['weight'] = 90.0
+        heap.push(best)
+        self.assertEqual(objs[1], heap.pop().obj)
+
+    def test_retain(self):
+        objs = [{'weight': 20.0}, {'weight': 50.0}, {'weight': 30.0}]
+        heap = self._get_heap(objs)
+        heap.retain(objs[:1])
+        self.assertEqual(objs[:1], heap.objects())
+
+
+@testtools.skipIf(weights.numpy is None, "NumPy is not installed")
+class TestArrayWeighing(test.NoDBTestCase):
+    def test_normalize_array(self):
+        # weight_list, expected_result, minval, maxval
+        map_ = (
+            ((), (), None, None),
+            ((0.0, 0.0), (0.0, 0.0), None, None),
+            ((1.0, 1.0), (0.0, 0.0), None, None),
+
+            ((20.0, 50.0), (0.0, 1.0), None, None),
+            ((20.0, 50.0), (0.0, 0.375), None, 100.0),
+            ((20.0, 50.0), (0.4, 1.0), 0.0, None),
+            ((20.0, 50.0), (0.2, 0.5), 0.0, 100.0),
+            # Preset bounds are widened like in weigh_objects()
+            ((-50.0, 50.0), (0.0, 1.0), 0.0, None),
+        )
+        for seq, result, minval, maxval in map_:
+            ret = weights.normalize_array(weights.numpy.array(seq),
+                                          minval=minval, maxval=maxval)
+            self.assertEqual(tuple(ret), result)
+
+    def test_top_indexes(self):
+        array = weights.numpy.array([1.0, 3.0, 2.0, 3.0, 0.0])
+        self.assertEqual([1, 3, 2, 0, 4],
+                         list(weights.top_indexes(array)))
+        self.assertEqual([1, 3], list(weights.top_indexes(array, 2)))
+        self.assertEqual([1], list(weights.top_indexes(array, 1)))
+
+    def test_top_indexes_keeps_order_of_ties_at_limit(self):
+        array = weights.numpy.array([2.0, 1.0, 1.0, 1.0, 3.0])
+        self.assertEqual([4, 0, 1], list(weights.top_indexes(array, 3)))
@@ -74,6 +74,11 @@ VIR_DOMAIN_CRASHED = 6
 
 VIR_DOMAIN_XML_SECURE = 1
 
+VIR_DOMAIN_STATS_STATE = 1
+VIR_DOMAIN_STATS_CPU_TOTAL = 2
+VIR_DOMAIN_STATS_BALLOON = 4
+VIR_DOMAIN_STATS_VCPU = 8
+
 VIR_DOMAIN_EVENT_ID_LIFECYCLE = 0
 
 VIR_DOMAIN_EVENT_DEFINED = 0
@@ -661,6 +666,25 @@ class Connection(object):
     def listDomainsID(self):
         return self._running_vms.keys()
 
+    def listAllDomains(self, flags):
+        return self._vms.values()
+
+    def getAllDomainStats(self, stats, flags=0):
+        records = []
+        for dom in self._vms.values():
+            record = {}
+            if stats & VIR_DOMAIN_STATS_STATE:
+                record['state.state'] = dom._state
+                record['state.reason'] = 0
+            if stats & VIR_DOMAIN_STATS_BALLOON:
+                record['balloon.current'] = long(dom._def['memory'])
+                record['balloon.maximum'] = long(dom._def['memory'])
+            if stats & VIR_DOMAIN_STATS_VCPU:
+                record['vcpu.current'] = dom._def['vcpu']
+                record['vcpu.maximum'] = dom._def['vcpu']
+            records.append((dom, record))
+        return records
+
     def lookupByID(self, id):
         if id in self._running_vms:
             return self._running_vms[id]
@@ -24,6 +24,7 @@ import os
 import re
 import shutil
 import tempfile
+import time
 
 from eventlet import greenthread
 from lxml import etree
@@ -36,6 +37,7 @@ from nova.compute import flavors
 from nova.compute import manager
 from nova.compute import power_state
 from nova.compute import task_states
+from nova.compute import utils as compute_utils
 from nova.compute import vm_mode
 from nova.compute import vm_states
 from nova import context
@@ -2792,6 +2794,92 @@ class LibvirtConnTestCase(test.TestCase,
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
         self.assertRaises(exception.NovaException, conn.list_instance_uuids)
 
+    def _fake_power_state_domains(self):
+        running = mock.Mock()
+        running.UUIDString.return_value = 'running-uuid'
+        running.info.return_value = [libvirt.VIR_DOMAIN_RUNNING]
+        paused = mock.Mock()
+        paused.UUIDString.return_value = 'paused-uuid'
+        paused.info.return_value = [libvirt.VIR_DOMAIN_PAUSED]
+        return running, paused
+
+    def _test_get_power_states(self, has_domain_stats):
+        running, paused = self._fake_power_state_domains()
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        instances = [{'uuid': 'running-uuid', 'name': 'running'},
+                     {'uuid': 'paused-uuid', 'name': 'paused'},
+                     {'uuid': 'gone-uuid', 'name': 'gone'}]
+
+        def fake_has_min_version(lv_ver=None, hv_ver=None, hv_type=None):
+            if lv_ver == libvirt_driver.MIN_LIBVIRT_DOMAIN_STATS_VERSION:
+                return has_domain_stats
+            return True
+
+        with contextlib.nested(
+                mock.patch.object(libvirt_driver.LibvirtDriver, '_conn'),
+                mock.patch.object(conn, '_has_min_version',
+                                  side_effect=fake_has_min_version),
+                mock.patch.object(conn, 'get_info')) as (
+                mock_conn, _mock_version, mock_get_info):
+            mock_conn.getAllDomainStats.return_value = [
+                (running, {'state.state': libvirt.VIR_DOMAIN_RUNNING}),
+                (paused, {'state.state': libvirt.VIR_DOMAIN_PAUSED})]
+            mock_conn.listAllDomains.return_value = [running, paused]
+            states = conn.get_power_states(instances)
+            self.assertFalse(mock_get_info.called)
+        self.assertEqual({'running-uuid': power_state.RUNNING,
+                          'paused-uuid': power_state.PAUSED,
+                          'gone-uuid': power_state.NOSTATE}, states)
+        return mock_conn
+
+    def test_get_power_states_domain_stats(self):
+        mock_conn = self._test_get_power_states(True)
+        mock_conn.getAllDomainStats.assert_called_once_with(
+            libvirt.VIR_DOMAIN_STATS_STATE)
+        self.assertFalse(mock_conn.listAllDomains.called)
+
+    def test_get_power_states_list_all_domains(self):
+        mock_conn = self._test_get_power_states(False)
+        mock_conn.listAllDomains.assert_called_once_with(0)
+        self.assertFalse(mock_conn.getAllDomainStats.called)
+
+    def test_get_power_states_list_all_domains_error(self):
+        running, paused = self._fake_power_state_domains()
+        paused.info.side_effect = fakelibvirt.make_libvirtError(
+            libvirt.libvirtError, 'Domain not found',
+            error_code=libvirt.VIR_ERR_NO_DOMAIN)
+        running.info.side_effect = fakelibvirt.make_libvirtError(
+            libvirt.libvirtError, 'Internal error',
+            error_code=libvirt.VIR_ERR_INTERNAL_ERROR)
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        instances = [{'uuid': 'running-uuid', 'name': 'running'},
+                     {'uuid': 'paused-uuid', 'name': 'paused'}]
+        with contextlib.nested(
+                mock.patch.object(libvirt_driver.LibvirtDriver, '_conn'),
+                mock.patch.object(conn, '_has_min_version',
+                                  side_effect=lambda lv_ver: lv_ver ==
+                                  libvirt_driver.
+                                  MIN_LIBVIRT_LIST_ALL_DOMAINS_VERSION)) as (
+                mock_conn, _mock_version):
+            mock_conn.listAllDomains.return_value = [running, paused]
+            states = conn.get_power_states(instances)
+        # The state of the running domain could not be read at all.
+        self.assertEqual({'paused-uuid': power_state.NOSTATE}, states)
+
+    def test_get_power_states_old_libvirt(self):
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        instance = {'uuid': 'running-uuid', 'name': 'running'}
+        with contextlib.nested(
+                mock.patch.object(conn, '_has_min_version',
+                                  return_value=False),
+                mock.patch.object(conn, 'get_info',
+                                  return_value={'state':
+                                                power_state.SHUTDOWN})) as (
+                _mock_version, mock_get_info):
+            states = conn.get_power_states([instance])
+        mock_get_info.assert_called_once_with(instance)
+        self.assertEqual({'running-uuid': power_state.SHUTDOWN}, states)
+
     def test_get_all_block_devices(self):
         xml = [
             # NOTE(vish): id 0 is skipped
@@ -5991,9 +6079,10 @@ class LibvirtConnTestCase(test.TestCase,
         # Ensure destroy calls managedSaveRemove for saved instance.
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
 
-        def list_instances():
-            return ['fake1', 'fake2']
-        self.stubs.Set(conn, 'list_instances', list_instances)
+        def get_domain_stats():
+            return [libvirt_driver.DomainStats('fake1'),
+                    libvirt_driver.DomainStats('fake2')]
+        self.stubs.Set(conn, '_get_domain_stats', get_domain_stats)
 
         fake_disks = {'fake1': [{'type': 'qcow2', 'path': '/somepath/disk1',
                                  'virt_disk_size': '10737418240',
@@ -6015,7 +6104,9 @@ class LibvirtConnTestCase(test.TestCase,
 
     def test_disk_over_committed_size_total_permission_denied(self):
         driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
-        driver.list_instances = mock.Mock(return_value=['fake1', 'fake2'])
+        driver._get_domain_stats = mock.Mock(
+            return_value=[libvirt_driver.DomainStats('fake1'),
+                          libvirt_driver.DomainStats('fake2')])
 
         fake_disks = {'fake1': [{'type': 'qcow2', 'path': '/somepath/disk1',
                                  'virt_disk_size': '10737418240',
@@ -6600,6 +6691,9 @@ class LibvirtConnTestCase(test.TestCase,
             def __init__(self, vcpus):
                 self._vcpus = vcpus
 
+            def name(self):
+                return 'fake-domain'
+
             def vcpus(self):
                 if self._vcpus is None:
                     raise libvirt.libvirtError("fake-error")
@@ -6628,6 +6722,9 @@ class LibvirtConnTestCase(test.TestCase,
             def __init__(self):
                 pass
 
+            def name(self):
+                return 'fake-domain'
+
             def vcpus(self):
                 return None
 
@@ -6642,6 +6739,114 @@ class LibvirtConnTestCase(test.TestCase,
         self.mox.ReplayAll()
         self.assertEqual(0, driver._get_vcpu_used())
 
+    def _fake_domain_stats_connection(self, num_domains, version):
+        """Return a fake libvirt connection running num_domains domains
+        of 2 vcpus and 512 MB each, and a stopped one.
+        """
+        conn = fakelibvirt.Connection('qemu:///system', version=version)
+        for i in range(num_domains + 1):
+            xml = ("<domain type='kvm'><name>instance-%08x</name>"
+                   "<memory>524288</memory><vcpu>2</vcpu>"
+                   "<os><type>hvm</type></os><devices/></domain>" % i)
+            if i < num_domains:
+                conn.createXML(xml, 0)
+            else:
+                conn.defineXML(xml)
+        return conn
+
+    def _test_get_domain_stats(self, version):
+        conn = self._fake_domain_stats_connection(3, version)
+        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        with mock.patch.object(libvirt_driver.LibvirtDriver, '_conn', conn):
+            domains = driver._get_domain_stats()
+            vcpus_used = driver._get_vcpu_used(domains)
+        self.assertEqual(4, len(domains))
+        self.assertEqual(['instance-00000000', 'instance-00000001',
+                          'instance-00000002', 'instance-00000003'],
+                         sorted(domain.name for domain in domains))
+        self.assertEqual(6, vcpus_used)
+        for domain in domains:
+            self.assertEqual(domain.name != 'instance-00000003',
+                             domain.active)
+            self.assertEqual(524288, domain.memory)
+            self.assertIsNotNone(domain.dom)
+
+    def test_get_domain_stats_bulk(self):
+        self._test_get_domain_stats(1002008)
+
+    def test_get_domain_stats_list_all_domains(self):
+        self._test_get_domain_stats(9013)
+
+    def test_get_memory_mb_used_xen(self):
+        self.flags(virt_type='xen', group='libvirt')
+        meminfo = ('MemTotal: 16194180 kB\n'
+                   'MemFree: 233092 kB\n'
+                   'Buffers: 8192 kB\n'
+                   'Cached: 8192 kB\n')
+        dom0 = libvirt_driver.DomainStats(None, id=0, memory=1024 * 1024)
+        domains = [dom0,
+                   libvirt_driver.DomainStats('fake1', id=1,
+                                              memory=512 * 1024),
+                   libvirt_driver.DomainStats('fake2', active=False,
+                                              memory=512 * 1024)]
+        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        with contextlib.nested(
+                mock.patch.object(libvirt_driver.sys, 'platform', 'linux2'),
+                mock.patch('__builtin__.open',
+                           mock.mock_open(read_data=meminfo), create=True),
+                mock.patch.object(driver, '_get_domain_stats')) as (
+                _mock_platform, _mock_open, mock_domain_stats):
+            # (dom0 - (free + buffers + cached) + fake1) KB in MB
+            self.assertEqual((1048576 - 249476 + 524288) / 1024,
+                             driver._get_memory_mb_used(domains))
+        self.assertFalse(mock_domain_stats.called)
+
+    def test_disk_over_committed_size_total_from_snapshot(self):
+        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        dom = mock.Mock()
+        dom.XMLDesc.return_value = '<domain/>'
+        domains = [libvirt_driver.DomainStats('fake1', dom=dom),
+                   libvirt_driver.DomainStats(None, id=0)]
+        disk_info = [{'over_committed_disk_size': '10653532160'}]
+        with contextlib.nested(
+                mock.patch.object(driver, '_get_instance_disk_info',
+                                  return_value=jsonutils.dumps(disk_info)),
+                mock.patch.object(driver, 'get_instance_disk_info')) as (
+                mock_disk_info, mock_lookup_disk_info):
+            result = driver._get_disk_over_committed_size_total(domains)
+        self.assertEqual(10653532160, result)
+        mock_disk_info.assert_called_once_with('fake1', '<domain/>')
+        self.assertFalse(mock_lookup_disk_info.called)
+
+    def test_host_stats_domain_stats_500_domains(self):
+        # The libvirt calls made by one update of the host stats must not
+        # grow with the number of domains.
+        conn = self._fake_domain_stats_connection(500, 1002008)
+        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        with contextlib.nested(
+                mock.patch.object(libvirt_driver.LibvirtDriver, '_conn',
+                                  conn),
+                mock.patch.object(conn, 'getAllDomainStats',
+                                  wraps=conn.getAllDomainStats),
+                mock.patch.object(conn, 'lookupByID',
+                                  side_effect=AssertionError),
+                mock.patch.object(conn, 'lookupByName',
+                                  side_effect=AssertionError),
+                mock.patch.object(driver, '_get_instance_disk_info',
+                                  return_value='[]')) as (
+                _mock_conn, mock_stats, _mock_by_id, _mock_by_name,
+                _mock_disk_info):
+            start = time.time()
+            domains = driver._get_domain_stats()
+            vcpus_used = driver._get_vcpu_used(domains)
+            disk_over_committed = driver._get_disk_over_committed_size_total(
+                domains)
+            elapsed = time.time() - start
+        self.assertEqual(1, mock_stats.call_count)
+        self.assertEqual(1000, vcpus_used)
+        self.assertEqual(0, disk_over_committed)
+        self.assertLess(elapsed, 5)
+
     def test_get_instance_capabilities(self):
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
 
@@ -7498,13 +7703,16 @@ class HostStateTestCase(test.TestCase):
         def _get_vcpu_total(self):
             return 1
 
-        def _get_vcpu_used(self):
+        def _get_domain_stats(self):
+            return []
+
+        def _get_vcpu_used(self, domains=None):
             return 0
 
         def _get_cpu_info(self):
             return HostStateTestCase.cpu_info
 
-        def _get_disk_over_committed_size_total(self):
+        def _get_disk_over_committed_size_total(self, domains=None):
             return 0
 
         def _get_local_gb_info(self):
@@ -7513,7 +7721,7 @@ class HostStateTestCase(test.TestCase):
         def _get_memory_mb_total(self):
             return 497
 
-        def _get_memory_mb_used(self):
+        def _get_memory_mb_used(self, domains=None):
             return 88
 
         def _get_hypervisor_type(self):
@@ -7884,6 +8092,187 @@ class IptablesFirewallTestCase(test.TestCase):
                                                    any_order=True)
             self.assertEqual(0, mock_filter.add_chain.call_count)
 
+    def test_instance_rules_share_security_group_rules(self):
+        admin_ctxt = context.get_admin_context()
+        secgroup = db.security_group_create(admin_ctxt,
+                                            {'user_id': 'fake',
+                                             'project_id': 'fake',
+                                             'name': 'testgroup',
+                                             'description': 'test group'})
+        db.security_group_rule_create(admin_ctxt,
+                                      {'parent_group_id': secgroup['id'],
+                                       'group_id': secgroup['id']})
+        instances = [self._create_instance_ref() for i in range(2)]
+        for instance in instances:
+            db.instance_add_security_group(admin_ctxt, instance['uuid'],
+                                           secgroup['id'])
+        network_info = _fake_network_info(self.stubs, 1)
+        self.stubs.Set(compute_utils, 'get_nw_info_for_instance',
+                       lambda instance: network_info)
+
+        get_by_security_group = objects.InstanceList.get_by_security_group
+        with mock.patch.object(objects.InstanceList, 'get_by_security_group',
+                               side_effect=get_by_security_group) as get:
+            rules = [self.fw.instance_rules(instance, network_info)
+                     for instance in instances]
+            self.assertEqual(1, get.call_count)
+            self.assertEqual(rules[0], rules[1])
+
+            self.fw.do_refresh_security_group_rules(secgroup['id'])
+            self.fw.instance_rules(instances[0], network_info)
+            self.assertEqual(2, get.call_count)
+
+    def test_invalidate_security_group_forgets_granting_groups(self):
+        self.fw._security_group_rules = {1: ([], [], set([2]), set()),
+                                         3: ([], [], set([4]), set())}
+        self.fw._security_group_members = {2: {}, 4: {}}
+        self.fw.invalidate_security_group(2)
+        self.assertEqual([3], self.fw._security_group_rules.keys())
+        self.assertEqual([4], self.fw._security_group_members.keys())
+
+    def test_do_refresh_instance_rules_forgets_instance_groups(self):
+        instance = {'id': 1, 'uuid': 'fake-uuid1'}
+        self.fw.instance_info = {1: (instance, 'netinfo1')}
+        self.fw._security_group_rules = {1: ([], [], set([2]), set()),
+                                         3: ([], [], set([4]), set())}
+        self.fw._security_group_grantees = {1: set([2]), 3: set([4])}
+        self.fw._security_group_members = {2: {}, 4: {}}
+        with contextlib.nested(
+                mock.patch.object(objects.SecurityGroupList,
+                                  'get_by_instance',
+                                  return_value=[{'id': 1}]),
+                mock.patch.object(self.fw, 'instance_rules',
+                                  return_value=(None, None)),
+                mock.patch.object(self.fw, '_inner_do_refresh_rules')):
+            self.fw.do_refresh_instance_rules(instance)
+        self.assertEqual([3], self.fw._security_group_rules.keys())
+        self.assertEqual([4], self.fw._security_group_members.keys())
+
+    def test_refresh_instance_security_rules_load_groups_once(self):
+        admin_ctxt = context.get_admin_context()
+        secgroup = db.security_group_create(admin_ctxt,
+                                            {'user_id': 'fake',
+                                             'project_id': 'fake',
+                                             'name': 'testgroup',
+                                             'description': 'test group'})
+        db.security_group_rule_create(admin_ctxt,
+                                      {'parent_group_id': secgroup['id'],
+                                       'group_id': secgroup['id']})
+        instances = [self._create_instance_ref() for i in range(3)]
+        for instance in instances:
+            db.instance_add_security_group(admin_ctxt, instance['uuid'],
+                                           secgroup['id'])
+        network_info = _fake_network_info(self.stubs, 1)
+        self.stubs.Set(compute_utils, 'get_nw_info_for_instance',
+                       lambda instance: network_info)
+        for instance in instances:
+            self.fw.instance_info[instance['id']] = (instance, network_info)
+            self.fw.instance_rules(instance, network_info)
+
+        # A member joining the group sends a refresh for each instance of
+        # the group.
+        get_rules = objects.SecurityGroupRuleList.get_by_security_group
+        get_members = objects.InstanceList.get_by_security_group
+        with contextlib.nested(
+                mock.patch.object(objects.SecurityGroupRuleList,
+                                  'get_by_security_group',
+                                  side_effect=get_rules),
+                mock.patch.object(objects.InstanceList,
+                                  'get_by_security_group',
+                                  side_effect=get_members),
+                mock.patch.object(self.fw, '_inner_do_refresh_rules'),
+                mock.patch.object(self.fw.iptables, 'apply'),
+        ) as (rules_get, members_get, inner_refresh, apply):
+            pool = eventlet.GreenPool()
+            for instance in instances:
+                pool.spawn(self.fw.refresh_instance_security_rules, instance)
+            pool.waitall()
+        self.assertEqual(1, rules_get.call_count)
+        self.assertEqual(1, members_get.call_count)
+        self.assertEqual(3, inner_refresh.call_count)
+        self.assertEqual(1, apply.call_count)
+
+    def _create_ipset_group(self, member_ips):
+        self.flags(use_ipset=True)
+        admin_ctxt = context.get_admin_context()
+        secgroup = db.security_group_create(admin_ctxt,
+                                            {'user_id': 'fake',
+                                             'project_id': 'fake',
+                                             'name': 'testgroup',
+                                             'description': 'test group'})
+        db.security_group_rule_create(admin_ctxt,
+                                      {'parent_group_id': secgroup['id'],
+                                       'protocol': 'tcp',
+                                       'from_port': 22,
+                                       'to_port': 22,
+                                       'group_id': secgroup['id']})
+        instance_ref = self._create_instance_ref()
+        db.instance_add_security_group(admin_ctxt, instance_ref['uuid'],
+                                       secgroup['id'])
+
+        def fake_get_nw_info_for_instance(instance):
+            return network_model.NetworkInfo([network_model.VIF(
+                network=network_model.Network(subnets=[network_model.Subnet(
+                    ips=[network_model.FixedIP(address=ip)
+                         for ip in member_ips])]))])
+
+        self.stubs.Set(compute_utils, 'get_nw_info_for_instance',
+                       fake_get_nw_info_for_instance)
+        self.ipset_executes = []
+
+        def fake_execute(*cmd, **kwargs):
+            self.ipset_executes.append(cmd)
+            return '', ''
+
+        self.fw.ipset.execute = fake_execute
+        return secgroup, instance_ref
+
+    def test_instance_rules_with_ipset(self):
+        secgroup, instance_ref = self._create_ipset_group(['10.0.0.5'])
+        network_info = _fake_network_info(self.stubs, 1)
+
+        ipv4_rules, ipv6_rules = self.fw.instance_rules(instance_ref,
+                                                        network_info)
+
+        name = 'nova-sg%s-v4' % secgroup['id']
+        self.assertIn('-j ACCEPT -p tcp --dport 22 -m set --match-set %s '
+                      'src' % name, ipv4_rules)
+        self.assertEqual([], [rule for rule in ipv4_rules
+                              if '10.0.0.5' in rule])
+        self.assertEqual([('ipset', 'restore', '-exist')],
+                         self.ipset_executes)
+        self.assertEqual({name: set(['10.0.0.5'])}, self.fw.ipset.sets)
+
+    def test_refresh_members_with_ipset_only_updates_ipset(self):
+        member_ips = ['10.0.0.5']
+        secgroup, instance_ref = self._create_ipset_group(member_ips)
+        network_info = _fake_network_info(self.stubs, 1)
+        iptables_executes = []
+
+        def fake_iptables_execute(*cmd, **kwargs):
+            iptables_executes.append(cmd)
+            return '', ''
+
+        self.stubs.Set(self.fw.iptables, 'execute', fake_iptables_execute)
+        self.fw.prepare_instance_filter(instance_ref, network_info)
+        self.ipset_executes = []
+        iptables_executes[:] = []
+
+        member_ips[:] = ['10.0.0.6']
+        self.fw.refresh_security_group_members(secgroup['id'])
+
+        name = 'nova-sg%s-v4' % secgroup['id']
+        self.assertEqual([('ipset', 'del', name, '10.0.0.5', '-exist'),
+                          ('ipset', 'add', name, '10.0.0.6', '-exist')],
+                         self.ipset_executes)
+        self.assertEqual([], iptables_executes)
+
+        self.stubs.Set(self.fw.nwfilter, 'unfilter_instance',
+                       lambda instance, network_info: None)
+        self.fw.unfilter_instance(instance_ref, network_info)
+        self.assertEqual(('ipset', 'destroy', name),
+                         self.ipset_executes[-1])
+
     def test_unfilter_instance_undefines_nwfilter(self):
         admin_ctxt = context.get_admin_context()
 
@@ -22,6 +22,7 @@ import netaddr
 import six
 
 from nova.compute import manager
+from nova.compute import power_state
 from nova import exception
 from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
@@ -485,6 +486,15 @@ class _VirtDriverTestCase(_FakeDriverBackendTestCase):
                           self.connection.get_info,
                           {'name': 'I just made this name up'})
 
+    @catch_notimplementederror
+    def test_get_power_states(self):
+        instance_ref, network_info = self._get_running_instance()
+        unknown = {'uuid': 'I just made this uuid up',
+                   'name': 'I just made this name up'}
+        states = self.connection.get_power_states([instance_ref, unknown])
+        self.assertEqual({instance_ref['uuid']: power_state.RUNNING,
+                          unknown['uuid']: power_state.NOSTATE}, states)
+
     @catch_notimplementederror
     def test_get_diagnostics(self):
         instance_ref, network_info = self._get_running_instance(obj=True)
@@ -24,6 +24,8 @@ import sys
 
 from oslo.config import cfg
 
+from nova.compute import power_state
+from nova import exception
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import importutils
 from nova.openstack.common import log as logging
@@ -186,6 +188,35 @@ class ComputeDriver(object):
         """
         return len(self.list_instances())
 
+    def get_power_states(self, instances):
+        """Return the power state of a set of instances.
+
+        :param instances: nova.objects.instance.Instance objects
+
+        Returns a dict of instance uuid to one of the power_state codes.
+        Instances the hypervisor does not know about are reported as
+        NOSTATE; instances whose state could not be read are left out.
+
+        .. note::
+
+            This implementation works for all drivers, but it is
+            not particularly efficient. Maintainers of the virt drivers are
+            encouraged to override this method with something more
+            efficient.
+        """
+        states = {}
+        for instance in instances:
+            try:
+                states[instance['uuid']] = self.get_info(instance)['state']
+            except exception.InstanceNotFound:
+                states[instance['uuid']] = power_state.NOSTATE
+            except NotImplementedError:
+                raise
+            except Exception:
+                LOG.exception(_("Error reading the power state of the "
+                                "instance"), instance=instance)
+        return states
+
     def instance_exists(self, instance):
         """Checks existence of an instance on the host.
 
@@ -15,6 +15,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from eventlet import greenthread
 from oslo.config import cfg
 
 from nova.compute import utils as compute_utils
@@ -39,6 +40,14 @@ firewall_opts = [
     cfg.BoolOpt('allow_same_net_traffic',
                 default=True,
                 help='Whether to allow network traffic from same network'),
+    cfg.BoolOpt('use_ipset',
+                default=False,
+                help='Whether to match the members of a security group that '
+                     'a rule grants access to with an ipset, and a single '
+                     'iptables rule, instead of one iptables rule per '
+                     'member. Membership changes then only update the '
+                     'ipset. Needs the ipset tool on the compute host, so '
+                     'it does not work with XenAPI.'),
 ]
 
 CONF = cfg.CONF
@@ -143,9 +152,27 @@ class IptablesFirewallDriver(FirewallDriver):
     def __init__(self, virtapi, **kwargs):
         super(IptablesFirewallDriver, self).__init__(virtapi)
         self.iptables = linux_net.iptables_manager
+        self.ipset = linux_net.IpsetManager()
         self.instance_info = {}
         self.basically_filtered = False
 
+        # The rendered rules of the security groups of the instances of
+        # this host, and the fixed IPs of the members of the groups these
+        # rules grant access to. They are shared by the instances until a
+        # refresh says they changed.
+        self._security_group_rules = {}
+        self._security_group_members = {}
+        # The groups the rules of each group last granted access to, kept
+        # after the rules are forgotten to know which members to forget.
+        self._security_group_grantees = {}
+
+        # The instances whose rules a refresh was requested for.
+        self._instances_to_refresh = {}
+
+        # The rules in the chain of each instance, and the ipsets they use.
+        self._instance_rules = {}
+        self._instance_ipsets = {}
+
         # Flags for DHCP request rule
         self.dhcp_create = False
         self.dhcp_created = False
@@ -171,7 +198,9 @@ class IptablesFirewallDriver(FirewallDriver):
     def unfilter_instance(self, instance, network_info):
         if self.instance_info.pop(instance['id'], None):
             self.remove_filters_for_instance(instance)
+            self.clear_security_group_cache()
             self.iptables.apply()
+            self.destroy_unused_ipsets(instance)
         else:
             LOG.info(_('Attempted to unfilter instance which is not '
                      'filtered'), instance=instance)
@@ -247,9 +276,12 @@ class IptablesFirewallDriver(FirewallDriver):
                                                             network_info)
         self._add_filters('local', ipv4_rules, ipv6_rules)
         self._add_filters(chain_name, inst_ipv4_rules, inst_ipv6_rules)
+        self._instance_rules[instance['id']] = (inst_ipv4_rules,
+                                                inst_ipv6_rules)
 
     def remove_filters_for_instance(self, instance):
         chain_name = self._instance_chain_name(instance)
+        self._instance_rules.pop(instance['id'], None)
 
         self.iptables.ipv4['filter'].remove_chain(chain_name)
         if CONF.use_ipv6:
@@ -359,71 +391,167 @@ class IptablesFirewallDriver(FirewallDriver):
             ctxt, instance)
 
         # then, security group chains and rules
+        ipsets = set()
         for security_group in security_groups:
-            rules_cls = security_group_rule_obj.SecurityGroupRuleList
-            rules = rules_cls.get_by_security_group(ctxt, security_group)
+            group_rules = self._get_security_group_rules(ctxt, security_group)
+            ipv4_rules += group_rules[0]
+            ipv6_rules += group_rules[1]
+            ipsets |= group_rules[3]
+        if CONF.use_ipset:
+            self._instance_ipsets[instance['id']] = ipsets
 
-            for rule in rules:
-                LOG.debug('Adding security group rule: %r', rule,
-                          instance=instance)
+        ipv4_rules += ['-j $sg-fallback']
+        ipv6_rules += ['-j $sg-fallback']
 
-                if not rule['cidr']:
-                    version = 4
-                else:
-                    version = netutils.get_ip_version(rule['cidr'])
+        return ipv4_rules, ipv6_rules
 
-                if version == 4:
-                    fw_rules = ipv4_rules
-                else:
-                    fw_rules = ipv6_rules
+    def _get_security_group_rules(self, ctxt, security_group):
+        """Return the IPv4 and IPv6 rules of a security group, the ids of
+        the groups they grant access to and the ipsets they use.
+        """
+        cached = self._security_group_rules.get(security_group['id'])
+        if cached is not None:
+            return cached
 
-                protocol = rule['protocol']
+        ipv4_rules = []
+        ipv6_rules = []
+        grantee_ids = set()
+        ipsets = set()
+        rules_cls = security_group_rule_obj.SecurityGroupRuleList
+        rules = rules_cls.get_by_security_group(ctxt, security_group)
 
-                if protocol:
-                    protocol = rule['protocol'].lower()
+        for rule in rules:
+            LOG.debug('Adding security group rule: %r', rule)
 
-                if version == 6 and protocol == 'icmp':
-                    protocol = 'icmpv6'
+            if not rule['cidr']:
+                version = 4
+            else:
+                version = netutils.get_ip_version(rule['cidr'])
 
-                args = ['-j ACCEPT']
-                if protocol:
-                    args += ['-p', protocol]
+            if version == 4:
+                fw_rules = ipv4_rules
+            else:
+                fw_rules = ipv6_rules
 
-                if protocol in ['udp', 'tcp']:
-                    args += self._build_tcp_udp_rule(rule, version)
-                elif protocol == 'icmp':
-                    args += self._build_icmp_rule(rule, version)
-                if rule['cidr']:
-                    LOG.debug('Using cidr %r', rule['cidr'], instance=instance)
-                    args += ['-s', str(rule['cidr'])]
-                    fw_rules += [' '.join(args)]
-                else:
-                    if rule['grantee_group']:
-                        insts = (
-                            objects.InstanceList.get_by_security_group(
-                                ctxt, rule['grantee_group']))
-                        for instance in insts:
-                            if instance['info_cache']['deleted']:
-                                LOG.debug('ignoring deleted cache')
-                                continue
-                            nw_info = compute_utils.get_nw_info_for_instance(
-                                    instance)
-
-                            ips = [ip['address']
-                                for ip in nw_info.fixed_ips()
-                                    if ip['version'] == version]
-
-                            LOG.debug('ips: %r', ips, instance=instance)
-                            for ip in ips:
-                                subrule = args + ['-s %s' % ip]
-                                fw_rules += [' '.join(subrule)]
-
-                LOG.debug('Using fw_rules: %r', fw_rules, instance=instance)
+            protocol = rule['protocol']
 
-        ipv4_rules += ['-j $sg-fallback']
-        ipv6_rules += ['-j $sg-fallback']
+            if protocol:
+                protocol = rule['protocol'].lower()
 
-        return ipv4_rules, ipv6_rules
+            if version == 6 and protocol == 'icmp':
+                protocol = 'icmpv6'
+
+            args = ['-j ACCEPT']
+            if protocol:
+                args += ['-p', protocol]
+
+            if protocol in ['udp', 'tcp']:
+                args += self._build_tcp_udp_rule(rule, version)
+            elif protocol == 'icmp':
+                args += self._build_icmp_rule(rule, version)
+            if rule['cidr']:
+                LOG.debug('Using cidr %r', rule['cidr'])
+                args += ['-s', str(rule['cidr'])]
+                fw_rules += [' '.join(args)]
+            else:
+                if rule['grantee_group']:
+                    grantee_ids.add(rule['grantee_group']['id'])
+                    ips = self._get_security_group_member_ips(
+                        ctxt, rule['grantee_group'])
+                    if CONF.use_ipset:
+                        name = self._sync_ipset(rule['grantee_group'],
+                                                version, ips.get(version, []))
+                        ipsets.add(name)
+                        subrule = args + ['-m set --match-set %s src' % name]
+                        fw_rules += [' '.join(subrule)]
+                    else:
+                        for ip in ips.get(version, []):
+                            subrule = args + ['-s %s' % ip]
+                            fw_rules += [' '.join(subrule)]
+
+            LOG.debug('Using fw_rules: %r', fw_rules)
+
+        cached = (ipv4_rules, ipv6_rules, grantee_ids, ipsets)
+        self._security_group_rules[security_group['id']] = cached
+        self._security_group_grantees[security_group['id']] = grantee_ids
+        return cached
+
+    def _get_security_group_member_ips(self, ctxt, security_group):
+        """Return the fixed IPs of the members of a security group, by IP
+        version.
+        """
+        ips = self._security_group_members.get(security_group['id'])
+        if ips is not None:
+            return ips
+
+        ips = {}
+        insts = objects.InstanceList.get_by_security_group(ctxt,
+                                                           security_group)
+        for instance in insts:
+            if instance['info_cache']['deleted']:
+                LOG.debug('ignoring deleted cache')
+                continue
+            nw_info = compute_utils.get_nw_info_for_instance(instance)
+            for ip in nw_info.fixed_ips():
+                ips.setdefault(ip['version'], []).append(ip['address'])
+            LOG.debug('ips: %r', [ip['address'] for ip in nw_info.fixed_ips()],
+                      instance=instance)
+
+        self._security_group_members[security_group['id']] = ips
+        return ips
+
+    def _sync_ipset(self, security_group, version, ips):
+        """Make the ipset of a security group hold the IPs of its members,
+        and return its name.
+        """
+        name = 'nova-sg%s-v%d' % (security_group['id'], version)
+        family = 'inet' if version == 4 else 'inet6'
+        self.ipset.set_members(name, ips, family=family)
+        return name
+
+    def destroy_unused_ipsets(self, instance):
+        """Destroy the ipsets only used by an instance no longer filtered.
+
+        The rules of the instance must have been removed from iptables.
+        """
+        names = self._instance_ipsets.pop(instance['id'], set())
+        for other_names in self._instance_ipsets.values():
+            names -= other_names
+        for name in sorted(names):
+            self.ipset.destroy_set(name)
+
+    def invalidate_security_group(self, security_group_id):
+        """Forget the rules of a security group, its members, and the rules
+        of the groups granting it access.
+        """
+        self._security_group_rules.pop(security_group_id, None)
+        self._security_group_members.pop(security_group_id, None)
+        for group_id, cached in self._security_group_rules.items():
+            if security_group_id in cached[2]:
+                del self._security_group_rules[group_id]
+
+    def forget_security_groups(self, security_group_ids):
+        """Forget the rules of security groups and the members of the
+        groups they grant access to.
+        """
+        for group_id in security_group_ids:
+            self._security_group_rules.pop(group_id, None)
+            for grantee_id in self._security_group_grantees.get(group_id, ()):
+                self._security_group_members.pop(grantee_id, None)
+        # Members of groups no rule grants access to anymore are not
+        # refreshed either.
+        granted = set()
+        for grantee_ids in self._security_group_grantees.values():
+            granted |= grantee_ids
+        for group_id in self._security_group_members.keys():
+            if group_id not in granted:
+                del self._security_group_members[group_id]
+
+    def clear_security_group_cache(self):
+        """Forget the rules and the members of every security group."""
+        self._security_group_rules.clear()
+        self._security_group_members.clear()
+        self._security_group_grantees.clear()
 
     def instance_filter_exists(self, instance, network_info):
         pass
@@ -437,8 +565,17 @@ class IptablesFirewallDriver(FirewallDriver):
         self.iptables.apply()
 
     def refresh_instance_security_rules(self, instance):
-        self.do_refresh_instance_rules(instance)
-        self.iptables.apply()
+        self._instances_to_refresh[instance['id']] = instance
+        # NOTE: A change of the rules or the members of a group is sent as
+        # a refresh of every instance it affects. Yielding first lets the
+        # refreshes received meanwhile be done at once, loading the rules
+        # and the members of the groups of the instances only once.
+        greenthread.sleep(0)
+        instances = self._instances_to_refresh.values()
+        self._instances_to_refresh.clear()
+        if instances:
+            self.do_refresh_instances_rules(instances)
+            self.iptables.apply()
 
     @utils.synchronized('iptables', external=True)
     def _inner_do_refresh_rules(self, instance, network_info, ipv4_rules,
@@ -450,11 +587,21 @@ class IptablesFirewallDriver(FirewallDriver):
                     'skipping') % chain_name,
                 instance=instance)
             return
+        if self._instance_rules.get(instance['id']) == (ipv4_rules,
+                                                        ipv6_rules):
+            # Such as when only the members of an ipset changed.
+            LOG.debug('Rules of instance chain %s unchanged', chain_name,
+                      instance=instance)
+            return
         self.remove_filters_for_instance(instance)
         self.add_filters_for_instance(instance, network_info, ipv4_rules,
                                       ipv6_rules)
 
     def do_refresh_security_group_rules(self, security_group):
+        # NOTE: Adding an instance to a security group or removing it
+        # refreshes the rules of the group, so its members and the groups
+        # granting it access are forgotten too.
+        self.invalidate_security_group(security_group)
         id_list = self.instance_info.keys()
         for instance_id in id_list:
             try:
@@ -469,10 +616,28 @@ class IptablesFirewallDriver(FirewallDriver):
                                          ipv6_rules)
 
     def do_refresh_instance_rules(self, instance):
-        _instance, network_info = self.instance_info[instance['id']]
-        ipv4_rules, ipv6_rules = self.instance_rules(instance, network_info)
-        self._inner_do_refresh_rules(instance, network_info, ipv4_rules,
-                                     ipv6_rules)
+        self.do_refresh_instances_rules([instance])
+
+    def do_refresh_instances_rules(self, instances):
+        # The rules of any group of the instances, or the members of any
+        # group they grant access to, may have changed.
+        ctxt = context.get_admin_context()
+        group_ids = set()
+        for instance in instances:
+            groups = security_group_obj.SecurityGroupList.get_by_instance(
+                ctxt, objects.Instance(uuid=instance['uuid']))
+            group_ids.update(group['id'] for group in groups)
+        self.forget_security_groups(group_ids)
+        for instance in instances:
+            try:
+                _instance, network_info = self.instance_info[instance['id']]
+            except KeyError:
+                # The instance was unfiltered since the refresh was asked.
+                continue
+            ipv4_rules, ipv6_rules = self.instance_rules(instance,
+                                                         network_info)
+            self._inner_do_refresh_rules(instance, network_info, ipv4_rules,
+                                         ipv6_rules)
 
     def refresh_provider_fw_rules(self):
         """See :class:`FirewallDriver` docs."""
@@ -302,6 +302,9 @@ MIN_QEMU_LIVESNAPSHOT_VERSION = (1, 3, 0)
 MIN_LIBVIRT_BLOCKIO_VERSION = (0, 10, 2)
 # BlockJobInfo management requirement
 MIN_LIBVIRT_BLOCKJOBINFO_VERSION = (1, 1, 1)
+# Bulk domain listing and statistics
+MIN_LIBVIRT_LIST_ALL_DOMAINS_VERSION = (0, 9, 13)
+MIN_LIBVIRT_DOMAIN_STATS_VERSION = (1, 2, 8)
 
 
 def libvirt_error_handler(context, err):
@@ -760,6 +763,43 @@ class LibvirtDriver(driver.ComputeDriver):
         """Efficient override of base get_num_instances method."""
         return self._conn.numOfDomains()
 
+    def get_power_states(self, instances):
+        """Efficient override of base get_power_states method.
+
+        Reads the state of every domain in one call to libvirt instead of
+        looking each instance up by name.
+        """
+        if self._has_min_version(MIN_LIBVIRT_DOMAIN_STATS_VERSION):
+            domain_states = {}
+            for dom, stats in self._conn.getAllDomainStats(
+                    libvirt.VIR_DOMAIN_STATS_STATE):
+                domain_states[dom.UUIDString()] = stats['state.state']
+        elif self._has_min_version(MIN_LIBVIRT_LIST_ALL_DOMAINS_VERSION):
+            domain_states = {}
+            for dom in self._conn.listAllDomains(0):
+                uuid = dom.UUIDString()
+                try:
+                    domain_states[uuid] = dom.info()[0]
+                except libvirt.libvirtError as ex:
+                    # A domain that went away since it was listed is
+                    # reported as NOSTATE, any other error leaves it out.
+                    if ex.get_error_code() != libvirt.VIR_ERR_NO_DOMAIN:
+                        LOG.warn(_LW("Error from libvirt while reading the "
+                                     "state of domain %(uuid)s: %(ex)s"),
+                                 {'uuid': uuid, 'ex': ex})
+                        domain_states[uuid] = None
+        else:
+            return super(LibvirtDriver, self).get_power_states(instances)
+
+        states = {}
+        for instance in instances:
+            uuid = instance['uuid']
+            if uuid not in domain_states:
+                states[uuid] = power_state.NOSTATE
+            elif domain_states[uuid] is not None:
+                states[uuid] = LIBVIRT_POWER_STATE[domain_states[uuid]]
+        return states
+
     def instance_exists(self, instance):
         """Efficient override of base instance_exists method."""
         try:
@@ -3799,42 +3839,117 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return info
 
-    def _get_vcpu_used(self):
-        """Get vcpu usage number of physical computer.
-
-        :returns: The total number of vcpu(s) that are currently being used.
+    def _get_domain_stats(self):
+        """Take a snapshot of the resource usage of every domain.
 
-        """
+        With a recent enough libvirt the snapshot costs a single call, so
+        it is taken once per update of the host stats and shared by the
+        vcpu, memory and disk accounting.
 
-        total = 0
-        if CONF.libvirt.virt_type == 'lxc':
-            return total + 1
+        :returns: a list of DomainStats
 
-        dom_ids = self._list_instance_ids()
-        for dom_id in dom_ids:
+        """
+        if self._has_min_version(MIN_LIBVIRT_DOMAIN_STATS_VERSION):
+            return self._get_domain_stats_bulk()
+        elif self._has_min_version(MIN_LIBVIRT_LIST_ALL_DOMAINS_VERSION):
+            return self._get_domain_stats_list_all()
+        return self._get_domain_stats_by_id()
+
+    def _get_domain_stats_bulk(self):
+        domains = []
+        for dom, stats in self._conn.getAllDomainStats(
+                libvirt.VIR_DOMAIN_STATS_STATE |
+                libvirt.VIR_DOMAIN_STATS_VCPU |
+                libvirt.VIR_DOMAIN_STATS_BALLOON):
+            dom_id = dom.ID()
+            domains.append(DomainStats(
+                dom.name() if dom_id != 0 else None, dom=dom, id=dom_id,
+                active=stats.get('state.state') != libvirt.VIR_DOMAIN_SHUTOFF,
+                vcpus=stats.get('vcpu.current', 0),
+                memory=stats.get('balloon.current', 0)))
+        return domains
+
+    def _get_domain_stats_list_all(self):
+        domains = []
+        for dom in self._conn.listAllDomains(0):
+            try:
+                dom_info = dom.info()
+            except libvirt.libvirtError as ex:
+                if ex.get_error_code() != libvirt.VIR_ERR_NO_DOMAIN:
+                    LOG.warn(_LW("couldn't obtain the info of domain "
+                                 "%(name)s, exception: %(ex)s"),
+                             {"name": dom.name(), "ex": ex})
+                continue
+            dom_id = dom.ID()
+            domains.append(DomainStats(
+                dom.name() if dom_id != 0 else None, dom=dom, id=dom_id,
+                active=dom_info[0] != libvirt.VIR_DOMAIN_SHUTOFF,
+                vcpus=dom_info[3], memory=dom_info[2]))
+        return domains
+
+    def _get_domain_stats_by_id(self):
+        """Fallback for libvirt versions without bulk domain listing,
+        which looks every running domain up by id.
+        """
+        domains = []
+        for dom_id in self._list_instance_ids():
             try:
                 dom = self._lookup_by_id(dom_id)
+                vcpus = 0
                 try:
-                    vcpus = dom.vcpus()
+                    dom_vcpus = dom.vcpus()
                 except libvirt.libvirtError as e:
                     LOG.warn(_LW("couldn't obtain the vpu count from "
                                  "domain id: %(id)s, exception: %(ex)s"),
                              {"id": dom_id, "ex": e})
                 else:
-                    if vcpus is not None and len(vcpus) > 1:
-                        total += len(vcpus[1])
-
+                    if dom_vcpus is not None and len(dom_vcpus) > 1:
+                        vcpus = len(dom_vcpus[1])
+                memory = 0
+                if CONF.libvirt.virt_type == 'xen':
+                    memory = int(dom.info()[2])
+                # We skip the name of the domain with ID 0 (hypervisor).
+                domains.append(DomainStats(
+                    dom.name() if dom_id != 0 else None, id=dom_id,
+                    vcpus=vcpus, memory=memory))
             except exception.InstanceNotFound:
                 LOG.info(_LI("libvirt can't find a domain with id: %s"),
                          dom_id)
                 continue
             # NOTE(gtt116): give change to do other task.
             greenthread.sleep(0)
+
+        names = set(domain.name for domain in domains)
+        for name in self._conn.listDefinedDomains():
+            if name not in names:
+                domains.append(DomainStats(name, active=False))
+        return domains
+
+    def _get_vcpu_used(self, domains=None):
+        """Get vcpu usage number of physical computer.
+
+        :param domains: a snapshot from _get_domain_stats(), taken if not
+                        given
+        :returns: The total number of vcpu(s) that are currently being used.
+
+        """
+
+        total = 0
+        if CONF.libvirt.virt_type == 'lxc':
+            return total + 1
+
+        if domains is None:
+            domains = self._get_domain_stats()
+        for domain in domains:
+            if domain.active:
+                total += domain.vcpus
         return total
 
-    def _get_memory_mb_used(self):
+    def _get_memory_mb_used(self, domains=None):
         """Get the used memory size(MB) of physical computer.
 
+        :param domains: a snapshot from _get_domain_stats(), taken if
+                        needed and not given
         :returns: the total usage of memory(MB).
 
         """
@@ -3848,21 +3963,19 @@ class LibvirtDriver(driver.ComputeDriver):
         idx2 = m.index('Buffers:')
         idx3 = m.index('Cached:')
         if CONF.libvirt.virt_type == 'xen':
+            if domains is None:
+                domains = self._get_domain_stats()
             used = 0
-            for domain_id in self._list_instance_ids():
-                try:
-                    dom_mem = int(self._lookup_by_id(domain_id).info()[2])
-                except exception.InstanceNotFound:
-                    LOG.info(_LI("libvirt can't find a domain with id: %s"),
-                             domain_id)
+            for domain in domains:
+                if not domain.active:
                     continue
                 # skip dom0
-                if domain_id != 0:
-                    used += dom_mem
+                if domain.id != 0:
+                    used += domain.memory
                 else:
                     # the mem reported by dom0 is be greater of what
                     # it is being used
-                    used += (dom_mem -
+                    used += (domain.memory -
                              (int(m[idx1 + 1]) +
                               int(m[idx2 + 1]) +
                               int(m[idx3 + 1])))
@@ -4773,15 +4886,28 @@ class LibvirtDriver(driver.ComputeDriver):
         return self._get_instance_disk_info(instance_name, xml,
                                             block_device_info)
 
-    def _get_disk_over_committed_size_total(self):
-        """Return total over committed disk size for all instances."""
+    def _get_disk_over_committed_size_total(self, domains=None):
+        """Return total over committed disk size for all instances.
+
+        :param domains: a snapshot from _get_domain_stats(), taken if not
+                        given
+        """
         # Disk size that all instance uses : virtual_size - disk_size
-        instances_name = self.list_instances()
+        if domains is None:
+            domains = self._get_domain_stats()
         disk_over_committed_size = 0
-        for i_name in instances_name:
+        for domain in domains:
+            i_name = domain.name
+            if i_name is None:
+                continue
             try:
-                disk_infos = jsonutils.loads(
-                        self.get_instance_disk_info(i_name))
+                if domain.dom is not None:
+                    # Already listed, no need to look it up again.
+                    disk_info = self._get_instance_disk_info(
+                        i_name, domain.dom.XMLDesc(0))
+                else:
+                    disk_info = self.get_instance_disk_info(i_name)
+                disk_infos = jsonutils.loads(disk_info)
                 for info in disk_infos:
                     disk_over_committed_size += int(
                         info['over_committed_disk_size'])
@@ -4804,6 +4930,10 @@ class LibvirtDriver(driver.ComputeDriver):
             except exception.InstanceNotFound:
                 # Instance was deleted during the check so ignore it
                 pass
+            except libvirt.libvirtError as ex:
+                # Domain was deleted since the snapshot so ignore it
+                if ex.get_error_code() != libvirt.VIR_ERR_NO_DOMAIN:
+                    raise
             # NOTE(gtt116): give change to do other task.
             greenthread.sleep(0)
         return disk_over_committed_size
@@ -5250,6 +5380,27 @@ class LibvirtDriver(driver.ComputeDriver):
                                        block_device_mapping)
 
 
+class DomainStats(object):
+    """Resource usage of a libvirt domain, as read in one snapshot.
+
+    :name:    the name of the domain, None for the xen dom0
+    :dom:     the libvirt domain, if it was listed rather than looked up
+    :id:      the id of the domain, -1 if it is not running
+    :active:  whether the domain is running
+    :vcpus:   the number of vcpus in use
+    :memory:  the memory in KBytes used by the domain
+    """
+
+    def __init__(self, name, dom=None, id=-1, active=True, vcpus=0,
+                 memory=0):
+        self.name = name
+        self.dom = dom
+        self.id = id
+        self.active = active
+        self.vcpus = vcpus or 0
+        self.memory = int(memory or 0)
+
+
 class HostState(object):
     """Manages information about the compute node through libvirt."""
     def __init__(self, driver):
@@ -5281,13 +5432,15 @@ class HostState(object):
             """
             disk_free_gb = disk_info_dict['free']
             disk_over_committed = (self.driver.
-                    _get_disk_over_committed_size_total())
+                    _get_disk_over_committed_size_total(domains))
             # Disk available least size
             available_least = disk_free_gb * units.Gi - disk_over_committed
             return (available_least / units.Gi)
 
         LOG.debug("Updating host stats")
         disk_info_dict = self.driver._get_local_gb_info()
+        # One snapshot of the domains for all of the accounting below
+        domains = self.driver._get_domain_stats()
         data = {}
 
         #NOTE(dprince): calling capabilities before getVersion works around
@@ -5300,8 +5453,8 @@ class HostState(object):
         data["vcpus"] = self.driver._get_vcpu_total()
         data["memory_mb"] = self.driver._get_memory_mb_total()
         data["local_gb"] = disk_info_dict['total']
-        data["vcpus_used"] = self.driver._get_vcpu_used()
-        data["memory_mb_used"] = self.driver._get_memory_mb_used()
+        data["vcpus_used"] = self.driver._get_vcpu_used(domains)
+        data["memory_mb_used"] = self.driver._get_memory_mb_used(domains)
         data["local_gb_used"] = disk_info_dict['used']
         data["hypervisor_type"] = self.driver._get_hypervisor_type()
         data["hypervisor_version"] = self.driver._get_hypervisor_version()
@@ -298,7 +298,9 @@ class IptablesFirewallDriver(base_firewall.IptablesFirewallDriver):
         # Overriding base class method for applying nwfilter operation
         if self.instance_info.pop(instance['id'], None):
             self.remove_filters_for_instance(instance)
+            self.clear_security_group_cache()
             self.iptables.apply()
+            self.destroy_unused_ipsets(instance)
             self.nwfilter.unfilter_instance(instance, network_info)
         else:
             LOG.info(_LI('Attempted to unfilter instance which is not '
@@ -18,10 +18,14 @@ Pluggable Weighing support
 """
 
 import abc
+import heapq
 
 import six
 
 from nova import loadables
+from nova.openstack.common import importutils
+
+numpy = importutils.try_import('numpy')
 
 
 def normalize(weight_list, minval=None, maxval=None):
@@ -53,6 +57,44 @@ def normalize(weight_list, minval=None, maxval=None):
     return ((i - minval) / range_ for i in weight_list)
 
 
+def normalize_array(weights, minval=None, maxval=None):
+    """Normalize a NumPy array of weights between 0 and 1.0.
+
+    Same as normalize(), except that minval and maxval, when set, are only
+    bounds: they are widened to the lowest and highest weights, matching
+    what BaseWeigher.weigh_objects() records for preset values.
+    """
+    if not len(weights):
+        return weights
+
+    minval = weights.min() if minval is None else min(minval, weights.min())
+    maxval = weights.max() if maxval is None else max(maxval, weights.max())
+
+    maxval = float(maxval)
+    minval = float(minval)
+
+    if minval == maxval:
+        return numpy.zeros(len(weights))
+
+    return (weights - minval) / (maxval - minval)
+
+
+def top_indexes(weights, limit=None):
+    """Return the indexes of the highest weights, highest first.
+
+    Equal weights keep their original order, as with a stable sort. When
+    limit is set only the top limit indexes are selected, using a partial
+    partition instead of sorting every weight.
+    """
+    candidates = numpy.arange(len(weights))
+    if limit is not None and limit < len(weights):
+        kth = len(weights) - limit
+        threshold = numpy.partition(weights, kth)[kth]
+        candidates = numpy.flatnonzero(weights >= threshold)
+    order = numpy.argsort(-weights[candidates], kind='mergesort')
+    return candidates[order][:limit]
+
+
 class WeighedObject(object):
     """Object with weight information."""
     def __init__(self, obj, weight):
@@ -117,17 +159,70 @@ class BaseWeigher(object):
 
         return weights
 
+    def weigh_columns(self, columns, weight_properties):
+        """Return a NumPy array with the weights of all objects, or None.
+
+        Override in a subclass that can compute every weight at once from
+        the columns offered by the handler. Weights are normalized and
+        multiplied by the handler as array operations. Returning None means
+        weigh_objects() is used instead.
+        """
+        return None
+
 
 class BaseWeightHandler(loadables.BaseLoader):
     object_class = WeighedObject
 
+    def _get_columns(self, obj_list):
+        """Return a columnar view of obj_list for batched weighing, or
+        None if batched weighing is not in use.
+        """
+        return None
+
+    def _get_weighed_columns(self, weigher_classes, obj_list, columns,
+            weighing_properties, limit):
+        """Weigh all objects as arrays and return the top WeighedObjects."""
+        weights = numpy.zeros(len(obj_list))
+        weighed_objs = None
+        for weigher_cls in weigher_classes:
+            weigher = weigher_cls()
+            weigher_weights = weigher.weigh_columns(columns,
+                                                    weighing_properties)
+            if weigher_weights is None:
+                if weighed_objs is None:
+                    weighed_objs = [self.object_class(obj, 0.0)
+                                    for obj in obj_list]
+                weigher_weights = numpy.array(
+                        weigher.weigh_objects(weighed_objs,
+                                              weighing_properties),
+                        dtype=numpy.float64)
+
+            weights += weigher.weight_multiplier() * normalize_array(
+                    weigher_weights, minval=weigher.minval,
+                    maxval=weigher.maxval)
+
+        indexes = top_indexes(weights, limit).tolist()
+        weights = weights.tolist()
+        return [self.object_class(obj_list[i], weights[i]) for i in indexes]
+
     def get_weighed_objects(self, weigher_classes, obj_list,
-            weighing_properties):
-        """Return a sorted (descending), normalized list of WeighedObjects."""
+            weighing_properties, limit=None):
+        """Return a sorted (descending), normalized list of WeighedObjects.
+
+        If limit is set, only the limit highest weighed objects are
+        returned.
+        """
 
         if not obj_list:
             return []
 
+        obj_list = list(obj_list)
+        columns = self._get_columns(obj_list)
+        if columns is not None:
+            return self._get_weighed_columns(weigher_classes, obj_list,
+                                             columns, weighing_properties,
+                                             limit)
+
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
         for weigher_cls in weigher_classes:
             weigher = weigher_cls()
@@ -142,4 +237,100 @@ class BaseWeightHandler(loadables.BaseLoader):
                 obj = weighed_objs[i]
                 obj.weight += weigher.weight_multiplier() * weight
 
+        if limit is not None:
+            return heapq.nlargest(limit, weighed_objs, key=lambda x: x.weight)
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+
+    def get_weighed_heap(self, weigher_classes, obj_list,
+            weighing_properties):
+        """Return a WeighedObjectHeap of the objects in obj_list."""
+        return WeighedObjectHeap(self, weigher_classes, obj_list,
+                                 weighing_properties)
+
+
+class WeighedObjectHeap(object):
+    """Objects ordered by weight, which can be re-weighed one at a time.
+
+    The weights are normalized once, over all the initial objects. An object
+    re-weighed later, e.g. after resources were consumed from it, is
+    normalized against the same bounds, so the weights of the other objects
+    stay valid and keeping them ordered only costs O(log n) per change.
+    Equal weights keep the order of the initial objects.
+    """
+
+    def __init__(self, handler, weigher_classes, obj_list,
+            weighing_properties):
+        self.object_class = handler.object_class
+        self.weighing_properties = weighing_properties
+        self._scales = []
+        self._order = {}
+        obj_list = list(obj_list)
+        weights = [0.0] * len(obj_list)
+        columns = handler._get_columns(obj_list) if obj_list else None
+        for weigher_cls in weigher_classes:
+            if not obj_list:
+                break
+            weigher = weigher_cls()
+            values = None
+            if columns is not None:
+                values = weigher.weigh_columns(columns, weighing_properties)
+            if values is None:
+                values = weigher.weigh_objects(
+                        [self.object_class(obj, 0.0) for obj in obj_list],
+                        weighing_properties)
+            values = list(values)
+
+            minval = min(values)
+            maxval = max(values)
+            if weigher.minval is not None:
+                minval = min(minval, weigher.minval)
+            if weigher.maxval is not None:
+                maxval = max(maxval, weigher.maxval)
+            # All the initial weights are equal and normalized to 0. Scale
+            # later changes by the magnitude of the values instead, so they
+            # still rank the objects.
+            range_ = float(maxval - minval) or float(abs(minval)) or 1.0
+            multiplier = weigher.weight_multiplier()
+            self._scales.append((weigher, multiplier, minval, range_))
+            for i, value in enumerate(values):
+                weights[i] += multiplier * (value - minval) / range_
+
+        self._heap = []
+        for i, obj in enumerate(obj_list):
+            self._order[id(obj)] = i
+            self._heap.append((-weights[i], i, self.object_class(obj,
+                                                                 weights[i])))
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def objects(self):
+        """Return the objects in the heap, in no particular order."""
+        return [entry[2].obj for entry in self._heap]
+
+    def pop(self):
+        """Remove and return the highest weighed object."""
+        return heapq.heappop(self._heap)[2]
+
+    def push(self, weighed_obj, reweigh=True):
+        """Put a popped WeighedObject back, re-weighing it unless told not
+        to.
+        """
+        if reweigh:
+            weighed_obj.weight = 0.0
+            for weigher, multiplier, minval, range_ in self._scales:
+                value = weigher.weigh_objects(
+                        [self.object_class(weighed_obj.obj, 0.0)],
+                        self.weighing_properties)[0]
+                weighed_obj.weight += multiplier * (value - minval) / range_
+        heapq.heappush(self._heap, (-weighed_obj.weight,
+                                    self._order[id(weighed_obj.obj)],
+                                    weighed_obj))
+
+    def retain(self, obj_list):
+        """Drop every object not in obj_list from the heap."""
+        keep = set(id(obj) for obj in obj_list)
+        self._heap = [entry for entry in self._heap
+                      if id(entry[2].obj) in keep]
+        heapq.heapify(self._heap)
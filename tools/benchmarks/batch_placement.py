@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark placing a multi-instance request with and without batch placement.
+
+Builds synthetic HostStates and times FilterScheduler._schedule() for one
+request of --instances instances with the core resource filters and the RAM
+weigher, with scheduler_batch_placement off and on.
+
+Run like:
+
+    python tools/benchmarks/batch_placement.py --hosts 1000 --instances 500
+"""
+
+from __future__ import print_function
+
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+from oslo.messaging import conffixture
+
+from nova import context
+from nova import rpc
+from nova.scheduler import filter_scheduler
+from nova.scheduler import host_manager
+
+CONF = cfg.CONF
+
+
+def make_hosts(num_hosts):
+    hosts = []
+    for i in xrange(num_hosts):
+        host = host_manager.HostState('host%d' % i, 'node%d' % i)
+        host.total_usable_ram_mb = 131072
+        host.free_ram_mb = random.randint(0, 131072)
+        host.total_usable_disk_gb = 2048
+        host.free_disk_mb = random.randint(0, 2048) * 1024
+        host.vcpus_total = 32
+        host.vcpus_used = random.randint(0, 64)
+        hosts.append(host)
+    return hosts
+
+
+def time_schedule(hosts, num_instances):
+    sched = filter_scheduler.FilterScheduler()
+    hosts = copy.deepcopy(hosts)
+    sched._get_all_host_states = lambda ctxt: hosts
+    instance_properties = {'project_id': 'bench', 'os_type': 'linux',
+                           'memory_mb': 2048, 'root_gb': 20,
+                           'ephemeral_gb': 0, 'vcpus': 1}
+    request_spec = {'num_instances': num_instances,
+                    'instance_properties': instance_properties,
+                    'instance_type': dict(instance_properties, swap=0)}
+    ctxt = context.get_admin_context()
+    start = time.time()
+    selected = sched._schedule(ctxt, request_spec, {})
+    return time.time() - start, [weighed.obj.host for weighed in selected]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--hosts', default='1000',
+                        help='Comma separated host counts')
+    parser.add_argument('--instances', type=int, default=500,
+                        help='Instances in the request')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    messaging_conf = conffixture.ConfFixture(CONF)
+    messaging_conf.setUp()
+    messaging_conf.transport_driver = 'fake'
+    rpc.init(CONF)
+    CONF.set_override('scheduler_default_filters',
+                      ['RamFilter', 'CoreFilter', 'DiskFilter'])
+    CONF.set_override('scheduler_weight_classes',
+                      ['nova.scheduler.weights.ram.RAMWeigher'])
+
+    print('%8s  %10s  %12s  %12s' % ('hosts', 'instances', 'per-inst ms',
+                                     'batch ms'))
+    for num_hosts in [int(n) for n in args.hosts.split(',')]:
+        hosts = make_hosts(num_hosts)
+        CONF.set_override('scheduler_batch_placement', False)
+        per_instance, expected = time_schedule(hosts, args.instances)
+        CONF.set_override('scheduler_batch_placement', True)
+        batch, placed = time_schedule(hosts, args.instances)
+        assert placed == expected
+        print('%8d  %10d  %12.2f  %12.2f' % (num_hosts, len(placed),
+                                             per_instance * 1000,
+                                             batch * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark per-host versus vectorized scheduler filtering.
+
+Builds synthetic HostStates and times one filter pass of the core resource
+filters (RamFilter, CoreFilter, DiskFilter, NumInstancesFilter and
+IoOpsFilter) with scheduler_vectorized_filters off, on with columns
+gathered from the host states per request, and on with the HostManager's
+persistent column store.
+
+Run like:
+
+    python tools/benchmarks/filter_engine.py --hosts 1000,10000
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+
+from nova.scheduler import columns
+from nova.scheduler import filters
+from nova.scheduler.filters import core_filter
+from nova.scheduler.filters import disk_filter
+from nova.scheduler.filters import io_ops_filter
+from nova.scheduler.filters import num_instances_filter
+from nova.scheduler.filters import ram_filter
+from nova.scheduler import host_manager
+
+CONF = cfg.CONF
+
+FILTER_CLASSES = [ram_filter.RamFilter, core_filter.CoreFilter,
+                  disk_filter.DiskFilter,
+                  num_instances_filter.NumInstancesFilter,
+                  io_ops_filter.IoOpsFilter]
+
+
+def make_hosts(num_hosts):
+    hosts = []
+    for i in xrange(num_hosts):
+        host = host_manager.HostState('host%d' % i, 'node%d' % i)
+        host.total_usable_ram_mb = 131072
+        host.free_ram_mb = random.randint(-65536, 131072)
+        host.total_usable_disk_gb = 2048
+        host.free_disk_mb = random.randint(0, 2048) * 1024
+        host.vcpus_total = 32
+        host.vcpus_used = random.randint(0, 600)
+        host.num_instances = random.randint(0, 60)
+        host.num_io_ops = random.randint(0, 10)
+        hosts.append(host)
+    return hosts
+
+
+def time_pass(handler, hosts, filter_properties, repeat):
+    best = None
+    for _i in xrange(repeat):
+        start = time.time()
+        result = handler.get_filtered_objects(FILTER_CLASSES, hosts,
+                                              filter_properties)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--hosts', default='1000,10000',
+                        help='Comma separated host counts')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Passes per run; the best one is reported')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    if not columns.is_available():
+        sys.exit('NumPy is required for the vectorized filter engine')
+
+    filter_properties = {'instance_type': {'memory_mb': 4096, 'vcpus': 2,
+                                           'root_gb': 40, 'ephemeral_gb': 0,
+                                           'swap': 0}}
+    handler = filters.HostFilterHandler()
+    print('%8s  %12s  %12s  %12s  %8s' % ('hosts', 'per-host ms',
+                                          'gathered ms', 'stored ms',
+                                          'passed'))
+    for num_hosts in [int(n) for n in args.hosts.split(',')]:
+        hosts = make_hosts(num_hosts)
+        CONF.set_override('scheduler_vectorized_filters', False)
+        per_host, passed = time_pass(handler, hosts, filter_properties,
+                                     args.repeat)
+        CONF.set_override('scheduler_vectorized_filters', True)
+        gathered, gathered_passed = time_pass(handler, hosts,
+                                              filter_properties, args.repeat)
+        store = columns.HostColumnStore(hosts)
+        stored, stored_passed = time_pass(handler, hosts, filter_properties,
+                                          args.repeat)
+        store.detach()
+        assert passed == gathered_passed == stored_passed
+        print('%8d  %12.2f  %12.2f  %12.2f  %8d' % (
+            num_hosts, per_host * 1000, gathered * 1000, stored * 1000,
+            passed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark concurrent fixed IP allocations in one network.
+
+Seeds a database with a network of --prefix bits and its fixed IPs, then
+starts --workers processes, like as many network hosts, that each
+allocate --allocations fixed IPs of the network to instances at the same
+time, through NetworkManager._associate_pool(). Reports the time until
+the last allocation, the allocations per second, the addresses that were
+allocated more than once and the allocations that failed.
+
+"pool" locks the first free fixed IP of the network, as
+fixed_ip_associate_pool() does; "bitmap" claims a random free address of
+the bitmap of the network, as use_fixed_ip_bitmap does.
+
+sqlite doesn't lock rows, so the "pool" allocations of the workers don't
+wait for each other there but may allocate the same address. Pass the
+--connection of a MySQL or PostgreSQL database to see them wait.
+
+Run like:
+
+    python tools/benchmarks/fixed_ip_allocation.py --workers 8 \\
+        --allocations 100 --prefix 16
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import netaddr
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+
+from nova import context
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.db.sqlalchemy import migration
+from nova.db.sqlalchemy import models
+from nova.network import manager as network_manager
+from nova import objects
+from nova.openstack.common import timeutils
+from nova import rpc
+
+CONF = cfg.CONF
+
+NETWORK_ID = 1
+
+
+def instance_uuid(worker, index):
+    return str(uuid.UUID(int=worker << 32 | index))
+
+
+def seed(engine, cidr, num_workers, num_allocations):
+    now = timeutils.utcnow()
+    network = netaddr.IPNetwork(cidr)
+    # Like _create_fixed_ips(), reserve the network, gateway and broadcast
+    # addresses.
+    reserved = (network.first, network.first + 1, network.last)
+    fixed_ips = [dict(address=str(netaddr.IPAddress(value)),
+                      network_id=NETWORK_ID, reserved=value in reserved,
+                      allocated=False, leased=False, created_at=now,
+                      deleted=0)
+                 for value in xrange(network.first, network.last + 1)]
+    instances = [dict(uuid=instance_uuid(worker, index),
+                      project_id='project', user_id='user',
+                      display_name='vm-%d-%d' % (worker, index),
+                      vm_state='building', created_at=now, deleted=0)
+                 for worker in xrange(num_workers)
+                 for index in xrange(num_allocations)]
+    with engine.begin() as conn:
+        conn.execute(models.Network.__table__.insert(),
+                     [dict(id=NETWORK_ID, label='private', cidr=cidr,
+                           netmask=str(network.netmask),
+                           gateway=str(netaddr.IPAddress(network.first + 1)),
+                           bridge='br100', created_at=now, deleted=0)])
+        conn.execute(models.FixedIp.__table__.insert(), fixed_ips)
+        conn.execute(models.Instance.__table__.insert(), instances)
+
+
+def reset(engine):
+    with engine.begin() as conn:
+        conn.execute(models.FixedIp.__table__.update().values(
+            instance_uuid=None))
+
+
+def count_allocated(engine):
+    table = models.FixedIp.__table__
+    with engine.begin() as conn:
+        return len(conn.execute(table.select().where(
+            table.c.instance_uuid != None)).fetchall())  # noqa
+
+
+def run_worker(args):
+    """Wait for --start-at, allocate the fixed IPs and print the time of
+    the last allocation and the numbers of allocations and failures.
+    """
+    if args.mode == 'bitmap':
+        CONF.set_override('use_fixed_ip_bitmap', True)
+    # The manager makes rpc clients, but they don't connect until used.
+    rpc.init(CONF)
+    manager = network_manager.NetworkManager(host='network-%d' % args.worker)
+    ctxt = context.get_admin_context()
+    network = {'id': NETWORK_ID, 'cidr': args.cidr}
+    allocated = failed = 0
+    time.sleep(max(0, args.start_at - time.time()))
+    for index in xrange(args.allocations):
+        try:
+            manager._associate_pool(ctxt, network,
+                                    instance_uuid(args.worker, index))
+            allocated += 1
+        except Exception:
+            failed += 1
+    print('%f %d %d' % (time.time(), allocated, failed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Processes allocating fixed IPs at once')
+    parser.add_argument('--allocations', type=int, default=100,
+                        help='Fixed IPs each worker allocates')
+    parser.add_argument('--prefix', type=int, default=16,
+                        help='Prefix length of the network')
+    parser.add_argument('--connection',
+                        help='Database to use, a new sqlite one by default')
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--cidr', help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    objects.register_all()
+    if args.mode:
+        CONF.set_override('connection', args.connection, group='database')
+        run_worker(args)
+        return
+
+    workdir = tempfile.mkdtemp()
+    try:
+        connection = args.connection or (
+            'sqlite:///' + os.path.join(workdir, 'nova.sqlite'))
+        CONF.set_override('connection', connection, group='database')
+        migration.db_sync()
+        engine = sqlalchemy_api.get_engine()
+        cidr = '10.0.0.0/%d' % args.prefix
+        seed(engine, cidr, args.workers, args.allocations)
+
+        print('%8s  %10s  %10s  %10s  %10s' % ('mode', 'ms', 'allocs/s',
+                                               'duplicates', 'failed'))
+        for mode in ('pool', 'bitmap'):
+            reset(engine)
+            # Leave the workers the time to start up before allocating.
+            start_at = time.time() + 5 + args.workers * 0.5
+            workers = [subprocess.Popen(
+                           [sys.executable, __file__,
+                            '--mode', mode, '--worker', str(worker),
+                            '--allocations', str(args.allocations),
+                            '--connection', connection, '--cidr', cidr,
+                            '--start-at', repr(start_at)],
+                           stdout=subprocess.PIPE)
+                       for worker in xrange(args.workers)]
+            end_at, allocated, failed = start_at, 0, 0
+            for worker in workers:
+                output = worker.communicate()[0].split()[-3:]
+                end_at = max(end_at, float(output[0]))
+                allocated += int(output[1])
+                failed += int(output[2])
+            elapsed = end_at - start_at
+            duplicates = allocated - count_allocated(engine)
+            print('%8s  %10.1f  %10.1f  %10d  %10d' % (
+                mode, elapsed * 1000, allocated / elapsed, duplicates,
+                failed))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark full versus incremental scheduler host state refresh.
+
+Seeds a database with synthetic nova-compute services and compute nodes,
+then times HostManager.get_all_host_states() per scheduling request with
+scheduler_incremental_host_state_refresh off and on. Between requests a
+fraction of the compute nodes is touched, as the resource tracker would.
+
+Reports, per request, the wall time spent in DB API calls and the CPU time
+spent in Python outside of them.
+
+Run like:
+
+    python tools/benchmarks/host_state_refresh.py --nodes 1000,5000,10000
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+
+from nova import context
+from nova import db
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.db.sqlalchemy import migration
+from nova.db.sqlalchemy import models
+from nova.openstack.common import jsonutils
+from nova.openstack.common import timeutils
+from nova.scheduler import host_manager
+
+CONF = cfg.CONF
+
+
+class DBTimer(object):
+    """Accumulate wall and CPU time spent inside wrapped db API calls."""
+
+    def __init__(self, *names):
+        self.wall = 0.0
+        self.cpu = 0.0
+        for name in names:
+            setattr(db, name, self._wrap(getattr(db, name)))
+
+    def _wrap(self, func):
+        def timed(*args, **kwargs):
+            wall, cpu = time.time(), time.clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.wall += time.time() - wall
+                self.cpu += time.clock() - cpu
+        return timed
+
+    def reset(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+
+
+def seed(engine, num_nodes):
+    with engine.begin() as conn:
+        conn.execute(models.ComputeNode.__table__.delete())
+        conn.execute(models.Service.__table__.delete())
+    now = timeutils.utcnow()
+    stats = jsonutils.dumps({'num_instances': 10, 'io_workload': 1,
+                             'num_proj_demo': 4, 'num_vm_active': 10})
+    services = []
+    nodes = []
+    for i in xrange(1, num_nodes + 1):
+        services.append(dict(id=i, host='host%d' % i, binary='nova-compute',
+                             topic='compute', report_count=1, disabled=False,
+                             created_at=now, updated_at=now, deleted=0))
+        nodes.append(dict(id=i, service_id=i, vcpus=32, memory_mb=131072,
+                          local_gb=2048, vcpus_used=8, memory_mb_used=32768,
+                          local_gb_used=512, free_ram_mb=98304,
+                          free_disk_gb=1536, disk_available_least=1500,
+                          hypervisor_type='QEMU', hypervisor_version=1002000,
+                          hypervisor_hostname='node%d' % i,
+                          cpu_info='{"arch": "x86_64"}', running_vms=10,
+                          current_workload=1, host_ip='10.0.0.1',
+                          supported_instances='[["x86_64", "kvm", "hvm"]]',
+                          stats=stats, metrics='[]', pci_stats='',
+                          extra_resources='', created_at=now,
+                          updated_at=now, deleted=0))
+    with engine.begin() as conn:
+        conn.execute(models.Service.__table__.insert(), services)
+        conn.execute(models.ComputeNode.__table__.insert(), nodes)
+
+
+def touch_nodes(engine, num_nodes, fraction):
+    """Bump updated_at on a random sample of compute nodes."""
+    table = models.ComputeNode.__table__
+    count = max(1, int(num_nodes * fraction))
+    ids = random.sample(xrange(1, num_nodes + 1), count)
+    # Keep touched rows strictly newer than anything seen so far.
+    timeutils.advance_time_delta(datetime.timedelta(seconds=1))
+    with engine.begin() as conn:
+        conn.execute(table.update().where(table.c.id.in_(ids)).
+                     values(updated_at=timeutils.utcnow()))
+
+
+def run(num_nodes, incremental, requests, fraction, timer):
+    CONF.set_override('scheduler_incremental_host_state_refresh',
+                      incremental)
+    engine = sqlalchemy_api.get_engine()
+    seed(engine, num_nodes)
+    ctxt = context.get_admin_context()
+    manager = host_manager.HostManager()
+    # The first request always does a full read; keep it out of the
+    # per-request numbers.
+    list(manager.get_all_host_states(ctxt))
+
+    db_wall = py_cpu = 0.0
+    for _i in xrange(requests):
+        touch_nodes(engine, num_nodes, fraction)
+        timer.reset()
+        cpu = time.clock()
+        list(manager.get_all_host_states(ctxt))
+        db_wall += timer.wall
+        py_cpu += (time.clock() - cpu) - timer.cpu
+    return db_wall / requests, py_cpu / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--nodes', default='1000,5000,10000',
+                        help='Comma separated compute node counts')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='Scheduling requests timed per run')
+    parser.add_argument('--changed', type=float, default=0.02,
+                        help='Fraction of nodes updated between requests')
+    parser.add_argument('--connection', default='sqlite://',
+                        help='Database connection URL to seed and query')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    CONF.set_override('connection', args.connection, group='database')
+    CONF.set_override('scheduler_host_state_resync_interval', 10 ** 6)
+    migration.db_sync()
+    timeutils.set_time_override()
+    timer = DBTimer('compute_node_get_all', 'compute_node_get_updated_since')
+
+    print('%8s  %-12s  %12s  %12s' % ('nodes', 'mode', 'db ms/req',
+                                      'python ms/req'))
+    for num_nodes in [int(n) for n in args.nodes.split(',')]:
+        for incremental in (False, True):
+            db_wall, py_cpu = run(num_nodes, incremental, args.requests,
+                                  args.changed, timer)
+            print('%8d  %-12s  %12.2f  %12.2f' % (
+                num_nodes, 'incremental' if incremental else 'full',
+                db_wall * 1000, py_cpu * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark paging through a project's instances with the DB API.
+
+Seeds a database with one large project and a few small ones, each
+instance having metadata, system metadata and an info cache, then pages
+through the large project the way GET /servers/detail does (sorted on
+created_at, descending, --page instances per page) and times the first
+page, a page in the middle and the last one.
+
+The "joined" column reproduces the previous query shape, where the joined
+tables were eagerly loaded by the paginated query itself and the marker
+was loaded with all of its joins; "keyset" is instance_get_all_by_filters.
+
+Run like:
+
+    python tools/benchmarks/instance_list.py --instances 50000 \
+        --connection sqlite:////tmp/nova-bench.sqlite
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+from sqlalchemy.orm import joinedload
+
+from nova import context
+from nova import db
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.db.sqlalchemy import migration
+from nova.db.sqlalchemy import models
+from nova.openstack.common.db.sqlalchemy import utils as sqlalchemyutils
+from nova.openstack.common import timeutils
+
+CONF = cfg.CONF
+
+PROJECT = 'big-project'
+
+
+def seed(engine, num_instances, other_projects=4, batch=5000):
+    tables = [models.InstanceInfoCache, models.InstanceMetadata,
+              models.InstanceSystemMetadata, models.Instance]
+    with engine.begin() as conn:
+        for model in tables:
+            conn.execute(model.__table__.delete())
+    start = timeutils.utcnow() - datetime.timedelta(days=365)
+    projects = [PROJECT] * num_instances
+    for i in xrange(other_projects):
+        projects.extend(['project-%d' % i] * (num_instances // 10))
+    for offset in xrange(0, len(projects), batch):
+        instances, infos, metas, sys_metas = [], [], [], []
+        for i in xrange(offset, min(offset + batch, len(projects))):
+            instance_uuid = str(uuid.uuid4())
+            created_at = start + datetime.timedelta(seconds=i)
+            instances.append(dict(uuid=instance_uuid, project_id=projects[i],
+                                  user_id='user', display_name='vm-%d' % i,
+                                  host='host%d' % (i % 500), vm_state='active',
+                                  memory_mb=2048, vcpus=1, root_gb=20,
+                                  created_at=created_at, deleted=0))
+            infos.append(dict(instance_uuid=instance_uuid,
+                              network_info='[]', created_at=created_at,
+                              deleted=0))
+            for key in ('role', 'owner', 'tier'):
+                metas.append(dict(instance_uuid=instance_uuid, key=key,
+                                  value='value', created_at=created_at,
+                                  deleted=0))
+            for key in ('image_disk_format', 'instance_type_id',
+                        'instance_type_name', 'instance_type_memory_mb',
+                        'instance_type_vcpus'):
+                sys_metas.append(dict(instance_uuid=instance_uuid, key=key,
+                                      value='1', created_at=created_at,
+                                      deleted=0))
+        with engine.begin() as conn:
+            conn.execute(models.Instance.__table__.insert(), instances)
+            conn.execute(models.InstanceInfoCache.__table__.insert(), infos)
+            conn.execute(models.InstanceMetadata.__table__.insert(), metas)
+            conn.execute(models.InstanceSystemMetadata.__table__.insert(),
+                         sys_metas)
+
+
+def joined_page(ctxt, limit, marker):
+    """The previous instance_get_all_by_filters query, for comparison."""
+    session = sqlalchemy_api.get_session()
+    query = session.query(models.Instance)
+    for column in ['info_cache', 'security_groups']:
+        query = query.options(joinedload(column))
+    query = query.filter_by(deleted=0, project_id=ctxt.project_id)
+    if marker is not None:
+        marker = sqlalchemy_api._instance_get_by_uuid(ctxt, marker,
+                                                      session=session)
+    query = sqlalchemyutils.paginate_query(query, models.Instance, limit,
+                                           ['created_at', 'id'],
+                                           marker=marker, sort_dir='desc')
+    return sqlalchemy_api._instances_fill_metadata(
+        ctxt, query.all(), ['metadata', 'system_metadata'])
+
+
+def keyset_page(ctxt, limit, marker):
+    return db.instance_get_all_by_filters(ctxt, {'deleted': False},
+                                          'created_at', 'desc', limit=limit,
+                                          marker=marker)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--instances', type=int, default=50000,
+                        help='Instances in the project listed')
+    parser.add_argument('--page', type=int, default=1000,
+                        help='Instances per page')
+    parser.add_argument('--connection', default='sqlite://',
+                        help='Database connection URL to seed and query')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    CONF.set_override('connection', args.connection, group='database')
+    migration.db_sync()
+    seed(sqlalchemy_api.get_engine(), args.instances)
+    ctxt = context.RequestContext('user', PROJECT, is_admin=False)
+
+    # Walk the pages once to find the markers of the timed pages.
+    markers = [None]
+    while True:
+        page = keyset_page(ctxt, args.page, markers[-1])
+        if len(page) < args.page:
+            break
+        markers.append(page[-1]['uuid'])
+    timed = [('first', markers[0]), ('middle', markers[len(markers) // 2]),
+             ('last', markers[-1])]
+
+    print('%8s  %12s  %12s' % ('page', 'joined ms', 'keyset ms'))
+    for name, marker in timed:
+        results = []
+        for page_func in (joined_page, keyset_page):
+            start = time.time()
+            page = page_func(ctxt, args.page, marker)
+            results.append((time.time() - start,
+                            [inst['uuid'] for inst in page]))
+        assert results[0][1] == results[1][1]
+        print('%8s  %12.2f  %12.2f' % (name, results[0][0] * 1000,
+                                       results[1][0] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark merging nova's iptables rules into an iptables-save dump.
+
+For each size in --lines, generates the filter table of a compute host
+the way iptables-save -c reports it. The table has a chain and about
+ten rules per instance, with non-zero counters, and a few rules that are
+not nova's. Every --top-every instances one instance also has an
+unwrapped rule at the top of FORWARD. Every --remove-every instances one
+instance has an unwrapped rule that was removed since the last apply.
+An IptablesManager holds the same rules. The benchmark then reports the
+time IptablesManager._modify_rules() takes to merge them, which is what
+every iptables apply does while holding the iptables lock.
+
+Run like:
+
+    python tools/benchmarks/iptables_modify_rules.py --lines 1000 10000 50000
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+
+from nova.network import linux_net
+
+CONF = cfg.CONF
+
+FOREIGN_RULES = [
+    '-A INPUT -i virbr0 -p udp -m udp --dport 53 -j ACCEPT',
+    '-A INPUT -i virbr0 -p tcp -m tcp --dport 53 -j ACCEPT',
+    '-A FORWARD -s 192.168.122.0/24 -i virbr0 -j ACCEPT',
+    '-A FORWARD -i virbr0 -o virbr0 -j ACCEPT',
+    '-A FORWARD -o virbr0 -j REJECT --reject-with icmp-port-unreachable',
+]
+
+
+def instance_rules(index):
+    """Return the chain and rules of an instance, like the libvirt
+    IptablesFirewallDriver creates them.
+    """
+    chain = 'inst-%d' % index
+    address = '10.%d.%d.%d' % (index // 62500, index // 250 % 250,
+                               index % 250 + 2)
+    rules = ['-m state --state INVALID -j DROP',
+             '-m state --state ESTABLISHED,RELATED -j ACCEPT',
+             '-j $provider',
+             '-s 10.0.0.1/32 -p udp -m udp --sport 67 --dport 68 -j ACCEPT',
+             '-s 10.0.0.0/8 -j ACCEPT',
+             '-p tcp -m tcp --dport 22 -j ACCEPT',
+             '-p tcp -m tcp --dport %d -j ACCEPT' % (8000 + index % 1000),
+             '-p icmp -j ACCEPT',
+             '-j $sg-fallback']
+    return chain, address, rules
+
+
+def build(num_lines, top_every, remove_every):
+    """Return an IptablesManager and a matching iptables-save dump of
+    about num_lines lines.
+    """
+    manager = linux_net.IptablesManager()
+    table = manager.ipv4['filter']
+    for chain in ('provider', 'sg-fallback'):
+        table.add_chain(chain)
+    table.add_rule('sg-fallback', '-j DROP')
+
+    # add_rule() looks for duplicates among every rule, too slow here.
+    binary = linux_net.binary_name
+
+    def add_rule(chain, rule, wrap=True, top=False):
+        rule = rule.replace('$', '%s-' % binary)
+        table.rules.append(linux_net.IptablesRule(chain, rule, wrap, top))
+
+    removed = []
+    lines_per_instance = 11
+    for index in xrange(max(1, num_lines // lines_per_instance)):
+        chain, address, rules = instance_rules(index)
+        table.chains.add(chain)
+        add_rule('local', '-d %s -j $%s' % (address, chain))
+        for rule in rules:
+            add_rule(chain, rule)
+        if top_every and index % top_every == 0:
+            add_rule('FORWARD', '-d %s/32 -p tcp --dport 22 -j ACCEPT' %
+                     address, wrap=False, top=True)
+        if remove_every and index % remove_every == 0:
+            removed.append(linux_net.IptablesRule(
+                'FORWARD', '-s %s/32 -j DROP' % address, wrap=False))
+
+    # What iptables-save reports for these rules, since the last apply.
+    counters = random.Random(0)
+    dump = ['# Generated by iptables-save v1.4.21',
+            '*filter',
+            ':INPUT ACCEPT [2223527:305688874]',
+            ':FORWARD ACCEPT [0:0]',
+            ':OUTPUT ACCEPT [2172501:140856656]',
+            ':nova-filter-top - [0:0]']
+    dump.extend(':%s-%s - [0:0]' % (binary, chain)
+                for chain in sorted(table.chains))
+    for rule in table.rules + removed:
+        dump.append('[%d:%d] %s' % (counters.randint(0, 1000),
+                                    counters.randint(0, 100000),
+                                    str(rule).split(' ', 1)[1]))
+    dump.extend('[%d:%d] %s' % (counters.randint(0, 1000),
+                                counters.randint(0, 100000), rule)
+                for rule in FOREIGN_RULES)
+    dump.extend(['COMMIT', '# Completed on Fri Feb 18 15:17:05 2011'])
+    return manager, dump, removed
+
+
+def best_of(repeat, func, *args):
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        result = func(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--lines', type=int, nargs='+',
+                        default=[1000, 10000, 50000],
+                        help='Sizes of the iptables-save dumps')
+    parser.add_argument('--top-every', type=int, default=10,
+                        help='Instances per unwrapped top rule, 0 for none')
+    parser.add_argument('--remove-every', type=int, default=20,
+                        help='Instances per removed unwrapped rule, 0 for '
+                             'none')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs of each merge, the best one is reported')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+
+    def merge(manager, dump, removed):
+        table = manager.ipv4['filter']
+        # _modify_rules() empties the rules to remove once it is done.
+        table.remove_rules[:] = removed
+        return manager._modify_rules(dump, table, 'filter')
+
+    print('%8s  %8s  %10s' % ('lines', 'rules', 'merge ms'))
+    for num_lines in args.lines:
+        manager, dump, removed = build(num_lines, args.top_every,
+                                       args.remove_every)
+        elapsed, new_lines = best_of(args.repeat, merge, manager, dump,
+                                     removed)
+        print('%8d  %8d  %10.1f' % (len(dump),
+                                    len(manager.ipv4['filter'].rules),
+                                    elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark building InstanceLists with lazily hydrated instances.
+
+Seeds a database with --instances instances on one host, each having
+metadata, system metadata and an info cache, and loads them with all of
+those joined, the way the compute manager's periodic tasks do. Then
+reports the time and the memory taken to build the list and read the
+uuid, host and vm_state of every instance, the way _sync_power_states()
+does, from the database rows (conductor side) and from the list's
+primitive (compute side).
+
+"eager" builds every Instance up front, as InstanceList used to; "lazy"
+is InstanceList, which only loads the fields that are touched. Each case
+runs in a new process, and memory is its RSS growth while the list is
+built and read, with the rows or the primitive already loaded.
+
+Run like:
+
+    python tools/benchmarks/lazy_instance_list.py --instances 5000
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+
+from nova import context
+from nova import db
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.db.sqlalchemy import migration
+from nova.db.sqlalchemy import models
+from nova import objects
+from nova.objects import base as obj_base
+from nova.objects import instance as instance_obj
+from nova.openstack.common import jsonutils
+from nova.openstack.common import timeutils
+
+CONF = cfg.CONF
+
+HOST = 'compute-1'
+EXPECTED_ATTRS = ['metadata', 'system_metadata', 'info_cache',
+                  'security_groups']
+
+
+def seed(engine, num_instances):
+    now = timeutils.utcnow()
+    instances, infos, metas, sys_metas = [], [], [], []
+    for i in xrange(num_instances):
+        instance_uuid = str(uuid.uuid4())
+        instances.append(dict(uuid=instance_uuid, project_id='project',
+                              user_id='user', display_name='vm-%d' % i,
+                              host=HOST, node=HOST, vm_state='active',
+                              power_state=1, memory_mb=2048, vcpus=1,
+                              root_gb=20, created_at=now, deleted=0))
+        infos.append(dict(instance_uuid=instance_uuid, created_at=now,
+                          network_info='[]', deleted=0))
+        for key in ('role', 'owner', 'tier'):
+            metas.append(dict(instance_uuid=instance_uuid, key=key,
+                              value='value', created_at=now, deleted=0))
+        for key in ('image_disk_format', 'instance_type_id',
+                    'instance_type_name', 'instance_type_memory_mb',
+                    'instance_type_vcpus', 'instance_type_root_gb',
+                    'instance_type_ephemeral_gb', 'instance_type_swap'):
+            sys_metas.append(dict(instance_uuid=instance_uuid, key=key,
+                                  value='1', created_at=now, deleted=0))
+    with engine.begin() as conn:
+        conn.execute(models.Instance.__table__.insert(), instances)
+        conn.execute(models.InstanceInfoCache.__table__.insert(), infos)
+        conn.execute(models.InstanceMetadata.__table__.insert(), metas)
+        conn.execute(models.InstanceSystemMetadata.__table__.insert(),
+                     sys_metas)
+
+
+def eager_from_rows(ctxt, rows):
+    return [objects.Instance._from_db_object(
+                ctxt, objects.Instance(ctxt), row,
+                expected_attrs=EXPECTED_ATTRS)
+            for row in rows]
+
+
+def lazy_from_rows(ctxt, rows):
+    return instance_obj._make_instance_list(ctxt, objects.InstanceList(),
+                                            rows, list(EXPECTED_ATTRS))
+
+
+def eager_from_primitive(ctxt, primitive):
+    return [obj_base.NovaObject.obj_from_primitive(item, ctxt)
+            for item in primitive['nova_object.data']['objects']]
+
+
+def lazy_from_primitive(ctxt, primitive):
+    return obj_base.NovaObject.obj_from_primitive(primitive, ctxt)
+
+
+def rss_kb():
+    with open('/proc/self/statm') as statm:
+        pages = int(statm.read().split()[1])
+    return pages * resource.getpagesize() // 1024
+
+
+def run_case(args):
+    """Build the list and read a few fields of every instance, print the
+    elapsed time and the RSS growth.
+    """
+    source, mode = args.case.split('-')
+    ctxt = context.get_admin_context()
+    if source == 'rows':
+        data = db.instance_get_all_by_host(
+            ctxt, HOST, columns_to_join=instance_obj._expected_cols(
+                EXPECTED_ATTRS))
+        build = eager_from_rows if mode == 'eager' else lazy_from_rows
+    else:
+        with open(args.primitive) as primitive_file:
+            data = jsonutils.loads(primitive_file.read())
+        build = (eager_from_primitive if mode == 'eager'
+                 else lazy_from_primitive)
+    gc.collect()
+    start_rss = rss_kb()
+    start = time.time()
+    instances = build(ctxt, data)
+    for instance in instances:
+        (instance.uuid, instance.host, instance.vm_state)
+    elapsed = time.time() - start
+    print('%f %d' % (elapsed, rss_kb() - start_rss))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--instances', type=int, default=5000,
+                        help='Instances on the host')
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    parser.add_argument('--connection', help=argparse.SUPPRESS)
+    parser.add_argument('--primitive', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    objects.register_all()
+    if args.case:
+        CONF.set_override('connection', args.connection, group='database')
+        run_case(args)
+        return
+
+    workdir = tempfile.mkdtemp()
+    try:
+        connection = 'sqlite:///' + os.path.join(workdir, 'nova.sqlite')
+        primitive_path = os.path.join(workdir, 'primitive.json')
+        CONF.set_override('connection', connection, group='database')
+        migration.db_sync()
+        seed(sqlalchemy_api.get_engine(), args.instances)
+        ctxt = context.get_admin_context()
+        rows = db.instance_get_all_by_host(
+            ctxt, HOST, columns_to_join=instance_obj._expected_cols(
+                EXPECTED_ATTRS))
+        with open(primitive_path, 'w') as primitive_file:
+            primitive_file.write(jsonutils.dumps(objects.InstanceList(
+                objects=eager_from_rows(ctxt, rows)).obj_to_primitive()))
+
+        print('%10s  %6s  %10s  %10s' % ('source', 'mode', 'ms', 'RSS KB'))
+        for source in ('rows', 'primitive'):
+            for mode in ('eager', 'lazy'):
+                output = subprocess.check_output(
+                    [sys.executable, __file__,
+                     '--case', '%s-%s' % (source, mode),
+                     '--connection', connection,
+                     '--primitive', primitive_path])
+                elapsed, rss = output.split()[-2:]
+                print('%10s  %6s  %10.1f  %10d' % (source, mode,
+                                                   float(elapsed) * 1000,
+                                                   int(rss)))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
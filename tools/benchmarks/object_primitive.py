@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark the size and speed of the object primitive formats.
+
+Builds an InstanceList of --instances instances with system metadata and
+an info cache, the way conductor returns InstanceList.get_by_host(), and
+reports the JSON message size and the time to encode it (dehydrate and
+dump to JSON) and decode it (load the JSON and hydrate) with the regular
+primitive format and with the compact one.
+
+Run like:
+
+    python tools/benchmarks/object_primitive.py --instances 1000
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+
+from nova import context
+from nova.network import model as network_model
+from nova import objects
+from nova.objects import base as obj_base
+from nova.openstack.common import jsonutils
+from nova.openstack.common import timeutils
+
+CONF = cfg.CONF
+
+
+def make_instances(ctxt, count):
+    instances = []
+    now = timeutils.utcnow()
+    for i in xrange(count):
+        instance_uuid = str(uuid.uuid4())
+        vif = network_model.VIF(
+            id=str(uuid.uuid4()), address='fa:16:3e:00:%02x:%02x' % (
+                i // 256 % 256, i % 256),
+            network=network_model.Network(
+                id='net', bridge='br100', label='private',
+                subnets=[network_model.Subnet(
+                    cidr='10.0.0.0/16',
+                    ips=[network_model.FixedIP(
+                        address='10.0.%d.%d' % (i // 250 % 250,
+                                                i % 250 + 2))])]))
+        instance = objects.Instance(
+            id=i, uuid=instance_uuid, user_id='user', project_id='project',
+            host='compute-1', node='compute-1', display_name='vm-%d' % i,
+            hostname='vm-%d' % i, vm_state='active', power_state=1,
+            task_state=None, memory_mb=2048, vcpus=1, root_gb=20,
+            ephemeral_gb=0, image_ref=str(uuid.uuid4()), launched_at=now,
+            created_at=now, updated_at=now, deleted_at=None, deleted=False,
+            metadata={'role': 'web', 'tier': 'front'},
+            system_metadata=dict(
+                ('instance_type_%s' % key, '1') for key in
+                ('id', 'name', 'memory_mb', 'vcpus', 'root_gb',
+                 'ephemeral_gb', 'flavorid', 'swap', 'rxtx_factor',
+                 'vcpu_weight')),
+            info_cache=objects.InstanceInfoCache(
+                instance_uuid=instance_uuid,
+                network_info=network_model.NetworkInfo([vif])))
+        # Like instances loaded from the database, have every column set.
+        for name, field in instance.fields.items():
+            if (field.nullable and not instance.obj_attr_is_set(name) and
+                    name not in objects.instance.INSTANCE_OPTIONAL_ATTRS):
+                setattr(instance, name, None)
+        instance.info_cache.obj_reset_changes()
+        instance.obj_reset_changes()
+        instances.append(instance)
+    instance_list = objects.InstanceList(objects=instances)
+    instance_list.obj_reset_changes()
+    return instance_list
+
+
+def regular_encode(instances):
+    return jsonutils.dumps(instances.obj_to_primitive())
+
+
+def compact_encode(instances):
+    return jsonutils.dumps(obj_base.compact_primitive(
+        instances.obj_to_primitive()))
+
+
+def regular_decode(ctxt, message):
+    return obj_base.NovaObject.obj_from_primitive(jsonutils.loads(message),
+                                                  context=ctxt)
+
+
+def compact_decode(ctxt, message):
+    return obj_base.NovaObject.obj_from_primitive(
+        obj_base.expand_primitive(jsonutils.loads(message)), context=ctxt)
+
+
+def best_of(repeat, func, *args):
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        result = func(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--instances', type=int, default=1000,
+                        help='Instances in the list')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Runs of each step, the best one is reported')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    objects.register_all()
+    ctxt = context.get_admin_context()
+    instances = make_instances(ctxt, args.instances)
+
+    print('%8s  %10s  %10s  %10s' % ('format', 'bytes', 'encode ms',
+                                     'decode ms'))
+    for name, encode, decode in (('regular', regular_encode, regular_decode),
+                                 ('compact', compact_encode, compact_decode)):
+        encode_time, message = best_of(args.repeat, encode, instances)
+        decode_time, decoded = best_of(args.repeat, decode, ctxt, message)
+        assert ([inst.uuid for inst in decoded] ==
+                [inst.uuid for inst in instances])
+        print('%8s  %10d  %10.1f  %10.1f' % (name, len(message),
+                                             encode_time * 1000,
+                                             decode_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark policy enforcement over the shipped policy file.
+
+Enforces every rule of etc/nova/policy.json for a few member and admin
+credentials and targets, the way nova.policy.enforce is called by API
+requests, with the interpreting common Enforcer, with the compiled nova
+Enforcer without its decision cache, and with the cache, which by
+default only keeps decisions of rules of --min-cached-checks checks or
+more.
+
+Run like:
+
+    python tools/benchmarks/policy_enforce.py --repeat 200
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                    os.pardir, os.pardir))
+sys.path.insert(0, ROOT)
+
+from oslo.config import cfg
+
+from nova.openstack.common import policy as common_policy
+from nova import policy
+
+CONF = cfg.CONF
+
+
+def make_requests(num_projects):
+    requests = []
+    for i in xrange(num_projects):
+        project_id = 'project-%d' % i
+        user_id = 'user-%d' % i
+        creds = dict(user_id=user_id, project_id=project_id,
+                     roles=['_member_'], is_admin=False)
+        admin_creds = dict(creds, roles=['admin'], is_admin=True)
+        for target in ({'project_id': project_id, 'user_id': user_id},
+                       {'project_id': 'other', 'user_id': 'other'}):
+            requests.append((creds, target))
+            requests.append((admin_creds, target))
+    return requests
+
+
+def time_enforcer(enforcer, rules, requests, repeat):
+    start = time.time()
+    decisions = []
+    for _i in xrange(repeat):
+        for creds, target in requests:
+            for rule in rules:
+                decisions.append(enforcer.enforce(rule, target, creds))
+    return time.time() - start, decisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--policy-file',
+                        default=os.path.join(ROOT, 'etc', 'nova',
+                                             'policy.json'),
+                        help='Policy file to enforce')
+    parser.add_argument('--projects', type=int, default=4,
+                        help='Distinct projects making requests')
+    parser.add_argument('--repeat', type=int, default=100,
+                        help='Times every rule is enforced per request')
+    parser.add_argument('--min-cached-checks', type=int,
+                        default=policy.Enforcer.min_cached_checks,
+                        help='Cache decisions of rules of at least this '
+                             'many checks')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    CONF.set_override('policy_file', args.policy_file)
+
+    requests = make_requests(args.projects)
+    interpreter = common_policy.Enforcer()
+    interpreter.load_rules()
+    rules = sorted(interpreter.rules)
+    uncached = policy.Enforcer()
+    uncached.decision_cache_size = 0
+    cached = policy.Enforcer()
+    cached.min_cached_checks = args.min_cached_checks
+
+    checks = len(rules) * len(requests) * args.repeat
+    print('%d rules, %d checks' % (len(rules), checks))
+    print('%12s  %10s  %12s' % ('enforcer', 'seconds', 'checks/s'))
+    expected = None
+    for name, enforcer in (('interpreted', interpreter),
+                           ('compiled', uncached),
+                           ('cached', cached)):
+        elapsed, decisions = time_enforcer(enforcer, rules, requests,
+                                           args.repeat)
+        if expected is None:
+            expected = decisions
+        assert decisions == expected, name
+        print('%12s  %10.2f  %12.0f' % (name, elapsed, checks / elapsed))
+
+
+if __name__ == '__main__':
+    main()
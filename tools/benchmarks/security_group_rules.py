@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark rendering the security group rules of the instances of a host.
+
+Seeds a database with a default security group of --members instances,
+--instances of them on the benchmarked host, and the usual default group
+rules: one granting access to the members of the group and one opening
+ssh to everyone. Then reports the time the IptablesFirewallDriver takes
+to render the rules of every instance of the host, which is what a
+refresh_security_group_members() of the group does before it rewrites
+the chain of every instance, and the time it takes to handle the
+refresh_instance_security_rules() sent for each instance of the host
+when a member joins or leaves the group. The chains are not rewritten.
+
+"uncached" renders the rules of every instance from scratch, as the
+driver used to; "cached" is IptablesFirewallDriver, which renders the
+rules of the group once.
+
+Run like:
+
+    python tools/benchmarks/security_group_rules.py --instances 200 \\
+        --members 500
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+import eventlet
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+
+from nova import context
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.db.sqlalchemy import migration
+from nova.db.sqlalchemy import models
+from nova.network import linux_net
+from nova.network import model as network_model
+from nova import objects
+from nova.openstack.common import jsonutils
+from nova.openstack.common import timeutils
+from nova.virt import fake
+from nova.virt import firewall
+
+CONF = cfg.CONF
+
+HOST = 'compute-1'
+GROUP_ID = 1
+
+
+class UncachedFirewallDriver(firewall.IptablesFirewallDriver):
+    """Renders the rules of every instance from scratch."""
+
+    def instance_rules(self, instance, network_info):
+        self.clear_security_group_cache()
+        return super(UncachedFirewallDriver, self).instance_rules(
+            instance, network_info)
+
+    def _inner_do_refresh_rules(self, *args):
+        pass
+
+
+class CachedFirewallDriver(firewall.IptablesFirewallDriver):
+    def _inner_do_refresh_rules(self, *args):
+        pass
+
+
+def network_info(index):
+    return network_model.NetworkInfo([network_model.VIF(
+        id=str(uuid.uuid4()), address='fa:16:3e:00:%02x:%02x' % (
+            index // 256 % 256, index % 256),
+        network=network_model.Network(
+            id='net', bridge='br100', label='private',
+            subnets=[network_model.Subnet(
+                cidr='10.0.0.0/16',
+                ips=[network_model.FixedIP(
+                    address='10.0.%d.%d' % (index // 250 % 250,
+                                            index % 250 + 2))])]))])
+
+
+def seed(engine, num_instances, num_members):
+    now = timeutils.utcnow()
+    instances, infos, associations = [], [], []
+    for i in xrange(num_members):
+        instance_uuid = str(uuid.uuid4())
+        host = HOST if i < num_instances else 'compute-2'
+        instances.append(dict(uuid=instance_uuid, project_id='project',
+                              user_id='user', display_name='vm-%d' % i,
+                              host=host, node=host, vm_state='active',
+                              created_at=now, deleted=0))
+        infos.append(dict(instance_uuid=instance_uuid, created_at=now,
+                          network_info=jsonutils.dumps(network_info(i)),
+                          deleted=0))
+        associations.append(dict(security_group_id=GROUP_ID,
+                                 instance_uuid=instance_uuid,
+                                 created_at=now, deleted=0))
+    with engine.begin() as conn:
+        conn.execute(models.SecurityGroup.__table__.insert(),
+                     [dict(id=GROUP_ID, name='default',
+                           description='default', project_id='project',
+                           user_id='user', created_at=now, deleted=0)])
+        conn.execute(models.SecurityGroupIngressRule.__table__.insert(),
+                     [dict(parent_group_id=GROUP_ID, group_id=GROUP_ID,
+                           protocol=None, from_port=None, to_port=None,
+                           cidr=None, created_at=now, deleted=0),
+                      dict(parent_group_id=GROUP_ID, group_id=None,
+                           protocol='tcp', from_port=22, to_port=22,
+                           cidr='0.0.0.0/0', created_at=now, deleted=0)])
+        conn.execute(models.Instance.__table__.insert(), instances)
+        conn.execute(models.InstanceInfoCache.__table__.insert(), infos)
+        conn.execute(
+            models.SecurityGroupInstanceAssociation.__table__.insert(),
+            associations)
+
+
+def render(driver):
+    # Like after a refresh, start without any cached rules.
+    driver.clear_security_group_cache()
+    for instance, nw_info in driver.instance_info.values():
+        driver.instance_rules(instance, nw_info)
+
+
+def refresh(driver):
+    # Like the casts of a member change, received at once.
+    pool = eventlet.GreenPool()
+    for instance, _nw_info in driver.instance_info.values():
+        pool.spawn(driver.refresh_instance_security_rules, instance)
+    pool.waitall()
+
+
+def best_of(repeat, func, *args):
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        result = func(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--instances', type=int, default=200,
+                        help='Instances of the group on the host')
+    parser.add_argument('--members', type=int, default=500,
+                        help='Instances of the group')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs of each step, the best one is reported')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    objects.register_all()
+    # Only render the rules, don't apply them.
+    linux_net.iptables_manager.apply = lambda: None
+    workdir = tempfile.mkdtemp()
+    try:
+        CONF.set_override('connection',
+                          'sqlite:///' + os.path.join(workdir, 'nova.sqlite'),
+                          group='database')
+        migration.db_sync()
+        seed(sqlalchemy_api.get_engine(), args.instances, args.members)
+
+        ctxt = context.get_admin_context()
+        instances = objects.InstanceList.get_by_host(
+            ctxt, HOST, expected_attrs=['info_cache'])
+
+        print('%10s  %10s  %10s' % ('driver', 'render ms', 'refresh ms'))
+        for name, driver_cls in (('uncached', UncachedFirewallDriver),
+                                 ('cached', CachedFirewallDriver)):
+            driver = driver_cls(fake.FakeVirtAPI())
+            for instance in instances:
+                driver.instance_info[instance.id] = (
+                    instance, instance.info_cache.network_info)
+            render_time, _rules = best_of(args.repeat, render, driver)
+            refresh_time, _result = best_of(args.repeat, refresh, driver)
+            print('%10s  %10.1f  %10.1f' % (name, render_time * 1000,
+                                            refresh_time * 1000))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
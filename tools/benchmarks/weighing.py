@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Micro-benchmark per-host versus batched scheduler weighing.
+
+Builds synthetic HostStates with RAM and metrics and times one weighing
+pass of RAMWeigher and MetricsWeigher: per host with a full sort, per host
+with a partial top-k, and with scheduler_vectorized_weighers set.
+
+Run like:
+
+    python tools/benchmarks/weighing.py --hosts 1000,10000 --subset 1
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                                os.pardir, os.pardir)))
+
+from oslo.config import cfg
+
+from nova.scheduler import columns
+from nova.scheduler import host_manager
+from nova.scheduler import weights
+from nova.scheduler.weights import metrics
+from nova.scheduler.weights import ram
+
+CONF = cfg.CONF
+
+WEIGHER_CLASSES = [ram.RAMWeigher, metrics.MetricsWeigher]
+
+
+def make_hosts(num_hosts):
+    hosts = []
+    for i in xrange(num_hosts):
+        host = host_manager.HostState('host%d' % i, 'node%d' % i)
+        host.free_ram_mb = random.randint(-65536, 131072)
+        host.metrics = {
+            'cpu.percent': host_manager.MetricItem(
+                value=random.random(), timestamp=None, source='bench'),
+            'cpu.frequency': host_manager.MetricItem(
+                value=random.randint(1200, 3600), timestamp=None,
+                source='bench')}
+        hosts.append(host)
+    return hosts
+
+
+def time_pass(handler, hosts, limit, repeat):
+    best = None
+    for _i in xrange(repeat):
+        start = time.time()
+        result = handler.get_weighed_objects(WEIGHER_CLASSES, hosts, {},
+                                             limit=limit)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, [weighed.obj for weighed in result[:limit or 1]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--hosts', default='1000,10000',
+                        help='Comma separated host counts')
+    parser.add_argument('--subset', type=int, default=1,
+                        help='scheduler_host_subset_size to select')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Passes per run; the best one is reported')
+    args = parser.parse_args()
+
+    CONF([], project='nova')
+    CONF.set_override('weight_setting',
+                      ['cpu.percent=-1.0', 'cpu.frequency=0.001'],
+                      group='metrics')
+    if not columns.is_available():
+        sys.exit('NumPy is required for batched weighing')
+
+    handler = weights.HostWeightHandler()
+    print('%8s  %12s  %12s  %12s' % ('hosts', 'sorted ms', 'top-k ms',
+                                     'batched ms'))
+    for num_hosts in [int(n) for n in args.hosts.split(',')]:
+        hosts = make_hosts(num_hosts)
+        CONF.set_override('scheduler_vectorized_weighers', False)
+        full, full_best = time_pass(handler, hosts, None, args.repeat)
+        top_k, top_k_best = time_pass(handler, hosts, args.subset,
+                                      args.repeat)
+        CONF.set_override('scheduler_vectorized_weighers', True)
+        batched, batched_best = time_pass(handler, hosts, args.subset,
+                                          args.repeat)
+        assert full_best[0] is top_k_best[0] is batched_best[0]
+        print('%8d  %12.2f  %12.2f  %12.2f' % (num_hosts, full * 1000,
+                                               top_k * 1000, batched * 1000))
+
+
+if __name__ == '__main__':
+    main()